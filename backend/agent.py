@@ -1,30 +1,66 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import select
-from models import AdCampaign, AgentLog
-from db import get_session
+from models import AdCampaign, AgentLog, AgentRun, AIAdvice
+from db import get_async_session
 from sqlmodel import Session
-from typing import List, Any
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Any, Optional
 from datetime import datetime
 from agent_core import ads_agent
+from news import news_fetcher
+from job_queue import job_queue
+from pagination import NEXT_CURSOR_HEADER, keyset_page, split_page, date_range
+from events import event_broker, campaign_topic, sse_stream, sse_message, publish_advice
+from response_cache import response_cache, campaign_tag, RawJSON
+from prompt_builder import NEWS_CANDIDATES, recent_metrics
+from retention import retention_manager
 import json
 import os
-import requests
-from dotenv import load_dotenv
+from contextlib import aclosing
 
 router = APIRouter(prefix="/api/campaigns", tags=["Agent"])
 
-load_dotenv()
-NEWS_API_KEY = os.getenv("NEWS_API_KEY")  # 可选，若有新闻API
+# SSE心跳间隔与单个连接的最长保持时间（秒）
+EVENT_HEARTBEAT = float(os.getenv("EVENT_HEARTBEAT", "15"))
+EVENT_STREAM_MAX_AGE = float(os.getenv("EVENT_STREAM_MAX_AGE", "300"))
 
-# 获取决策链路（从数据库查询真实数据）
+# 获取决策链路：默认返回最近一次Agent运行预先生成的决策链路文档（单行查询，命中响应缓存时不再查询；新的Agent步骤写入后失效）
 @router.get("/{campaign_id}/decisions")
-def get_decision_chain(campaign_id: int, session: Session = Depends(get_session)) -> Any:
-    # 从AgentLog表查询决策链路
-    logs = session.exec(
-        select(AgentLog)
-        .where(AgentLog.campaign_id == campaign_id)
-        .order_by(AgentLog.created_at.asc())
-    ).all()
+async def get_decision_chain(
+    campaign_id: int,
+    request: Request,
+    run_id: Optional[int] = Query(None, description="指定Agent运行，默认最近一次"),
+    created_from: Optional[datetime] = Query(None, description="记录时间起（含），指定时间范围时按日志逐条构建"),
+    created_to: Optional[datetime] = Query(None, description="记录时间止（不含）"),
+    session: AsyncSession = Depends(get_async_session)
+) -> Any:
+    return await response_cache.respond(
+        request, [campaign_tag(campaign_id)], lambda: _load_decision_chain(campaign_id, session, run_id, created_from, created_to)
+    )
+
+async def _load_decision_chain(campaign_id: int, session: AsyncSession, run_id: Optional[int] = None,
+                               created_from: Optional[datetime] = None, created_to: Optional[datetime] = None) -> Any:
+    if run_id is not None or not (created_from or created_to):
+        query = select(AgentRun).where(AgentRun.campaign_id == campaign_id)
+        if run_id is not None:
+            query = query.where(AgentRun.id == run_id)
+        run = (await session.exec(query.order_by(AgentRun.id.desc()).limit(1))).first()
+        if run is not None:
+            # flow在写入步骤时已序列化，直接拼接输出
+            return RawJSON(f'{{"runId":{run.id},"status":{json.dumps(run.status)},"decisionFlow":{run.flow}}}')
+        if run_id is not None:
+            raise HTTPException(status_code=404, detail="Agent运行不存在")
+
+    # 按时间范围查询，或活动只有未按运行分组的历史日志：从AgentLog表逐条构建
+    query = select(AgentLog).where(AgentLog.campaign_id == campaign_id)
+    query = date_range(query, AgentLog.created_at, created_from, created_to)
+    logs = (await session.exec(query.order_by(AgentLog.created_at.asc(), AgentLog.id.asc()))).all()
+    # 时间范围早于热数据窗口时，合并冷归档中的历史步骤
+    logs = await session.run_sync(
+        retention_manager.with_archived, AgentLog, logs, campaign_id, created_from, created_to, descending=False
+    )
     
     # 构建决策链路
     decision_flow = []
@@ -34,14 +70,14 @@ def get_decision_chain(campaign_id: int, session: Session = Depends(get_session)
             "type": log.step,
             "title": log.step.title(),
             "description": log.message,
-            "status": "completed" if log.step != "error" else "error",
+            "status": log.status or ("completed" if log.step != "error" else "error"),
             "timestamp": log.created_at.strftime("%Y-%m-%d %H:%M:%S"),
             "input": json.loads(log.data) if log.data else {},
-            "output": {"message": log.message}
+            "output": json.loads(log.output) if log.output else {"message": log.message}
         })
     
-    # 如果没有日志，返回mock数据
-    if not decision_flow:
+    # 如果没有日志，返回mock数据（仅限未按时间筛选）
+    if not decision_flow and not (created_from or created_to):
         decision_flow = [
             {
                 "id": 1,
@@ -87,29 +123,63 @@ def get_decision_chain(campaign_id: int, session: Session = Depends(get_session)
     
     return {"decisionFlow": decision_flow}
 
+# Agent运行列表（每次优化运行一条决策链路，按开始时间倒序游标分页）
+@router.get("/{campaign_id}/runs")
+async def list_agent_runs(
+    campaign_id: int,
+    response: Response,
+    status: Optional[str] = Query(None, description="按运行状态筛选：running/completed/error"),
+    limit: int = Query(20, ge=1, le=100, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页响应头X-Next-Cursor"),
+    session: AsyncSession = Depends(get_async_session)
+) -> Any:
+    query = select(AgentRun.id, AgentRun.kind, AgentRun.status, AgentRun.step_count, AgentRun.created_at, AgentRun.updated_at, AgentRun.finished_at)
+    query = query.where(AgentRun.campaign_id == campaign_id)
+    if status:
+        query = query.where(AgentRun.status == status)
+    runs, next_cursor = split_page((await session.exec(keyset_page(query, AgentRun, limit, cursor))).all(), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return {
+        "runs": [
+            {
+                "id": run.id,
+                "kind": run.kind,
+                "status": run.status,
+                "stepCount": run.step_count,
+                "createdAt": run.created_at,
+                "updatedAt": run.updated_at,
+                "finishedAt": run.finished_at,
+            }
+            for run in runs
+        ]
+    }
+
 # 获取Agent日志（从数据库查询真实数据）
 @router.get("/{campaign_id}/logs")
-def get_agent_logs(campaign_id: int, session: Session = Depends(get_session)) -> Any:
-    # 从AgentLog表查询日志
-    logs = session.exec(
-        select(AgentLog)
-        .where(AgentLog.campaign_id == campaign_id)
-        .order_by(AgentLog.created_at.desc())
-    ).all()
-    
-    # 构建日志数据
-    agent_logs = []
-    for log in logs:
-        agent_logs.append({
-            "timestamp": log.created_at.strftime("%H:%M:%S"),
-            "level": "info" if log.step != "error" else "error",
-            "component": log.step.title(),
-            "message": log.message,
-            "data": json.loads(log.data) if log.data else {}
-        })
+async def get_agent_logs(
+    campaign_id: int,
+    step: Optional[str] = Query(None, description="按步骤类型筛选"),
+    created_from: Optional[datetime] = Query(None, description="记录时间起（含）"),
+    created_to: Optional[datetime] = Query(None, description="记录时间止（不含）"),
+    limit: int = Query(100, ge=1, le=500, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页响应头X-Next-Cursor"),
+    session: AsyncSession = Depends(get_async_session)
+) -> Any:
+    # 从AgentLog表按(created_at, id)倒序分页查询日志
+    query = select(AgentLog).where(AgentLog.campaign_id == campaign_id)
+    if step:
+        query = query.where(AgentLog.step == step)
+    query = date_range(query, AgentLog.created_at, created_from, created_to)
+    rows = (await session.exec(keyset_page(query, AgentLog, limit, cursor))).all()
+    # 时间范围早于热数据窗口时，从冷归档补齐
+    rows = await session.run_sync(
+        retention_manager.with_archived, AgentLog, rows, campaign_id, created_from, created_to, cursor, limit, step=step
+    )
+    logs, next_cursor = split_page(rows, limit)
     
-    # 如果没有日志，返回mock数据
-    if not agent_logs:
+    # 如果没有日志，返回mock数据（仅限未筛选的第一页）
+    if not logs and not (cursor or step or created_from or created_to):
         agent_logs = [
             {"timestamp": "14:30:15", "level": "info", "component": "DataAnalyzer", "message": "开始分析活动 '春季新品推广' 的表现数据", "data": {"campaign_id": "camp_001", "metrics_count": 12}},
             {"timestamp": "14:30:18", "level": "info", "component": "DataAnalyzer", "message": "CTR: 3.2%, 转化: 3312, 成本: ¥18.8", "data": {}},
@@ -117,63 +187,117 @@ def get_agent_logs(campaign_id: int, session: Session = Depends(get_session)) ->
             {"timestamp": "14:31:00", "level": "info", "component": "Executor", "message": "执行优化: 增加30%预算，扩展关键词，测试新创意", "data": {}},
             {"timestamp": "14:31:05", "level": "info", "component": "Monitor", "message": "开始监控优化后的广告效果", "data": {}}
         ]
+        return {"agentLogs": agent_logs}
     
-    return {"agentLogs": agent_logs}
+    # 日志的data字段写入时已序列化，直接拼接输出，不再逐行解析
+    body = '{"agentLogs":[%s]}' % ",".join(_render_log(log) for log in logs)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return Response(content=body, media_type="application/json", headers=headers)
 
-# 触发Agent优化（集成真实Agent逻辑）
-@router.post("/{campaign_id}/agent/optimize")
-def trigger_agent_optimize(campaign_id: int, session: Session = Depends(get_session)):
-    campaign = session.get(AdCampaign, campaign_id)
+def _render_log(log) -> str:
+    return '{"timestamp":"%s","level":"%s","component":%s,"message":%s,"runId":%s,"data":%s}' % (
+        log.created_at.strftime("%H:%M:%S"),
+        "error" if log.status == "error" or log.step == "error" else "info",
+        json.dumps(log.step.title(), ensure_ascii=False),
+        json.dumps(log.message, ensure_ascii=False),
+        json.dumps(log.run_id),
+        log.data or "{}",
+    )
+
+# 实时推送Agent日志步骤与AI建议状态变更（SSE），断线重连时按Last-Event-ID补发
+@router.get("/{campaign_id}/events")
+async def stream_campaign_events(
+    campaign_id: int,
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+    since: Optional[int] = Query(None, description="等同Last-Event-ID，供无法设置请求头的客户端使用"),
+    session: AsyncSession = Depends(get_async_session)
+):
+    campaign = await session.get(AdCampaign, campaign_id)
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
-    
-    try:
-        # 调用真实Agent进行优化
-        result = ads_agent.optimize_campaign(campaign_id, session)
-        return {
-            "message": f"Agent optimization completed for campaign {campaign_id}",
-            "status": "completed",
-            "result": result
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Agent optimization failed: {str(e)}") 
+    return StreamingResponse(
+        sse_stream(
+            event_broker,
+            campaign_topic(campaign_id),
+            last_event_id if last_event_id is not None else since,
+            heartbeat=EVENT_HEARTBEAT,
+            max_age=EVENT_STREAM_MAX_AGE,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# 后台任务：执行Agent优化
+@job_queue.register("optimize_campaign")
+def _run_optimize_job(payload: dict, session: Session, ctx) -> dict:
+    return ads_agent.optimize_campaign(payload["campaign_id"], session, should_cancel=ctx.check_cancelled)
+
+# 触发Agent优化（入队后立即返回任务ID，通过 /api/jobs/{job_id} 查询进度与结果）
+@router.post("/{campaign_id}/agent/optimize", status_code=202)
+async def trigger_agent_optimize(
+    campaign_id: int,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    session: AsyncSession = Depends(get_async_session)
+):
+    campaign = await session.get(AdCampaign, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    key = f"optimize_campaign:{campaign_id}:{idempotency_key}" if idempotency_key else None
+    job = await run_in_threadpool(job_queue.enqueue, "optimize_campaign", {"campaign_id": campaign_id}, idempotency_key=key)
+    return {
+        "message": f"Agent optimization queued for campaign {campaign_id}",
+        "job_id": job.id,
+        "status": job.status
+    }
 
 @router.post("/{campaign_id}/agent/analyze")
-def analyze_campaign(campaign_id: int, session: Session = Depends(get_session)):
-    campaign = session.get(AdCampaign, campaign_id)
+async def analyze_campaign(
+    campaign_id: int,
+    no_cache: bool = False,
+    stream: bool = Query(False, description="以SSE逐段返回生成内容，完成后保存为AI建议"),
+    session: AsyncSession = Depends(get_async_session),
+):
+    campaign = await session.get(AdCampaign, campaign_id)
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
-    # 1. 抓取行业新闻（可扩展为微博、知乎等）
-    info_list = []
+    # 1. 行业新闻由后台定时抓取入库，这里只读本地存储，不在请求路径上访问外部接口
+    info_list = await session.run_sync(news_fetcher.latest, NEWS_CANDIDATES)
+    metrics = (await session.run_sync(recent_metrics, [campaign_id])).get(campaign_id)
+    # 2. 用AI分析（异步调用，共享连接池）；行业信息按相关度在token预算内截取
+    if stream:
+        return StreamingResponse(
+            _stream_analysis(session.bind, campaign, info_list, metrics, use_cache=not no_cache),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     try:
-        # 示例：用NewsAPI抓取“广告投放”相关新闻
-        if NEWS_API_KEY:
-            url = f"https://newsapi.org/v2/everything?q=广告投放&language=zh&sortBy=publishedAt&apiKey={NEWS_API_KEY}"
-            resp = requests.get(url, timeout=10)
-            resp.raise_for_status()
-            articles = resp.json().get("articles", [])[:5]
-            for art in articles:
-                info_list.append({
-                    "title": art.get("title", ""),
-                    "summary": art.get("description", "") or art.get("content", "") or ""
-                })
-        else:
-            # 没有API Key时，抓取百度新闻（简单爬虫，仅示例）
-            r = requests.get("https://news.baidu.com/widget?id=adnews&ajax=json", timeout=10)
-            if r.ok:
-                data = r.json()
-                for item in data.get("data", {}).get("adnews", {}).get("items", [])[:5]:
-                    info_list.append({
-                        "title": item.get("title", ""),
-                        "summary": item.get("abs", "")
-                    })
+        suggestion = await ads_agent.analyze_campaign(campaign, info_list, use_cache=not no_cache, metrics=metrics)
     except Exception as e:
-        info_list.append({"title": "信息抓取失败", "summary": str(e)})
-    if not info_list:
-        info_list = [{"title": "暂无最新行业信息", "summary": ""}]
-    # 2. 用AI分析
+        suggestion = f"AI分析失败: {e}"
+    return {"info": info_list, "suggestion": suggestion}
+
+async def _stream_analysis(bind, campaign: AdCampaign, info_list: list, metrics: Optional[dict], use_cache: bool):
+    """
+    先推送info事件（行业信息），生成过程中逐段推送token事件；完整结束后保存为AI建议并推送done事件，
+    失败时推送error事件且不保存。客户端中途断开时生成随之取消，同样不保存。
+    生成器在处理函数返回后才运行，请求作用域的会话届时可能已关闭，保存建议时在同一引擎上另开会话
+    """
+    yield sse_message("info", {"info": info_list})
+    parts = []
     try:
-        suggestion = ads_agent.analyze_campaign(campaign, info_list)
+        # 客户端断开时StreamingResponse关闭本生成器，aclosing随之逐层关闭大模型流并归还并发名额
+        async with aclosing(ads_agent.stream_analysis(campaign, info_list, use_cache=use_cache, metrics=metrics)) as texts:
+            async for text in texts:
+                parts.append(text)
+                yield sse_message("token", {"text": text})
     except Exception as e:
-        suggestion = f"AI分析失败: {e}"
-    return {"info": info_list, "suggestion": suggestion} 
\ No newline at end of file
+        yield sse_message("error", {"detail": f"AI分析失败: {e}"})
+        return
+    advice = AIAdvice(campaign_id=campaign.id, type="analysis", content="".join(parts), status="pending")
+    async with AsyncSession(bind, expire_on_commit=False) as session:
+        session.add(advice)
+        await session.commit()
+        await session.refresh(advice)
+    await run_in_threadpool(publish_advice, advice)
+    response_cache.invalidate(campaign_tag(campaign.id))
+    yield sse_message("done", {"advice_id": advice.id, "suggestion": advice.content})
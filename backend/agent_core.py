@@ -1,36 +1,46 @@
-import json
-from datetime import datetime
-from models import AgentLog
 import os
-import requests
-from dotenv import load_dotenv
-
-# 加载环境变量
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+from contextlib import aclosing
+from agent_log import AgentLogWriter
+from events import event_broker
+from llm_client import AsyncLLMClient, LLMError
+from prompt_builder import PromptBuilder
 
 # 简化的Agent核心类（不依赖LangChain）
 class AdsAgent:
-    def __init__(self):
-        pass
+    def __init__(self, llm: AsyncLLMClient = None, log_buffer: int = 50, broker=None,
+                 prompt_builder: PromptBuilder = None, max_tokens: int = None):
+        self.llm = llm or AsyncLLMClient.from_env()
+        # prompt的token预算与回复的token上限
+        self.prompt_builder = prompt_builder or PromptBuilder.from_env()
+        self.max_tokens = max_tokens or int(os.getenv("LLM_MAX_TOKENS", "512"))
+        # 单次优化运行内缓存的日志条数上限，1表示每个步骤单独提交
+        self.log_buffer = log_buffer
+        # 日志写入后推送给SSE订阅者
+        self.broker = broker or event_broker
     
-    def optimize_campaign(self, campaign_id: int, session) -> dict:
-        """执行广告活动优化（简化版本）"""
+    def optimize_campaign(self, campaign_id: int, session, should_cancel=None) -> dict:
+        """执行广告活动优化（简化版本）；should_cancel在每个步骤前调用，可抛出异常中止优化"""
+        check = should_cancel or (lambda: None)
+        with AgentLogWriter(session, campaign_id, max_buffer=self.log_buffer, broker=self.broker, run_kind="optimize") as writer:
+            return self._optimize(writer, campaign_id, check)
+
+    def _optimize(self, writer: AgentLogWriter, campaign_id: int, check) -> dict:
         # 记录开始日志
-        self._log_step(session, campaign_id, "start", "开始广告活动优化", {})
+        self._log_step(writer, "start", "开始广告活动优化", {})
         
         try:
             # 模拟Agent优化流程
             # 1. 数据分析
-            self._log_step(session, campaign_id, "analysis", "分析广告活动表现数据", {
+            check()
+            self._log_step(writer, "analysis", "分析广告活动表现数据", {
                 "ctr": "3.2%",
                 "conversions": 3312,
                 "cost_per_conversion": "¥18.8"
             })
             
             # 2. 决策制定
-            self._log_step(session, campaign_id, "decision", "制定优化策略", {
+            check()
+            self._log_step(writer, "decision", "制定优化策略", {
                 "action": "increase_budget",
                 "budget_increase": "30%",
                 "new_keywords": ["春季新品", "时尚潮流", "优质好物"],
@@ -38,7 +48,8 @@ class AdsAgent:
             })
             
             # 3. 执行优化
-            self._log_step(session, campaign_id, "execution", "执行优化措施", {
+            check()
+            self._log_step(writer, "execution", "执行优化措施", {
                 "status": "executed",
                 "changes_applied": {
                     "budget_increase": "30%",
@@ -48,10 +59,11 @@ class AdsAgent:
             })
             
             # 4. 监控效果
-            self._log_step(session, campaign_id, "monitoring", "开始监控优化效果", {})
+            check()
+            self._log_step(writer, "monitoring", "开始监控优化效果", {})
             
             # 记录完成日志
-            self._log_step(session, campaign_id, "complete", "广告活动优化完成", {
+            self._log_step(writer, "complete", "广告活动优化完成", {
                 "result": "优化成功，预计CTR提升15%"
             })
             
@@ -62,58 +74,40 @@ class AdsAgent:
             }
         except Exception as e:
             # 记录错误日志
-            self._log_step(session, campaign_id, "error", f"优化失败: {str(e)}", {})
+            self._log_step(writer, "error", f"优化失败: {str(e)}", {})
             raise e
     
-    def _log_step(self, session, campaign_id: int, step: str, message: str, data: dict):
-        """记录Agent执行步骤"""
-        log = AgentLog(
-            campaign_id=campaign_id,
-            step=step,
-            message=message,
-            data=json.dumps(data)
-        )
-        session.add(log)
-        session.commit()
+    def _log_step(self, writer: AgentLogWriter, step: str, message: str, data: dict):
+        """记录Agent执行步骤（缓冲写入，运行结束或出错时落库）"""
+        writer.log(step, message, data)
 
-    def analyze_campaign(self, campaign, info_list: list) -> str:
-        """用大模型分析信息和活动，生成广告投放建议"""
-        prompt = self._build_prompt(campaign, info_list)
-        # 优先用OpenAI
-        if OPENAI_API_KEY:
-            return self._call_openai(prompt)
-        elif DEEPSEEK_API_KEY:
-            return self._call_deepseek(prompt)
-        else:
+    async def analyze_campaign(self, campaign, info_list: list, use_cache: bool = True, metrics: dict = None) -> str:
+        """
+        用大模型分析信息和活动，生成广告投放建议（异步，优先OpenAI，失败自动切换DeepSeek；相同prompt命中缓存）。
+        metrics为prompt_builder.recent_metrics预先汇总的近期效果，行业信息按相关度在token预算内截取
+        """
+        if not self.llm.providers:
             return "未配置AI API KEY，无法生成建议。"
+        plan = self._build_prompt(campaign, info_list, metrics)
+        return await self.llm.complete(
+            plan.prompt, max_tokens=self.max_tokens, use_cache=use_cache,
+            purpose="analyze_campaign", campaign_id=campaign.id,
+        )
 
-    def _build_prompt(self, campaign, info_list):
-        info_text = "\n".join([f"- {item['title']}: {item['summary']}" for item in info_list])
-        return f"你是一名广告投放专家。请根据以下最新行业信息和广告活动数据，给出详细的广告投放建议。\n\n【行业信息】\n{info_text}\n\n【广告活动】\n名称: {campaign.name}\n产品: {campaign.product}\n目标: {campaign.objective}\n预算: {campaign.budget}\n\n请用简洁明了的语言输出建议。"
-
-    def _call_openai(self, prompt):
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
-        data = {
-            "model": "gpt-3.5-turbo",
-            "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": 512
-        }
-        resp = requests.post(url, headers=headers, json=data, timeout=30)
-        resp.raise_for_status()
-        return resp.json()["choices"][0]["message"]["content"]
+    async def stream_analysis(self, campaign, info_list: list, use_cache: bool = True, metrics: dict = None):
+        """analyze_campaign的流式版本：逐段产出建议文本，prompt构建方式相同"""
+        if not self.llm.providers:
+            raise LLMError("未配置AI API KEY，无法生成建议。")
+        plan = self._build_prompt(campaign, info_list, metrics)
+        async with aclosing(self.llm.stream(
+            plan.prompt, max_tokens=self.max_tokens, use_cache=use_cache,
+            purpose="analyze_campaign", campaign_id=campaign.id,
+        )) as texts:
+            async for text in texts:
+                yield text
 
-    def _call_deepseek(self, prompt):
-        url = "https://api.deepseek.com/v1/chat/completions"
-        headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}", "Content-Type": "application/json"}
-        data = {
-            "model": "deepseek-chat",
-            "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": 512
-        }
-        resp = requests.post(url, headers=headers, json=data, timeout=30)
-        resp.raise_for_status()
-        return resp.json()["choices"][0]["message"]["content"]
+    def _build_prompt(self, campaign, info_list, metrics: dict = None):
+        return self.prompt_builder.build_analysis(campaign, info_list, metrics)
 
 # 全局Agent实例
 ads_agent = AdsAgent() 
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""
+Agent日志缓冲写入：一次优化运行内的步骤先缓存在内存，按条数/时间阈值或运行结束时在单个事务中批量写入。
+指定run_kind时同一writer写入的步骤归为一次Agent运行（agentrun），步骤在写入时序列化为决策链路条目并追加到运行的flow文档，
+查询决策链路时直接输出该文档，不再逐行解析日志
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime, time as dt_time
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import insert
+
+from events import campaign_topic
+from response_cache import response_cache, campaign_tag
+from models import AgentLog, AgentRun
+
+logger = logging.getLogger("agent_log")
+
+def _default(value):
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def _json_dumps(data) -> str:
+    """未安装orjson时使用，输出与orjson一致：紧凑分隔符、非ASCII字符原样输出、按插入顺序输出键、日期时间转ISO 8601"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default)
+
+try:
+    import orjson
+
+    def dumps(data) -> str:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+except ImportError:  # orjson为可选依赖
+    dumps = _json_dumps
+
+# 必须立即落库的步骤：失败信息不能因为进程随后退出而丢失
+FLUSH_IMMEDIATELY = {"error"}
+
+def step_status(step: str) -> str:
+    return "error" if step == "error" else "completed"
+
+def render_step(index: int, step: str, status: str, message: str, data: dict, output: dict, created_at: datetime) -> str:
+    """决策链路中的单个步骤，写入时序列化一次"""
+    return dumps({
+        "id": index,
+        "type": step,
+        "title": step.title(),
+        "description": message,
+        "status": status,
+        "timestamp": created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "input": data,
+        "output": output,
+    })
+
+def append_flow(flow: str, items: list) -> str:
+    """把已序列化的步骤追加到JSON数组文本末尾，不解析已有内容"""
+    if not items:
+        return flow
+    return flow[:-1] + ("," if flow != "[]" else "") + ",".join(items) + "]"
+
+class AgentLogWriter:
+    def __init__(self, session, campaign_id: int, max_buffer: int = 50, max_age: float = 2.0, broker=None,
+                 run_kind: Optional[str] = None):
+        """
+        max_buffer: 缓存达到该条数时写入
+        max_age: 最早一条缓存日志超过该时长（秒）时写入；步骤之间等待较久（如调用大模型）时由定时器线程写入，
+                 writer存续期间session只能由writer使用
+        broker: 实时事件代理，写入成功后把新步骤推送给订阅者
+        run_kind: 运行类型（如optimize）；指定时首次写入创建agentrun记录并维护其决策链路文档
+        """
+        self.session = session
+        self.campaign_id = campaign_id
+        self.max_buffer = max_buffer
+        self.max_age = max_age
+        self.broker = broker
+        self._buffer = []
+        self._payloads = []
+        self._first_at: Optional[float] = None
+        self.flushes = 0
+        self.run_kind = run_kind
+        self.run_id: Optional[int] = None
+        self._flow_items = []
+        self._steps = 0
+        self._finished: Optional[str] = None
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+
+    def log(self, step: str, message: str, data: dict = None, output: dict = None):
+        with self._lock:
+            self._log(step, message, data, output)
+
+    def _log(self, step: str, message: str, data: dict = None, output: dict = None):
+        if not self._buffer:
+            self._first_at = time.monotonic()
+            self._arm_timer()
+        created_at = datetime.utcnow()
+        status = step_status(step)
+        output = output if output is not None else {"message": message}
+        self._buffer.append({
+            "campaign_id": self.campaign_id,
+            "step": step,
+            "status": status,
+            "message": message,
+            "data": dumps(data or {}),
+            "output": dumps(output),
+            "created_at": created_at,
+        })
+        self._steps += 1
+        if self.run_kind:
+            self._flow_items.append(render_step(self._steps, step, status, message, data or {}, output, created_at))
+        if self.broker is not None:
+            self._payloads.append({
+                "campaign_id": self.campaign_id,
+                "step": step,
+                "message": message,
+                "data": data or {},
+                "output": output,
+                "status": status,
+                "created_at": created_at,
+                # 步骤在所属运行中的序号，与决策链路文档中的id一致
+                "index": self._steps,
+            })
+        if (
+            step in FLUSH_IMMEDIATELY
+            or len(self._buffer) >= self.max_buffer
+            or time.monotonic() - self._first_at >= self.max_age
+        ):
+            self.flush()
+
+    def _arm_timer(self):
+        if self.max_age <= 0:
+            return
+        self._timer = threading.Timer(self.max_age, self._flush_due)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_due(self):
+        """定时器线程：最早一条缓存日志到期时写入，写入失败只记录日志"""
+        try:
+            with self._lock:
+                # 等锁期间缓存已被写入（定时器已取消）时不再重复写入
+                if self._timer is threading.current_thread():
+                    self.flush()
+        except Exception:
+            logger.exception("Agent日志定时写入失败")
+
+    def flush(self):
+        """在单个事务中写入全部缓存日志，并同步更新所属运行的决策链路文档"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer and not (self.run_id and self._finished):
+            return
+        rows, self._buffer = self._buffer, []
+        payloads, self._payloads = self._payloads, []
+        items, self._flow_items = self._flow_items, []
+        self._first_at = None
+        try:
+            if self.run_kind:
+                self._sync_run(items, any(row["status"] == "error" for row in rows))
+                for row in rows:
+                    row["run_id"] = self.run_id
+            if rows:
+                self.session.execute(insert(AgentLog), rows)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        self.flushes += 1
+        for payload in payloads:
+            payload["run_id"] = self.run_id
+        # 决策链路等按活动缓存的响应随新步骤落库失效
+        response_cache.invalidate(campaign_tag(self.campaign_id))
+        if payloads:
+            self._publish(payloads)
+
+    def _sync_run(self, items: list, failed: bool):
+        """创建或更新运行记录：追加决策链路条目、步骤数与状态（与日志写入在同一事务中）"""
+        run = self.session.get(AgentRun, self.run_id) if self.run_id else None
+        if run is None:
+            run = AgentRun(campaign_id=self.campaign_id, kind=self.run_kind)
+        now = datetime.utcnow()
+        run.flow = append_flow(run.flow, items)
+        run.step_count += len(items)
+        run.updated_at = now
+        if failed:
+            run.status = "error"
+        if self._finished:
+            run.status = "error" if run.status == "error" else self._finished
+            run.finished_at = now
+        self.session.add(run)
+        self.session.flush()
+        self.run_id = run.id
+
+    def _publish(self, payloads: list):
+        """推送失败只记录日志，不影响优化流程"""
+        topic = campaign_topic(self.campaign_id)
+        try:
+            self.broker.publish_many([(topic, "agent_log", payload) for payload in payloads])
+        except Exception:
+            logger.exception("推送Agent日志事件失败")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._lock:
+            self._finished = "error" if exc_type else "completed"
+            self.flush()
+        return False
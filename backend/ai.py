@@ -1,20 +1,33 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from sqlalchemy import update
 from sqlmodel import select
 from models import AIAdvice, AIExecution, IndustryBrief, AdCampaign
-from db import get_session
-from sqlmodel import Session
+from db import get_async_session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime
 from typing import List, Optional
+from agent_core import ads_agent
+from news import news_fetcher
+from fastapi.concurrency import run_in_threadpool
+from batch_analysis import create_job, job_progress
+from job_queue import job_queue
+from events import publish_advice
+from response_cache import response_cache, campaign_tag, BRIEF_TAG, DASHBOARD_TAG
+from rule_engine import apply_advice_action, is_rule_advice
+from forecast import DEFAULT_HORIZON, forecast_advices, simulate
+from llm_usage import usage_summary
+from pagination import NEXT_CURSOR_HEADER, keyset_page, split_page, date_range
+from pydantic import BaseModel, Field
 
 router = APIRouter(prefix="/api/ai", tags=["AI"])
 
 # 生成AI建议（可批量/全局）
 @router.post("/advise", response_model=AIAdvice)
-def create_ai_advice(
+async def create_ai_advice(
     campaign_id: Optional[int] = None,
     type: str = "general",
     content: str = "",
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     if not content:
         raise HTTPException(status_code=400, detail="建议内容不能为空")
@@ -26,81 +39,173 @@ def create_ai_advice(
         created_at=datetime.utcnow()
     )
     session.add(advice)
-    session.commit()
-    session.refresh(advice)
+    await session.commit()
+    await session.refresh(advice)
+    await run_in_threadpool(publish_advice, advice)
+    response_cache.invalidate(campaign_tag(advice.campaign_id) if advice.campaign_id else None)
     return advice
 
 # 查询AI建议列表
 @router.get("/advices", response_model=List[AIAdvice])
-def list_ai_advices(
+async def list_ai_advices(
+    response: Response,
     campaign_id: Optional[int] = None,
     status: Optional[str] = None,
-    session: Session = Depends(get_session)
+    type: Optional[str] = None,
+    created_from: Optional[datetime] = Query(None, description="创建时间起（含）"),
+    created_to: Optional[datetime] = Query(None, description="创建时间止（不含）"),
+    limit: int = Query(50, ge=1, le=200, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页响应头X-Next-Cursor"),
+    session: AsyncSession = Depends(get_async_session)
 ):
     query = select(AIAdvice)
     if campaign_id:
         query = query.where(AIAdvice.campaign_id == campaign_id)
     if status:
         query = query.where(AIAdvice.status == status)
-    advices = session.exec(query.order_by(AIAdvice.created_at.desc())).all()
+    if type:
+        query = query.where(AIAdvice.type == type)
+    query = date_range(query, AIAdvice.created_at, created_from, created_to)
+    advices, next_cursor = split_page((await session.exec(keyset_page(query, AIAdvice, limit, cursor))).all(), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return advices
 
 # 审批AI建议
 @router.post("/approve/{advice_id}", response_model=AIAdvice)
-def approve_ai_advice(
+async def approve_ai_advice(
     advice_id: int,
     approve: bool,
     approved_by: Optional[str] = None,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
-    advice = session.get(AIAdvice, advice_id)
+    advice = await session.get(AIAdvice, advice_id)
     if not advice:
         raise HTTPException(status_code=404, detail="AI建议不存在")
     advice.status = "approved" if approve else "rejected"
     advice.approved_by = approved_by
     session.add(advice)
-    session.commit()
-    session.refresh(advice)
+    await session.commit()
+    await session.refresh(advice)
+    await run_in_threadpool(publish_advice, advice)
+    response_cache.invalidate(campaign_tag(advice.campaign_id) if advice.campaign_id else None)
     return advice
 
 # 执行AI建议
 @router.post("/execute/{advice_id}", response_model=AIExecution)
-def execute_ai_advice(
+async def execute_ai_advice(
     advice_id: int,
     result: str = "",
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
-    advice = session.get(AIAdvice, advice_id)
+    advice = await session.get(AIAdvice, advice_id)
     if not advice:
         raise HTTPException(status_code=404, detail="AI建议不存在")
-    advice.status = "executed"
-    advice.executed_at = datetime.utcnow()
-    session.add(advice)
+    if advice.status == "rejected":
+        raise HTTPException(status_code=409, detail="AI建议已被拒绝，不能执行")
+    # 规则引擎生成的建议在人工执行时才真正调整活动，调整预算/状态前必须经过审批
+    action_text = None
+    if advice.status != "executed":
+        rule_advice = await session.run_sync(is_rule_advice, advice_id)
+        if rule_advice and advice.status != "approved":
+            raise HTTPException(status_code=409, detail="规则生成的建议会调整活动预算或状态，请先审批再执行")
+        # 条件UPDATE原子地认领建议：并发执行同一条建议时只有一个请求认领成功，规则动作只执行一次
+        claimable = ["approved"] if rule_advice else ["pending", "approved"]
+        claimed = (await session.execute(
+            update(AIAdvice)
+            .where(AIAdvice.id == advice_id, AIAdvice.status.in_(claimable))
+            .values(status="executed", executed_at=datetime.utcnow())
+        )).rowcount
+        if not claimed:
+            await session.rollback()
+            raise HTTPException(status_code=409, detail="AI建议已被执行或状态已变更，请刷新后重试")
+        try:
+            # 与认领在同一事务中调整活动，失败时一起回滚
+            action_text = await session.run_sync(apply_advice_action, advice_id)
+        except ValueError as e:
+            await session.rollback()
+            raise HTTPException(status_code=409, detail=str(e))
     execution = AIExecution(
         advice_id=advice_id,
-        result=result or f"AI建议已执行: {advice.content}",
+        result=result or (f"规则动作已执行: {action_text}" if action_text else f"AI建议已执行: {advice.content}"),
         executed_at=datetime.utcnow()
     )
     session.add(execution)
-    session.commit()
-    session.refresh(execution)
+    await session.commit()
+    await session.refresh(execution)
+    await session.refresh(advice)
+    await run_in_threadpool(publish_advice, advice)
+    response_cache.invalidate(
+        campaign_tag(advice.campaign_id) if advice.campaign_id else None,
+        DASHBOARD_TAG if action_text else None,
+    )
     return execution
 
+class AdviceForecastRequest(BaseModel):
+    advice_ids: Optional[List[int]] = Field(None, description="指定建议ID，为空时预测全部待审批建议")
+    horizon: int = Field(DEFAULT_HORIZON, ge=1, le=90, description="预测天数")
+
+class BudgetChange(BaseModel):
+    campaign_id: int
+    budget_change: float = Field(..., ge=-100, description="预算调整百分比，30表示提高30%")
+
+class SimulateRequest(BaseModel):
+    items: List[BudgetChange] = Field(..., max_length=20000)
+    horizon: int = Field(DEFAULT_HORIZON, ge=1, le=90, description="预测天数")
+
+# 预测单条建议执行后的花费曲线与转化（审批前参考）
+@router.get("/advices/{advice_id}/forecast")
+async def get_advice_forecast(
+    advice_id: int,
+    horizon: int = Query(DEFAULT_HORIZON, ge=1, le=90, description="预测天数"),
+    budget_change: Optional[float] = Query(None, ge=-100, description="覆盖从建议中识别出的预算调整百分比"),
+    session: AsyncSession = Depends(get_async_session)
+):
+    advice = await session.get(AIAdvice, advice_id)
+    if not advice:
+        raise HTTPException(status_code=404, detail="AI建议不存在")
+    if advice.campaign_id is None:
+        raise HTTPException(status_code=400, detail="该建议未关联广告活动")
+    result = await session.run_sync(forecast_advices, [advice], horizon, budget_change)
+    if not result["forecasts"]:
+        raise HTTPException(status_code=400, detail="该建议不涉及预算调整，请指定budget_change")
+    return result["forecasts"][0]
+
+# 批量预测多条建议，并给出组合合计
+@router.post("/advices/forecast")
+async def forecast_ai_advices(request: AdviceForecastRequest, session: AsyncSession = Depends(get_async_session)):
+    query = select(AIAdvice)
+    if request.advice_ids:
+        query = query.where(AIAdvice.id.in_(request.advice_ids))
+    else:
+        query = query.where(AIAdvice.status == "pending")
+    advices = (await session.exec(query.order_by(AIAdvice.id))).all()
+    return await session.run_sync(forecast_advices, advices, request.horizon, None, False)
+
+# 模拟任意一组活动的预算调整
+@router.post("/forecast/simulate")
+async def simulate_budget_changes(request: SimulateRequest, session: AsyncSession = Depends(get_async_session)):
+    items = [(item.campaign_id, item.budget_change) for item in request.items]
+    return await session.run_sync(simulate, items, request.horizon, False)
+
 # 查询行业快讯
 @router.get("/daily-brief", response_model=List[IndustryBrief])
-def get_daily_brief(
+async def get_daily_brief(
+    request: Request,
     limit: int = 7,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
-    briefs = session.exec(select(IndustryBrief).order_by(IndustryBrief.date.desc()).limit(limit)).all()
-    return briefs
+    async def _build():
+        return (await session.exec(select(IndustryBrief).order_by(IndustryBrief.date.desc()).limit(limit))).all()
+
+    return await response_cache.respond(request, [BRIEF_TAG], _build)
 
 # 新增行业快讯
 @router.post("/daily-brief", response_model=IndustryBrief)
-def create_daily_brief(
+async def create_daily_brief(
     content: str,
     raw_data: Optional[str] = None,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     brief = IndustryBrief(
         content=content,
@@ -108,6 +213,65 @@ def create_daily_brief(
         date=datetime.utcnow()
     )
     session.add(brief)
-    session.commit()
-    session.refresh(brief)
-    return brief 
\ No newline at end of file
+    await session.commit()
+    await session.refresh(brief)
+    response_cache.invalidate(BRIEF_TAG)
+    return brief
+
+# 查询大模型响应缓存统计
+@router.get("/llm-cache/stats")
+def get_llm_cache_stats():
+    cache = ads_agent.llm.cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.snapshot()}
+
+# 查询大模型token用量（按服务商、模型、用途汇总）
+@router.get("/llm-usage/stats")
+async def get_llm_usage_stats(
+    days: int = Query(7, ge=1, le=365),
+    campaign_id: Optional[int] = None,
+    session: AsyncSession = Depends(get_async_session)
+):
+    return await session.run_sync(usage_summary, days, campaign_id)
+
+# 手动触发一次行业新闻抓取
+@router.post("/news/refresh")
+async def refresh_news():
+    return await run_in_threadpool(news_fetcher.refresh)
+
+# 查询行业新闻抓取状态与最新条目
+@router.get("/news")
+async def get_news(limit: int = 20, session: AsyncSession = Depends(get_async_session)):
+    return {
+        "sources": [source.name for source in news_fetcher.sources],
+        "status": news_fetcher.status,
+        "items": await session.run_sync(news_fetcher.latest, limit),
+    }
+
+class BatchAnalyzeRequest(BaseModel):
+    status: Optional[str] = Field(None, description="按活动状态筛选")
+    campaign_ids: Optional[List[int]] = Field(None, description="指定活动ID")
+    concurrency: int = Field(5, ge=1, le=50, description="大模型并发上限")
+    rate: float = Field(0, ge=0, description="每秒最多发起的大模型请求数，0为不限")
+
+# 创建批量分析任务（立即返回任务ID，由任务队列在后台执行）
+@router.post("/batch-analyze")
+async def create_batch_analysis(request: BatchAnalyzeRequest, session: AsyncSession = Depends(get_async_session)):
+    if not request.status and not request.campaign_ids:
+        raise HTTPException(status_code=400, detail="需要指定活动状态或活动ID")
+    job = await session.run_sync(
+        create_job, request.status, request.campaign_ids, request.concurrency, request.rate
+    )
+    queued = await run_in_threadpool(
+        job_queue.enqueue, "batch_analysis", {"analysis_job_id": job.id}, idempotency_key=f"batch_analysis:{job.id}"
+    )
+    return {"job_id": job.id, "queue_job_id": queued.id, "total": job.total, "status": job.status}
+
+# 查询批量分析任务进度与结果
+@router.get("/batch-analyze/{job_id}")
+async def get_batch_analysis(job_id: int, session: AsyncSession = Depends(get_async_session)):
+    progress = await session.run_sync(job_progress, job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="批量分析任务不存在")
+    return progress
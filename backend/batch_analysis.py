@@ -0,0 +1,272 @@
+"""
+批量分析任务：按状态或ID选取活动，只抓取一次行业信息，并发调用大模型并把结果写成AIAdvice
+
+命令行用法（在backend目录下）:
+    python batch_analysis.py --status running --concurrency 5 --rate 2
+    python batch_analysis.py --ids 1 2 3
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from models import AdCampaign, AIAdvice, AnalysisJob, AnalysisJobItem
+from events import publish_advice
+from job_queue import job_queue
+from response_cache import response_cache, campaign_tag
+from prompt_builder import NEWS_CANDIDATES, recent_metrics
+
+logger = logging.getLogger("batch_analysis")
+
+class RateLimiter:
+    """按固定间隔放行请求的异步限流器（rate为每秒请求数，<=0表示不限流）"""
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+def _engine(engine=None):
+    if engine is None:
+        from db import engine as default_engine
+        return default_engine
+    return engine
+
+def create_job(session: Session, status: Optional[str] = None, campaign_ids: Optional[List[int]] = None, concurrency: int = 5, rate: float = 0) -> AnalysisJob:
+    """选取活动并创建任务与任务明细，返回待执行的任务"""
+    query = select(AdCampaign.id)
+    if campaign_ids:
+        query = query.where(AdCampaign.id.in_(campaign_ids))
+    if status:
+        query = query.where(AdCampaign.status == status)
+    ids = session.exec(query.order_by(AdCampaign.id)).all()
+    job = AnalysisJob(
+        params=json.dumps({"status": status, "campaign_ids": campaign_ids, "concurrency": concurrency, "rate": rate}),
+        total=len(ids),
+    )
+    session.add(job)
+    session.flush()
+    for campaign_id in ids:
+        session.add(AnalysisJobItem(job_id=job.id, campaign_id=campaign_id))
+    session.commit()
+    session.refresh(job)
+    return job
+
+def _finish_item(engine, item_id: int, campaign_id: int, suggestion: Optional[str], error: Optional[str]):
+    """写入单个活动的结果：成功时生成AIAdvice，并更新任务进度"""
+    with Session(engine) as session:
+        item = session.get(AnalysisJobItem, item_id)
+        advice = None
+        if error is None:
+            advice = AIAdvice(campaign_id=campaign_id, type="analysis", content=suggestion, status="pending")
+            session.add(advice)
+            session.flush()
+            item.advice_id = advice.id
+            item.status = "completed"
+            counter = {"succeeded": AnalysisJob.succeeded + 1}
+        else:
+            item.status = "failed"
+            item.error = error
+            counter = {"failed": AnalysisJob.failed + 1}
+        item.finished_at = datetime.utcnow()
+        session.add(item)
+        # 同一任务的多个活动在不同线程并发写入，进度计数在数据库中原子累加，避免读改写丢失更新
+        session.execute(update(AnalysisJob).where(AnalysisJob.id == item.job_id).values(**counter))
+        session.commit()
+        if advice is not None:
+            session.refresh(advice)
+            publish_advice(advice)
+            response_cache.invalidate(campaign_tag(campaign_id))
+
+async def run_job(job_id: int, agent=None, fetcher=None, engine=None):
+    """执行批量分析任务：行业信息只读取一次，大模型调用按并发上限与限流扇出"""
+    if agent is None:
+        from agent_core import ads_agent as agent
+    if fetcher is None:
+        from news import news_fetcher as fetcher
+    engine = _engine(engine)
+
+    def _load():
+        with Session(engine) as session:
+            job = session.get(AnalysisJob, job_id)
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+            params = json.loads(job.params or "{}")
+            rows = session.exec(
+                select(AnalysisJobItem, AdCampaign)
+                .join(AdCampaign, AdCampaign.id == AnalysisJobItem.campaign_id)
+                .where(AnalysisJobItem.job_id == job_id, AnalysisJobItem.status == "pending")
+            ).all()
+            info_list = fetcher.latest(session, NEWS_CANDIDATES)
+            # 所有活动的近期效果一次查询汇总好，随prompt一起发送
+            metrics = recent_metrics(session, [campaign.id for _, campaign in rows])
+            return params, [(item.id, campaign) for item, campaign in rows], info_list, metrics
+
+    def _set_status(status: str, error: Optional[str] = None):
+        with Session(engine) as session:
+            job = session.get(AnalysisJob, job_id)
+            job.status = status
+            job.error = error
+            job.finished_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+
+    def _fail_pending(error: str):
+        """整个任务无法执行：未完成的活动全部记为失败"""
+        with Session(engine) as session:
+            now = datetime.utcnow()
+            job = session.get(AnalysisJob, job_id)
+            items = session.exec(
+                select(AnalysisJobItem).where(AnalysisJobItem.job_id == job_id, AnalysisJobItem.status == "pending")
+            ).all()
+            for item in items:
+                item.status = "failed"
+                item.error = error
+                item.finished_at = now
+                session.add(item)
+            job.failed += len(items)
+            job.status = "failed"
+            job.error = error
+            job.finished_at = now
+            session.add(job)
+            session.commit()
+
+    if not agent.llm.providers:
+        # 未配置服务商时analyze_campaign只返回提示文本，不能当作分析结果写成AIAdvice
+        await asyncio.to_thread(_fail_pending, "未配置AI API KEY，无法生成建议。")
+        return
+
+    try:
+        params, items, info_list, metrics = await asyncio.to_thread(_load)
+        semaphore = asyncio.Semaphore(max(1, int(params.get("concurrency") or 5)))
+        limiter = RateLimiter(params.get("rate") or 0)
+
+        async def _analyze(item_id: int, campaign):
+            async with semaphore:
+                await limiter.acquire()
+                try:
+                    suggestion, error = await agent.analyze_campaign(campaign, info_list, metrics=metrics.get(campaign.id)), None
+                except Exception as e:
+                    logger.warning("活动%s分析失败: %s", campaign.id, e)
+                    suggestion, error = None, str(e)
+            try:
+                await asyncio.to_thread(_finish_item, engine, item_id, campaign.id, suggestion, error)
+            except Exception as e:
+                # 写入失败时事务已回滚，改记为失败；单个活动出错不影响同批其他活动
+                logger.exception("活动%s结果写入失败", campaign.id)
+                if error is None:
+                    await asyncio.to_thread(_finish_item, engine, item_id, campaign.id, None, f"保存结果失败: {e}")
+                else:
+                    raise
+
+        results = await asyncio.gather(*[_analyze(item_id, campaign) for item_id, campaign in items], return_exceptions=True)
+        for (_, campaign), result in zip(items, results):
+            if isinstance(result, Exception):
+                logger.error("活动%s结果未能写入，保留为pending，任务重试时重新分析: %s", campaign.id, result)
+        await asyncio.to_thread(_set_status, "completed")
+    except Exception as e:
+        logger.exception("批量分析任务%s失败", job_id)
+        await asyncio.to_thread(_set_status, "failed", str(e))
+
+@job_queue.register("batch_analysis")
+def _run_batch_job(payload: dict, session: Session, ctx) -> dict:
+    """在任务队列worker线程中执行；重试或worker退出后回收时只重新分析仍为pending的活动"""
+    from agent_core import ads_agent
+
+    async def _run():
+        try:
+            await run_job(payload["analysis_job_id"], engine=ctx.queue.engine)
+        finally:
+            # asyncio.run结束时事件循环随之关闭，只关闭在该循环上创建的大模型连接池，不影响其他线程
+            await ads_agent.llm.aclose(current_only=True)
+
+    asyncio.run(_run())
+    job = session.get(AnalysisJob, payload["analysis_job_id"])
+    return {"status": job.status, "succeeded": job.succeeded, "failed": job.failed, "total": job.total}
+
+def job_progress(session: Session, job_id: int) -> Optional[dict]:
+    """查询任务进度与已完成的结果"""
+    job = session.get(AnalysisJob, job_id)
+    if job is None:
+        return None
+    rows = session.exec(
+        select(AnalysisJobItem, AIAdvice)
+        .join(AIAdvice, AIAdvice.id == AnalysisJobItem.advice_id, isouter=True)
+        .where(AnalysisJobItem.job_id == job_id)
+        .order_by(AnalysisJobItem.id)
+    ).all()
+    return {
+        "id": job.id,
+        "status": job.status,
+        "params": json.loads(job.params or "{}"),
+        "total": job.total,
+        "succeeded": job.succeeded,
+        "failed": job.failed,
+        "pending": job.total - job.succeeded - job.failed,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "items": [
+            {
+                "campaign_id": item.campaign_id,
+                "status": item.status,
+                "advice_id": item.advice_id,
+                "suggestion": advice.content if advice else None,
+                "error": item.error,
+            }
+            for item, advice in rows
+        ],
+    }
+
+def main():
+    from db import engine, init_db
+
+    parser = argparse.ArgumentParser(description="批量分析广告活动")
+    parser.add_argument("--status", help="按活动状态筛选，如running")
+    parser.add_argument("--ids", type=int, nargs="*", help="指定活动ID")
+    parser.add_argument("--concurrency", type=int, default=5, help="大模型并发上限")
+    parser.add_argument("--rate", type=float, default=0, help="每秒最多发起的大模型请求数，0为不限")
+    args = parser.parse_args()
+
+    init_db()
+    with Session(engine) as session:
+        job = create_job(session, status=args.status, campaign_ids=args.ids, concurrency=args.concurrency, rate=args.rate)
+    print(f"🚀 批量分析任务 {job.id}：共 {job.total} 个活动")
+
+    async def _run():
+        from agent_core import ads_agent
+        try:
+            await run_job(job.id)
+        finally:
+            # asyncio.run结束时事件循环随之关闭，先关闭在该循环上创建的大模型连接池
+            await ads_agent.llm.aclose()
+
+    asyncio.run(_run())
+    with Session(engine) as session:
+        progress = job_progress(session, job.id)
+    for item in progress["items"]:
+        mark = "✅" if item["status"] == "completed" else "❌"
+        print(f"{mark} 活动 {item['campaign_id']}: {item['suggestion'] or item['error']}")
+    print(f"📊 成功 {progress['succeeded']} / 失败 {progress['failed']} / 共 {progress['total']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Agent日志写入基准测试 - 对比每步提交与缓冲批量提交下 optimize_campaign 的吞吐（次/秒）
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_agent_log [运行次数] [并发线程数]
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+
+from agent_core import AdsAgent
+from benchmarks.seed import make_engine, seed_campaigns
+from llm_client import AsyncLLMClient
+
+def run(log_buffer: int, runs: int, threads: int) -> float:
+    engine = make_engine()
+    campaign_ids = seed_campaigns(engine, 100)
+    agent = AdsAgent(llm=AsyncLLMClient([]), log_buffer=log_buffer)
+    errors = []
+
+    def _one(i: int):
+        with Session(engine) as session:
+            try:
+                agent.optimize_campaign(campaign_ids[i % len(campaign_ids)], session)
+            except OperationalError as e:
+                errors.append(e)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(_one, range(runs)))
+    elapsed = time.perf_counter() - start
+    if errors:
+        print(f"   ⚠️  {len(errors)} 次运行因数据库锁失败")
+    return runs / elapsed
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    print("🚀 Agent日志写入基准测试")
+    print("=" * 50)
+    before = run(1, runs, threads)
+    print(f"✅ 每步提交（优化前）  {before:8.1f} 次/秒")
+    after = run(50, runs, threads)
+    print(f"✅ 缓冲批量提交（优化后）{after:8.1f} 次/秒")
+    print("=" * 50)
+    print(f"📊 提升 {after / before:.1f}x（{runs} 次运行，{threads} 个并发线程）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+批量活动操作基准测试 - 对比逐条请求与批量接口创建、更新、变更状态的吞吐（条/秒）
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_bulk_campaigns [条数]
+"""
+
+import sys
+import time
+from fastapi.testclient import TestClient
+
+from benchmarks.seed import make_engine, use_engine
+from main import app
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+def run(client: TestClient, n: int, offset: int, bulk: bool) -> dict:
+    """在一批新建的活动上依次执行创建、更新、变更状态，返回各操作耗时"""
+    creates = [
+        {"name": f"活动{offset + i}", "product": f"产品{i % 50}", "objective": "转化优化", "budget": 1000.0 + i}
+        for i in range(n)
+    ]
+    ids = []
+
+    def _create():
+        if bulk:
+            resp = client.post("/api/campaigns/bulk/create", json={"items": creates})
+            ids.extend(r["id"] for r in resp.json()["results"])
+        else:
+            for item in creates:
+                ids.append(client.post("/api/campaigns/", json=item).json()["id"])
+
+    def _update():
+        if bulk:
+            client.post("/api/campaigns/bulk/update", json={"items": [{"id": i, "budget": 2000.0} for i in ids]})
+        else:
+            for i in ids:
+                client.put(f"/api/campaigns/{i}", json={"budget": 2000.0})
+
+    def _status():
+        if bulk:
+            client.post("/api/campaigns/bulk/status", json={"items": [{"id": i, "status": "paused"} for i in ids]})
+        else:
+            for i in ids:
+                client.post(f"/api/campaigns/{i}/status", json={"status": "paused"})
+
+    timings = {"create": _timed(_create), "update": _timed(_update), "status": _timed(_status)}
+    assert len(ids) == n
+    return timings
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print("🚀 批量活动操作基准测试")
+    print("=" * 50)
+    engine = make_engine()
+    async_engine = use_engine(app, engine)
+    try:
+        # 不进入TestClient上下文：不执行启动钩子（不会连ads_agent.db初始化、启动后台抓取与任务worker）
+        client = TestClient(app)
+        single = run(client, n, 0, bulk=False)
+        bulk = run(client, n, n, bulk=True)
+    finally:
+        app.dependency_overrides.clear()
+
+    for op, label in (("create", "创建"), ("update", "更新"), ("status", "变更状态")):
+        print(f"✅ {label:6s} 逐条 {n / single[op]:9.1f} 条/秒   批量 {n / bulk[op]:9.1f} 条/秒   提升 {single[op] / bulk[op]:6.1f}x")
+    print("=" * 50)
+    print(f"📊 {n} 个活动，逐条为 {n} 次请求/事务，批量为 1 次请求/事务")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+仪表盘总览基准测试 - 验证数据量增长时 /api/dashboard/overview 的延迟保持平稳
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_dashboard [最大效果数据行数]
+"""
+
+import sys
+import time
+from sqlmodel import Session
+
+from benchmarks.seed import make_engine, seed_campaigns, seed_results
+from dashboard import build_overview
+from rollups import refresh_rollups
+
+def measure(engine, repeat: int = 20) -> float:
+    """返回多次调用的中位数延迟（毫秒）"""
+    samples = []
+    with Session(engine) as session:
+        # 总览只读汇总表，先把造好的效果数据汇总进去
+        refresh_rollups(session)
+        build_overview(session)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            build_overview(session)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    recent_per_day = 5000
+    sizes = [s for s in (10_000, 100_000, max_rows) if s <= max_rows]
+    print("🚀 仪表盘总览基准测试")
+    print("=" * 50)
+    results = []
+    for size in sizes:
+        engine = make_engine()
+        campaign_ids = seed_campaigns(engine, 1000)
+        start = time.perf_counter()
+        seed_results(engine, campaign_ids, size, recent_per_day=recent_per_day)
+        print(f"  造数 {size:>9} 行，用时 {time.perf_counter() - start:.1f}s")
+        latency = measure(engine)
+        results.append((size, latency))
+        print(f"✅ {size:>9} 行效果数据 - p50延迟 {latency:.2f} ms")
+    print("=" * 50)
+    ratio = results[-1][1] / results[0][1] if results[0][1] else 0
+    print(f"📊 最大/最小数据量延迟比: {ratio:.2f}x")
+    if ratio > 3:
+        print("⚠️  延迟随数据量明显增长，请检查索引与查询计划")
+        sys.exit(1)
+    print("🎉 延迟保持平稳")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+数据库配置负载测试 - 对比默认SQLite配置（回滚日志、synchronous=FULL、无组合索引）
+与生产配置（WAL、synchronous=NORMAL、mmap/cache、组合索引）下的读写并发表现
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_db_profile [每轮秒数] [读线程数] [写线程数]
+"""
+
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from benchmarks.seed import make_engine, seed_campaigns
+from models import AgentLog, AIAdvice
+
+LEGACY_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL", "mmap_size": 0, "cache_size": -2000, "temp_store": None}
+
+def seed(engine, campaigns: int = 2000, logs: int = 200_000, advices: int = 50_000):
+    ids = seed_campaigns(engine, campaigns)
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        for start in range(0, logs, 50_000):
+            session.execute(insert(AgentLog), [
+                {"campaign_id": rng.choice(ids), "step": "analysis", "message": "m", "data": "{}", "created_at": now - timedelta(seconds=i)}
+                for i in range(start, min(start + 50_000, logs))
+            ])
+        session.execute(insert(AIAdvice), [
+            {"campaign_id": rng.choice(ids), "type": "analysis", "content": "c", "status": rng.choice(["pending", "approved", "executed"]), "created_at": now - timedelta(seconds=i)}
+            for i in range(advices)
+        ])
+        session.commit()
+    return ids
+
+def run(engine, ids: list, seconds: float, readers: int, writers: int) -> dict:
+    stop = time.monotonic() + seconds
+    stats = {"reads": [], "writes": [], "errors": 0}
+    lock = threading.Lock()
+
+    def _reader(seed_value: int):
+        rng = random.Random(seed_value)
+        with Session(engine) as session:
+            while time.monotonic() < stop:
+                campaign_id = rng.choice(ids)
+                start = time.perf_counter()
+                try:
+                    session.exec(select(AgentLog).where(AgentLog.campaign_id == campaign_id).order_by(AgentLog.created_at.desc()).limit(50)).all()
+                    session.exec(select(AIAdvice).where(AIAdvice.campaign_id == campaign_id, AIAdvice.status == "pending").order_by(AIAdvice.created_at.desc())).all()
+                    session.rollback()
+                except OperationalError:
+                    with lock:
+                        stats["errors"] += 1
+                    continue
+                with lock:
+                    stats["reads"].append(time.perf_counter() - start)
+
+    def _writer(seed_value: int):
+        rng = random.Random(seed_value)
+        with Session(engine) as session:
+            while time.monotonic() < stop:
+                start = time.perf_counter()
+                try:
+                    session.add(AgentLog(campaign_id=rng.choice(ids), step="execution", message="m", data="{}"))
+                    session.commit()
+                except OperationalError:
+                    session.rollback()
+                    with lock:
+                        stats["errors"] += 1
+                    continue
+                with lock:
+                    stats["writes"].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=_reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=_writer, args=(100 + i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return stats
+
+def _p95(samples: list) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[int(len(samples) * 0.95)] * 1000
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    writers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    print("🚀 数据库配置负载测试")
+    print("=" * 50)
+    profiles = [
+        ("默认配置", make_engine(migrate=False, pragmas=LEGACY_PRAGMAS)),
+        ("生产配置", make_engine()),
+    ]
+    for name, engine in profiles:
+        ids = seed(engine)
+        stats = run(engine, ids, seconds, readers, writers)
+        print(f"✅ {name}: 读 {len(stats['reads']) / seconds:8.1f} 次/秒 (p95 {_p95(stats['reads']):6.2f} ms)，"
+              f"写 {len(stats['writes']) / seconds:8.1f} 次/秒 (p95 {_p95(stats['writes']):6.2f} ms)，锁冲突 {stats['errors']}")
+    print("=" * 50)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+决策链路基准测试 - 活动历史日志增长时，逐条解析日志构建决策链路 vs 直接输出预先生成的运行文档的延迟
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_decisions [每个活动的历史日志条数...]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from agent_core import AdsAgent
+from benchmarks.seed import make_engine, seed_agent_logs, seed_campaigns, use_engine
+from main import app
+from response_cache import response_cache
+
+def measure(client: TestClient, path: str, params: dict, repeat: int = 50) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resp = client.get(path, params=params)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert resp.status_code == 200, resp.text
+    return statistics.median(samples)
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000]
+    print("🚀 决策链路基准测试")
+    print("=" * 50)
+    # 关闭响应缓存，测量每次请求实际的构建开销
+    response_cache.enabled = False
+    agent = AdsAgent()
+    for size in sizes:
+        engine = make_engine()
+        ids = seed_campaigns(engine, 10)
+        seed_agent_logs(engine, ids, size * len(ids))
+        with Session(engine) as session:
+            agent.optimize_campaign(ids[0], session)
+        async_engine = use_engine(app, engine)
+        client = TestClient(app)
+        path = f"/api/campaigns/{ids[0]}/decisions"
+        try:
+            per_row = measure(client, path, {"created_from": "2000-01-01T00:00:00"})
+            per_run = measure(client, path, {})
+        finally:
+            asyncio.run(async_engine.dispose())
+        print(f"✅ 历史日志 {size:6d} 条  逐条构建 {per_row:8.2f} ms  运行文档 {per_run:6.2f} ms")
+    print("=" * 50)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+数据导出基准测试 - 流式导出Agent日志时的吞吐与内存峰值，
+数据量翻倍时内存峰值应保持不变且低于上限，超过上限时以非零状态码退出
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_export [最大行数] [内存上限MB]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from benchmarks.seed import make_engine, seed_campaigns, seed_agent_logs
+from export import AGENT_LOG_COLUMNS, agent_logs_query, iter_export, pa
+
+def run(engine, fmt: str) -> tuple:
+    """完整消费一次导出，返回(输出字节数, 耗时秒, Python内存峰值MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = 0
+    for block in iter_export(engine, agent_logs_query(), AGENT_LOG_COLUMNS, fmt):
+        size += len(block)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, elapsed, peak / 1024 / 1024
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 400000
+    ceiling = float(sys.argv[2]) if len(sys.argv) > 2 else 64
+    formats = ["csv", "ndjson"] + (["parquet"] if pa is not None else [])
+    print("🚀 数据导出基准测试")
+    print("=" * 50)
+    failed = False
+    for rows in (max_rows // 4, max_rows):
+        engine = make_engine()
+        seed_agent_logs(engine, seed_campaigns(engine, 1000), rows)
+        print(f"📦 Agent日志 {rows} 行")
+        for fmt in formats:
+            size, elapsed, peak = run(engine, fmt)
+            mark = "✅" if peak <= ceiling else "❌"
+            failed = failed or peak > ceiling
+            print(f"{mark} {fmt:8s} {size / 1024 / 1024:8.1f} MB  {rows / elapsed:9.0f} 行/秒  内存峰值 {peak:6.1f} MB")
+        engine.dispose()
+    print("=" * 50)
+    print(f"📊 内存上限 {ceiling:.0f} MB：{'超出' if failed else '全部通过'}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
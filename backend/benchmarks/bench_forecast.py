@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+预算预测基准测试 - 1万个活动：首次拟合、新数据到达后的增量更新、批量模拟预算调整的耗时，
+并用已知的响应曲线造数，检查拟合出的花费弹性是否接近真实值。汇总表刷新的耗时单独列出
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_forecast [活动数] [天数]
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from benchmarks.seed import make_engine, seed_campaigns
+from forecast import refresh_forecast_params, simulate
+from models import AdResult, ForecastParams
+from rollups import refresh_rollups
+
+def seed_curves(engine, campaign_ids: list, days: int, offset: int = 0, seed: int = 42, chunk: int = 50000) -> np.ndarray:
+    """
+    每个活动每天写入一条效果数据：日花费在基准值附近波动，转化 = a·花费^b（含噪声），
+    返回各活动真实的弹性b
+    """
+    rng = np.random.default_rng(seed)
+    n = len(campaign_ids)
+    base = rng.uniform(200, 2000, n)
+    scale = rng.uniform(0.02, 0.2, n)
+    elasticity = rng.uniform(0.4, 0.9, n)
+    rng = np.random.default_rng(seed + offset + 1)
+    today = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+    with Session(engine) as session:
+        batch = []
+        for d in range(days):
+            spend = base * rng.uniform(0.5, 1.5, n)
+            conversions = np.maximum(np.rint(scale * spend ** elasticity * rng.lognormal(0, 0.1, n)), 0)
+            ts = today - timedelta(days=days - d - offset)
+            batch.extend(
+                {"campaign_id": cid, "impressions": int(s * 20), "clicks": int(s), "conversions": int(c), "cost": round(float(s), 2), "created_at": ts}
+                for cid, s, c in zip(campaign_ids, spend, conversions)
+            )
+            if len(batch) >= chunk:
+                session.execute(insert(AdResult), batch)
+                batch = []
+        if batch:
+            session.execute(insert(AdResult), batch)
+        session.commit()
+    return elasticity
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    print("🚀 预算预测基准测试")
+    print("=" * 50)
+    engine = make_engine()
+    campaign_ids = seed_campaigns(engine, n)
+    elasticity = seed_curves(engine, campaign_ids, days)
+    print(f"📦 {n} 个活动 × {days} 天效果数据")
+    with Session(engine) as session:
+        _, elapsed = _timed(refresh_rollups, session)
+        print(f"📦 汇总表刷新: {elapsed * 1000:8.1f} ms")
+        summary, elapsed = _timed(refresh_forecast_params, session)
+        print(f"✅ 首次拟合: {summary['campaigns']} 个活动 {elapsed * 1000:8.1f} ms")
+
+        seed_curves(engine, campaign_ids, 1, offset=1)
+        _, elapsed = _timed(refresh_rollups, session)
+        print(f"📦 新增一天数据后汇总表刷新: {elapsed * 1000:8.1f} ms")
+        summary, elapsed = _timed(refresh_forecast_params, session)
+        print(f"✅ 新增一天数据后增量更新: {summary['days']} 个(活动, 天) {elapsed * 1000:8.1f} ms")
+
+        slopes = np.array(session.exec(select(ForecastParams.slope).order_by(ForecastParams.campaign_id)).all())
+        error = np.abs(slopes - elasticity)
+        print(f"✅ 花费弹性拟合误差: 中位数 {np.median(error):.3f}，90分位 {np.percentile(error, 90):.3f}")
+
+        items = [(cid, 30.0) for cid in campaign_ids]
+        result, elapsed = _timed(simulate, session, items, 14, False)
+        portfolio = result["portfolio"]
+        print(f"✅ 模拟 {n} 个活动预算提高30%: {elapsed * 1000:8.1f} ms")
+        print(f"   14天花费 {portfolio['current_spend']:.0f} → {portfolio['projected_spend']:.0f}，"
+              f"转化 {portfolio['current_conversions']:.0f} → {portfolio['projected_conversions']:.0f}")
+    engine.dispose()
+    print("=" * 50)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+批量导入基准测试 - 测量 POST /api/results/bulk 在SQLite上的吞吐（行/秒）
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_ingest [行数]
+"""
+
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+
+from benchmarks.seed import make_engine, seed_campaigns, use_engine
+from main import app
+
+def ndjson_body(n: int, campaign_ids: list, seed: int = 42):
+    """按块生成NDJSON请求体，客户端同样不在内存里拼出完整上传内容"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    batch = []
+    for i in range(n):
+        impressions = rng.randint(100, 10000)
+        clicks = rng.randint(0, impressions // 10)
+        batch.append(json.dumps({
+            "campaign_id": rng.choice(campaign_ids),
+            "impressions": impressions,
+            "clicks": clicks,
+            "conversions": rng.randint(0, clicks // 5),
+            "cost": round(clicks * rng.uniform(0.5, 3.0), 2),
+            "created_at": (now - timedelta(seconds=rng.randint(0, 7 * 86400))).isoformat(),
+        }))
+        if len(batch) == 1000:
+            yield ("\n".join(batch) + "\n").encode()
+            batch = []
+    if batch:
+        yield ("\n".join(batch) + "\n").encode()
+
+def csv_body(n: int, campaign_ids: list, seed: int = 42):
+    rng = random.Random(seed)
+    yield b"campaign_id,impressions,clicks,conversions,cost\n"
+    batch = []
+    for i in range(n):
+        impressions = rng.randint(100, 10000)
+        clicks = rng.randint(0, impressions // 10)
+        batch.append(f"{rng.choice(campaign_ids)},{impressions},{clicks},{rng.randint(0, clicks // 5)},{clicks * 1.5:.2f}")
+        if len(batch) == 1000:
+            yield ("\n".join(batch) + "\n").encode()
+            batch = []
+    if batch:
+        yield ("\n".join(batch) + "\n").encode()
+
+def run(fmt: str, n: int) -> float:
+    engine = make_engine()
+    campaign_ids = seed_campaigns(engine, 1000)
+
+    use_engine(app, engine)
+    try:
+        client = TestClient(app)
+        body = ndjson_body(n, campaign_ids) if fmt == "ndjson" else csv_body(n, campaign_ids)
+        content_type = "application/x-ndjson" if fmt == "ndjson" else "text/csv"
+        start = time.perf_counter()
+        resp = client.post("/api/results/bulk?refresh=false", content=body, headers={"content-type": content_type})
+        elapsed = time.perf_counter() - start
+    finally:
+        app.dependency_overrides.clear()
+    resp.raise_for_status()
+    report = resp.json()
+    assert report["inserted"] == n, report
+    return n / elapsed
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print("🚀 批量导入基准测试")
+    print("=" * 50)
+    for fmt in ("ndjson", "csv"):
+        rate = run(fmt, n)
+        print(f"✅ {fmt:<6} {n} 行 - 吞吐 {rate:,.0f} 行/秒")
+    print("=" * 50)
+
+if __name__ == "__main__":
+    main()
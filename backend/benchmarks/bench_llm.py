@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+大模型客户端基准测试 - 用本地假服务验证并发上限、延迟与故障切换（完全离线）
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_llm [请求数] [并发上限]
+"""
+
+import asyncio
+import sys
+import time
+import httpx
+
+from benchmarks.fake_llm import create_fake_llm_app
+from llm_client import AsyncLLMClient, LLMProvider
+import logging
+
+logging.getLogger("llm_client").setLevel(logging.ERROR)
+
+class _Router(httpx.AsyncBaseTransport):
+    """按域名把请求分发给不同的假服务，模拟主备两个服务商"""
+    def __init__(self, apps: dict):
+        self.transports = {host: httpx.ASGITransport(app=app) for host, app in apps.items()}
+
+    async def handle_async_request(self, request):
+        return await self.transports[request.url.host].handle_async_request(request)
+
+async def run(n: int, concurrency: int, latency: float):
+    primary = create_fake_llm_app(latency=latency)
+    client = AsyncLLMClient(
+        [LLMProvider("primary", "http://primary/v1", "fake-model", "key")],
+        max_concurrency=concurrency,
+        transport=_Router({"primary": primary}),
+    )
+    start = time.perf_counter()
+    replies = await asyncio.gather(*[client.complete(f"prompt {i}") for i in range(n)])
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    assert len(replies) == n
+    return elapsed, primary.state.stats["max_in_flight"]
+
+async def run_failover(n: int):
+    broken = create_fake_llm_app(latency=0.01, failure_rate=1.0)
+    backup = create_fake_llm_app(latency=0.01)
+    client = AsyncLLMClient(
+        [LLMProvider("openai", "http://openai/v1", "gpt", "key"), LLMProvider("deepseek", "http://deepseek/v1", "deepseek-chat", "key")],
+        max_retries=2,
+        backoff_base=0.01,
+        transport=_Router({"openai": broken, "deepseek": backup}),
+    )
+    replies = await asyncio.gather(*[client.complete(f"prompt {i}") for i in range(n)])
+    await client.aclose()
+    assert all("deepseek-chat" in r for r in replies)
+    return broken.state.stats["requests"], backup.state.stats["requests"]
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    latency = 0.2
+    print("🚀 大模型客户端基准测试（本地假服务）")
+    print("=" * 50)
+    elapsed, max_in_flight = asyncio.run(run(n, concurrency, latency))
+    ideal = n / concurrency * latency
+    print(f"✅ {n} 次请求，并发上限 {concurrency}，单次延迟 {latency}s")
+    print(f"   总耗时 {elapsed:.2f}s（理论下限 {ideal:.2f}s，串行需 {n * latency:.1f}s），峰值在途请求 {max_in_flight}")
+    if max_in_flight > concurrency:
+        print("❌ 在途请求超过并发上限")
+        sys.exit(1)
+    primary_calls, backup_calls = asyncio.run(run_failover(10))
+    print(f"✅ 故障切换：主服务商收到 {primary_calls} 次请求（含重试），备用服务商完成 {backup_calls} 次")
+    print("=" * 50)
+
+if __name__ == "__main__":
+    main()
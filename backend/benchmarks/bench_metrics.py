@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+运行时指标基准测试 - 对比开启/关闭指标中间件与SQL计时钩子时的请求延迟，并检查 /metrics 输出
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_metrics [请求次数]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import instrumentation
+from benchmarks.seed import make_engine, seed_campaigns, use_engine
+from main import app
+
+HOOKS = (
+    ("before_cursor_execute", instrumentation._before_cursor_execute),
+    ("after_cursor_execute", instrumentation._after_cursor_execute),
+    ("handle_error", instrumentation._handle_error),
+)
+
+def set_enabled(enabled: bool):
+    instrumentation.METRICS_ENABLED = enabled
+    for name, fn in HOOKS:
+        if enabled and not event.contains(Engine, name, fn):
+            event.listen(Engine, name, fn)
+        elif not enabled and event.contains(Engine, name, fn):
+            event.remove(Engine, name, fn)
+
+def measure(client: TestClient, path: str, repeat: int) -> float:
+    """重复请求取中位数延迟（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resp = client.get(path)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert resp.status_code == 200, resp.text
+    return statistics.median(samples)
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    paths = ["/health", "/api/campaigns/1", "/api/campaigns/?limit=50"]
+    print("🚀 运行时指标基准测试")
+    print("=" * 50)
+    engine = make_engine()
+    seed_campaigns(engine, 1000)
+    async_engine = use_engine(app, engine)
+    client = TestClient(app)
+    try:
+        for path in paths:
+            # 预热，排除首次请求的连接与编译开销
+            measure(client, path, 10)
+            set_enabled(False)
+            off = measure(client, path, repeat)
+            set_enabled(True)
+            on = measure(client, path, repeat)
+            print(f"✅ {path:28s} 关闭 {off:6.2f} ms  开启 {on:6.2f} ms  差值 {on - off:+.2f} ms")
+        text = client.get("/metrics").text
+    finally:
+        asyncio.run(async_engine.dispose())
+    series = [line for line in text.splitlines() if line and not line.startswith("#")]
+    print(f"✅ /metrics 输出 {len(series)} 条时间序列，{len(text)} 字节")
+    print("=" * 50)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+分页基准测试 - 对比 GET /api/campaigns 在第1页与第10000页时 offset分页 与 游标分页 的延迟
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_pagination [每页数量] [目标页码]
+"""
+
+import statistics
+import sys
+import time
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from benchmarks.seed import make_engine, seed_campaigns, use_engine
+from main import app
+from models import AdCampaign
+from pagination import NEXT_CURSOR_HEADER, encode_cursor
+
+def cursor_before_page(engine, page: int, limit: int) -> str:
+    """直接算出第page页的游标（等价于从第1页逐页翻到该页）"""
+    if page <= 1:
+        return None
+    with Session(engine) as session:
+        last = session.exec(
+            select(AdCampaign)
+            .order_by(AdCampaign.created_at.desc(), AdCampaign.id.desc())
+            .offset((page - 1) * limit - 1)
+            .limit(1)
+        ).one()
+    return encode_cursor(last.created_at, last.id)
+
+def measure(client: TestClient, params: dict, repeat: int = 30) -> float:
+    """重复请求取中位数延迟（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resp = client.get("/api/campaigns/", params=params)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert resp.status_code == 200, resp.text
+    return statistics.median(samples)
+
+def main():
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    page = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    rows = limit * page + limit
+    print("🚀 分页基准测试")
+    print("=" * 50)
+    engine = make_engine()
+    seed_campaigns(engine, rows)
+    print(f"📦 已写入 {rows} 个广告活动，每页 {limit} 条")
+
+    async_engine = use_engine(app, engine)
+    try:
+        # 不进入TestClient上下文：不执行启动钩子（不会连ads_agent.db初始化、启动后台抓取与任务worker）
+        client = TestClient(app)
+        offset_first = measure(client, {"limit": limit})
+        offset_deep = measure(client, {"limit": limit, "offset": (page - 1) * limit})
+        cursor = cursor_before_page(engine, page, limit)
+        cursor_deep = measure(client, {"limit": limit, "cursor": cursor})
+        resp = client.get("/api/campaigns/", params={"limit": limit, "cursor": cursor})
+        assert len(resp.json()) == limit and resp.headers.get(NEXT_CURSOR_HEADER)
+    finally:
+        app.dependency_overrides.clear()
+
+    print(f"✅ 第1页              {offset_first:8.2f} ms")
+    print(f"✅ 第{page}页 offset    {offset_deep:8.2f} ms")
+    print(f"✅ 第{page}页 游标      {cursor_deep:8.2f} ms")
+    print("=" * 50)
+    print(f"📊 游标深分页/第1页 = {cursor_deep / offset_first:.2f}x，offset深分页/第1页 = {offset_deep / offset_first:.2f}x")
+
+if __name__ == "__main__":
+    main()
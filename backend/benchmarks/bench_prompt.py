@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Prompt构建基准测试 - 行业信息条数增长时，原始拼接方式与按token预算构建的prompt大小和构建耗时对比
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_prompt [token预算]
+"""
+
+import random
+import sys
+import time
+
+from models import AdCampaign
+from prompt_builder import PromptBuilder, estimate_tokens
+
+TOPICS = ["口红", "面霜", "手机", "耳机", "跑鞋", "咖啡", "母婴", "家电"]
+
+def make_info(n: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "title": f"{rng.choice(TOPICS)}品类第{i}期行业动态",
+            "summary": f"{rng.choice(TOPICS)}市场本周投放竞争加剧，平均CPC上涨{rng.uniform(1, 20):.1f}%，"
+                       f"头部品牌加大{rng.choice(TOPICS)}相关素材投放，转化率{rng.choice(['上升', '下降', '持平'])}。" * rng.randint(1, 4),
+        }
+        for i in range(n)
+    ]
+
+def naive_prompt(campaign, info_list: list) -> str:
+    """按条目原样拼接（原实现）"""
+    info_text = "\n".join([f"- {item['title']}: {item['summary']}" for item in info_list])
+    return f"你是一名广告投放专家。请根据以下最新行业信息和广告活动数据，给出详细的广告投放建议。\n\n【行业信息】\n{info_text}\n\n【广告活动】\n名称: {campaign.name}\n产品: {campaign.product}\n目标: {campaign.objective}\n预算: {campaign.budget}\n\n请用简洁明了的语言输出建议。"
+
+def main():
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    builder = PromptBuilder(budget)
+    campaign = AdCampaign(id=1, name="春季美妆推广", product="口红", objective="转化优化", budget=5000.0)
+    print("🚀 Prompt构建基准测试")
+    print("=" * 50)
+    for n in (5, 20, 100, 500):
+        info = make_info(n)
+        naive = estimate_tokens(naive_prompt(campaign, info))
+        start = time.perf_counter()
+        plan = builder.build_analysis(campaign, info)
+        elapsed = time.perf_counter() - start
+        mark = "✅" if plan.estimated_tokens <= budget else "❌"
+        print(f"{mark} {n:4d} 条信息: 原始 {naive:7d} tokens → 预算内 {plan.estimated_tokens:5d} tokens"
+              f"（保留 {plan.items_used} 条，去重/截断 {plan.items_dropped} 条）构建 {elapsed * 1000:6.1f} ms")
+    print("=" * 50)
+    print(f"📊 token预算 {budget}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+冷归档基准测试 - 归档吞吐、归档前后数据库体积，以及查询跨入归档范围时 /logs、/decisions 的延迟与结果一致性
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_retention [日志条数] [效果数据条数]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+
+from benchmarks.seed import make_engine, seed_agent_logs, seed_campaigns, seed_results, use_engine
+from main import app
+from models import AdResult, AgentLog
+from pagination import NEXT_CURSOR_HEADER
+from response_cache import response_cache
+from retention import RetentionPolicy, retention_manager
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+def walk_logs(client: TestClient, campaign_id: int, params: dict) -> list:
+    """按游标翻完所有页"""
+    rows, cursor = [], None
+    while True:
+        query = dict(params, limit=100, **({"cursor": cursor} if cursor else {}))
+        resp = client.get(f"/api/campaigns/{campaign_id}/logs", params=query)
+        rows.extend(resp.json()["agentLogs"])
+        cursor = resp.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return rows
+
+def measure(client: TestClient, path: str, params: dict, repeat: int = 20) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resp = client.get(path, params=params)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert resp.status_code == 200, resp.text
+    return statistics.median(samples)
+
+def main():
+    n_logs = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    n_results = int(sys.argv[2]) if len(sys.argv) > 2 else 300000
+    print("🚀 冷归档基准测试")
+    print("=" * 50)
+    db_path = os.path.join(tempfile.mkdtemp(prefix="ads_bench_"), "bench.db")
+    engine = make_engine(db_path)
+    ids = seed_campaigns(engine, 200)
+    seed_agent_logs(engine, ids, n_logs)
+    seed_results(engine, ids, n_results)
+    async_engine = use_engine(app, engine)
+    client = TestClient(app)
+    response_cache.enabled = False
+
+    # 数据分布在最近30天，只保留最近7天为热数据
+    retention_manager.engine = engine
+    retention_manager.directory = tempfile.mkdtemp(prefix="ads_archive_")
+    retention_manager.policies = {"agentlog": RetentionPolicy(AgentLog, 7), "adresult": RetentionPolicy(AdResult, 7)}
+    retention_manager.pause = 0
+
+    old_range = {
+        "created_from": (datetime.utcnow() - timedelta(days=20)).isoformat(),
+        "created_to": (datetime.utcnow() - timedelta(days=10)).isoformat(),
+    }
+    checks = [
+        ("/logs 全部翻页", lambda: walk_logs(client, ids[0], {})),
+        ("/logs 历史区间翻页", lambda: walk_logs(client, ids[0], old_range)),
+        ("/decisions 历史区间", lambda: client.get(f"/api/campaigns/{ids[0]}/decisions", params=old_range).json()),
+        ("/dashboard 汇总", lambda: client.get("/api/dashboard/overview").json()),
+    ]
+    timed = [
+        ("/logs 最新一页", f"/api/campaigns/{ids[0]}/logs", {"limit": 100}),
+        ("/logs 历史区间", f"/api/campaigns/{ids[0]}/logs", dict(old_range, limit=100)),
+        ("/decisions 历史区间", f"/api/campaigns/{ids[0]}/decisions", old_range),
+    ]
+    try:
+        before = {name: fn() for name, fn in checks}
+        before_ms = {name: measure(client, path, params) for name, path, params in timed}
+        size_before = os.path.getsize(db_path)
+
+        print(f"📊 待归档: {retention_manager.run(dry_run=True)}")
+        start = time.perf_counter()
+        summary = retention_manager.run()
+        elapsed = time.perf_counter() - start
+        archived = sum(result["rows"] for result in summary.values())
+        print(f"✅ 归档 {archived} 行，用时 {elapsed:.2f}s（{archived / elapsed:.0f} 行/秒），格式 {retention_manager.fmt}")
+        for name, result in summary.items():
+            print(f"   {name}: {result['rows']} 行 / {len(result['months'])} 个月份 / 合并 {result['compaction']}")
+
+        start = time.perf_counter()
+        retention_manager.vacuum()
+        print(f"✅ VACUUM 用时 {time.perf_counter() - start:.2f}s")
+        size_after = os.path.getsize(db_path)
+        archive_size = dir_size(retention_manager.directory)
+        print(f"✅ 数据库 {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB，归档文件 {archive_size / 1e6:.1f} MB")
+
+        for name, fn in checks:
+            after = fn()
+            status = "一致" if after == before[name] else "不一致"
+            print(f"{'✅' if after == before[name] else '❌'} {name}: 归档前后结果{status}")
+        for name, path, params in timed:
+            after_ms = measure(client, path, params)
+            print(f"✅ {name:16s} 归档前 {before_ms[name]:7.2f} ms  归档后 {after_ms:7.2f} ms")
+    finally:
+        asyncio.run(async_engine.dispose())
+    print("=" * 50)
+
+if __name__ == "__main__":
+    main()
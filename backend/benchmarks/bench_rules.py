@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+规则引擎基准测试 - 大量运行中活动上加载窗口指标、匹配规则、写入建议三个阶段的耗时，
+规则匹配耗时超过上限时以非零状态码退出
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_rules [活动数] [匹配上限毫秒]
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update
+from sqlmodel import Session, select
+
+from benchmarks.seed import make_engine, seed_campaigns
+from models import AdCampaign, AdResultHourly, AutomationRule
+from rule_engine import CampaignSnapshot, evaluate, record_matches, run_rules
+
+RULES = [
+    AutomationRule(name="高CPA暂停", metric="cpa", operator=">", threshold=80, min_impressions=1000,
+                   action="pause", auto_execute=True, priority=10),
+    AutomationRule(name="低CTR降预算", metric="ctr", operator="<", threshold=0.8, min_impressions=1000,
+                   action="budget_decrease", action_value=20, priority=20),
+    AutomationRule(name="高CTR加预算", metric="ctr", operator=">", threshold=9, window_hours=6,
+                   action="budget_increase", action_value=20, auto_execute=True, priority=30),
+]
+
+def seed_hourly(engine, campaign_ids: list, hours: int = 24, seed: int = 42, chunk: int = 50000):
+    """每个活动写入最近hours小时的小时汇总数据"""
+    rng = random.Random(seed)
+    start = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    with Session(engine) as session:
+        batch = []
+        for campaign_id in campaign_ids:
+            for h in range(hours):
+                impressions = rng.randint(0, 500)
+                clicks = rng.randint(0, impressions // 10)
+                batch.append({
+                    "campaign_id": campaign_id,
+                    "bucket": start - timedelta(hours=h),
+                    "impressions": impressions,
+                    "clicks": clicks,
+                    "conversions": rng.randint(0, max(clicks // 8, 0)),
+                    "cost": round(clicks * rng.uniform(0.5, 3.0), 2),
+                    "rows": 1,
+                })
+                if len(batch) >= chunk:
+                    session.execute(insert(AdResultHourly), batch)
+                    batch = []
+        if batch:
+            session.execute(insert(AdResultHourly), batch)
+        session.execute(update(AdCampaign).values(status="running"))
+        session.commit()
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    ceiling = float(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    print("🚀 规则引擎基准测试")
+    print("=" * 50)
+    engine = make_engine()
+    seed_hourly(engine, seed_campaigns(engine, n))
+    with Session(engine) as session:
+        session.add_all(RULES)
+        session.commit()
+        rules = session.exec(select(AutomationRule)).all()
+
+        start = time.perf_counter()
+        snapshot = CampaignSnapshot(session, datetime.utcnow(), [rule.window_hours for rule in rules])
+        loaded = time.perf_counter() - start
+        start = time.perf_counter()
+        matches = evaluate(session, snapshot, rules)
+        evaluated = time.perf_counter() - start
+        matched = sum(len(index) for _, index, _ in matches)
+        for rule, index, _ in matches:
+            print(f"📌 {rule.name:8s} 命中 {len(index):7d} 个活动{'（自动执行）' if rule.auto_execute else ''}")
+        mark = "✅" if evaluated * 1000 <= ceiling else "❌"
+        print(f"✅ 加载 {n} 个活动的窗口指标: {loaded * 1000:8.1f} ms")
+        print(f"{mark} 匹配 {n} 个活动 × {len(rules)} 条规则: {evaluated * 1000:8.1f} ms")
+
+        start = time.perf_counter()
+        summary = record_matches(session, snapshot, matches)
+        written = time.perf_counter() - start
+        print(f"✅ 写入 {summary['advices']} 条建议（自动执行 {summary['executed']} 条）: {written * 1000:8.1f} ms")
+
+        # 冷却期内再次评估不应重复命中
+        again = run_rules(session, dry_run=True)
+        print(f"✅ 冷却期内再次评估命中 {again['matched']} 个活动")
+    engine.dispose()
+    print("=" * 50)
+    print(f"📊 匹配上限 {ceiling:.0f} ms：{'超出' if evaluated * 1000 > ceiling else '通过'}，共命中 {matched} 个活动")
+    if evaluated * 1000 > ceiling:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+全文搜索基准测试 - 100万文档（活动/AI建议/行业快讯）写入时的索引维护吞吐，
+以及不同命中量的关键词FTS5查询与LIKE全表扫描的延迟对比
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_search [文档总数]
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert, text
+from sqlmodel import Session
+
+from benchmarks.seed import make_engine
+from models import AdCampaign, AIAdvice, IndustryBrief
+from search_index import search
+
+WORDS = [
+    "预算", "提高", "降低", "转化", "点击率", "曝光", "投放", "人群", "定向", "出价", "创意", "素材", "关键词",
+    "竞争", "行业", "趋势", "消费", "回暖", "品牌", "推广", "拉新", "复购", "成本", "优化", "暂停", "扩展",
+    "短视频", "直播", "电商", "大促", "节日", "营销", "用户", "增长", "效果", "稳定", "波动", "明显", "建议",
+    "春季", "新品", "夏季", "清仓", "会员", "积分", "门店", "线下", "小程序", "搜索", "信息流", "开屏",
+    "美妆", "服饰", "数码", "家电", "母婴", "食品", "饮料", "运动", "户外", "宠物", "家居", "汽车", "教育",
+]
+# 只出现在约0.1%文档中的低频词
+RARE = "露营装备"
+QUERIES = [
+    ("高频词", "预算"),
+    ("中频短语", "春季新品"),
+    ("多词组合", "直播 转化 提高"),
+    ("低频词", RARE),
+    ("单字前缀", "宠"),
+]
+
+def sentence(rng: random.Random, n_words: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(n_words)]
+    if rng.random() < 0.001:
+        words.insert(rng.randrange(len(words)), RARE)
+    return "，".join("".join(words[i:i + 3]) for i in range(0, len(words), 3)) + "。"
+
+def seed(engine, total: int, chunk: int = 20000) -> float:
+    """按1:7:2写入活动、AI建议、行业快讯，返回写入耗时（秒，含触发器维护索引）"""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    counts = {AdCampaign: total // 10, AIAdvice: total * 7 // 10}
+    counts[IndustryBrief] = total - sum(counts.values())
+    rows = {
+        AdCampaign: lambda i: {
+            "name": f"{rng.choice(WORDS)}{rng.choice(WORDS)}活动{i}", "product": f"{rng.choice(WORDS)}产品{i % 500}",
+            "objective": rng.choice(["品牌推广", "转化优化", "拉新"]), "budget": float(rng.randint(1000, 50000)),
+            "status": "running", "created_at": now - timedelta(minutes=i),
+        },
+        AIAdvice: lambda i: {
+            "campaign_id": rng.randint(1, counts[AdCampaign]), "type": rng.choice(["analysis", "budget_increase", "pause"]),
+            "content": sentence(rng, rng.randint(10, 30)), "status": "pending", "created_at": now - timedelta(seconds=i),
+        },
+        IndustryBrief: lambda i: {"date": now - timedelta(hours=i), "content": sentence(rng, rng.randint(30, 80))},
+    }
+    start = time.perf_counter()
+    with Session(engine) as session:
+        for model, n in counts.items():
+            for offset in range(0, n, chunk):
+                session.execute(insert(model), [rows[model](i) for i in range(offset, min(offset + chunk, n))])
+                session.commit()
+    return time.perf_counter() - start
+
+def timed(fn, repeat: int = 20) -> tuple:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1], result
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print("🚀 全文搜索基准测试")
+    print("=" * 50)
+    engine = make_engine()
+    elapsed = seed(engine, total)
+    db_path = engine.url.database
+    print(f"✅ 写入 {total} 个文档（含索引维护）用时 {elapsed:.1f}s，{total / elapsed:.0f} 文档/秒")
+    with Session(engine) as session:
+        conn = session.connection()
+        conn.exec_driver_sql("INSERT INTO searchindex(searchindex) VALUES ('optimize')")
+        session.commit()
+    print(f"✅ 数据库文件 {os.path.getsize(db_path) / 1e6:.1f} MB")
+
+    with Session(engine) as session:
+        for label, query in QUERIES:
+            p50, p95, (results, last) = timed(lambda: search(session, query, limit=20))
+            page2, _, _ = timed(lambda: search(session, query, after=last, limit=20)) if last else (0.0, 0.0, None)
+            matches = session.connection().execute(
+                text("SELECT count(*) FROM searchindex WHERE searchindex MATCH :q"),
+                {"q": __import__("search_index").match_query(query)},
+            ).scalar()
+            like, _, _ = timed(lambda: session.connection().execute(
+                text("SELECT id FROM aiadvice WHERE content LIKE :q ORDER BY id"),
+                {"q": f"%{query.split()[0]}%"},
+            ).all(), repeat=3)
+            print(f"✅ {label:6s} {query!r:14s} 命中 {matches:7d}  FTS p50 {p50:7.2f} ms / p95 {p95:7.2f} ms"
+                  f"  第2页 {page2:7.2f} ms  LIKE全量匹配 {like:8.2f} ms")
+
+        # 单条写入的索引维护开销
+        samples = []
+        for i in range(200):
+            start = time.perf_counter()
+            session.add(AIAdvice(campaign_id=1, type="analysis", content=f"测试建议{i}：直播转化提高，建议扩展春季新品关键词"))
+            session.commit()
+            samples.append((time.perf_counter() - start) * 1000)
+        print(f"✅ 单条AI建议写入（含索引）p50 {statistics.median(samples):.2f} ms")
+    print("=" * 50)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+流式分析基准测试 - 对比 /api/campaigns/{id}/agent/analyze 流式与非流式的首字节耗时（完全离线）
+
+假大模型服务与后端应用都以uvicorn在本机回环端口启动（进程内ASGITransport会缓冲完整响应，测不出首字节），
+流式结束后检查AI建议已保存、token用量表记录了首字耗时。
+
+用法（在backend目录下）:
+    python -m benchmarks.bench_stream [请求数]
+"""
+
+import asyncio
+import logging
+import socket
+import statistics
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+from sqlmodel import Session, select
+
+from agent_core import ads_agent
+from benchmarks.fake_llm import create_fake_llm_app
+from benchmarks.seed import make_engine, seed_campaigns, use_engine
+from llm_client import AsyncLLMClient, LLMProvider
+from llm_usage import LLMUsageRecorder, usage_summary
+from main import app
+from models import AIAdvice
+
+logging.getLogger("llm_client").setLevel(logging.ERROR)
+
+# 假服务：首字0.3s，之后每4个字符一段、段间20ms
+LATENCY = 0.3
+TOKEN_INTERVAL = 0.02
+REPLY = "建议：" + "根据近7天点击率上升、转化成本下降的趋势，适当提高预算并扩充相关关键词。" * 10
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _serve(asgi_app) -> tuple:
+    """在后台线程启动uvicorn（不执行应用的启动事件），返回(server, base_url)"""
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+async def _request(client: httpx.AsyncClient, url: str, stream: bool) -> tuple:
+    """返回(首字节耗时ms, 总耗时ms, 完整内容字符数)"""
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", url, params={"no_cache": True, "stream": stream}) as resp:
+        resp.raise_for_status()
+        body = []
+        async for chunk in resp.aiter_text():
+            if first is None and (not stream or "event: token" in "".join(body) + chunk):
+                first = (time.perf_counter() - start) * 1000
+            body.append(chunk)
+    return first, (time.perf_counter() - start) * 1000, len("".join(body))
+
+async def run(base_url: str, campaign_id: int, n: int) -> dict:
+    url = f"{base_url}/api/campaigns/{campaign_id}/agent/analyze"
+    results = {}
+    async with httpx.AsyncClient(timeout=60) as client:
+        for stream in (False, True):
+            results[stream] = [await _request(client, url, stream) for _ in range(n)]
+    return results
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print("🚀 流式分析基准测试（本地假服务）")
+    print("=" * 50)
+    engine = make_engine()
+    seed_campaigns(engine, 1)
+    async_engine = use_engine(app, engine)
+    fake = create_fake_llm_app(latency=LATENCY, token_interval=TOKEN_INTERVAL, reply=REPLY)
+    fake_server, fake_url = _serve(fake)
+    ads_agent.llm = AsyncLLMClient(
+        [LLMProvider("fake", f"{fake_url}/v1", "fake-model", "key")],
+        usage=LLMUsageRecorder(engine),
+    )
+    app_server, app_url = _serve(app)
+    try:
+        results = asyncio.run(run(app_url, 1, n))
+    finally:
+        app_server.should_exit = fake_server.should_exit = True
+    print(f"📦 假服务：首字 {LATENCY * 1000:.0f} ms，回复 {len(REPLY)} 字，每4字一段、段间 {TOKEN_INTERVAL * 1000:.0f} ms；每种方式 {n} 次")
+    for stream, label in ((False, "非流式"), (True, "流式  ")):
+        first = statistics.median(r[0] for r in results[stream])
+        total = statistics.median(r[1] for r in results[stream])
+        print(f"✅ {label} 首字节中位数 {first:8.1f} ms，完整响应中位数 {total:8.1f} ms")
+
+    with Session(engine) as session:
+        saved = session.exec(select(AIAdvice).where(AIAdvice.type == "analysis")).all()
+        summary = usage_summary(session)
+    print(f"✅ 流式完成后保存AI建议 {len(saved)} 条，内容完整: {all(a.content == REPLY for a in saved)}")
+    for group in summary["groups"]:
+        mode = "流式" if group["streamed"] else "非流式"
+        print(f"   用量记录 {group['purpose']}({mode}): {group['calls']} 次，平均首字耗时 {group['avg_ttft_ms']} ms，平均总耗时 {group['avg_latency_ms']} ms")
+    print("=" * 50)
+    asyncio.run(async_engine.dispose())
+    if len(saved) != n:
+        print("❌ 流式分析未保存AI建议")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+本地假大模型服务 - 模拟OpenAI兼容的 /v1/chat/completions 接口（含stream=true的SSE流式输出），用于离线测试并发、延迟、故障切换与首字耗时
+
+进程内使用（无需网络；httpx.ASGITransport会等响应完整结束才返回，测流式首字耗时需作为独立服务启动）:
+    transport = httpx.ASGITransport(app=create_fake_llm_app(latency=0.2))
+    client = AsyncLLMClient([LLMProvider("fake", "http://fake/v1", "fake-model", "key")], transport=transport)
+
+作为独立服务启动（在backend目录下）:
+    python -m benchmarks.fake_llm --port 9100 --latency 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=fake uvicorn main:app
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+def create_fake_llm_app(latency: float = 0.1, jitter: float = 0.0, failure_rate: float = 0.0, status_code: int = 503,
+                        reply: str = None, token_interval: float = 0.0, chunk_chars: int = 4) -> FastAPI:
+    """
+    latency/jitter: 每次请求的模拟首字耗时（秒）
+    failure_rate: 以该概率返回status_code错误，用于验证重试与故障切换
+    token_interval/chunk_chars: 每chunk_chars个字符为一段，段间间隔token_interval秒；
+    非流式请求等全部生成完才返回，流式请求逐段推送
+    """
+    app = FastAPI(title="Fake LLM")
+    app.state.stats = {"requests": 0, "failures": 0, "in_flight": 0, "max_in_flight": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        stats = app.state.stats
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            body = await request.json()
+            await asyncio.sleep(latency + random.uniform(0, jitter))
+            if random.random() < failure_rate:
+                stats["failures"] += 1
+                return JSONResponse({"error": {"message": "fake failure"}}, status_code=status_code)
+            prompt = body["messages"][-1]["content"]
+            content = reply or f"[{body.get('model')}] 建议：保持当前投放节奏。（prompt长度{len(prompt)}）"
+            pieces = [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)]
+            usage = {"prompt_tokens": len(prompt) // 2, "completion_tokens": len(content) // 2, "total_tokens": (len(prompt) + len(content)) // 2}
+            if body.get("stream"):
+                stats["in_flight"] += 1
+                include_usage = (body.get("stream_options") or {}).get("include_usage")
+                return StreamingResponse(_stream(stats, body.get("model"), pieces, usage if include_usage else None), media_type="text/event-stream")
+            await asyncio.sleep(token_interval * max(len(pieces) - 1, 0))
+            return {
+                "id": "fake-completion",
+                "object": "chat.completion",
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+        finally:
+            stats["in_flight"] -= 1
+
+    async def _stream(stats: dict, model: str, pieces: list, usage: dict = None):
+        def chunk(choices, **extra):
+            data = {"id": "fake-completion", "object": "chat.completion.chunk", "model": model, "choices": choices, **extra}
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        try:
+            for i, piece in enumerate(pieces):
+                if i:
+                    await asyncio.sleep(token_interval)
+                yield chunk([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+            yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if usage is not None:
+                yield chunk([], usage=usage)
+            yield "data: [DONE]\n\n"
+        finally:
+            stats["in_flight"] -= 1
+
+    return app
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="本地假大模型服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--token-interval", type=float, default=0.0)
+    args = parser.parse_args()
+    app = create_fake_llm_app(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                              token_interval=args.token_interval)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
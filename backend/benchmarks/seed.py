@@ -0,0 +1,140 @@
+"""
+基准测试数据生成工具 - 在独立的SQLite文件中批量造数
+"""
+
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from sqlmodel import SQLModel, Session
+
+from db import create_db_engine, create_async_db_engine, async_url, init_db, get_session, get_async_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import AdCampaign, AdResult, AgentLog, AIAdvice
+
+STATUSES = ["created", "running", "paused", "completed"]
+
+def make_engine(path: str = None, migrate: bool = True, **options):
+    """创建基准测试专用的数据库引擎（默认放在临时目录，不影响ads_agent.db）"""
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="ads_bench_"), "bench.db")
+    engine = create_db_engine(f"sqlite:///{path}", **options)
+    if migrate:
+        init_db(engine)
+    else:
+        SQLModel.metadata.create_all(engine)
+    return engine
+
+def use_engine(app, engine):
+    """让应用的同步/异步会话依赖都指向基准测试数据库，返回异步引擎（用完后调用dispose）"""
+    async_engine = create_async_db_engine(async_url(engine.url.render_as_string(hide_password=False)))
+
+    def _session():
+        with Session(engine) as session:
+            yield session
+
+    async def _async_session():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = _session
+    app.dependency_overrides[get_async_session] = _async_session
+    return async_engine
+
+def seed_campaigns(engine, n: int, seed: int = 42) -> list:
+    """批量写入n个广告活动，返回活动ID列表"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    rows = [
+        {
+            "name": f"活动{i}",
+            "product": f"产品{i % 50}",
+            "objective": rng.choice(["品牌推广", "转化优化", "拉新"]),
+            "budget": float(rng.randint(1000, 50000)),
+            "status": rng.choice(STATUSES),
+            "created_at": now - timedelta(minutes=i),
+        }
+        for i in range(n)
+    ]
+    with Session(engine) as session:
+        session.execute(insert(AdCampaign), rows)
+        session.commit()
+    return list(range(1, n + 1))
+
+def seed_results(engine, campaign_ids: list, n: int, days: int = 30, recent_per_day: int = None, seed: int = 42, chunk: int = 50000):
+    """
+    批量写入n条效果数据，分布在最近days天内。
+    指定recent_per_day时，最近两天固定写入该数量，其余作为历史数据，
+    便于验证“数据增长但近期窗口不变”时的查询延迟。
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    def _row(ts):
+        impressions = rng.randint(100, 10000)
+        clicks = rng.randint(0, impressions // 10)
+        return {
+            "campaign_id": rng.choice(campaign_ids),
+            "impressions": impressions,
+            "clicks": clicks,
+            "conversions": rng.randint(0, max(clicks // 5, 0)),
+            "cost": round(clicks * rng.uniform(0.5, 3.0), 2),
+            "created_at": ts,
+        }
+
+    def _timestamps():
+        recent = min(recent_per_day * 2, n) if recent_per_day else 0
+        for _ in range(recent):
+            yield now - timedelta(seconds=rng.randint(1, 2 * 86400 - 1))
+        history_start = 2 * 86400 if recent_per_day else 1
+        for _ in range(n - recent):
+            yield now - timedelta(seconds=rng.randint(history_start, days * 86400))
+
+    with Session(engine) as session:
+        batch = []
+        for ts in _timestamps():
+            batch.append(_row(ts))
+            if len(batch) >= chunk:
+                session.execute(insert(AdResult), batch)
+                batch = []
+        if batch:
+            session.execute(insert(AdResult), batch)
+        session.commit()
+
+def seed_agent_logs(engine, campaign_ids: list, n: int, seed: int = 42, chunk: int = 50000):
+    """批量写入n条Agent日志，时间均匀分布在最近30天内"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    steps = ["analyze", "decision", "execute", "monitor"]
+    with Session(engine) as session:
+        for start in range(0, n, chunk):
+            session.execute(insert(AgentLog), [
+                {
+                    "campaign_id": rng.choice(campaign_ids),
+                    "step": rng.choice(steps),
+                    "message": f"第{i}步：CTR {rng.uniform(0.5, 5):.2f}%，建议调整出价",
+                    "data": f'{{"ctr": {rng.uniform(0.5, 5):.4f}, "step": {i}}}',
+                    "created_at": now - timedelta(seconds=rng.randint(1, 30 * 86400)),
+                }
+                for i in range(start, min(start + chunk, n))
+            ])
+        session.commit()
+
+def seed_advices(engine, campaign_ids: list, n: int, seed: int = 42, chunk: int = 50000):
+    """批量写入n条AI建议，状态随机，时间均匀分布在最近30天内"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        for start in range(0, n, chunk):
+            session.execute(insert(AIAdvice), [
+                {
+                    "campaign_id": rng.choice(campaign_ids),
+                    "type": rng.choice(["analysis", "budget_increase", "pause"]),
+                    "content": f"建议{i}：预算提高{rng.randint(5, 50)}%",
+                    "status": rng.choice(["pending", "approved", "executed", "rejected"]),
+                    "created_at": now - timedelta(seconds=rng.randint(1, 30 * 86400)),
+                }
+                for i in range(start, min(start + chunk, n))
+            ])
+        session.commit()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+端到端压测套件 - 造数后以进程内ASGI客户端按设定并发驱动 campaigns / dashboard / agent / ai 各路由，
+统计每个场景的p50/p95/p99延迟与吞吐，可保存为JSON基线并在回归超过阈值时以非0状态码退出。
+大模型使用本地假服务（benchmarks/fake_llm.py），行业新闻使用固定条目的信息源，完全离线。
+
+用法（在backend目录下）:
+    python -m benchmarks.suite                          # 运行全部场景，存在基线时与之对比
+    python -m benchmarks.suite --save                   # 运行并把结果保存为基线
+    python -m benchmarks.suite --scenarios dashboard agent.logs --concurrency 20 --requests 500
+
+基线与机器相关，不随代码提交：CI中先在基准分支上以--save生成基线并缓存，再对待合并的代码以--require-baseline对比（见README）
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import httpx
+import numpy as np
+
+from agent_core import ads_agent
+from benchmarks.fake_llm import create_fake_llm_app
+from benchmarks.seed import make_engine, seed_advices, seed_agent_logs, seed_campaigns, seed_results, use_engine
+from job_queue import job_queue
+from llm_client import AsyncLLMClient, LLMProvider
+from llm_usage import LLMUsageRecorder
+from main import app
+from news import StaticNewsSource, news_fetcher
+from response_cache import response_cache
+from rollups import refresh_rollups
+from sqlmodel import Session
+
+logging.getLogger("llm_client").setLevel(logging.ERROR)
+logging.getLogger("instrumentation").setLevel(logging.ERROR)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "suite.json")
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    # (rng, 活动ID列表) -> (路径, 查询参数, JSON请求体)
+    build: Callable
+    expected: tuple = (200,)
+
+def _campaign(rng, ids):
+    return rng.choice(ids)
+
+SCENARIOS: List[Scenario] = [
+    Scenario("campaigns.list", "GET", lambda rng, ids: ("/api/campaigns/", {"limit": 20}, None)),
+    Scenario("campaigns.list_by_status", "GET", lambda rng, ids: ("/api/campaigns/", {"status": "running", "limit": 50}, None)),
+    Scenario("campaigns.get", "GET", lambda rng, ids: (f"/api/campaigns/{_campaign(rng, ids)}", None, None)),
+    Scenario("campaigns.performance", "GET", lambda rng, ids: (f"/api/campaigns/{_campaign(rng, ids)}/performance", {"days": 30}, None)),
+    Scenario("campaigns.create", "POST", lambda rng, ids: (
+        "/api/campaigns/", None,
+        {"name": f"压测活动{rng.random()}", "product": "压测产品", "objective": "转化优化", "budget": rng.randint(1000, 9000)},
+    )),
+    Scenario("campaigns.update", "PUT", lambda rng, ids: (f"/api/campaigns/{_campaign(rng, ids)}", None, {"budget": rng.randint(1000, 9000)})),
+    Scenario("dashboard.overview", "GET", lambda rng, ids: ("/api/dashboard/overview", None, None)),
+    Scenario("agent.decisions", "GET", lambda rng, ids: (f"/api/campaigns/{_campaign(rng, ids)}/decisions", None, None)),
+    Scenario("agent.logs", "GET", lambda rng, ids: (f"/api/campaigns/{_campaign(rng, ids)}/logs", {"limit": 50}, None)),
+    Scenario("agent.analyze", "POST", lambda rng, ids: (f"/api/campaigns/{_campaign(rng, ids)}/agent/analyze", {"no_cache": True}, None)),
+    Scenario("agent.optimize", "POST", lambda rng, ids: (f"/api/campaigns/{_campaign(rng, ids)}/agent/optimize", None, None), (202,)),
+    Scenario("ai.advices", "GET", lambda rng, ids: ("/api/ai/advices", {"campaign_id": _campaign(rng, ids)}, None)),
+    Scenario("ai.advise", "POST", lambda rng, ids: ("/api/ai/advise", {"campaign_id": _campaign(rng, ids), "type": "general", "content": "压测建议"}, None)),
+    Scenario("ai.news", "GET", lambda rng, ids: ("/api/ai/news", {"limit": 20}, None)),
+    Scenario("ai.llm_usage", "GET", lambda rng, ids: ("/api/ai/llm-usage/stats", None, None)),
+]
+
+def seed(args) -> tuple:
+    """在临时SQLite文件中造数，并把应用的数据库、大模型、新闻源与任务队列都指向本地"""
+    engine = make_engine()
+    started = time.perf_counter()
+    ids = seed_campaigns(engine, args.campaigns)
+    seed_results(engine, ids, args.results)
+    seed_agent_logs(engine, ids, args.logs)
+    seed_advices(engine, ids, args.advices)
+    with Session(engine) as session:
+        refresh_rollups(session)
+    async_engine = use_engine(app, engine)
+
+    news_fetcher.engine = engine
+    news_fetcher.sources = [StaticNewsSource([
+        {"title": f"行业动态{i}：电商广告投放趋势", "summary": f"第{i}条：转化成本与点击率变化", "url": f"https://example.com/news/{i}"}
+        for i in range(50)
+    ])]
+    news_fetcher.refresh()
+    job_queue._engine = engine
+    fake_llm = create_fake_llm_app(latency=args.llm_latency)
+    ads_agent.llm = AsyncLLMClient(
+        [LLMProvider("fake", "http://fake-llm/v1", "fake-model", "key")],
+        max_concurrency=args.concurrency,
+        transport=httpx.ASGITransport(app=fake_llm),
+        usage=LLMUsageRecorder(engine),
+    )
+    response_cache.enabled = not args.no_response_cache
+    print(f"📦 造数 {args.campaigns} 个活动、{args.results} 条效果数据、{args.logs} 条Agent日志、{args.advices} 条AI建议"
+          f"（{time.perf_counter() - started:.1f}s）")
+    return ids, async_engine
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, ids: list, requests: int, concurrency: int,
+                       warmup: int, round_no: int = 0) -> dict:
+    """concurrency个worker共同完成requests次请求；warmup次预热请求不计入统计。每轮的请求序列固定且互不相同"""
+    rng = random.Random(f"{scenario.name}:{round_no}")
+    latencies, errors = [], []
+
+    async def _one(record: bool):
+        path, params, body = scenario.build(rng, ids)
+        start = time.perf_counter()
+        try:
+            resp = await client.request(scenario.method, path, params=params, json=body)
+            status = resp.status_code
+        except Exception as e:
+            status = type(e).__name__
+        if record:
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status not in scenario.expected:
+                errors.append(status)
+
+    for _ in range(warmup):
+        await _one(False)
+    remaining = requests
+
+    async def _worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await _one(True)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[_worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_codes": sorted({str(e) for e in errors}),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "mean_ms": round(float(np.mean(latencies)), 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+    }
+
+def _median_of_rounds(rounds: List[dict]) -> dict:
+    """多轮结果逐项取中位数，降低单轮抖动对基线对比的影响；错误数取合计"""
+    merged = {key: round(float(np.median([r[key] for r in rounds])), 2) for key in ("p50_ms", "p95_ms", "p99_ms", "mean_ms", "throughput_rps")}
+    merged["requests"] = sum(r["requests"] for r in rounds)
+    merged["errors"] = sum(r["errors"] for r in rounds)
+    merged["error_codes"] = sorted({code for r in rounds for code in r["error_codes"]})
+    merged["rounds"] = len(rounds)
+    return merged
+
+async def run(args, ids: list, scenarios: List[Scenario]) -> Dict[str, dict]:
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for scenario in scenarios:
+            rounds = [
+                await run_scenario(client, scenario, ids, args.requests, args.concurrency, args.warmup if i == 0 else 0, i)
+                for i in range(args.rounds)
+            ]
+            results[scenario.name] = result = _median_of_rounds(rounds)
+            flag = "✅" if not result["errors"] else "❌"
+            print(f"{flag} {scenario.name:26s} p50 {result['p50_ms']:8.2f}  p95 {result['p95_ms']:8.2f}  p99 {result['p99_ms']:8.2f} ms"
+                  f"  {result['throughput_rps']:8.1f} req/s" + (f"  错误 {result['errors']} {result['error_codes']}" if result["errors"] else ""))
+    await ads_agent.llm.aclose()
+    return results
+
+def compare(results: Dict[str, dict], baseline: dict, threshold: float, min_delta_ms: float, metric: str = "p50_ms") -> List[str]:
+    """
+    延迟指标metric上升或吞吐下降超过threshold即视为回归；延迟差值不超过min_delta_ms时忽略，避免毫秒级抖动误报。
+    写入类场景的p95/p99受SQLite写锁等待影响波动较大，默认按p50判断
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        delta = current[metric] - base[metric]
+        if delta <= min_delta_ms:
+            continue
+        if current[metric] > base[metric] * (1 + threshold):
+            regressions.append(f"{name}: {metric} {base[metric]:.2f} → {current[metric]:.2f} ms")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{name}: 吞吐 {base['throughput_rps']:.1f} → {current['throughput_rps']:.1f} req/s")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="端到端压测套件")
+    parser.add_argument("--campaigns", type=int, default=2000)
+    parser.add_argument("--results", type=int, default=200_000)
+    parser.add_argument("--logs", type=int, default=50_000)
+    parser.add_argument("--advices", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=10, help="并发worker数")
+    parser.add_argument("--requests", type=int, default=200, help="每个场景计入统计的请求数")
+    parser.add_argument("--warmup", type=int, default=10, help="每个场景的预热请求数")
+    parser.add_argument("--rounds", type=int, default=3, help="每个场景重复的轮数，各项指标取中位数")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="假大模型服务的单次延迟（秒）")
+    parser.add_argument("--no-response-cache", action="store_true", help="关闭响应缓存，测量未命中时的延迟")
+    parser.add_argument("--scenarios", nargs="*", help="只运行名称以给定前缀开头的场景，如 dashboard agent.logs")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线JSON文件路径")
+    parser.add_argument("--save", action="store_true", help="把本次结果保存为基线（不做对比）")
+    parser.add_argument("--output", help="另存本次结果的JSON文件路径")
+    parser.add_argument("--threshold", type=float, default=0.25, help="回归阈值（比例）")
+    parser.add_argument("--metric", default="p50_ms", choices=["p50_ms", "p95_ms", "p99_ms", "mean_ms"], help="判断回归所用的延迟指标")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="--metric所选延迟指标的差值低于该毫秒数时不判为回归")
+    parser.add_argument("--require-baseline", action="store_true", help="找不到基线时以非0状态码退出（CI中使用，避免漏比）")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [s for s in SCENARIOS if not args.scenarios or any(s.name.startswith(p) for p in args.scenarios)]
+    if not scenarios:
+        print(f"❌ 没有匹配的场景，可选: {', '.join(s.name for s in SCENARIOS)}")
+        sys.exit(2)
+    print("🚀 端到端压测套件")
+    print("=" * 50)
+    ids, async_engine = seed(args)
+    print(f"📦 并发 {args.concurrency}，每个场景 {args.rounds} 轮 × {args.requests} 次请求（另有 {args.warmup} 次预热），指标取各轮中位数")
+    try:
+        results = asyncio.run(run(args, ids, scenarios))
+    finally:
+        asyncio.run(async_engine.dispose())
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: getattr(args, k) for k in ("campaigns", "results", "logs", "advices", "concurrency", "requests", "rounds", "llm_latency", "no_response_cache")},
+        },
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print("=" * 50)
+
+    failed = [name for name, r in results.items() if r["errors"]]
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 已保存基线: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"]["params"] != report["meta"]["params"]:
+            print(f"⚠️ 基线参数与本次不同，对比结果仅供参考: {baseline['meta']['params']}")
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms, args.metric)
+        if regressions:
+            print(f"❌ 相对基线（{baseline['meta']['created_at']}）回归超过 {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"✅ 与基线（{baseline['meta']['created_at']}）相比无回归（阈值 {args.threshold:.0%}）")
+    elif args.require_baseline:
+        print(f"❌ 未找到基线 {args.baseline}，先在基准版本上以 --save 生成")
+        sys.exit(2)
+    else:
+        print(f"ℹ️ 未找到基线 {args.baseline}，使用 --save 保存")
+    if failed:
+        print(f"❌ 以下场景出现非预期状态码: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from sqlmodel import select
 from models import AdCampaign, AdCampaignCreate, AdCampaignUpdate
-from db import get_session
-from typing import List
-from sqlmodel import Session
-from pydantic import BaseModel
+from db import get_async_session
+from rollups import campaign_series, ROLLUP_TABLES
+from pagination import NEXT_CURSOR_HEADER, keyset_page, split_page, date_range
+from response_cache import response_cache, campaign_tag, DASHBOARD_TAG
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlmodel.ext.asyncio.session import AsyncSession
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import update
 import logging
 
 router = APIRouter(prefix="/api/campaigns", tags=["Campaigns"])
@@ -14,28 +19,173 @@ logger = logging.getLogger("campaigns")
 class StatusUpdate(BaseModel):
     status: str
 
+# 批量接口单次请求的条数上限：全部在一个事务中提交，上限决定了单个事务的写锁时长
+MAX_BULK_ITEMS = 5000
+
+class BulkRequest(BaseModel):
+    items: List[dict] = Field(..., description="逐条校验，单条不合法不影响其他条目")
+    atomic: bool = Field(False, description="为true时任一条目不合法则全部不写入")
+
+def _validation_error(e: Exception) -> str:
+    if isinstance(e, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, err['loc'])) or 'item'}: {err['msg']}" for err in e.errors())
+    return str(e)
+
+def _bulk_validate(items: List[dict], parse) -> tuple:
+    """逐条解析，返回(合法条目[(序号, 解析结果)], 每条的结果列表)"""
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单次最多提交{MAX_BULK_ITEMS}条")
+    valid, results = [], []
+    for index, raw in enumerate(items):
+        try:
+            valid.append((index, parse(raw)))
+            results.append({"index": index, "ok": True})
+        except (ValidationError, ValueError) as e:
+            results.append({"index": index, "ok": False, "error": _validation_error(e)})
+    return valid, results
+
+def _bulk_summary(results: list, applied: bool) -> dict:
+    if not applied:
+        for result in results:
+            if result["ok"]:
+                result.update(ok=False, error="存在不合法条目，整批未写入")
+    succeeded = sum(1 for r in results if r["ok"])
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+def _campaign_id(raw: dict) -> int:
+    if "id" not in raw:
+        raise ValueError("缺少活动id")
+    if isinstance(raw["id"], bool) or not isinstance(raw["id"], int):
+        raise ValueError("活动id必须为整数")
+    return raw["id"]
+
+def _parse_patch(raw: dict):
+    """批量更新条目：id + AdCampaignUpdate字段"""
+    fields = {k: v for k, v in raw.items() if k != "id"}
+    return _campaign_id(raw), AdCampaignUpdate.model_validate(fields).dict(exclude_unset=True)
+
+def _parse_status(raw: dict):
+    return _campaign_id(raw), StatusUpdate.model_validate({"status": raw.get("status")}).status
+
+async def _load_campaigns(session: AsyncSession, ids: list) -> dict:
+    rows = (await session.exec(select(AdCampaign).where(AdCampaign.id.in_(ids)))).all()
+    return {c.id: c for c in rows}
+
+def _mark_missing(valid: list, results: list, existing) -> list:
+    """目标活动不存在的条目记为失败，返回仍然有效的条目"""
+    kept = []
+    for index, (campaign_id, data) in valid:
+        if campaign_id in existing:
+            kept.append((index, (campaign_id, data)))
+        else:
+            results[index].update(ok=False, error="Campaign not found")
+    return kept
+
 @router.get("/", response_model=List[AdCampaign])
-def list_campaigns(
-    session: Session = Depends(get_session),
+async def list_campaigns(
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
     limit: int = Query(20, ge=1, le=100, description="每页数量"),
-    offset: int = Query(0, ge=0, description="偏移量")
+    offset: int = Query(0, ge=0, description="偏移量（已废弃，深分页请使用cursor）"),
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页响应头X-Next-Cursor"),
+    status: Optional[str] = Query(None, description="按状态筛选"),
+    created_from: Optional[datetime] = Query(None, description="创建时间起（含）"),
+    created_to: Optional[datetime] = Query(None, description="创建时间止（不含）")
 ):
+    query = select(AdCampaign)
+    if status:
+        query = query.where(AdCampaign.status == status)
+    query = date_range(query, AdCampaign.created_at, created_from, created_to)
+    query = keyset_page(query, AdCampaign, limit, cursor)
+    if offset and not cursor:
+        query = query.offset(offset)
     try:
-        campaigns = session.exec(
-            select(AdCampaign).order_by(AdCampaign.created_at.desc()).offset(offset).limit(limit)
-        ).all()
-        return campaigns
+        campaigns, next_cursor = split_page((await session.exec(query)).all(), limit)
     except Exception as e:
         logger.exception("获取广告活动列表失败")
         raise HTTPException(status_code=500, detail="服务器内部错误")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return campaigns
 
-@router.get("/{campaign_id}", response_model=AdCampaign)
-def get_campaign(campaign_id: int, session: Session = Depends(get_session)):
+# 批量接口必须注册在 /{campaign_id}/... 之前，否则 /bulk/status 会被当作活动ID匹配
+@router.post("/bulk/create")
+async def bulk_create_campaigns(body: BulkRequest, session: AsyncSession = Depends(get_async_session)):
+    """批量创建：逐条按AdCampaignCreate校验，合法条目在一个事务中写入"""
+    valid, results = _bulk_validate(body.items, AdCampaignCreate.model_validate)
+    if body.atomic and len(valid) < len(results):
+        return _bulk_summary(results, applied=False)
+    campaigns = [(index, AdCampaign.from_orm(item)) for index, item in valid]
+    try:
+        session.add_all([c for _, c in campaigns])
+        await session.commit()
+    except Exception:
+        logger.exception("批量创建广告活动失败")
+        raise HTTPException(status_code=500, detail="服务器内部错误")
+    for index, campaign in campaigns:
+        results[index]["id"] = campaign.id
+    response_cache.invalidate(DASHBOARD_TAG)
+    return _bulk_summary(results, applied=True)
+
+@router.post("/bulk/update")
+async def bulk_update_campaigns(body: BulkRequest, session: AsyncSession = Depends(get_async_session)):
+    """批量更新：条目为id + AdCampaignUpdate字段，一次查询加载全部目标活动，在一个事务中提交"""
+    valid, results = _bulk_validate(body.items, _parse_patch)
     try:
-        campaign = session.get(AdCampaign, campaign_id)
+        existing = await _load_campaigns(session, list({campaign_id for _, (campaign_id, _) in valid}))
+        valid = _mark_missing(valid, results, existing)
+        if body.atomic and len(valid) < len(results):
+            return _bulk_summary(results, applied=False)
+        for index, (campaign_id, data) in valid:
+            campaign = existing[campaign_id]
+            for key, value in data.items():
+                setattr(campaign, key, value)
+            session.add(campaign)
+            results[index]["id"] = campaign_id
+        await session.commit()
+    except Exception:
+        logger.exception("批量更新广告活动失败")
+        raise HTTPException(status_code=500, detail="服务器内部错误")
+    response_cache.invalidate(*{campaign_tag(campaign_id) for _, (campaign_id, _) in valid}, DASHBOARD_TAG)
+    return _bulk_summary(results, applied=True)
+
+@router.post("/bulk/status")
+async def bulk_change_campaign_status(body: BulkRequest, session: AsyncSession = Depends(get_async_session)):
+    """批量变更状态：条目为{id, status}，按目标状态分组，每组一条UPDATE，在一个事务中提交"""
+    valid, results = _bulk_validate(body.items, _parse_status)
+    try:
+        ids = list({campaign_id for _, (campaign_id, _) in valid})
+        existing = set((await session.exec(select(AdCampaign.id).where(AdCampaign.id.in_(ids)))).all())
+        valid = _mark_missing(valid, results, existing)
+        if body.atomic and len(valid) < len(results):
+            return _bulk_summary(results, applied=False)
+        # 同一活动出现多次时以最后一条为准
+        targets = {}
+        for index, (campaign_id, status) in valid:
+            targets[campaign_id] = status
+            results[index]["id"] = campaign_id
+        by_status = {}
+        for campaign_id, status in targets.items():
+            by_status.setdefault(status, []).append(campaign_id)
+        for status, campaign_ids in by_status.items():
+            await session.execute(update(AdCampaign).where(AdCampaign.id.in_(campaign_ids)).values(status=status))
+        await session.commit()
+    except Exception:
+        logger.exception("批量变更广告活动状态失败")
+        raise HTTPException(status_code=500, detail="服务器内部错误")
+    response_cache.invalidate(*{campaign_tag(campaign_id) for campaign_id in targets}, DASHBOARD_TAG)
+    return _bulk_summary(results, applied=True)
+
+@router.get("/{campaign_id}", response_model=AdCampaign)
+async def get_campaign(campaign_id: int, request: Request, session: AsyncSession = Depends(get_async_session)):
+    async def _build():
+        campaign = await session.get(AdCampaign, campaign_id)
         if not campaign:
             raise HTTPException(status_code=404, detail="Campaign not found")
         return campaign
+
+    try:
+        return await response_cache.respond(request, [campaign_tag(campaign_id)], _build)
     except HTTPException:
         raise
     except Exception as e:
@@ -43,29 +193,31 @@ def get_campaign(campaign_id: int, session: Session = Depends(get_session)):
         raise HTTPException(status_code=500, detail="服务器内部错误")
 
 @router.post("/", response_model=AdCampaign)
-def create_campaign(campaign: AdCampaignCreate, session: Session = Depends(get_session)):
+async def create_campaign(campaign: AdCampaignCreate, session: AsyncSession = Depends(get_async_session)):
     try:
         db_campaign = AdCampaign.from_orm(campaign)
         session.add(db_campaign)
-        session.commit()
-        session.refresh(db_campaign)
+        await session.commit()
+        await session.refresh(db_campaign)
+        response_cache.invalidate(DASHBOARD_TAG)
         return db_campaign
     except Exception as e:
         logger.exception("创建广告活动失败")
         raise HTTPException(status_code=500, detail="服务器内部错误")
 
 @router.put("/{campaign_id}", response_model=AdCampaign)
-def update_campaign(campaign_id: int, campaign_update: AdCampaignUpdate, session: Session = Depends(get_session)):
+async def update_campaign(campaign_id: int, campaign_update: AdCampaignUpdate, session: AsyncSession = Depends(get_async_session)):
     try:
-        campaign = session.get(AdCampaign, campaign_id)
+        campaign = await session.get(AdCampaign, campaign_id)
         if not campaign:
             raise HTTPException(status_code=404, detail="Campaign not found")
         update_data = campaign_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(campaign, key, value)
         session.add(campaign)
-        session.commit()
-        session.refresh(campaign)
+        await session.commit()
+        await session.refresh(campaign)
+        response_cache.invalidate(campaign_tag(campaign_id), DASHBOARD_TAG)
         return campaign
     except HTTPException:
         raise
@@ -74,18 +226,48 @@ def update_campaign(campaign_id: int, campaign_update: AdCampaignUpdate, session
         raise HTTPException(status_code=500, detail="服务器内部错误")
 
 @router.post("/{campaign_id}/status", response_model=AdCampaign)
-def change_campaign_status(campaign_id: int, status_update: StatusUpdate, session: Session = Depends(get_session)):
+async def change_campaign_status(campaign_id: int, status_update: StatusUpdate, session: AsyncSession = Depends(get_async_session)):
     try:
-        campaign = session.get(AdCampaign, campaign_id)
+        campaign = await session.get(AdCampaign, campaign_id)
         if not campaign:
             raise HTTPException(status_code=404, detail="Campaign not found")
         campaign.status = status_update.status
         session.add(campaign)
-        session.commit()
-        session.refresh(campaign)
+        await session.commit()
+        await session.refresh(campaign)
+        response_cache.invalidate(campaign_tag(campaign_id), DASHBOARD_TAG)
         return campaign
     except HTTPException:
         raise
     except Exception as e:
         logger.exception("变更广告活动状态失败")
-        raise HTTPException(status_code=500, detail="服务器内部错误") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="服务器内部错误") 
+
+@router.get("/{campaign_id}/performance")
+async def get_campaign_performance(
+    campaign_id: int,
+    session: AsyncSession = Depends(get_async_session),
+    grain: str = Query("daily", description="汇总粒度: hourly/daily"),
+    days: int = Query(30, ge=1, le=365, description="回溯天数")
+):
+    """从汇总表读取活动效果时间序列与合计"""
+    if grain not in ROLLUP_TABLES:
+        raise HTTPException(status_code=400, detail="不支持的汇总粒度")
+    try:
+        campaign = await session.get(AdCampaign, campaign_id)
+        if not campaign:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+        series = await session.run_sync(campaign_series, campaign_id, grain, datetime.utcnow() - timedelta(days=days))
+        totals = {
+            key: sum(point[key] for point in series)
+            for key in ("impressions", "clicks", "conversions", "cost")
+        }
+        totals["ctr"] = totals["clicks"] / totals["impressions"] if totals["impressions"] else 0.0
+        totals["cvr"] = totals["conversions"] / totals["clicks"] if totals["clicks"] else 0.0
+        totals["cpa"] = totals["cost"] / totals["conversions"] if totals["conversions"] else 0.0
+        return {"campaign_id": campaign_id, "grain": grain, "totals": totals, "series": series}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("获取广告活动效果数据失败")
+        raise HTTPException(status_code=500, detail="服务器内部错误")
@@ -0,0 +1,56 @@
+"""
+pytest公共夹具：每个用例在临时目录中建独立的数据库（benchmarks.seed.make_engine），不读写ads_agent.db。
+设置TEST_DATABASE_URL（可清空的PostgreSQL测试库）时，依赖数据库的用例再在PostgreSQL上各运行一遍；
+依赖SQLite特性的用例加@pytest.mark.sqlite_only
+"""
+
+import asyncio
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from benchmarks.seed import make_engine, use_engine
+from db import create_db_engine, init_db
+from main import app
+from response_cache import MemoryCacheBackend, response_cache
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+# 同步引擎 + 对应的异步驱动（SQLite: aiosqlite，PostgreSQL: asyncpg），由use_engine按async_url推导
+BACKENDS = ["sqlite"] + (["postgresql"] if TEST_DATABASE_URL else [])
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "sqlite_only: 依赖SQLite特性（FTS5全文索引、外部sqlite3连接），只在SQLite上运行")
+
+def _reset_postgres(engine):
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "test.db")
+
+@pytest.fixture(params=BACKENDS)
+def engine(request, db_path):
+    if request.param == "sqlite":
+        engine = make_engine(db_path)
+    else:
+        if request.node.get_closest_marker("sqlite_only"):
+            pytest.skip("依赖SQLite特性")
+        engine = create_db_engine(TEST_DATABASE_URL)
+        _reset_postgres(engine)
+        init_db(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    """接口请求指向临时库；每个用例使用独立的响应缓存。不进入TestClient上下文，不启动后台任务"""
+    monkeypatch.setattr(response_cache, "backend", MemoryCacheBackend())
+    async_engine = use_engine(app, engine)
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    asyncio.run(async_engine.dispose())
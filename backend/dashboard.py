@@ -1,28 +1,126 @@
-from fastapi import APIRouter, Depends
+import os
+from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy import and_, func, case
 from sqlmodel import select
-from models import AdCampaign
-from db import get_session
+from models import AdCampaign, AdResultHourly
+from db import get_async_session
+from rollups import refresh_rollups, rebuild_rollups
+from response_cache import response_cache, DASHBOARD_TAG
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import datetime, timedelta
 from typing import Any
 
+load_dotenv()
+
 router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
 
-@router.get("/overview")
-def dashboard_overview(session: Session = Depends(get_session)) -> Any:
-    # 统计数据（可根据实际业务调整）
-    total_campaigns = session.exec(select(AdCampaign)).count()
-    running_campaigns = session.exec(select(AdCampaign).where(AdCampaign.status == "running")).count()
-    today_budget = session.exec(select(AdCampaign.budget)).all()
-    today_budget_sum = sum(today_budget) if today_budget else 0
-    # mock数据，后续可接入真实效果
-    stats = [
-        {"title": "活跃广告活动", "value": str(running_campaigns), "change": "+2", "trend": "up", "icon": "Zap", "color": "text-primary"},
-        {"title": "今日投放预算", "value": f"¥{today_budget_sum}", "change": "+12.5%", "trend": "up", "icon": "DollarSign", "color": "text-success"},
-        {"title": "点击率(CTR)", "value": "3.2%", "change": "+0.8%", "trend": "up", "icon": "Target", "color": "text-warning"},
-        {"title": "转化率", "value": "8.6%", "change": "+1.2%", "trend": "up", "icon": "TrendingUp", "color": "text-secondary"}
+# “今日”按该时区的自然日统计（默认北京时间），与昨日同一时段对比得出change/trend；须为整小时以对齐小时汇总表
+DAY_OFFSET = timedelta(hours=int(os.getenv("DASHBOARD_TZ_OFFSET_HOURS", "8")))
+
+def _day_start(now: datetime) -> datetime:
+    """now（UTC）所在自然日的零点，换算回UTC"""
+    return (now + DAY_OFFSET).replace(hour=0, minute=0, second=0, microsecond=0) - DAY_OFFSET
+
+def _campaign_stats(session: Session, today_start: datetime) -> dict:
+    """单次GROUP BY统计各状态的活动数量、预算与今日新建数"""
+    rows = session.exec(
+        select(
+            AdCampaign.status,
+            func.count(AdCampaign.id),
+            func.coalesce(func.sum(AdCampaign.budget), 0.0),
+            func.count(case((AdCampaign.created_at >= today_start, AdCampaign.id))),
+        )
+        .group_by(AdCampaign.status)
+    ).all()
+    by_status = {status: {"count": count, "budget": float(budget), "created_today": new} for status, count, budget, new in rows}
+    return {
+        "total": sum(v["count"] for v in by_status.values()),
+        "budget": sum(v["budget"] for v in by_status.values()),
+        "by_status": by_status,
+    }
+
+def _period_metrics(session: Session, now: datetime, today_start: datetime) -> dict:
+    """从小时汇总表单次扫描，分别汇总今日与昨日同一时段（截至当前小时）的效果数据"""
+    yesterday_start = today_start - timedelta(days=1)
+    is_current = AdResultHourly.bucket >= today_start
+    is_previous = and_(
+        AdResultHourly.bucket < today_start,
+        AdResultHourly.bucket <= now.replace(minute=0, second=0, microsecond=0) - timedelta(days=1),
+    )
+
+    columns = []
+    for column in (AdResultHourly.impressions, AdResultHourly.clicks, AdResultHourly.conversions, AdResultHourly.cost):
+        columns.append(func.coalesce(func.sum(case((is_current, column), else_=0)), 0))
+        columns.append(func.coalesce(func.sum(case((is_previous, column), else_=0)), 0))
+    row = session.exec(select(*columns).where(AdResultHourly.bucket >= yesterday_start)).one()
+    keys = ["impressions", "clicks", "conversions", "cost"]
+    current = {k: row[i * 2] for i, k in enumerate(keys)}
+    previous = {k: row[i * 2 + 1] for i, k in enumerate(keys)}
+    return {"current": current, "previous": previous}
+
+def _rate(numerator, denominator) -> float:
+    return numerator / denominator * 100 if denominator else 0.0
+
+def _trend(delta: float) -> str:
+    return "down" if delta < 0 else "up"
+
+def build_overview_stats(campaigns: dict, metrics: dict) -> list:
+    """根据活动统计与今日/昨日同时段效果数据构造仪表盘指标卡片，每张卡片的数值与变化量取自同一指标"""
+    current, previous = metrics["current"], metrics["previous"]
+    # 活跃活动：运行中的活动数，变化量为其中今日新建的数量（状态变更没有历史记录，无法还原昨日的运行数）
+    running = campaigns["by_status"].get("running", {})
+    running_count, running_new = running.get("count", 0), running.get("created_today", 0)
+    cost_change = _rate(current["cost"] - previous["cost"], previous["cost"])
+    ctr = _rate(current["clicks"], current["impressions"])
+    ctr_delta = ctr - _rate(previous["clicks"], previous["impressions"])
+    cvr = _rate(current["conversions"], current["clicks"])
+    cvr_delta = cvr - _rate(previous["conversions"], previous["clicks"])
+    return [
+        {"title": "活跃广告活动", "value": str(running_count), "change": f"{running_new:+d}", "trend": _trend(running_new), "icon": "Zap", "color": "text-primary"},
+        {"title": "今日花费", "value": f"¥{current['cost']:.2f}", "change": f"{cost_change:+.1f}%", "trend": _trend(cost_change), "icon": "DollarSign", "color": "text-success"},
+        {"title": "点击率(CTR)", "value": f"{ctr:.1f}%", "change": f"{ctr_delta:+.1f}%", "trend": _trend(ctr_delta), "icon": "Target", "color": "text-warning"},
+        {"title": "转化率", "value": f"{cvr:.1f}%", "change": f"{cvr_delta:+.1f}%", "trend": _trend(cvr_delta), "icon": "TrendingUp", "color": "text-secondary"}
     ]
+
+def build_overview(session: Session) -> dict:
+    # 统计数据全部在SQL端聚合完成；效果数据读小时汇总表，查询成本只与活动数×小时数相关
+    # 只读：汇总表由写路径与后台定时刷新维护
+    now = datetime.utcnow()
+    today_start = _day_start(now)
+    campaigns = _campaign_stats(session, today_start)
+    metrics = _period_metrics(session, now, today_start)
+    stats = build_overview_stats(campaigns, metrics)
     recent_campaigns = session.exec(select(AdCampaign).order_by(AdCampaign.created_at.desc()).limit(3)).all()
     recent_campaigns_data = [
         {"name": c.name, "status": c.status, "budget": f"¥{c.budget}", "performance": 80, "ai_optimized": True} for c in recent_campaigns
     ]
-    return {"stats": stats, "recentCampaigns": recent_campaigns_data} 
\ No newline at end of file
+    campaign_summary = {
+        "total": campaigns["total"],
+        "budget": campaigns["budget"],
+        "byStatus": {status: {"count": v["count"], "budget": v["budget"]} for status, v in campaigns["by_status"].items()},
+    }
+    return {"stats": stats, "campaigns": campaign_summary, "recentCampaigns": recent_campaigns_data}
+
+# 总览的统计周期随时间滚动，缓存有效期取较短值
+OVERVIEW_CACHE_TTL = 30
+
+@router.get("/overview")
+async def dashboard_overview(request: Request, session: AsyncSession = Depends(get_async_session)) -> Any:
+    async def _build():
+        return await session.run_sync(build_overview)
+
+    return await response_cache.respond(request, [DASHBOARD_TAG], _build, ttl=OVERVIEW_CACHE_TTL)
+
+@router.post("/rollups/refresh")
+async def refresh_result_rollups(rebuild: bool = False, session: AsyncSession = Depends(get_async_session)) -> Any:
+    """增量刷新效果汇总表；rebuild=true时清空后完整重建"""
+    summary = await session.run_sync(rebuild_rollups if rebuild else refresh_rollups)
+    response_cache.invalidate(DASHBOARD_TAG)
+    return summary
+
+@router.get("/cache/stats")
+async def response_cache_stats() -> Any:
+    """读接口响应缓存的命中率、304次数、失效次数等统计"""
+    return response_cache.snapshot()
@@ -0,0 +1,329 @@
+"""
+实时事件推送：Agent日志步骤、AI建议状态变更按活动分发给SSE订阅者，支持Last-Event-ID断线续传。
+默认进程内分发（单worker）；多worker部署时设置EVENT_BROKER=database，经事件表在进程间广播（仅支持SQLite）。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, insert
+from sqlmodel import Session, select
+
+from models import LiveEvent
+
+load_dotenv()
+
+logger = logging.getLogger("events")
+
+@dataclass
+class Event:
+    id: int
+    topic: str
+    kind: str
+    data: dict
+
+def campaign_topic(campaign_id: int) -> str:
+    return f"campaign:{campaign_id}"
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def format_sse(event: Event) -> str:
+    payload = json.dumps(event.data, ensure_ascii=False, default=_json_default)
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {payload}\n\n"
+
+def sse_message(kind: str, data: dict) -> str:
+    """不进入事件代理、无需续传的一次性SSE消息（如流式生成的文本片段）"""
+    payload = json.dumps(data, ensure_ascii=False, default=_json_default)
+    return f"event: {kind}\ndata: {payload}\n\n"
+
+# 无法续传（事件已被淘汰或服务重启）时通知客户端重新拉取全量数据
+RESET_MESSAGE = "event: reset\ndata: {}\n\n"
+
+class Subscription:
+    def __init__(self, topic: str, maxsize: int):
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.loop = asyncio.get_running_loop()
+        self.overflowed = False
+
+    def push(self, event: Event):
+        """只在订阅者所在的事件循环中调用"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+class EventBroker:
+    """进程内订阅管理与分发；子类决定事件ID的分配、持久化与回放"""
+
+    def __init__(self, queue_size: int = 1000):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, set] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, topic: str, kind: str, data: dict):
+        self.publish_many([(topic, kind, data)])
+
+    def publish_many(self, items: list):
+        """发布一组(topic, kind, data)；可在任意线程中调用"""
+        raise NotImplementedError
+
+    def replay(self, topic: str, after_id: int) -> Optional[List[Event]]:
+        """返回after_id之后的事件；无法保证完整时返回None"""
+        raise NotImplementedError
+
+    def subscribe(self, topic: str) -> Subscription:
+        sub = Subscription(topic, self.queue_size)
+        with self._lock:
+            self._subscribers[topic].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(sub.topic)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.topic]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def _dispatch(self, events: List[Event]):
+        with self._lock:
+            targets = [(event, list(self._subscribers.get(event.topic, ()))) for event in events]
+        for event, subs in targets:
+            for sub in subs:
+                try:
+                    sub.loop.call_soon_threadsafe(sub.push, event)
+                except RuntimeError:  # 订阅者的事件循环已关闭
+                    self.unsubscribe(sub)
+
+    def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+class MemoryEventBroker(EventBroker):
+    """进程内广播：每个主题保留最近buffer_size条事件用于断线续传"""
+
+    def __init__(self, buffer_size: int = 500, queue_size: int = 1000):
+        super().__init__(queue_size)
+        self.buffer_size = buffer_size
+        self._seq = 0
+        self._buffers: Dict[str, deque] = {}
+        self._evicted: Dict[str, int] = {}
+
+    def publish_many(self, items: list):
+        events = []
+        with self._lock:
+            for topic, kind, data in items:
+                self._seq += 1
+                event = Event(self._seq, topic, kind, data)
+                buffer = self._buffers.setdefault(topic, deque(maxlen=self.buffer_size))
+                if len(buffer) == buffer.maxlen:
+                    self._evicted[topic] = buffer[0].id
+                buffer.append(event)
+                events.append(event)
+        self._dispatch(events)
+
+    def replay(self, topic: str, after_id: int) -> Optional[List[Event]]:
+        with self._lock:
+            # 事件ID只在进程生命周期内有效：大于当前序号说明服务已重启
+            if after_id > self._seq or after_id < self._evicted.get(topic, 0):
+                return None
+            return [e for e in self._buffers.get(topic, ()) if e.id > after_id]
+
+class DatabaseEventBroker(EventBroker):
+    """
+    经事件表在多个worker进程间广播：发布即写表，各进程轮询新事件后分发给本进程订阅者。
+    事件ID即自增主键，服务重启后依然可以续传；超过retention的事件定期清理。
+    只支持SQLite：轮询与续传都按“ID > 已读ID”读取，依赖事件按ID顺序提交。PostgreSQL等数据库中
+    序列号在插入时分配、事务可乱序提交，较小ID的事件可能晚于较大ID可见而被永久跳过，因此拒绝启动
+    """
+
+    def __init__(self, engine=None, poll_interval: float = 0.5, retention: timedelta = timedelta(hours=24),
+                 replay_limit: int = 1000, queue_size: int = 1000):
+        super().__init__(queue_size)
+        self._engine = engine
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.replay_limit = replay_limit
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from db import engine
+            self._engine = engine
+        return self._engine
+
+    def publish_many(self, items: list):
+        if not items:
+            return
+        now = datetime.utcnow()
+        rows = [
+            {"topic": topic, "kind": kind, "data": json.dumps(data, ensure_ascii=False, default=_json_default), "created_at": now}
+            for topic, kind, data in items
+        ]
+        with Session(self.engine) as session:
+            session.execute(insert(LiveEvent), rows)
+            session.commit()
+
+    def _to_event(self, row: LiveEvent) -> Event:
+        return Event(row.id, row.topic, row.kind, json.loads(row.data))
+
+    def replay(self, topic: str, after_id: int) -> Optional[List[Event]]:
+        with Session(self.engine) as session:
+            oldest = session.exec(select(func.min(LiveEvent.id))).one()
+            if oldest is not None and after_id < oldest - 1:
+                return None
+            rows = session.exec(
+                select(LiveEvent)
+                .where(LiveEvent.topic == topic, LiveEvent.id > after_id)
+                .order_by(LiveEvent.id)
+                .limit(self.replay_limit + 1)
+            ).all()
+        if len(rows) > self.replay_limit:
+            return None
+        return [self._to_event(row) for row in rows]
+
+    def _poll(self, last_id: int) -> List[Event]:
+        with Session(self.engine) as session:
+            rows = session.exec(
+                select(LiveEvent).where(LiveEvent.id > last_id).order_by(LiveEvent.id).limit(self.replay_limit)
+            ).all()
+            return [self._to_event(row) for row in rows]
+
+    def _prune(self):
+        with Session(self.engine) as session:
+            session.execute(delete(LiveEvent).where(LiveEvent.created_at < datetime.utcnow() - self.retention))
+            session.commit()
+
+    def _max_id(self) -> int:
+        with Session(self.engine) as session:
+            return session.exec(select(func.max(LiveEvent.id))).one() or 0
+
+    async def _run(self):
+        last_id = await run_in_threadpool(self._max_id)
+        last_prune = 0.0
+        while True:
+            events = []
+            try:
+                # SQLite写事务串行，提交顺序与自增ID一致，按ID递增读取不会漏掉事件
+                events = await run_in_threadpool(self._poll, last_id)
+                if events:
+                    last_id = events[-1].id
+                    self._dispatch(events)
+                if time.monotonic() - last_prune > 3600:
+                    await run_in_threadpool(self._prune)
+                    last_prune = time.monotonic()
+            except Exception:
+                logger.exception("轮询实时事件失败")
+            if not events:
+                await asyncio.sleep(self.poll_interval)
+
+    def check_backend(self):
+        dialect = self.engine.dialect.name
+        if dialect != "sqlite":
+            raise RuntimeError(
+                f"EVENT_BROKER=database只支持SQLite（当前数据库为{dialect}）：事件ID不保证按提交顺序可见，轮询会漏掉事件"
+            )
+
+    def start(self):
+        if self._task is None:
+            self.check_backend()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+def broker_from_env() -> EventBroker:
+    kind = os.getenv("EVENT_BROKER", "memory")
+    if kind == "database":
+        return DatabaseEventBroker(
+            poll_interval=float(os.getenv("EVENT_POLL_INTERVAL", "0.5")),
+            retention=timedelta(hours=float(os.getenv("EVENT_RETENTION_HOURS", "24"))),
+        )
+    return MemoryEventBroker(buffer_size=int(os.getenv("EVENT_BUFFER_SIZE", "500")))
+
+async def sse_stream(broker: EventBroker, topic: str, last_event_id: Optional[int] = None,
+                     heartbeat: float = 15.0, max_age: float = 300.0) -> AsyncIterator[str]:
+    """
+    SSE响应体：先订阅再回放，避免回放与订阅之间的事件丢失；按事件ID去重。
+    连接最长保持max_age秒后主动结束，由浏览器EventSource携带Last-Event-ID自动重连，
+    这样服务关闭时不会被长连接阻塞。
+    """
+    sub = broker.subscribe(topic)
+    try:
+        yield "retry: 3000\n\n"
+        seen = 0
+        if last_event_id is not None:
+            replayed = await run_in_threadpool(broker.replay, topic, last_event_id)
+            if replayed is None:
+                yield RESET_MESSAGE
+            else:
+                for event in replayed:
+                    yield format_sse(event)
+                    seen = event.id
+        deadline = time.monotonic() + max_age
+        while time.monotonic() < deadline:
+            if sub.overflowed:
+                sub.overflowed = False
+                yield RESET_MESSAGE
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), timeout=min(heartbeat, max(deadline - time.monotonic(), 0.01)))
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event.id <= seen:
+                continue
+            seen = event.id
+            yield format_sse(event)
+    finally:
+        broker.unsubscribe(sub)
+
+def advice_event(advice) -> dict:
+    return {
+        "id": advice.id,
+        "campaign_id": advice.campaign_id,
+        "type": advice.type,
+        "content": advice.content,
+        "status": advice.status,
+        "created_at": advice.created_at,
+        "executed_at": advice.executed_at,
+        "approved_by": advice.approved_by,
+    }
+
+def publish_advice(advice):
+    """AI建议新建或状态变更后推送给对应活动的订阅者；推送失败不影响业务写入"""
+    if advice.campaign_id is None:
+        return
+    try:
+        event_broker.publish(campaign_topic(advice.campaign_id), "advice", advice_event(advice))
+    except Exception:
+        logger.exception("推送AI建议事件失败")
+
+# 全局事件代理
+event_broker = broker_from_env()
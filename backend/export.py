@@ -0,0 +1,251 @@
+"""
+数据导出：广告活动（含效果汇总）、Agent日志、AI建议执行记录，支持CSV/NDJSON/Parquet。
+使用数据库游标分批读取、分块输出响应体，导出规模再大内存占用也只与单批行数相关。
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from db import get_session
+from models import AdCampaign, AdResult, AgentLog, AIAdvice, AIExecution
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow为可选依赖，未安装时不支持parquet导出
+    pa = None
+
+router = APIRouter(prefix="/api/export", tags=["Export"])
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# 每批从数据库读取的行数（同时也是Parquet的行组大小）
+CHUNK_SIZE = 5000
+
+# 各导出数据集的列定义：(列名, 类型)，类型用于生成Parquet schema
+CAMPAIGN_COLUMNS = [
+    ("id", "int"), ("name", "str"), ("product", "str"), ("objective", "str"),
+    ("budget", "float"), ("status", "str"), ("created_at", "datetime"),
+    ("impressions", "int"), ("clicks", "int"), ("conversions", "int"), ("cost", "float"),
+    ("result_rows", "int"),
+]
+AGENT_LOG_COLUMNS = [
+    ("id", "int"), ("campaign_id", "int"), ("run_id", "int"), ("step", "str"), ("status", "str"), ("message", "str"),
+    ("data", "str"), ("output", "str"), ("created_at", "datetime"),
+]
+EXECUTION_COLUMNS = [
+    ("id", "int"), ("advice_id", "int"), ("campaign_id", "int"), ("advice_type", "str"),
+    ("advice_content", "str"), ("advice_status", "str"), ("approved_by", "str"),
+    ("result", "str"), ("executed_at", "datetime"),
+]
+
+def campaigns_query(campaign_ids: Optional[List[int]] = None, status: Optional[str] = None,
+                    created_from: Optional[datetime] = None, created_to: Optional[datetime] = None):
+    """广告活动 + 时间范围内的效果数据合计；时间范围作用于AdResult.created_at"""
+    totals = select(
+        AdResult.campaign_id,
+        func.sum(AdResult.impressions).label("impressions"),
+        func.sum(AdResult.clicks).label("clicks"),
+        func.sum(AdResult.conversions).label("conversions"),
+        func.sum(AdResult.cost).label("cost"),
+        func.count(AdResult.id).label("result_rows"),
+    )
+    if created_from:
+        totals = totals.where(AdResult.created_at >= created_from)
+    if created_to:
+        totals = totals.where(AdResult.created_at < created_to)
+    if campaign_ids:
+        totals = totals.where(AdResult.campaign_id.in_(campaign_ids))
+    totals = totals.group_by(AdResult.campaign_id).subquery()
+    query = select(
+        AdCampaign.id, AdCampaign.name, AdCampaign.product, AdCampaign.objective,
+        AdCampaign.budget, AdCampaign.status, AdCampaign.created_at,
+        func.coalesce(totals.c.impressions, 0).label("impressions"),
+        func.coalesce(totals.c.clicks, 0).label("clicks"),
+        func.coalesce(totals.c.conversions, 0).label("conversions"),
+        func.coalesce(totals.c.cost, 0.0).label("cost"),
+        func.coalesce(totals.c.result_rows, 0).label("result_rows"),
+    ).outerjoin(totals, totals.c.campaign_id == AdCampaign.id)
+    if campaign_ids:
+        query = query.where(AdCampaign.id.in_(campaign_ids))
+    if status:
+        query = query.where(AdCampaign.status == status)
+    return query.order_by(AdCampaign.id)
+
+def agent_logs_query(campaign_ids: Optional[List[int]] = None,
+                     created_from: Optional[datetime] = None, created_to: Optional[datetime] = None):
+    query = select(
+        AgentLog.id, AgentLog.campaign_id, AgentLog.run_id, AgentLog.step, AgentLog.status,
+        AgentLog.message, AgentLog.data, AgentLog.output, AgentLog.created_at,
+    )
+    if campaign_ids:
+        query = query.where(AgentLog.campaign_id.in_(campaign_ids))
+    if created_from:
+        query = query.where(AgentLog.created_at >= created_from)
+    if created_to:
+        query = query.where(AgentLog.created_at < created_to)
+    return query.order_by(AgentLog.id)
+
+def executions_query(campaign_ids: Optional[List[int]] = None,
+                     created_from: Optional[datetime] = None, created_to: Optional[datetime] = None):
+    query = select(
+        AIExecution.id, AIExecution.advice_id, AIAdvice.campaign_id,
+        AIAdvice.type.label("advice_type"), AIAdvice.content.label("advice_content"),
+        AIAdvice.status.label("advice_status"), AIAdvice.approved_by,
+        AIExecution.result, AIExecution.executed_at,
+    ).join(AIAdvice, AIAdvice.id == AIExecution.advice_id)
+    if campaign_ids:
+        query = query.where(AIAdvice.campaign_id.in_(campaign_ids))
+    if created_from:
+        query = query.where(AIExecution.executed_at >= created_from)
+    if created_to:
+        query = query.where(AIExecution.executed_at < created_to)
+    return query.order_by(AIExecution.id)
+
+def _iter_chunks(bind, query, chunk_size: int) -> Iterator[list]:
+    """在独立连接上用流式游标分批读取，每批返回一组元组"""
+    with bind.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        for rows in result.partitions(chunk_size):
+            yield rows
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value)}")
+
+def _encode_csv(chunks: Iterator[list], columns: list) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def _encode_ndjson(chunks: Iterator[list], columns: list) -> Iterator[bytes]:
+    names = [name for name, _ in columns]
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(names, row)), ensure_ascii=False, default=_json_default) + "\n" for row in rows
+        ).encode("utf-8")
+
+class _ParquetSink:
+    """只追加的文件对象：ParquetWriter每写完一个行组就把字节取走，不在内存里累积整个文件"""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.parts.append(data)
+        self.size += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.size
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+def _parquet_schema(columns: list):
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string(), "datetime": pa.timestamp("us")}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+def _encode_parquet(chunks: Iterator[list], columns: list) -> Iterator[bytes]:
+    schema = _parquet_schema(columns)
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    for rows in chunks:
+        arrays = [pa.array([row[i] for row in rows], type=schema.field(i).type) for i in range(len(columns))]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+ENCODERS = {"csv": _encode_csv, "ndjson": _encode_ndjson, "parquet": _encode_parquet}
+
+def iter_export(bind, query, columns: list, fmt: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """按格式逐块编码导出数据（生成器，供StreamingResponse在线程池中迭代）"""
+    return ENCODERS[fmt](_iter_chunks(bind, query, chunk_size), columns)
+
+def _check_format(fmt: str):
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail="不支持的导出格式")
+    if fmt == "parquet" and pa is None:
+        raise HTTPException(status_code=400, detail="服务器未安装pyarrow，不支持parquet导出")
+
+def _response(session: Session, name: str, query, columns: list, fmt: str, chunk_size: int) -> StreamingResponse:
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{fmt}"
+    return StreamingResponse(
+        iter_export(session.get_bind(), query, columns, fmt, chunk_size),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/campaigns")
+def export_campaigns(
+    format: str = Query("csv", description="csv/ndjson/parquet"),
+    campaign_id: Optional[List[int]] = Query(None, description="活动ID，可重复传入多个"),
+    status: Optional[str] = Query(None, description="按活动状态筛选"),
+    created_from: Optional[datetime] = Query(None, description="效果数据时间起（含）"),
+    created_to: Optional[datetime] = Query(None, description="效果数据时间止（不含）"),
+    chunk_size: int = Query(CHUNK_SIZE, ge=100, le=50000, description="每批读取行数"),
+    session: Session = Depends(get_session)
+):
+    """导出广告活动及时间范围内的效果数据合计"""
+    _check_format(format)
+    query = campaigns_query(campaign_id, status, created_from, created_to)
+    return _response(session, "campaigns", query, CAMPAIGN_COLUMNS, format, chunk_size)
+
+@router.get("/agent-logs")
+def export_agent_logs(
+    format: str = Query("csv", description="csv/ndjson/parquet"),
+    campaign_id: Optional[List[int]] = Query(None, description="活动ID，可重复传入多个"),
+    created_from: Optional[datetime] = Query(None, description="记录时间起（含）"),
+    created_to: Optional[datetime] = Query(None, description="记录时间止（不含）"),
+    chunk_size: int = Query(CHUNK_SIZE, ge=100, le=50000, description="每批读取行数"),
+    session: Session = Depends(get_session)
+):
+    """导出Agent执行日志（审计轨迹）"""
+    _check_format(format)
+    query = agent_logs_query(campaign_id, created_from, created_to)
+    return _response(session, "agent-logs", query, AGENT_LOG_COLUMNS, format, chunk_size)
+
+@router.get("/executions")
+def export_executions(
+    format: str = Query("csv", description="csv/ndjson/parquet"),
+    campaign_id: Optional[List[int]] = Query(None, description="活动ID，可重复传入多个"),
+    created_from: Optional[datetime] = Query(None, description="执行时间起（含）"),
+    created_to: Optional[datetime] = Query(None, description="执行时间止（不含）"),
+    chunk_size: int = Query(CHUNK_SIZE, ge=100, le=50000, description="每批读取行数"),
+    session: Session = Depends(get_session)
+):
+    """导出AI建议执行记录（含对应建议内容与审批人）"""
+    _check_format(format)
+    query = executions_query(campaign_id, created_from, created_to)
+    return _response(session, "executions", query, EXECUTION_COLUMNS, format, chunk_size)
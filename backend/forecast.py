@@ -0,0 +1,283 @@
+"""
+预算预测：从天级汇总的效果数据为每个活动拟合花费节奏与转化响应曲线，
+批量模拟预算调整后的日花费、转化与CPA，供审批提高/降低预算的AI建议前参考。
+
+每个活动的模型：
+- 转化响应：ln(1+转化) = intercept + slope·ln(1+花费)，slope限制在[0, 1]（边际收益递减）；
+  有花费的天数不足或花费没有波动时取slope=1，即按历史平均CPA线性外推
+- 花费节奏：预算利用率u = 日均花费 / 日预算；提高预算时新增部分按u消化，降低预算时以新预算封顶
+
+回归只依赖按天累加的充分统计量，缓存在forecastparams表中：新效果数据到达后只重算被影响的
+(活动, 天)，用“新值的贡献 - 旧值的贡献”更新统计量，不需要重新扫描历史数据。
+"""
+
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, insert, update
+from sqlmodel import Session, select
+
+from models import AdCampaign, AdResult, AdResultDaily, AIAdvice, ForecastParams, RuleTrigger
+from rollups import _bucket_expr, lock_watermarks, refresh_rollups
+
+WATERMARK = "forecast"
+STAT_FIELDS = ("days", "sum_spend", "sum_conversions", "sum_x", "sum_y", "sum_xx", "sum_xy")
+# 少于该天数时不做回归
+FIT_MIN_DAYS = 3
+DEFAULT_HORIZON = 14
+# 单条IN查询的活动ID数
+ID_CHUNK = 500
+
+def _contributions(spend: np.ndarray, conversions: np.ndarray) -> np.ndarray:
+    """每天对充分统计量的贡献（7×N），没有花费的天不计入"""
+    x = np.log1p(spend)
+    y = np.log1p(conversions)
+    active = spend > 0
+    return np.vstack([np.ones_like(spend), spend, conversions, x, y, x * x, x * y]) * active
+
+def fit(stats: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """由7×N的充分统计量批量拟合，返回(intercept, slope)"""
+    days, _, _, sum_x, sum_y, sum_xx, sum_xy = stats
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_x = sum_x / days
+        mean_y = sum_y / days
+        var_x = sum_xx / days - mean_x ** 2
+        slope = (sum_xy / days - mean_x * mean_y) / var_x
+    fitted = (days >= FIT_MIN_DAYS) & (var_x > 1e-6)
+    slope = np.where(fitted, np.clip(slope, 0.0, 1.0), 1.0)
+    intercept = np.where(days > 0, mean_y - slope * mean_x, 0.0)
+    return intercept, slope
+
+def _as_datetime(value) -> datetime:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def _daily_changes(session: Session, low_id: int, high_id: int) -> tuple:
+    """
+    返回AdResult ID区间(low_id, high_id]影响到的每个(活动, 天)：(活动ID数组, 新的日花费/转化, 旧的日花费/转化)。
+    天级汇总表已刷新到high_id，旧值 = 当前汇总值 - 本区间的增量。
+    """
+    if low_id == 0:
+        # 首次构建：直接读取天级汇总表，没有旧值
+        rows = session.exec(select(AdResultDaily.campaign_id, AdResultDaily.cost, AdResultDaily.conversions)).all()
+        data = np.array([tuple(row) for row in rows], dtype=np.float64).reshape(-1, 3)
+        return data[:, 0].astype(np.int64), data[:, 1:], np.zeros((len(data), 2))
+
+    bucket = _bucket_expr(session, "daily").label("bucket")
+    deltas = session.exec(
+        select(AdResult.campaign_id, bucket, func.sum(AdResult.cost), func.sum(AdResult.conversions))
+        .where(AdResult.id > low_id, AdResult.id <= high_id)
+        .group_by(AdResult.campaign_id, bucket)
+    ).all()
+    keys = [(campaign_id, _as_datetime(day)) for campaign_id, day, _, _ in deltas]
+    current = {}
+    if keys:
+        ids = sorted({campaign_id for campaign_id, _ in keys})
+        since = min(day for _, day in keys)
+        for start in range(0, len(ids), ID_CHUNK):
+            rows = session.exec(
+                select(AdResultDaily.campaign_id, AdResultDaily.bucket, AdResultDaily.cost, AdResultDaily.conversions)
+                .where(AdResultDaily.campaign_id.in_(ids[start:start + ID_CHUNK]), AdResultDaily.bucket >= since)
+            ).all()
+            current.update(((campaign_id, day), (cost, conversions)) for campaign_id, day, cost, conversions in rows)
+    new = np.array([current.get(key, (0.0, 0.0)) for key in keys], dtype=np.float64).reshape(-1, 2)
+    delta = np.array([(cost or 0.0, conversions or 0) for _, _, cost, conversions in deltas], dtype=np.float64).reshape(-1, 2)
+    campaign_ids = np.array([campaign_id for campaign_id, _ in keys], dtype=np.int64)
+    return campaign_ids, new, new - delta
+
+def _load_params(session: Session, campaign_ids: list) -> Dict[int, ForecastParams]:
+    params = {}
+    for start in range(0, len(campaign_ids), ID_CHUNK):
+        chunk = campaign_ids[start:start + ID_CHUNK]
+        params.update((p.campaign_id, p) for p in session.exec(select(ForecastParams).where(ForecastParams.campaign_id.in_(chunk))))
+    return params
+
+def refresh_forecast_params(session: Session) -> dict:
+    """增量刷新预测参数：先刷新汇总表，再把新到达的效果数据折算进各活动的统计量"""
+    refresh_rollups(session)
+    # 同时锁定天级汇总水位：折算期间天级汇总表不能前进，否则读到的新值会包含high_id之后的数据
+    marks = lock_watermarks(session, ["daily", WATERMARK])
+    high_id = marks["daily"].last_result_id
+    mark = marks[WATERMARK]
+    low_id = mark.last_result_id
+    if high_id <= low_id:
+        session.commit()
+        return {"campaigns": 0, "days": 0}
+
+    campaign_ids, new, old = _daily_changes(session, low_id, high_id)
+    unique_ids, inverse = np.unique(campaign_ids, return_inverse=True)
+    contrib = _contributions(new[:, 0], new[:, 1]) - _contributions(old[:, 0], old[:, 1])
+    deltas = np.vstack([np.bincount(inverse, weights=row, minlength=len(unique_ids)) for row in contrib])
+
+    ids = unique_ids.tolist()
+    existing = _load_params(session, ids)
+    stats = np.array([[getattr(existing[i], f) if i in existing else 0.0 for f in STAT_FIELDS] for i in ids]).T.reshape(7, -1)
+    stats = stats + deltas
+    intercept, slope = fit(stats)
+    now = datetime.utcnow()
+    rows = [
+        {
+            "campaign_id": campaign_id,
+            **{f: float(stats[k, j]) for k, f in enumerate(STAT_FIELDS)},
+            "days": int(round(stats[0, j])),
+            "intercept": float(intercept[j]),
+            "slope": float(slope[j]),
+            "updated_at": now,
+        }
+        for j, campaign_id in enumerate(ids)
+    ]
+    updates = [row for row in rows if row["campaign_id"] in existing]
+    inserts = [row for row in rows if row["campaign_id"] not in existing]
+    # 已加载的对象不再使用，避免批量UPDATE后与会话中的旧状态不一致
+    for params in existing.values():
+        session.expunge(params)
+    if updates:
+        session.execute(update(ForecastParams), updates)
+    if inserts:
+        session.execute(insert(ForecastParams), inserts)
+    mark.last_result_id = high_id
+    mark.refreshed_at = now
+    session.add(mark)
+    session.commit()
+    return {"campaigns": len(ids), "days": len(campaign_ids)}
+
+def project(budget: np.ndarray, stats: np.ndarray, intercept: np.ndarray, slope: np.ndarray,
+            change: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    向量化模拟：change为预算调整百分比（30表示提高30%，-100表示暂停），
+    返回当前与调整后的日花费、日转化（没有历史花费的活动为NaN）
+    """
+    days, sum_spend = stats[0], stats[1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_spend = np.where(days > 0, sum_spend / days, 0.0)
+        utilization = np.where(budget > 0, np.clip(avg_spend / budget, 0.0, 1.0), 1.0)
+    new_budget = np.maximum(budget * (1 + change / 100), 0.0)
+    current_spend = np.where(budget > 0, np.minimum(avg_spend, budget), avg_spend)
+    projected_spend = np.minimum(new_budget, current_spend + np.maximum(new_budget - budget, 0.0) * utilization)
+
+    def _conversions(spend):
+        fitted = np.where(spend > 0, np.maximum(np.expm1(intercept + slope * np.log1p(spend)), 0.0), 0.0)
+        return np.where(days > 0, fitted, np.nan)
+
+    return {
+        "new_budget": new_budget,
+        "utilization": utilization,
+        "current_spend": current_spend,
+        "current_conversions": _conversions(current_spend),
+        "projected_spend": projected_spend,
+        "projected_conversions": _conversions(projected_spend),
+    }
+
+def _number(value: float, digits: int = 2) -> Optional[float]:
+    return round(float(value), digits) if np.isfinite(value) else None
+
+def _cpa(spend: float, conversions: float) -> Optional[float]:
+    return _number(spend / conversions) if conversions > 0 else None
+
+def simulate(session: Session, items: List[Tuple[int, float]], horizon: int = DEFAULT_HORIZON,
+             curves: bool = True) -> dict:
+    """
+    批量模拟一组(活动ID, 预算调整百分比)，同一活动可出现多次（如针对同一活动的多条建议）。
+    返回与items顺序一致的预测结果（活动不存在时为None）及组合合计。
+    只读取已有的预测参数，参数由效果数据导入与后台定时刷新（rollups.rollup_refresher）维护。
+    """
+    ids = sorted({campaign_id for campaign_id, _ in items})
+    budgets = {}
+    for start in range(0, len(ids), ID_CHUNK):
+        rows = session.exec(select(AdCampaign.id, AdCampaign.budget).where(AdCampaign.id.in_(ids[start:start + ID_CHUNK]))).all()
+        budgets.update(rows)
+    found = [(i, campaign_id, change) for i, (campaign_id, change) in enumerate(items) if campaign_id in budgets]
+
+    # 只读取参数列，不构造ORM对象；没有历史数据的活动统计量全为0
+    columns = [getattr(ForecastParams, f) for f in STAT_FIELDS] + [ForecastParams.intercept, ForecastParams.slope]
+    params = {}
+    loaded = list(budgets)
+    for start in range(0, len(loaded), ID_CHUNK):
+        rows = session.exec(
+            select(ForecastParams.campaign_id, *columns).where(ForecastParams.campaign_id.in_(loaded[start:start + ID_CHUNK]))
+        ).all()
+        params.update((row[0], tuple(row[1:])) for row in rows)
+    empty = (0.0,) * len(STAT_FIELDS) + (0.0, 1.0)
+    data = np.array([params.get(campaign_id, empty) for _, campaign_id, _ in found], dtype=np.float64).reshape(-1, len(empty))
+    budget = np.array([budgets[campaign_id] for _, campaign_id, _ in found], dtype=np.float64)
+    stats = data[:, :len(STAT_FIELDS)].T
+    intercept, slope = data[:, -2], data[:, -1]
+    change = np.array([change for _, _, change in found], dtype=np.float64)
+    result = project(budget, stats, intercept, slope, change)
+
+    forecasts: List[Optional[dict]] = [None] * len(items)
+    steps = np.arange(1, horizon + 1)
+    for j, (i, campaign_id, pct) in enumerate(found):
+        current = (result["current_spend"][j], result["current_conversions"][j])
+        projected = (result["projected_spend"][j], result["projected_conversions"][j])
+        forecast = {
+            "campaign_id": campaign_id,
+            "budget": float(budget[j]),
+            "budget_change": float(pct),
+            "new_budget": _number(result["new_budget"][j]),
+            "history_days": int(stats[0, j]),
+            "utilization": _number(result["utilization"][j], 3),
+            "slope": _number(slope[j], 3),
+            "current": {"daily_spend": _number(current[0]), "daily_conversions": _number(current[1]), "cpa": _cpa(*current)},
+            "projected": {"daily_spend": _number(projected[0]), "daily_conversions": _number(projected[1]), "cpa": _cpa(*projected)},
+        }
+        if curves:
+            forecast["spend_curve"] = np.round(projected[0] * steps, 2).tolist()
+            forecast["conversion_curve"] = np.round(projected[1] * steps, 2).tolist() if np.isfinite(projected[1]) else None
+        forecasts[i] = forecast
+
+    known = np.isfinite(result["projected_conversions"])
+    portfolio = {
+        "campaigns": len(budgets),
+        "horizon_days": horizon,
+        "current_spend": _number(result["current_spend"].sum() * horizon),
+        "projected_spend": _number(result["projected_spend"].sum() * horizon),
+        "current_conversions": _number(result["current_conversions"][known].sum() * horizon),
+        "projected_conversions": _number(result["projected_conversions"][known].sum() * horizon),
+        "without_history": int((~known).sum()),
+    }
+    return {"forecasts": forecasts, "portfolio": portfolio}
+
+# 从建议文本中识别预算调整幅度，如“预算提高30%”、"budget_increase": "30%"
+_CHANGE_PATTERNS = [
+    (re.compile(r"预算(?:提高|增加|上调|提升)\s*(\d+(?:\.\d+)?)\s*%"), 1),
+    (re.compile(r"预算(?:降低|减少|下调|削减)\s*(\d+(?:\.\d+)?)\s*%"), -1),
+    (re.compile(r"budget_increase\W{0,4}(\d+(?:\.\d+)?)\s*%"), 1),
+    (re.compile(r"budget_decrease\W{0,4}(\d+(?:\.\d+)?)\s*%"), -1),
+    (re.compile(r"(?:raise|increase)\s+(?:the\s+)?budget\s+(?:by\s+)?(\d+(?:\.\d+)?)\s*%", re.I), 1),
+    (re.compile(r"(?:cut|decrease|reduce|lower)\s+(?:the\s+)?budget\s+(?:by\s+)?(\d+(?:\.\d+)?)\s*%", re.I), -1),
+]
+
+def advice_budget_change(session: Session, advice: AIAdvice) -> Optional[float]:
+    """建议对应的预算调整百分比：规则生成的建议取命中记录中的动作，其余从建议文本中识别"""
+    trigger = session.exec(select(RuleTrigger).where(RuleTrigger.advice_id == advice.id)).first()
+    if trigger is not None:
+        if trigger.action == "pause":
+            return -100.0
+        return trigger.action_value if trigger.action == "budget_increase" else -trigger.action_value
+    for pattern, sign in _CHANGE_PATTERNS:
+        match = pattern.search(advice.content or "")
+        if match:
+            return sign * float(match.group(1))
+    return None
+
+def forecast_advices(session: Session, advices: List[AIAdvice], horizon: int = DEFAULT_HORIZON,
+                     budget_change: Optional[float] = None, curves: bool = True) -> dict:
+    """为一组建议批量生成预测；不涉及预算调整或没有关联活动的建议放在skipped中"""
+    items, targets, skipped = [], [], []
+    for advice in advices:
+        change = budget_change if budget_change is not None else advice_budget_change(session, advice)
+        if advice.campaign_id is None or change is None:
+            skipped.append(advice.id)
+            continue
+        items.append((advice.campaign_id, change))
+        targets.append(advice.id)
+    result = simulate(session, items, horizon, curves)
+    forecasts = []
+    for advice_id, forecast in zip(targets, result["forecasts"]):
+        if forecast is None:
+            skipped.append(advice_id)
+        else:
+            forecasts.append({"advice_id": advice_id, **forecast})
+    return {"forecasts": forecasts, "portfolio": result["portfolio"], "skipped": skipped}
@@ -0,0 +1,397 @@
+"""
+运行时指标：进程内Prometheus指标注册表、按路由统计的ASGI中间件、SQL执行耗时钩子（每请求查询数与N+1检测）、
+大模型与行业新闻抓取指标，以及慢请求采样剖析（输出折叠栈，可直接生成火焰图）。
+所有指标通过 GET /metrics 以Prometheus文本格式暴露
+"""
+
+import bisect
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter as _Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+load_dotenv()
+
+logger = logging.getLogger("instrumentation")
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# 单个请求内同一条SQL执行达到该次数时视为疑似N+1查询
+N_PLUS_ONE_THRESHOLD = int(os.getenv("METRICS_N_PLUS_ONE_THRESHOLD", "10"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield from self._render_sample(key, value)
+
+    def _render_sample(self, key: Tuple, value) -> Iterable[str]:
+        yield f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        """各桶只记落入本区间的次数，输出时再累加成Prometheus要求的累计计数"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _render_sample(self, key: Tuple, state) -> Iterable[str]:
+        counts, total, count = state
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            le = 'le="%s"' % _format_value(bound)
+            yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+        yield f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}"
+        yield f"{self.name}_count{_labels(self.labelnames, key)} {count}"
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标{metric.name}已注册")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for metric in self._metrics.values():
+            metric.clear()
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter("http_requests_total", "HTTP请求数", ("method", "route", "status"))
+HTTP_LATENCY = registry.histogram("http_request_duration_seconds", "HTTP请求耗时（流式响应计到最后一个数据块发送完）", ("method", "route"))
+HTTP_IN_PROGRESS = registry.gauge("http_requests_in_progress", "正在处理的HTTP请求数")
+REQUEST_QUERIES = registry.histogram("http_request_db_queries", "单个请求执行的SQL条数", ("route",), COUNT_BUCKETS)
+REQUEST_DB_TIME = registry.histogram("http_request_db_duration_seconds", "单个请求内SQL执行总耗时", ("route",))
+N_PLUS_ONE = registry.counter("db_n_plus_one_total", "同一SQL在单个请求内重复执行达到阈值的次数（疑似N+1查询）", ("route",))
+DB_QUERY_LATENCY = registry.histogram("db_query_duration_seconds", "SQL执行耗时（含后台任务）", ("operation",), QUERY_BUCKETS)
+DB_QUERY_ERRORS = registry.counter("db_query_errors_total", "SQL执行出错次数", ("operation",))
+LLM_REQUESTS = registry.counter("llm_requests_total", "大模型调用次数（outcome: success/cached/error）", ("provider", "purpose", "outcome"))
+LLM_LATENCY = registry.histogram("llm_request_duration_seconds", "大模型调用总耗时（含重试与缓存读取）", ("provider", "streamed"))
+LLM_TTFT = registry.histogram("llm_time_to_first_token_seconds", "流式调用的首字耗时", ("provider",))
+LLM_TOKENS = registry.counter("llm_tokens_total", "大模型token用量（服务商未返回时为本地估算值）", ("provider", "kind"))
+NEWS_FETCH_LATENCY = registry.histogram("news_fetch_duration_seconds", "单个行业新闻信息源的抓取耗时", ("source",))
+NEWS_FETCHES = registry.counter("news_fetch_total", "行业新闻信息源抓取次数（outcome: success/error）", ("source", "outcome"))
+NEWS_INSERTED = registry.counter("news_items_inserted_total", "新入库的行业新闻条数", ("source",))
+PROFILES_DUMPED = registry.counter("profiles_dumped_total", "慢请求剖析文件输出次数", ("route",))
+
+def observe_llm(provider: str, purpose: Optional[str], outcome: str, seconds: float = None, streamed: bool = False,
+                ttft: float = None, prompt_tokens: int = 0, completion_tokens: int = 0):
+    LLM_REQUESTS.inc(provider=provider, purpose=purpose or "general", outcome=outcome)
+    if seconds is not None:
+        LLM_LATENCY.observe(seconds, provider=provider, streamed=str(streamed).lower())
+    if ttft is not None:
+        LLM_TTFT.observe(ttft, provider=provider)
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, provider=provider, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, provider=provider, kind="completion")
+
+class RequestStats:
+    """单个请求内的SQL执行统计；同步路由在线程池中执行时通过contextvars共享同一对象"""
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = _Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.queries += 1
+        self.db_seconds += seconds
+        self.statements[statement] += 1
+
+    def repeated(self) -> Tuple[Optional[str], int]:
+        """执行次数最多的SQL及其次数"""
+        if not self.statements:
+            return None, 0
+        return self.statements.most_common(1)[0]
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip()[:6].upper()
+    return word if word in _OPERATIONS else "OTHER"
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    DB_QUERY_LATENCY.observe(elapsed, operation=_operation(statement))
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+def _handle_error(context):
+    stack = context.connection.info.get("query_started") if context.connection is not None else None
+    if stack:
+        stack.pop()
+    DB_QUERY_ERRORS.inc(operation=_operation(context.statement or ""))
+
+_sql_hooks_installed = False
+
+def instrument_sqlalchemy():
+    """在Engine类上注册钩子，同步/异步引擎（含后续新建的引擎）统一计时；重复调用无副作用"""
+    global _sql_hooks_installed
+    if _sql_hooks_installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _sql_hooks_installed = True
+
+class SlowRequestProfiler:
+    """
+    采样式剖析：被抽中的请求处理期间由后台线程每隔interval秒采集一次全部线程的调用栈，
+    请求耗时超过threshold_ms时把采样结果写成折叠栈文件（flamegraph.pl / speedscope 可直接打开）。
+    采样针对整个进程，并发请求的栈会同时出现，适合在低并发时定位慢请求
+    """
+
+    def __init__(self, threshold_ms: float, directory: str = "profiles", interval: float = 0.005, sample_rate: float = 1.0):
+        self.threshold_ms = threshold_ms
+        self.directory = directory
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self._collectors: Dict[int, _Counter] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["SlowRequestProfiler"]:
+        """PROFILE_SLOW_REQUEST_MS为0（默认）时不启用"""
+        threshold = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "0"))
+        if threshold <= 0:
+            return None
+        return cls(
+            threshold_ms=threshold,
+            directory=os.getenv("PROFILE_DIR", "profiles"),
+            interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "1.0")),
+        )
+
+    def begin(self) -> Optional[_Counter]:
+        if random.random() >= self.sample_rate:
+            return None
+        samples = _Counter()
+        with self._lock:
+            self._collectors[id(samples)] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+        return samples
+
+    def end(self, samples: _Counter, method: str, route: str, elapsed_ms: float) -> Optional[str]:
+        with self._lock:
+            self._collectors.pop(id(samples), None)
+        if elapsed_ms < self.threshold_ms or not samples:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{method}_{route}").strip("_")
+        path = os.path.join(self.directory, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}_{name}_{elapsed_ms:.0f}ms.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        PROFILES_DUMPED.inc(route=route)
+        logger.warning("慢请求 %s %s 耗时%.0fms，剖析结果已写入%s", method, route, elapsed_ms, path)
+        return path
+
+    @staticmethod
+    def _fold(frame, thread_name: str) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        names.append(thread_name)
+        return ";".join(reversed(names))
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                collectors = list(self._collectors.values())
+                if not collectors:
+                    self._thread = None
+                    return
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [
+                self._fold(frame, names.get(ident, str(ident)))
+                for ident, frame in sys._current_frames().items()
+                if ident != me
+            ]
+            for samples in collectors:
+                samples.update(stacks)
+            time.sleep(self.interval)
+
+def _route_name(scope) -> str:
+    """用路由模板而不是实际路径作为标签，避免活动ID等路径参数造成标签数量膨胀"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__name__", None) or "<unmatched>"
+
+class MetricsMiddleware:
+    """
+    纯ASGI中间件（不缓冲响应体，SSE/流式导出不受影响）：按路由模板统计请求数、耗时、SQL条数与耗时，
+    检测N+1查询，并在启用时对慢请求采样剖析
+    """
+
+    def __init__(self, app, profiler: Optional[SlowRequestProfiler] = None, n_plus_one_threshold: int = None):
+        self.app = app
+        self.profiler = profiler if profiler is not None else SlowRequestProfiler.from_env()
+        self.n_plus_one_threshold = n_plus_one_threshold or N_PLUS_ONE_THRESHOLD
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        samples = self.profiler.begin() if self.profiler is not None else None
+        HTTP_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec()
+            _request_stats.reset(token)
+            method, route = scope["method"], _route_name(scope)
+            HTTP_REQUESTS.inc(method=method, route=route, status=status)
+            HTTP_LATENCY.observe(elapsed, method=method, route=route)
+            REQUEST_QUERIES.observe(stats.queries, route=route)
+            REQUEST_DB_TIME.observe(stats.db_seconds, route=route)
+            statement, repeats = stats.repeated()
+            if repeats >= self.n_plus_one_threshold:
+                N_PLUS_ONE.inc(route=route)
+                logger.warning("%s %s 中同一SQL执行了%d次，疑似N+1查询: %s", method, route, repeats, " ".join(statement.split())[:200])
+            if samples is not None:
+                self.profiler.end(samples, method, route, elapsed * 1000)
@@ -0,0 +1,282 @@
+"""
+基于数据库的持久化任务队列：固定数量的worker并发执行，支持幂等键、失败重试与取消
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from models import Job
+
+logger = logging.getLogger("job_queue")
+
+TERMINAL_STATUSES = {"succeeded", "failed", "cancelled"}
+
+class JobCancelled(Exception):
+    """任务在执行过程中被取消"""
+
+class JobContext:
+    """传给任务处理函数的上下文，处理函数可在步骤之间调用check_cancelled实现协作式取消"""
+    def __init__(self, queue: "JobQueue", job_id: int, attempt: int):
+        self.queue = queue
+        self.job_id = job_id
+        self.attempt = attempt
+
+    def cancelled(self) -> bool:
+        with Session(self.queue.engine) as session:
+            job = session.get(Job, self.job_id)
+            return bool(job and job.cancel_requested)
+
+    def check_cancelled(self):
+        if self.cancelled():
+            raise JobCancelled("任务已取消")
+
+class JobQueue:
+    def __init__(self, engine=None, workers: int = 2, poll_interval: float = 0.5, retry_backoff: float = 2.0, lock_timeout: float = 600):
+        """
+        workers: 同时执行的任务数上限
+        retry_backoff: 失败重试的退避基数（秒），按2^attempt指数增长并加抖动
+        lock_timeout: running状态的任务超过该时长（秒）未续期视为worker已退出，重新入队；
+                      worker每lock_timeout/2为本进程执行中的任务续期并回收其他worker遗留的任务
+        """
+        self._engine = engine
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.lock_timeout = lock_timeout
+        self.handlers: Dict[str, Callable] = {}
+        self.worker_id = uuid.uuid4().hex[:8]
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop = None
+        self._running = set()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from db import engine
+            self._engine = engine
+        return self._engine
+
+    def register(self, kind: str):
+        """注册任务处理函数：handler(payload: dict, session, ctx: JobContext) -> dict"""
+        def decorator(func):
+            self.handlers[kind] = func
+            return func
+        return decorator
+
+    def enqueue(self, kind: str, payload: dict, idempotency_key: Optional[str] = None, max_attempts: int = 3) -> Job:
+        """入队；带幂等键时，相同键的任务只会创建一次并直接返回已有任务"""
+        if kind not in self.handlers:
+            raise ValueError(f"未注册的任务类型: {kind}")
+        with Session(self.engine) as session:
+            if idempotency_key:
+                existing = session.exec(select(Job).where(Job.idempotency_key == idempotency_key)).first()
+                if existing:
+                    return existing
+            job = Job(kind=kind, payload=json.dumps(payload), idempotency_key=idempotency_key, max_attempts=max_attempts)
+            session.add(job)
+            try:
+                session.commit()
+            except IntegrityError:
+                session.rollback()
+                return session.exec(select(Job).where(Job.idempotency_key == idempotency_key)).one()
+            session.refresh(job)
+        self._notify()
+        return job
+
+    def _notify(self):
+        """唤醒空闲worker（enqueue可能在线程池中被调用，需线程安全地投递到事件循环）"""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with Session(self.engine) as session:
+            return session.get(Job, job_id)
+
+    def cancel(self, job_id: int) -> Optional[Job]:
+        """排队中的任务直接取消；运行中的任务标记取消请求，由处理函数在步骤间检查"""
+        with Session(self.engine) as session:
+            job = session.get(Job, job_id)
+            if job is None or job.status in TERMINAL_STATUSES:
+                return job
+            job.cancel_requested = True
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+            return job
+
+    def _claim(self) -> Optional[Job]:
+        """原子地认领一个可执行任务（条件更新，多个worker/进程不会重复认领）"""
+        now = datetime.utcnow()
+        with Session(self.engine) as session:
+            candidates = session.exec(
+                select(Job.id)
+                .where(Job.status == "queued", Job.run_after <= now)
+                .order_by(Job.run_after, Job.id)
+                .limit(self.workers)
+            ).all()
+            for job_id in candidates:
+                claimed = session.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "queued")
+                    .values(status="running", locked_by=self.worker_id, locked_at=now, started_at=now, attempts=Job.attempts + 1)
+                ).rowcount
+                session.commit()
+                if claimed:
+                    return session.get(Job, job_id)
+        return None
+
+    def _finish(self, job_id: int, status: str, result: Optional[dict] = None, error: Optional[str] = None, retry_at: Optional[datetime] = None):
+        with Session(self.engine) as session:
+            job = session.get(Job, job_id)
+            job.locked_by = None
+            job.locked_at = None
+            job.error = error
+            if retry_at is not None:
+                job.status = "queued"
+                job.run_after = retry_at
+            else:
+                job.status = status
+                job.result = json.dumps(result, ensure_ascii=False) if result is not None else None
+                job.finished_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+
+    def run_one(self) -> bool:
+        """认领并同步执行一个任务，没有可执行任务时返回False"""
+        job = self._claim()
+        if job is None:
+            return False
+        handler = self.handlers.get(job.kind)
+        ctx = JobContext(self, job.id, job.attempts)
+        self._running.add(job.id)
+        try:
+            if handler is None:
+                raise ValueError(f"未注册的任务类型: {job.kind}")
+            ctx.check_cancelled()
+            with Session(self.engine) as session:
+                result = handler(json.loads(job.payload), session, ctx)
+            self._finish(job.id, "succeeded", result=result)
+        except JobCancelled:
+            self._finish(job.id, "cancelled", error="任务已取消")
+        except Exception as e:
+            logger.exception("任务%s执行失败（第%d次）", job.id, job.attempts)
+            if job.attempts < job.max_attempts and not ctx.cancelled():
+                delay = random.uniform(0.5, 1.0) * self.retry_backoff * (2 ** (job.attempts - 1))
+                self._finish(job.id, "queued", error=str(e), retry_at=datetime.utcnow() + timedelta(seconds=delay))
+            else:
+                self._finish(job.id, "failed", error=str(e))
+        finally:
+            self._running.discard(job.id)
+        return True
+
+    def heartbeat(self) -> int:
+        """为本进程正在执行的任务续期锁，避免执行时间超过lock_timeout的任务被当作遗留任务回收"""
+        running = list(self._running)
+        if not running:
+            return 0
+        with Session(self.engine) as session:
+            count = session.execute(
+                update(Job)
+                .where(Job.id.in_(running), Job.status == "running", Job.locked_by == self.worker_id)
+                .values(locked_at=datetime.utcnow())
+            ).rowcount
+            session.commit()
+        return count
+
+    def recover_stale(self) -> int:
+        """回收锁超时的running任务（worker进程异常退出后恢复）：还有重试次数的重新入队，否则记为失败"""
+        now = datetime.utcnow()
+        stale = (Job.status == "running", Job.locked_at < now - timedelta(seconds=self.lock_timeout))
+        with Session(self.engine) as session:
+            requeued = session.execute(
+                update(Job)
+                .where(*stale, Job.attempts < Job.max_attempts)
+                .values(status="queued", locked_by=None, locked_at=None, run_after=now)
+            ).rowcount
+            failed = session.execute(
+                update(Job)
+                .where(*stale, Job.attempts >= Job.max_attempts)
+                .values(status="failed", locked_by=None, locked_at=None, finished_at=now,
+                        error="执行任务的worker已退出，且已达到最大重试次数")
+            ).rowcount
+            session.commit()
+        if requeued or failed:
+            logger.warning("回收锁超时的任务：重新入队%d个，失败%d个", requeued, failed)
+        return requeued + failed
+
+    def maintain(self):
+        self.heartbeat()
+        self.recover_stale()
+
+    async def _maintainer(self):
+        """与worker并行运行：worker全部在执行长任务时也能按时续期"""
+        while True:
+            await asyncio.sleep(self.lock_timeout / 2)
+            try:
+                await asyncio.to_thread(self.maintain)
+            except Exception:
+                logger.exception("任务队列续期/回收失败")
+
+    async def _worker(self):
+        while True:
+            try:
+                ran = await asyncio.to_thread(self.run_one)
+            except Exception:
+                logger.exception("任务队列worker异常")
+                ran = False
+            if not ran:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self):
+        """在当前事件循环中启动worker池"""
+        if self._tasks:
+            return
+        self.recover_stale()
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._tasks = [self._loop.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(self._loop.create_task(self._maintainer()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+        self._loop = None
+
+def job_to_dict(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "payload": json.loads(job.payload or "{}"),
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "cancel_requested": job.cancel_requested,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+job_queue = JobQueue(workers=int(os.getenv("JOB_WORKERS", "2")), lock_timeout=float(os.getenv("JOB_LOCK_TIMEOUT", "600")))
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlmodel import select
+from models import Job
+from db import get_session
+from job_queue import job_queue, job_to_dict
+from sqlmodel import Session
+from typing import Optional
+
+router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+@router.get("/")
+def list_jobs(
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    session: Session = Depends(get_session)
+):
+    query = select(Job)
+    if status:
+        query = query.where(Job.status == status)
+    if kind:
+        query = query.where(Job.kind == kind)
+    jobs = session.exec(query.order_by(Job.id.desc()).limit(limit)).all()
+    return [job_to_dict(job) for job in jobs]
+
+@router.get("/{job_id}")
+def get_job(job_id: int):
+    """查询任务状态与结果"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job_to_dict(job)
+
+@router.post("/{job_id}/cancel")
+def cancel_job(job_id: int):
+    """取消任务：排队中的任务立即取消，运行中的任务在下一个步骤前中止"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job_to_dict(job)
@@ -0,0 +1,155 @@
+"""
+大模型响应缓存：按(服务商, 模型, prompt, max_tokens)的哈希寻址，进程内LRU + 数据库持久层两级
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func
+from sqlmodel import Session, select
+
+from models import LLMCacheEntry
+
+def cache_key(provider: str, model: str, prompt: str, max_tokens: int) -> str:
+    raw = json.dumps([provider, model, prompt, max_tokens], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    def __init__(self, engine=None, ttl: float = 3600, memory_size: int = 256, max_entries: int = 10000, prune_every: int = 100):
+        """
+        ttl: 缓存有效期（秒），两级共用
+        memory_size: 进程内LRU容量
+        max_entries: 持久层最大条数，超出后按最近使用时间淘汰
+        """
+        self.engine = engine
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stores_since_prune = 0
+        self.stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0, "memory_evictions": 0, "persistent_evictions": 0, "expired": 0}
+
+    @classmethod
+    def from_env(cls, engine=None) -> "LLMResponseCache":
+        if engine is None:
+            from db import engine
+        return cls(
+            engine=engine,
+            ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+            memory_size=int(os.getenv("LLM_CACHE_MEMORY_SIZE", "256")),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000")),
+        )
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            response, expires = item
+            if expires <= time.time():
+                del self._memory[key]
+                self.stats["expired"] += 1
+                return None
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return response
+
+    def _memory_set(self, key: str, response: str, expires: float):
+        with self._lock:
+            self._memory[key] = (response, expires)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+                self.stats["memory_evictions"] += 1
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """先查进程内LRU，再查持久层；持久层命中后回填LRU"""
+        response = self._memory_get(key)
+        if response is not None:
+            return response
+        if self.engine is not None:
+            now = datetime.utcnow()
+            with Session(self.engine) as session:
+                entry = session.get(LLMCacheEntry, key)
+                if entry is not None and entry.expires_at > now:
+                    entry.hits += 1
+                    entry.last_used_at = now
+                    session.add(entry)
+                    session.commit()
+                    self._count("persistent_hits")
+                    remaining = (entry.expires_at - now).total_seconds()
+                    self._memory_set(key, entry.response, time.time() + remaining)
+                    return entry.response
+                if entry is not None:
+                    session.delete(entry)
+                    session.commit()
+                    self._count("expired")
+        return None
+
+    def get(self, *keys: str) -> Optional[str]:
+        """按顺序查找多个候选键，返回第一个命中的响应；全部未命中只记一次miss"""
+        for key in keys:
+            response = self._lookup(key)
+            if response is not None:
+                return response
+        self._count("misses")
+        return None
+
+    def set(self, key: str, provider: str, model: str, response: str):
+        self._memory_set(key, response, time.time() + self.ttl)
+        self._count("stores")
+        if self.engine is None:
+            return
+        now = datetime.utcnow()
+        with Session(self.engine) as session:
+            entry = session.get(LLMCacheEntry, key) or LLMCacheEntry(key=key, provider=provider, model=model, response=response, expires_at=now)
+            entry.response = response
+            entry.created_at = now
+            entry.last_used_at = now
+            entry.expires_at = now + timedelta(seconds=self.ttl)
+            session.add(entry)
+            session.commit()
+        with self._lock:
+            self._stores_since_prune += 1
+            should_prune = self._stores_since_prune >= self.prune_every
+            if should_prune:
+                self._stores_since_prune = 0
+        if should_prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """删除过期条目，并按最近使用时间淘汰超出容量的条目"""
+        if self.engine is None:
+            return 0
+        with Session(self.engine) as session:
+            expired = session.execute(delete(LLMCacheEntry).where(LLMCacheEntry.expires_at <= datetime.utcnow())).rowcount
+            total = session.exec(select(func.count(LLMCacheEntry.key))).one()
+            evicted = 0
+            if total > self.max_entries:
+                oldest = select(LLMCacheEntry.key).order_by(LLMCacheEntry.last_used_at.asc()).limit(total - self.max_entries)
+                evicted = session.execute(delete(LLMCacheEntry).where(LLMCacheEntry.key.in_(oldest))).rowcount
+            session.commit()
+        self._count("expired", expired)
+        self._count("persistent_evictions", evicted)
+        return expired + evicted
+
+    def snapshot(self) -> dict:
+        """命中/未命中/淘汰计数与当前容量"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["persistent_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["persistent_hits"]) / lookups if lookups else 0.0
+        return stats
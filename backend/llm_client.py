@@ -0,0 +1,395 @@
+"""
+异步大模型客户端：共享连接池、并发上限、抖动退避重试、OpenAI→DeepSeek自动切换、响应缓存、token用量记录、流式生成
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from instrumentation import observe_llm
+from llm_cache import LLMResponseCache, cache_key
+from llm_usage import LLMUsageRecorder
+from prompt_builder import estimate_tokens
+
+load_dotenv()
+
+logger = logging.getLogger("llm_client")
+
+# 可重试的HTTP状态码：限流与服务端错误
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class LLMError(Exception):
+    """所有服务商均调用失败"""
+
+@dataclass
+class LLMProvider:
+    name: str
+    base_url: str
+    model: str
+    api_key: str
+
+def providers_from_env() -> List[LLMProvider]:
+    """按优先级读取已配置API KEY的服务商（OpenAI优先，DeepSeek兜底）"""
+    providers = []
+    if os.getenv("OPENAI_API_KEY"):
+        providers.append(LLMProvider(
+            name="openai",
+            base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+            model=os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"),
+            api_key=os.getenv("OPENAI_API_KEY"),
+        ))
+    if os.getenv("DEEPSEEK_API_KEY"):
+        providers.append(LLMProvider(
+            name="deepseek",
+            base_url=os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1"),
+            model=os.getenv("DEEPSEEK_MODEL", "deepseek-chat"),
+            api_key=os.getenv("DEEPSEEK_API_KEY"),
+        ))
+    return providers
+
+class ConcurrencyLimiter:
+    """
+    跨事件循环共享的并发上限（asyncio.Semaphore只能在一个循环内使用）。
+    名额由线程锁保护，等待者在各自的事件循环上被唤醒；等待中被取消时已分到的名额会归还
+    """
+
+    def __init__(self, limit: int):
+        self._lock = threading.Lock()
+        self._free = limit
+        self._waiters = deque()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove((loop, waiter))
+                    granted = False
+                except ValueError:
+                    granted = True
+            if granted and waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                if loop.is_closed():
+                    continue
+                # 名额直接转交给等待者；唤醒前等待者已被取消时由_grant归还
+                loop.call_soon_threadsafe(self._grant, waiter)
+                return
+            self._free += 1
+
+    def _grant(self, waiter: asyncio.Future):
+        if waiter.done():
+            self.release()
+        else:
+            waiter.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+class AsyncLLMClient:
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        max_concurrency: int = 8,
+        max_retries: int = 2,
+        timeout: float = 30.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        cache: Optional[LLMResponseCache] = None,
+        usage: Optional[LLMUsageRecorder] = None,
+    ):
+        self.providers = providers
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.transport = transport
+        self.cache = cache
+        self.usage = usage
+        # httpx连接池绑定在创建它的事件循环上，每个循环一个；并发上限在所有循环间共享
+        self._clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._limiter = ConcurrencyLimiter(max_concurrency)
+        self._clients_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "AsyncLLMClient":
+        kwargs.setdefault("max_concurrency", int(os.getenv("LLM_MAX_CONCURRENCY", "8")))
+        kwargs.setdefault("max_retries", int(os.getenv("LLM_MAX_RETRIES", "2")))
+        kwargs.setdefault("timeout", float(os.getenv("LLM_TIMEOUT", "30")))
+        if "cache" not in kwargs and os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true":
+            kwargs["cache"] = LLMResponseCache.from_env()
+        if "usage" not in kwargs and os.getenv("LLM_USAGE_ENABLED", "true").lower() == "true":
+            kwargs["usage"] = LLMUsageRecorder()
+        return cls(providers_from_env(), **kwargs)
+
+    def _client(self) -> httpx.AsyncClient:
+        """当前事件循环的连接池，首次使用时创建；已关闭的循环留下的连接池一并丢弃"""
+        loop = asyncio.get_running_loop()
+        with self._clients_lock:
+            http = self._clients.get(loop)
+            if http is not None:
+                return http
+            for stale in [other for other in self._clients if other.is_closed()]:
+                logger.warning("事件循环已关闭但未调用aclose，丢弃其大模型连接池")
+                del self._clients[stale]
+            http = self._clients[loop] = httpx.AsyncClient(
+                timeout=self.timeout,
+                transport=self.transport,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                    keepalive_expiry=60,
+                ),
+            )
+            return http
+
+    def _backoff(self, attempt: int) -> float:
+        """指数退避 + 全抖动"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _post(self, provider: LLMProvider, payload: dict) -> dict:
+        http = self._client()
+        headers = {"Authorization": f"Bearer {provider.api_key}", "Content-Type": "application/json"}
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._limiter:
+                    resp = await http.post(f"{provider.base_url}/chat/completions", headers=headers, json=payload)
+                if resp.status_code in RETRYABLE_STATUS:
+                    last_error = httpx.HTTPStatusError(f"HTTP {resp.status_code}", request=resp.request, response=resp)
+                else:
+                    resp.raise_for_status()
+                    return resp.json()
+            except httpx.HTTPStatusError:
+                raise
+            except httpx.TransportError as e:
+                last_error = e
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt)
+                logger.warning("调用%s失败(%s)，%.2fs后第%d次重试", provider.name, last_error, delay, attempt + 1)
+                await asyncio.sleep(delay)
+        raise last_error
+
+    async def _post_stream(self, provider: LLMProvider, payload: dict) -> AsyncIterator[dict]:
+        """
+        流式调用，逐个产出SSE数据块。收到第一个数据块之前的失败按退避策略重试；
+        之后连接中断直接抛出（已输出的内容无法撤回）。整个流式过程占用一个并发名额，
+        生成器结束或被关闭（aclose，调用方须用contextlib.aclosing驱动）时在finally中归还
+        """
+        http = self._client()
+        headers = {"Authorization": f"Bearer {provider.api_key}", "Content-Type": "application/json"}
+        last_error = None
+        received = False
+        for attempt in range(self.max_retries + 1):
+            await self._limiter.acquire()
+            try:
+                async with http.stream("POST", f"{provider.base_url}/chat/completions", headers=headers, json=payload) as resp:
+                    if resp.status_code in RETRYABLE_STATUS:
+                        last_error = httpx.HTTPStatusError(f"HTTP {resp.status_code}", request=resp.request, response=resp)
+                    else:
+                        resp.raise_for_status()
+                        async for line in resp.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                return
+                            received = True
+                            yield json.loads(data)
+                        return
+            except httpx.HTTPStatusError:
+                raise
+            except httpx.TransportError as e:
+                if received:
+                    raise
+                last_error = e
+            finally:
+                self._limiter.release()
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt)
+                logger.warning("调用%s失败(%s)，%.2fs后第%d次重试", provider.name, last_error, delay, attempt + 1)
+                await asyncio.sleep(delay)
+        raise last_error
+
+    async def _record_usage(self, provider: LLMProvider, prompt: str, usage: Optional[dict], cached: bool,
+                            started: float, purpose: Optional[str], campaign_id: Optional[int],
+                            ttft_ms: Optional[float] = None, streamed: bool = False, completion: str = ""):
+        """
+        ttft_ms为首字耗时，未给出时（非流式、命中缓存）等于总耗时；服务商未返回completion用量时按回复文本估算。
+        同时更新/metrics中的调用次数、耗时与token指标
+        """
+        usage = usage or {}
+        estimated = estimate_tokens(prompt)
+        latency = (time.perf_counter() - started) * 1000
+        prompt_tokens = 0 if cached else int(usage.get("prompt_tokens") or estimated)
+        completion_tokens = int(usage.get("completion_tokens") or (0 if cached else estimate_tokens(completion)))
+        observe_llm(
+            provider.name, purpose, "cached" if cached else "success", latency / 1000, streamed,
+            ttft_ms / 1000 if streamed and ttft_ms is not None else None, prompt_tokens, completion_tokens,
+        )
+        if self.usage is None:
+            return
+        await asyncio.to_thread(
+            self.usage.record,
+            provider.name,
+            provider.model,
+            prompt_tokens,
+            completion_tokens,
+            estimated,
+            cached,
+            latency,
+            purpose,
+            campaign_id,
+            streamed,
+            latency if ttft_ms is None else ttft_ms,
+        )
+
+    async def complete(self, prompt: str, max_tokens: int = 512, use_cache: bool = True,
+                       purpose: Optional[str] = None, campaign_id: Optional[int] = None) -> str:
+        """
+        按优先级依次尝试各服务商，单个服务商内部按退避策略重试；use_cache=False时跳过缓存读取。
+        purpose/campaign_id随token用量一起记录，便于按用途、活动统计成本
+        """
+        if not self.providers:
+            raise LLMError("未配置AI API KEY")
+        started = time.perf_counter()
+        keys = [cache_key(p.name, p.model, prompt, max_tokens) for p in self.providers]
+        if self.cache is not None and use_cache:
+            # 任一服务商的缓存命中即可直接返回，避免主服务商故障时先重试再查备用缓存
+            response = await asyncio.to_thread(self.cache.get, *keys)
+            if response is not None:
+                await self._record_usage(self.providers[0], prompt, None, True, started, purpose, campaign_id)
+                return response
+        errors = []
+        for provider, key in zip(self.providers, keys):
+            payload = {
+                "model": provider.model,
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": max_tokens,
+            }
+            try:
+                data = await self._post(provider, payload)
+                content = data["choices"][0]["message"]["content"]
+            except Exception as e:
+                observe_llm(provider.name, purpose, "error")
+                logger.warning("服务商%s调用失败，切换下一个: %s", provider.name, e)
+                errors.append(f"{provider.name}: {e}")
+                continue
+            if self.cache is not None:
+                try:
+                    await asyncio.to_thread(self.cache.set, key, provider.name, provider.model, content)
+                except Exception:
+                    logger.exception("写入大模型响应缓存失败")
+            await self._record_usage(provider, prompt, data.get("usage"), False, started, purpose, campaign_id,
+                                     completion=content)
+            return content
+        raise LLMError("; ".join(errors))
+
+    async def stream(self, prompt: str, max_tokens: int = 512, use_cache: bool = True,
+                     purpose: Optional[str] = None, campaign_id: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        流式生成，逐段产出回复文本。命中缓存时一次性产出完整内容；服务商在输出第一段之前失败时切换下一个，
+        已输出部分内容后失败则抛出LLMError。完整结束后写入缓存并记录token用量与首字耗时
+        """
+        if not self.providers:
+            raise LLMError("未配置AI API KEY")
+        started = time.perf_counter()
+        keys = [cache_key(p.name, p.model, prompt, max_tokens) for p in self.providers]
+        if self.cache is not None and use_cache:
+            response = await asyncio.to_thread(self.cache.get, *keys)
+            if response is not None:
+                await self._record_usage(self.providers[0], prompt, None, True, started, purpose, campaign_id,
+                                         streamed=True)
+                yield response
+                return
+        errors = []
+        for provider, key in zip(self.providers, keys):
+            payload = {
+                "model": provider.model,
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": max_tokens,
+                "stream": True,
+                # 要求在最后一个数据块中返回token用量
+                "stream_options": {"include_usage": True},
+            }
+            parts, usage, ttft_ms = [], None, None
+            try:
+                # 调用方提前关闭本生成器时，aclosing立即关闭底层流并归还并发名额，不等垃圾回收
+                async with aclosing(self._post_stream(provider, payload)) as chunks:
+                    async for chunk in chunks:
+                        if chunk.get("usage"):
+                            usage = chunk["usage"]
+                        for choice in chunk.get("choices") or []:
+                            text = (choice.get("delta") or {}).get("content")
+                            if not text:
+                                continue
+                            if ttft_ms is None:
+                                ttft_ms = (time.perf_counter() - started) * 1000
+                            parts.append(text)
+                            yield text
+            except Exception as e:
+                observe_llm(provider.name, purpose, "error")
+                if parts:
+                    raise LLMError(f"{provider.name}: 输出中断: {e}") from e
+                logger.warning("服务商%s调用失败，切换下一个: %s", provider.name, e)
+                errors.append(f"{provider.name}: {e}")
+                continue
+            content = "".join(parts)
+            if self.cache is not None and content:
+                try:
+                    await asyncio.to_thread(self.cache.set, key, provider.name, provider.model, content)
+                except Exception:
+                    logger.exception("写入大模型响应缓存失败")
+            await self._record_usage(provider, prompt, usage, False, started, purpose, campaign_id,
+                                     ttft_ms=ttft_ms, streamed=True, completion=content)
+            return
+        raise LLMError("; ".join(errors))
+
+    async def aclose(self, current_only: bool = False):
+        """
+        关闭连接池：当前循环的直接关闭，其他仍在运行的循环上的提交到该循环关闭（服务停止时使用）。
+        current_only=True时只关闭当前循环的连接池，供在临时事件循环中运行的任务（如asyncio.run）结束前调用
+        """
+        current = asyncio.get_running_loop()
+        with self._clients_lock:
+            if current_only:
+                http = self._clients.pop(current, None)
+                clients = {current: http} if http is not None else {}
+            else:
+                clients, self._clients = self._clients, {}
+        for loop, http in clients.items():
+            if loop is current:
+                await http.aclose()
+            elif loop.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(http.aclose(), loop))
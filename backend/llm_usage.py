@@ -0,0 +1,96 @@
+"""
+大模型token用量记录：每次调用写入llmusage表（服务商未返回usage时用本地估算值），按用途/服务商汇总用于成本追踪
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, insert
+from sqlmodel import Session, select
+
+from models import LLMUsage
+
+logger = logging.getLogger("llm_usage")
+
+class LLMUsageRecorder:
+    def __init__(self, engine=None):
+        self._engine = engine
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from db import engine
+            self._engine = engine
+        return self._engine
+
+    def record(self, provider: str, model: str, prompt_tokens: int, completion_tokens: int,
+               estimated_prompt_tokens: int = 0, cached: bool = False, latency_ms: float = 0.0,
+               purpose: Optional[str] = None, campaign_id: Optional[int] = None,
+               streamed: bool = False, ttft_ms: Optional[float] = None):
+        """记录失败只写日志，不影响调用结果"""
+        try:
+            with Session(self.engine) as session:
+                session.execute(insert(LLMUsage), [{
+                    "provider": provider,
+                    "model": model,
+                    "purpose": purpose or "general",
+                    "campaign_id": campaign_id,
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "estimated_prompt_tokens": estimated_prompt_tokens,
+                    "cached": cached,
+                    "streamed": streamed,
+                    "latency_ms": latency_ms,
+                    "ttft_ms": ttft_ms,
+                    "created_at": datetime.utcnow(),
+                }])
+                session.commit()
+        except Exception:
+            logger.exception("记录大模型token用量失败")
+
+def usage_summary(session: Session, days: int = 7, campaign_id: Optional[int] = None) -> dict:
+    """近days天按服务商、模型、用途、是否流式分组的调用次数、token合计与平均耗时"""
+    since = datetime.utcnow() - timedelta(days=days)
+    query = (
+        select(
+            LLMUsage.provider,
+            LLMUsage.model,
+            LLMUsage.purpose,
+            LLMUsage.streamed,
+            func.count(LLMUsage.id),
+            func.sum(LLMUsage.cached),
+            func.sum(LLMUsage.prompt_tokens),
+            func.sum(LLMUsage.completion_tokens),
+            func.sum(LLMUsage.estimated_prompt_tokens),
+            func.avg(LLMUsage.latency_ms),
+            func.avg(LLMUsage.ttft_ms),
+        )
+        .where(LLMUsage.created_at >= since)
+        .group_by(LLMUsage.provider, LLMUsage.model, LLMUsage.purpose, LLMUsage.streamed)
+    )
+    if campaign_id is not None:
+        query = query.where(LLMUsage.campaign_id == campaign_id)
+    groups = [
+        {
+            "provider": provider,
+            "model": model,
+            "purpose": purpose,
+            "streamed": bool(streamed),
+            "calls": calls,
+            "cached_calls": int(cached or 0),
+            "prompt_tokens": int(prompt or 0),
+            "completion_tokens": int(completion or 0),
+            "estimated_prompt_tokens": int(estimated or 0),
+            "avg_latency_ms": round(latency or 0.0, 1),
+            "avg_ttft_ms": round(ttft, 1) if ttft is not None else None,
+        }
+        for provider, model, purpose, streamed, calls, cached, prompt, completion, estimated, latency, ttft in session.exec(query).all()
+    ]
+    return {
+        "days": days,
+        "calls": sum(g["calls"] for g in groups),
+        "prompt_tokens": sum(g["prompt_tokens"] for g in groups),
+        "completion_tokens": sum(g["completion_tokens"] for g in groups),
+        "groups": groups,
+    }
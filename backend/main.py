@@ -1,10 +1,18 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
+from instrumentation import CONTENT_TYPE, MetricsMiddleware, instrument_sqlalchemy, registry
 from startup import register_startup
 from campaigns import router as campaigns_router
 from dashboard import router as dashboard_router
 from agent import router as agent_router
 from ai import router as ai_router
+from results import router as results_router
+from jobs import router as jobs_router
+from export import router as export_router
+from rules import router as rules_router
+from search import router as search_router
+from pagination import NEXT_CURSOR_HEADER
 
 app = FastAPI(title="Adsgency AI Agent Backend", description="智能广告Agent后端API服务", version="0.1.0")
 
@@ -17,14 +25,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 游标分页的下一页游标在响应头中，跨域时须显式暴露给前端脚本
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# 按路由统计请求耗时与SQL执行情况（最外层，计入其他中间件的耗时）；SQL钩子对所有引擎生效
+app.add_middleware(MetricsMiddleware)
+instrument_sqlalchemy()
+
 app.include_router(campaigns_router)
 app.include_router(dashboard_router)
 app.include_router(agent_router)
 app.include_router(ai_router)
+app.include_router(results_router)
+app.include_router(jobs_router)
+app.include_router(export_router)
+app.include_router(rules_router)
+app.include_router(search_router)
 
 @app.get("/health", tags=["Health"])
 def health_check():
     """健康检查接口"""
-    return {"status": "ok"} 
\ No newline at end of file
+    return {"status": "ok"} 
+
+@app.get("/metrics", tags=["Health"])
+def prometheus_metrics():
+    """Prometheus文本格式的运行时指标（Content-Type直接写在响应头里，media_type会被重复追加charset）"""
+    return Response(registry.render(), headers={"Content-Type": CONTENT_TYPE})
@@ -0,0 +1,83 @@
+"""
+数据库迁移：按版本号顺序执行，已执行的版本记录在schemamigration表中，重复执行是幂等的
+"""
+
+import logging
+from datetime import datetime
+from sqlalchemy import inspect, text
+
+import search_index
+
+logger = logging.getLogger("migrations")
+
+def add_column(table: str, column: str, ddl: str):
+    """给已有表加列；新建的数据库由create_all建表时已包含该列，此时跳过"""
+    def _apply(conn):
+        if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return _apply
+
+# (版本号, 说明, DDL列表)；DDL为SQL语句或接收连接的函数；只能追加，不能修改已发布的版本
+MIGRATIONS = [
+    (1, "常用查询的组合索引", [
+        # campaigns.py: 列表按created_at倒序；dashboard按status分组/筛选
+        "CREATE INDEX IF NOT EXISTS ix_adcampaign_created_at ON adcampaign (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_adcampaign_status_created_at ON adcampaign (status, created_at)",
+        # agent.py: 决策链路与日志按活动筛选、按created_at排序
+        "CREATE INDEX IF NOT EXISTS ix_agentlog_campaign_id_created_at ON agentlog (campaign_id, created_at)",
+        # ai.py: 建议列表按活动/状态筛选、按created_at倒序
+        "CREATE INDEX IF NOT EXISTS ix_aiadvice_campaign_id_status_created_at ON aiadvice (campaign_id, status, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_aiadvice_status_created_at ON aiadvice (status, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_aiexecution_advice_id ON aiexecution (advice_id)",
+        "CREATE INDEX IF NOT EXISTS ix_industrybrief_date ON industrybrief (date)",
+        # 效果数据按活动+时间范围查询，以及仪表盘按时间窗口扫描
+        "CREATE INDEX IF NOT EXISTS ix_adresult_campaign_id_created_at ON adresult (campaign_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_adresult_created_at ON adresult (created_at)",
+    ]),
+    (2, "游标分页的排序索引", [
+        # 游标分页按(created_at, id)排序；SQLite索引隐式包含rowid，组合索引即覆盖排序键
+        "CREATE INDEX IF NOT EXISTS ix_aiadvice_created_at ON aiadvice (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_aiadvice_campaign_id_created_at ON aiadvice (campaign_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_agentlog_campaign_id_step_created_at ON agentlog (campaign_id, step, created_at)",
+    ]),
+    (3, "Agent步骤按运行分组的结构化字段", [
+        add_column("agentlog", "run_id", "INTEGER REFERENCES agentrun (id)"),
+        add_column("agentlog", "status", "VARCHAR NOT NULL DEFAULT 'completed'"),
+        add_column("agentlog", "output", "VARCHAR"),
+        "UPDATE agentlog SET status = 'error' WHERE step = 'error'",
+        "CREATE INDEX IF NOT EXISTS ix_agentlog_run_id ON agentlog (run_id)",
+        # agent.py: 按活动取最新一次运行的决策链路；运行列表按(created_at, id)游标分页
+        "CREATE INDEX IF NOT EXISTS ix_agentrun_campaign_id_id ON agentrun (campaign_id, id)",
+        "CREATE INDEX IF NOT EXISTS ix_agentrun_campaign_id_created_at ON agentrun (campaign_id, created_at)",
+    ]),
+    (4, "活动/AI建议/行业快讯全文搜索索引（SQLite FTS5，触发器增量维护）", [
+        search_index.install,
+    ]),
+    (5, "全文搜索触发器改为纯SQL变更队列，不再依赖应用注册的自定义函数", [
+        search_index.replace_function_triggers,
+    ]),
+]
+
+def run_migrations(engine) -> list:
+    """执行尚未执行的迁移，返回本次执行的版本号"""
+    applied = []
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schemamigration (version INTEGER PRIMARY KEY, description VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        ))
+        done = {row[0] for row in conn.execute(text("SELECT version FROM schemamigration"))}
+        for version, description, statements in MIGRATIONS:
+            if version in done:
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(text(statement))
+            conn.execute(
+                text("INSERT INTO schemamigration (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.utcnow()},
+            )
+            logger.info("已执行数据库迁移 %s: %s", version, description)
+            applied.append(version)
+    return applied
@@ -1,6 +1,7 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import UniqueConstraint
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timezone
 from pydantic import validator, model_validator
 
 class AdCampaign(SQLModel, table=True):
@@ -19,14 +20,29 @@ class AdResult(SQLModel, table=True):
     clicks: int = 0
     conversions: int = 0
     cost: float = 0.0
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class AgentRun(SQLModel, table=True):
+    """Agent运行：一次优化运行的全部步骤构成一条决策链路，flow为预先序列化好的决策链路文档（JSON数组），追加步骤时同步更新"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    campaign_id: int = Field(foreign_key="adcampaign.id")
+    kind: str = Field(default="optimize", description="运行类型")
+    status: str = Field(default="running", description="running / completed / error")
+    step_count: int = 0
+    flow: str = Field(default="[]", description="决策链路文档，/decisions直接输出")
+    created_at: datetime = Field(default_factory=datetime.utcnow, description="运行开始时间")
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
 
 class AgentLog(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     campaign_id: int = Field(foreign_key="adcampaign.id")
+    run_id: Optional[int] = Field(default=None, foreign_key="agentrun.id", index=True, description="所属Agent运行")
     step: str  # e.g. "create", "generate_ad", "optimize", "deploy"
+    status: str = Field(default="completed", description="completed / error")
     message: str
-    data: Optional[str] = None  # 可存储JSON字符串
+    data: Optional[str] = None  # 步骤输入，JSON字符串
+    output: Optional[str] = None  # 步骤输出，JSON字符串
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class AdCampaignUpdate(SQLModel):
@@ -60,6 +76,28 @@ class AdCampaignCreate(SQLModel):
             raise ValueError('预算必须为正数')
         return v 
 
+class AdResultCreate(SQLModel):
+    """批量导入的效果数据行"""
+    campaign_id: int
+    impressions: int = 0
+    clicks: int = 0
+    conversions: int = 0
+    cost: float = 0.0
+    created_at: Optional[datetime] = None
+
+    @validator('impressions', 'clicks', 'conversions', 'cost')
+    def not_negative(cls, v):
+        if v < 0:
+            raise ValueError('效果数据不能为负数')
+        return v
+
+    @validator('created_at')
+    def to_naive_utc(cls, v):
+        # 库中时间均为不带时区的UTC（汇总时间桶、统计窗口同此约定）：带时区偏移的时间先换算为UTC再去掉时区
+        if v is not None and v.tzinfo is not None:
+            v = v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
 class AIAdvice(SQLModel, table=True):
     """AI建议表"""
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -83,4 +121,226 @@ class IndustryBrief(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     date: datetime = Field(default_factory=datetime.utcnow, description="快讯日期")
     content: str = Field(description="AI生成的行业摘要")
-    raw_data: Optional[str] = Field(default=None, description="原始爬取数据(JSON)") 
\ No newline at end of file
+    raw_data: Optional[str] = Field(default=None, description="原始爬取数据(JSON)") 
+
+class AdResultHourly(SQLModel, table=True):
+    """广告效果小时级汇总表（活动×小时）"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    campaign_id: int = Field(foreign_key="adcampaign.id", index=True)
+    bucket: datetime = Field(index=True, description="小时起点(UTC)")
+    impressions: int = 0
+    clicks: int = 0
+    conversions: int = 0
+    cost: float = 0.0
+    rows: int = Field(default=0, description="汇总的原始效果数据行数")
+
+    __table_args__ = (UniqueConstraint("campaign_id", "bucket", name="uq_adresulthourly_campaign_bucket"),)
+
+class AdResultDaily(SQLModel, table=True):
+    """广告效果天级汇总表（活动×天）"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    campaign_id: int = Field(foreign_key="adcampaign.id", index=True)
+    bucket: datetime = Field(index=True, description="当天零点(UTC)")
+    impressions: int = 0
+    clicks: int = 0
+    conversions: int = 0
+    cost: float = 0.0
+    rows: int = Field(default=0, description="汇总的原始效果数据行数")
+
+    __table_args__ = (UniqueConstraint("campaign_id", "bucket", name="uq_adresultdaily_campaign_bucket"),)
+
+class RollupWatermark(SQLModel, table=True):
+    """汇总表刷新水位：记录已汇总到的AdResult最大ID"""
+    name: str = Field(primary_key=True, description="汇总表名称")
+    last_result_id: int = Field(default=0)
+    refreshed_at: datetime = Field(default_factory=datetime.utcnow)
+
+class LLMCacheEntry(SQLModel, table=True):
+    """大模型响应缓存（持久层）"""
+    key: str = Field(primary_key=True, description="sha256(provider, model, prompt, max_tokens)")
+    provider: str
+    model: str
+    response: str
+    hits: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime = Field(index=True)
+    last_used_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class NewsItem(SQLModel, table=True):
+    """行业新闻条目（后台抓取、标准化并去重后入库）"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    source: str = Field(description="信息源名称")
+    title: str
+    summary: str = ""
+    url: Optional[str] = None
+    content_hash: str = Field(unique=True, description="URL或标题的哈希，用于去重")
+    published_at: Optional[datetime] = None
+    fetched_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class AnalysisJob(SQLModel, table=True):
+    """批量分析任务"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    status: str = Field(default="pending", description="pending/running/completed/failed")
+    params: Optional[str] = Field(default=None, description="任务参数(JSON)")
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class AnalysisJobItem(SQLModel, table=True):
+    """批量分析任务中单个活动的执行结果"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: int = Field(foreign_key="analysisjob.id", index=True)
+    campaign_id: int = Field(foreign_key="adcampaign.id")
+    status: str = Field(default="pending", description="pending/completed/failed")
+    advice_id: Optional[int] = Field(default=None, foreign_key="aiadvice.id")
+    error: Optional[str] = None
+    finished_at: Optional[datetime] = None
+
+class Job(SQLModel, table=True):
+    """后台任务队列"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str = Field(index=True, description="任务类型，如optimize_campaign")
+    payload: str = Field(default="{}", description="任务参数(JSON)")
+    status: str = Field(default="queued", index=True, description="queued/running/succeeded/failed/cancelled")
+    idempotency_key: Optional[str] = Field(default=None, unique=True, description="幂等键，相同键只入队一次")
+    attempts: int = 0
+    max_attempts: int = 3
+    cancel_requested: bool = False
+    result: Optional[str] = Field(default=None, description="执行结果(JSON)")
+    error: Optional[str] = None
+    run_after: datetime = Field(default_factory=datetime.utcnow, description="最早可执行时间（重试退避）")
+    locked_by: Optional[str] = None
+    locked_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class LiveEvent(SQLModel, table=True):
+    """实时事件表（EVENT_BROKER=database时用于多worker间广播与断线续传）"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    topic: str = Field(index=True, description="事件主题，如campaign:1")
+    kind: str = Field(description="事件类型：agent_log/advice")
+    data: str = Field(description="事件内容(JSON)")
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class AutomationRule(SQLModel, table=True):
+    """自动化规则：按时间窗口内的效果指标筛选运行中的活动，生成AI建议并可自动执行"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(unique=True, description="规则名称")
+    metric: str = Field(description="指标：impressions/clicks/conversions/cost/ctr/cvr/cpa/cpc（ctr/cvr为百分比）")
+    operator: str = Field(description="比较符：> >= < <=")
+    threshold: float
+    window_hours: int = Field(default=24, description="统计窗口（小时）")
+    min_impressions: int = Field(default=0, description="窗口内展示数低于该值的活动不参与判断")
+    action: str = Field(description="pause/budget_increase/budget_decrease")
+    action_value: float = Field(default=0.0, description="预算调整百分比，如20表示20%")
+    auto_execute: bool = Field(default=False, description="安全规则：命中后直接执行，否则生成待审批建议")
+    cooldown_hours: int = Field(default=24, description="同一活动再次触发该规则的最短间隔")
+    priority: int = Field(default=100, description="数值越小越先判断；同一活动单次评估只执行一条规则")
+    enabled: bool = True
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+RULE_METRICS = ("impressions", "clicks", "conversions", "cost", "ctr", "cvr", "cpa", "cpc")
+RULE_OPERATORS = (">", ">=", "<", "<=")
+RULE_ACTIONS = ("pause", "budget_increase", "budget_decrease")
+
+class AutomationRuleUpdate(SQLModel):
+    name: Optional[str] = None
+    metric: Optional[str] = None
+    operator: Optional[str] = None
+    threshold: Optional[float] = None
+    window_hours: Optional[int] = None
+    min_impressions: Optional[int] = None
+    action: Optional[str] = None
+    action_value: Optional[float] = None
+    auto_execute: Optional[bool] = None
+    cooldown_hours: Optional[int] = None
+    priority: Optional[int] = None
+    enabled: Optional[bool] = None
+
+    @model_validator(mode='after')
+    def check_fields(self):
+        if self.metric is not None and self.metric not in RULE_METRICS:
+            raise ValueError(f'不支持的指标: {self.metric}')
+        if self.operator is not None and self.operator not in RULE_OPERATORS:
+            raise ValueError(f'不支持的比较符: {self.operator}')
+        if self.action is not None and self.action not in RULE_ACTIONS:
+            raise ValueError(f'不支持的动作: {self.action}')
+        if self.window_hours is not None and self.window_hours <= 0:
+            raise ValueError('统计窗口必须大于0')
+        if self.action_value is not None and not 0 <= self.action_value <= 100:
+            raise ValueError('预算调整百分比必须在0~100之间')
+        return self
+
+class AutomationRuleCreate(AutomationRuleUpdate):
+    name: str
+    metric: str
+    operator: str
+    threshold: float
+    action: str
+
+class RuleTrigger(SQLModel, table=True):
+    """规则命中记录：关联生成的AI建议，执行建议时据此调整活动"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    rule_id: int = Field(foreign_key="automationrule.id", index=True)
+    campaign_id: int = Field(foreign_key="adcampaign.id", index=True)
+    advice_id: int = Field(foreign_key="aiadvice.id", index=True)
+    action: str
+    action_value: float = 0.0
+    metric: str
+    value: Optional[float] = Field(default=None, description="命中时的指标值（无转化时的CPA等无穷大值记为空）")
+    threshold: float
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class ForecastParams(SQLModel, table=True):
+    """
+    活动预算响应曲线的缓存参数：按天累计的回归充分统计量（x=ln(1+花费)，y=ln(1+转化)），
+    新效果数据到达时增量更新，拟合结果(intercept, slope)随之刷新
+    """
+    campaign_id: int = Field(foreign_key="adcampaign.id", primary_key=True)
+    days: int = Field(default=0, description="有花费的天数")
+    sum_spend: float = 0.0
+    sum_conversions: float = 0.0
+    sum_x: float = 0.0
+    sum_y: float = 0.0
+    sum_xx: float = 0.0
+    sum_xy: float = 0.0
+    intercept: float = 0.0
+    slope: float = Field(default=1.0, description="花费弹性，限制在0~1（边际收益递减）")
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class LLMUsage(SQLModel, table=True):
+    """大模型调用的token用量：每次调用一条，缓存命中记为0 token，用于成本统计"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    provider: str = Field(index=True)
+    model: str
+    purpose: str = Field(default="general", index=True, description="调用用途，如analyze_campaign")
+    campaign_id: Optional[int] = Field(default=None, index=True)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    estimated_prompt_tokens: int = Field(default=0, description="本地估算的prompt token数")
+    cached: bool = False
+    streamed: bool = False
+    latency_ms: float = 0.0
+    ttft_ms: Optional[float] = Field(default=None, description="首字耗时：流式调用为收到第一段内容的时间，非流式等于总耗时")
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class ArchivePartition(SQLModel, table=True):
+    """冷归档文件清单：每次归档按表×月份写出一个分片文件，查询历史数据时据此定位需要读取的文件"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    table_name: str = Field(index=True, description="源表名，如agentlog/adresult")
+    month: str = Field(index=True, description="分区月份，YYYY-MM")
+    path: str = Field(description="归档文件路径（相对ARCHIVE_DIR）")
+    format: str = Field(description="parquet / ndjson.gz")
+    rows: int = 0
+    bytes: int = 0
+    min_id: int = 0
+    max_id: int = 0
+    min_created_at: datetime
+    max_created_at: datetime
+    compacted: bool = Field(default=False, description="是否已合并并按活动排序")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
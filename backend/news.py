@@ -0,0 +1,200 @@
+"""
+行业新闻抓取子系统：可插拔信息源 + 后台定时刷新 + 入库去重，分析请求只读本地存储
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import requests
+from dotenv import load_dotenv
+from sqlmodel import Session, select
+
+from instrumentation import NEWS_FETCHES, NEWS_FETCH_LATENCY, NEWS_INSERTED
+from models import NewsItem
+
+load_dotenv()
+
+logger = logging.getLogger("news")
+
+EMPTY_INFO = [{"title": "暂无最新行业信息", "summary": ""}]
+
+class NewsSource:
+    """信息源适配器基类：fetch返回标准化条目 {title, summary, url, published_at}"""
+    name = "base"
+
+    def fetch(self) -> List[dict]:
+        raise NotImplementedError
+
+class NewsAPISource(NewsSource):
+    name = "newsapi"
+
+    def __init__(self, api_key: str, query: str = "广告投放", limit: int = 20):
+        self.api_key = api_key
+        self.query = query
+        self.limit = limit
+
+    def fetch(self) -> List[dict]:
+        resp = requests.get(
+            "https://newsapi.org/v2/everything",
+            params={"q": self.query, "language": "zh", "sortBy": "publishedAt", "apiKey": self.api_key},
+            timeout=10,
+        )
+        resp.raise_for_status()
+        items = []
+        for art in resp.json().get("articles", [])[:self.limit]:
+            published = art.get("publishedAt")
+            items.append({
+                "title": art.get("title", ""),
+                "summary": art.get("description", "") or art.get("content", "") or "",
+                "url": art.get("url"),
+                "published_at": datetime.fromisoformat(published.replace("Z", "+00:00")).replace(tzinfo=None) if published else None,
+            })
+        return items
+
+class BaiduNewsSource(NewsSource):
+    """百度新闻广告频道（简单爬虫，仅示例）"""
+    name = "baidu"
+
+    def __init__(self, limit: int = 20):
+        self.limit = limit
+
+    def fetch(self) -> List[dict]:
+        r = requests.get("https://news.baidu.com/widget?id=adnews&ajax=json", timeout=10)
+        r.raise_for_status()
+        data = r.json()
+        return [
+            {"title": item.get("title", ""), "summary": item.get("abs", ""), "url": item.get("url"), "published_at": None}
+            for item in data.get("data", {}).get("adnews", {}).get("items", [])[:self.limit]
+        ]
+
+class StaticNewsSource(NewsSource):
+    """固定条目的信息源，用于本地测试与基准测试"""
+    name = "static"
+
+    def __init__(self, items: List[dict], name: str = "static"):
+        self.items = items
+        self.name = name
+
+    def fetch(self) -> List[dict]:
+        return list(self.items)
+
+def content_hash(item: dict) -> str:
+    """优先按URL去重，没有URL时按规范化后的标题去重"""
+    key = item.get("url") or " ".join((item.get("title") or "").split()).lower()
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def _insert(session: Session):
+    if session.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
+
+def default_sources() -> List[NewsSource]:
+    api_key = os.getenv("NEWS_API_KEY")
+    return [NewsAPISource(api_key)] if api_key else [BaiduNewsSource()]
+
+class NewsFetcher:
+    def __init__(self, sources: List[NewsSource] = None, engine=None, interval: float = 600):
+        self.sources = sources if sources is not None else default_sources()
+        self.engine = engine
+        self.interval = interval
+        self.status = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _engine(self):
+        if self.engine is None:
+            from db import engine
+            return engine
+        return self.engine
+
+    def refresh(self) -> dict:
+        """抓取全部信息源并入库，单个信息源失败不影响其他信息源"""
+        summary = {}
+        with Session(self._engine()) as session:
+            for source in self.sources:
+                started = time.perf_counter()
+                try:
+                    items = source.fetch()
+                except Exception as e:
+                    NEWS_FETCHES.inc(source=source.name, outcome="error")
+                    logger.warning("信息源%s抓取失败: %s", source.name, e)
+                    self.status[source.name] = {**self.status.get(source.name, {}), "last_error": str(e), "last_error_at": datetime.utcnow()}
+                    summary[source.name] = {"error": str(e)}
+                    continue
+                NEWS_FETCH_LATENCY.observe(time.perf_counter() - started, source=source.name)
+                NEWS_FETCHES.inc(source=source.name, outcome="success")
+                inserted = self._store(session, source.name, items)
+                NEWS_INSERTED.inc(inserted, source=source.name)
+                self.status[source.name] = {**self.status.get(source.name, {}), "last_success_at": datetime.utcnow(), "fetched": len(items), "inserted": inserted}
+                summary[source.name] = {"fetched": len(items), "inserted": inserted}
+        return summary
+
+    def _store(self, session: Session, source_name: str, items: List[dict]) -> int:
+        """INSERT ... ON CONFLICT DO NOTHING：并发刷新时被另一轮先写入的条目直接跳过，不影响同批其他条目入库"""
+        items = [item for item in items if item.get("title")]
+        by_hash = {content_hash(item): item for item in items}
+        if not by_hash:
+            return 0
+        existing = set(session.exec(select(NewsItem.content_hash).where(NewsItem.content_hash.in_(list(by_hash)))).all())
+        now = datetime.utcnow()
+        rows = [
+            {
+                "source": source_name,
+                "title": item["title"],
+                "summary": item.get("summary") or "",
+                "url": item.get("url"),
+                "content_hash": h,
+                "published_at": item.get("published_at"),
+                "fetched_at": now,
+            }
+            for h, item in by_hash.items()
+            if h not in existing
+        ]
+        if not rows:
+            return 0
+        inserted = session.execute(
+            _insert(session)(NewsItem).values(rows).on_conflict_do_nothing(index_elements=["content_hash"])
+        ).rowcount
+        session.commit()
+        return inserted
+
+    def latest(self, session: Session, limit: int = 5) -> List[dict]:
+        """供分析请求使用：只读本地存储，不触发外部抓取"""
+        items = session.exec(
+            select(NewsItem).order_by(NewsItem.fetched_at.desc(), NewsItem.id.desc()).limit(limit)
+        ).all()
+        if not items:
+            return list(EMPTY_INFO)
+        return [{"title": item.title, "summary": item.summary} for item in items]
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception:
+                logger.exception("行业新闻刷新失败")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """在当前事件循环中启动后台定时刷新（interval<=0时不启动）"""
+        if self.interval <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+news_fetcher = NewsFetcher(interval=float(os.getenv("NEWS_REFRESH_INTERVAL", "600")))
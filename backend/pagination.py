@@ -0,0 +1,73 @@
+"""
+游标（Keyset）分页：按(created_at, id)排序，下一页从上一页最后一行之后继续读取，
+翻页深度不影响查询耗时；游标对客户端不透明
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import or_
+
+# 响应头：下一页游标，没有更多数据时不返回
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+def encode_rank_cursor(rank: float, row_id: int) -> str:
+    """按相关度排序的结果（如全文搜索）的游标：(rank, 行ID)"""
+    raw = json.dumps([rank, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rank, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(rank), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+def keyset_page(query, model, limit: int, cursor: Optional[str] = None, descending: bool = True):
+    """在查询上追加游标条件、排序与limit；多取一行用于判断是否还有下一页"""
+    created_at, row_id = model.created_at, model.id
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor)
+        # 写成“created_at <= x AND (created_at < x OR id < y)”而不是纯OR：
+        # 前半部分能被索引当作范围条件，否则SQLite会退化为从头扫描索引
+        if descending:
+            query = query.where(created_at <= last_created_at, or_(created_at < last_created_at, row_id < last_id))
+        else:
+            query = query.where(created_at >= last_created_at, or_(created_at > last_created_at, row_id > last_id))
+    if descending:
+        query = query.order_by(created_at.desc(), row_id.desc())
+    else:
+        query = query.order_by(created_at.asc(), row_id.asc())
+    return query.limit(limit + 1)
+
+def split_page(rows: list, limit: int) -> Tuple[list, Optional[str]]:
+    """去掉多取的一行，返回(本页数据, 下一页游标)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.id)
+
+def date_range(query, column, created_from: Optional[datetime], created_to: Optional[datetime]):
+    """按[created_from, created_to)过滤时间范围"""
+    if created_from:
+        query = query.where(column >= created_from)
+    if created_to:
+        query = query.where(column < created_to)
+    return query
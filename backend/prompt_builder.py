@@ -0,0 +1,214 @@
+"""
+分析类prompt构建：本地估算token数，按与活动产品/目标的相关度对行业信息排序去重，
+在token预算内截断，并附上预先汇总好的近期效果指标。
+"""
+
+import math
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import case, func
+from sqlmodel import Session, select
+
+from models import AdResultDaily
+
+try:
+    import tiktoken
+except ImportError:  # 未安装时使用字符级估算
+    tiktoken = None
+
+load_dotenv()
+
+# 分析时从本地新闻库读取的候选条数，排序截断后实际放入prompt的条数由token预算决定
+NEWS_CANDIDATES = int(os.getenv("PROMPT_NEWS_CANDIDATES", "20"))
+
+_ENCODING = None
+_TOKEN_PATTERN = re.compile(r"[㐀-鿿豈-﫿]|[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_CJK = re.compile(r"[㐀-鿿豈-﫿]+")
+_WORD = re.compile(r"[a-z0-9]{2,}")
+_NORMALIZE = re.compile(r"[\W_]+")
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算token数。安装了tiktoken时按cl100k_base精确计数；否则汉字按1个、
+    英文单词按每4个字母1个、数字按每3位1个、标点按1个估算（对中文内容偏保守）
+    """
+    global _ENCODING
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _ENCODING is None:
+            _ENCODING = tiktoken.get_encoding("cl100k_base")
+        return len(_ENCODING.encode(text))
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece.isascii() and piece.isalpha():
+            tokens += math.ceil(len(piece) / 4)
+        elif piece.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        else:
+            tokens += 1
+    return tokens
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "…") -> str:
+    """按估算token数截断文本（二分查找截断位置）"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid] + suffix) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + suffix if low else ""
+
+def _terms(text: str) -> set:
+    """相关度计算用的词项：中文取相邻二字组，英文/数字取小写单词"""
+    text = (text or "").lower()
+    terms = set(_WORD.findall(text))
+    for run in _CJK.findall(text):
+        terms.update(run[i:i + 2] for i in range(len(run) - 1))
+        if len(run) == 1:
+            terms.add(run)
+    return terms
+
+def _similar(a: set, b: set, threshold: float = 0.8) -> bool:
+    if not a or not b:
+        return False
+    return len(a & b) / len(a | b) >= threshold
+
+def rank_info(campaign, info_list: List[dict]) -> List[dict]:
+    """按与活动产品、目标、名称的词项重合度排序（标题权重加倍），同分保持原顺序（即新近程度）；去掉重复条目"""
+    keywords = _terms(f"{campaign.product} {campaign.objective} {campaign.name}")
+    scored, seen_titles, seen_terms = [], set(), []
+    for order, item in enumerate(info_list):
+        title = item.get("title") or ""
+        summary = item.get("summary") or ""
+        normalized = _NORMALIZE.sub("", title.lower())
+        terms = _terms(f"{title} {summary}")
+        if (normalized and normalized in seen_titles) or any(_similar(terms, other) for other in seen_terms):
+            continue
+        seen_titles.add(normalized)
+        seen_terms.append(terms)
+        score = 2 * len(keywords & _terms(title)) + len(keywords & _terms(summary))
+        scored.append((-score, order, item))
+    scored.sort(key=lambda entry: entry[:2])
+    return [item for _, _, item in scored]
+
+def recent_metrics(session: Session, campaign_ids: List[int], days: int = 7) -> Dict[int, dict]:
+    """从天级汇总表一次查询多个活动近days天及上一周期的效果合计"""
+    if not campaign_ids:
+        return {}
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    current_start = today - timedelta(days=days - 1)
+    previous_start = current_start - timedelta(days=days)
+    is_current = AdResultDaily.bucket >= current_start
+
+    def _sum(column, current: bool):
+        return func.sum(case((is_current if current else ~is_current, column), else_=0))
+
+    columns = ("impressions", "clicks", "conversions", "cost")
+    rows = session.exec(
+        select(
+            AdResultDaily.campaign_id,
+            *[_sum(getattr(AdResultDaily, c), True) for c in columns],
+            *[_sum(getattr(AdResultDaily, c), False) for c in columns],
+        )
+        .where(AdResultDaily.campaign_id.in_(campaign_ids), AdResultDaily.bucket >= previous_start)
+        .group_by(AdResultDaily.campaign_id)
+    ).all()
+    return {
+        row[0]: {
+            "days": days,
+            "current": dict(zip(columns, row[1:5])),
+            "previous": dict(zip(columns, row[5:9])),
+        }
+        for row in rows
+    }
+
+def _rates(totals: dict) -> dict:
+    impressions, clicks, conversions, cost = (totals.get(c) or 0 for c in ("impressions", "clicks", "conversions", "cost"))
+    return {
+        "ctr": clicks / impressions * 100 if impressions else None,
+        "cvr": conversions / clicks * 100 if clicks else None,
+        "cpa": cost / conversions if conversions else None,
+    }
+
+def format_metrics(metrics: Optional[dict]) -> str:
+    """压缩成一行：近N天合计与派生指标，附环比变化"""
+    if not metrics or not any(metrics["current"].values()):
+        return "暂无近期效果数据"
+    current, previous = metrics["current"], metrics["previous"]
+    rates, previous_rates = _rates(current), _rates(previous)
+    parts = [
+        f"展示{current['impressions'] or 0}",
+        f"点击{current['clicks'] or 0}",
+        f"转化{current['conversions'] or 0}",
+        f"花费¥{current['cost'] or 0:.0f}",
+    ]
+    for name, label, fmt in (("ctr", "CTR", "{:.2f}%"), ("cvr", "CVR", "{:.2f}%"), ("cpa", "CPA", "¥{:.1f}")):
+        value = rates[name]
+        if value is None:
+            continue
+        text = f"{label} {fmt.format(value)}"
+        before = previous_rates[name]
+        if before:
+            text += f"(环比{(value - before) / before * 100:+.0f}%)"
+        parts.append(text)
+    return f"近{metrics['days']}天: " + "，".join(parts)
+
+@dataclass
+class PromptPlan:
+    prompt: str
+    estimated_tokens: int
+    items_used: int
+    items_dropped: int
+    truncated: bool
+
+class PromptBuilder:
+    # 截断后剩余预算不足该值时不再放入半条信息
+    MIN_ITEM_TOKENS = 24
+
+    def __init__(self, token_budget: int = 1500):
+        """token_budget: prompt（不含回复）的token上限"""
+        self.token_budget = token_budget
+
+    @classmethod
+    def from_env(cls) -> "PromptBuilder":
+        return cls(token_budget=int(os.getenv("PROMPT_TOKEN_BUDGET", "1500")))
+
+    def build_analysis(self, campaign, info_list: List[dict], metrics: Optional[dict] = None) -> PromptPlan:
+        """固定部分（说明、活动信息、效果指标）优先，剩余预算按相关度依次放入行业信息"""
+        head = "你是一名广告投放专家。请根据以下最新行业信息和广告活动数据，给出详细的广告投放建议。\n\n【行业信息】\n"
+        tail = (
+            f"\n\n【广告活动】\n名称: {campaign.name}\n产品: {campaign.product}\n目标: {campaign.objective}\n"
+            f"预算: {campaign.budget}\n效果: {format_metrics(metrics)}\n\n请用简洁明了的语言输出建议。"
+        )
+        remaining = self.token_budget - estimate_tokens(head) - estimate_tokens(tail)
+        ranked = rank_info(campaign, info_list)
+        lines, truncated = [], False
+        for item in ranked:
+            line = f"- {item.get('title') or ''}: {item.get('summary') or ''}"
+            # 各行之间的换行符单独计1个token
+            cost = estimate_tokens(line) + 1
+            if cost <= remaining:
+                lines.append(line)
+                remaining -= cost
+                continue
+            if remaining >= self.MIN_ITEM_TOKENS:
+                lines.append(truncate_to_tokens(line, remaining - 1))
+                truncated = True
+            break
+        prompt = head + "\n".join(lines) + tail
+        return PromptPlan(
+            prompt=prompt,
+            estimated_tokens=estimate_tokens(prompt),
+            items_used=len(lines),
+            items_dropped=len(info_list) - len(lines),
+            truncated=truncated,
+        )
@@ -0,0 +1,202 @@
+"""
+读接口响应缓存：按路由+查询参数缓存序列化后的JSON，写接口按标签失效；支持ETag/If-None-Match返回304。
+失效采用标签版本号：缓存键包含所依赖标签的当前版本，写入时只需把标签版本+1，旧条目自然不再命中，
+内存与Redis两种后端使用同一套逻辑。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+load_dotenv()
+
+logger = logging.getLogger("response_cache")
+
+DASHBOARD_TAG = "dashboard"
+BRIEF_TAG = "brief"
+
+def campaign_tag(campaign_id: int) -> str:
+    """单个活动的详情与决策链路共用的标签"""
+    return f"campaign:{campaign_id}"
+
+class MemoryCacheBackend:
+    """进程内LRU，条目带过期时间；多worker部署时各进程的失效互不可见"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def versions(self, tags: List[str]) -> List[int]:
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags: List[str]):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+class RedisCacheBackend:
+    """Redis后端：client为redis-py兼容对象（get/set/mget/incr），多worker共享缓存与失效"""
+
+    def __init__(self, client, prefix: str = "resp:"):
+        self.client = client
+        self.prefix = prefix
+        self.evictions = 0
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCacheBackend":
+        import redis  # 可选依赖，仅在RESPONSE_CACHE_BACKEND=redis时需要
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(self.prefix + key, value, ex=max(int(ttl), 1))
+
+    def versions(self, tags: List[str]) -> List[int]:
+        values = self.client.mget([f"{self.prefix}tag:{tag}" for tag in tags])
+        return [int(v) if v is not None else 0 for v in values]
+
+    def bump(self, tags: List[str]):
+        for tag in tags:
+            self.client.incr(f"{self.prefix}tag:{tag}")
+
+    def clear(self):
+        pass
+
+    def size(self) -> Optional[int]:
+        return None
+
+class ResponseCache:
+    def __init__(self, backend=None, default_ttl: float = 60, enabled: bool = True):
+        self.backend = backend or MemoryCacheBackend()
+        self.default_ttl = default_ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        if os.getenv("RESPONSE_CACHE_BACKEND", "memory") == "redis":
+            backend = RedisCacheBackend.from_url(os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0"))
+        else:
+            backend = MemoryCacheBackend(max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")))
+        return cls(
+            backend,
+            default_ttl=float(os.getenv("RESPONSE_CACHE_TTL", "60")),
+            enabled=os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true",
+        )
+
+    def _key(self, request: Request, tags: List[str]) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        versions = ",".join(f"{tag}={v}" for tag, v in zip(tags, self.backend.versions(tags)))
+        return f"{request.url.path}?{query}|{versions}"
+
+    def _response(self, request: Request, etag: str, body: bytes, status: str) -> Response:
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache", "X-Cache": status}
+        if request.headers.get("if-none-match") == etag:
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    async def respond(self, request: Request, tags: List[str], build: Callable[[], Awaitable], ttl: Optional[float] = None) -> Response:
+        """命中缓存直接返回；未命中时调用build生成数据并写入缓存。build抛出的HTTPException不会被缓存"""
+        if not self.enabled:
+            return Response(content=_dumps(await build()), media_type="application/json")
+        try:
+            key = self._key(request, tags)
+            cached = self.backend.get(key)
+        except Exception:
+            # 缓存后端不可用时降级为直接查询
+            logger.exception("读取响应缓存失败")
+            return Response(content=_dumps(await build()), media_type="application/json")
+        if cached is not None:
+            self.hits += 1
+            etag, _, body = cached.partition(b"\n")
+            return self._response(request, etag.decode(), body, "HIT")
+        self.misses += 1
+        body = _dumps(await build())
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        try:
+            self.backend.set(key, etag.encode() + b"\n" + body, ttl or self.default_ttl)
+        except Exception:
+            logger.exception("写入响应缓存失败")
+        return self._response(request, etag, body, "MISS")
+
+    def invalidate(self, *tags: str):
+        """写操作提交后调用：使依赖这些标签的缓存全部失效；失效失败只记录日志"""
+        tags = [tag for tag in tags if tag]
+        if not tags or not self.enabled:
+            return
+        try:
+            self.backend.bump(tags)
+            self.invalidations += len(tags)
+        except Exception:
+            logger.exception("响应缓存失效失败")
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "evictions": self.backend.evictions,
+            "size": self.backend.size(),
+        }
+
+class RawJSON(str):
+    """已序列化好的JSON文本（如预先生成的决策链路文档），缓存与响应时原样输出"""
+
+def _dumps(data) -> bytes:
+    if isinstance(data, RawJSON):
+        return data.encode("utf-8")
+    # 与FastAPI默认JSONResponse的序列化方式保持一致
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+# 全局响应缓存
+response_cache = ResponseCache.from_env()
@@ -0,0 +1,187 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlmodel import select
+from models import AdCampaign, AdResult, AdResultCreate
+from db import get_session
+from forecast import refresh_forecast_params
+from response_cache import response_cache, DASHBOARD_TAG
+from sqlmodel import Session
+from datetime import datetime
+from typing import Any, AsyncIterator, Optional
+import csv
+import json
+import logging
+
+router = APIRouter(prefix="/api/results", tags=["Results"])
+
+logger = logging.getLogger("results")
+
+# 每个批次最多校验/写入的行数，决定了导入过程中的内存上限
+CHUNK_SIZE = 5000
+# 每个批次最多返回的错误明细条数、最多返回的出错批次数，避免错误报告本身无限增长
+MAX_ERRORS_PER_CHUNK = 20
+MAX_ERROR_CHUNKS = 100
+# 单行最大字节数：请求体缺少换行时，缓冲区不会无限增长
+MAX_LINE_BYTES = 64 * 1024
+
+CSV_FIELDS = ["campaign_id", "impressions", "clicks", "conversions", "cost", "created_at"]
+
+def _line_too_long(line_no: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"第{line_no}行超过{MAX_LINE_BYTES}字节，导入已中止（之前的批次已写入）")
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """把请求体字节流切分成行，只在内存里保留不完整的最后一行；单行超过MAX_LINE_BYTES时中止"""
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if len(line) > MAX_LINE_BYTES:
+                raise _line_too_long(line_no)
+            yield line
+        if len(buffer) > MAX_LINE_BYTES:
+            raise _line_too_long(line_no + 1)
+    if buffer:
+        yield buffer
+
+def _decode(line: bytes) -> str:
+    try:
+        return line.decode("utf-8").rstrip("\r")
+    except UnicodeDecodeError as e:
+        raise ValueError(f"不是合法的UTF-8文本（第{e.start + 1}字节）")
+
+def _parse_ndjson(line: str) -> dict:
+    return json.loads(line)
+
+def _csv_parser(header: str):
+    fields = next(csv.reader([header]))
+    unknown = set(fields) - set(CSV_FIELDS)
+    if unknown or "campaign_id" not in fields:
+        raise HTTPException(status_code=400, detail=f"CSV表头不合法: {header}")
+
+    def _parse(line: str) -> dict:
+        values = next(csv.reader([line]))
+        if len(values) != len(fields):
+            raise ValueError(f"列数不匹配，期望{len(fields)}列，实际{len(values)}列")
+        return {k: v for k, v in zip(fields, values) if v != ""}
+
+    return _parse
+
+def _validate_chunk(rows: list, session: Session) -> tuple:
+    """校验一个批次，返回(可写入的行, 错误明细)"""
+    valid, errors = [], []
+    for line_no, raw in rows:
+        if isinstance(raw, Exception):
+            errors.append({"line": line_no, "error": f"解析失败: {raw}"})
+            continue
+        try:
+            item = AdResultCreate.model_validate(raw)
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            errors.append({"line": line_no, "error": detail})
+            continue
+        except (ValueError, TypeError) as e:
+            errors.append({"line": line_no, "error": str(e)})
+            continue
+        data = item.model_dump()
+        if data["created_at"] is None:
+            data["created_at"] = datetime.utcnow()
+        valid.append((line_no, data))
+    campaign_ids = {data["campaign_id"] for _, data in valid}
+    existing = set(session.exec(select(AdCampaign.id).where(AdCampaign.id.in_(campaign_ids))).all()) if campaign_ids else set()
+    rows_to_insert = []
+    for line_no, data in valid:
+        if data["campaign_id"] not in existing:
+            errors.append({"line": line_no, "error": f"广告活动不存在: {data['campaign_id']}"})
+            continue
+        rows_to_insert.append(data)
+    return rows_to_insert, errors
+
+def _write_chunk(rows: list, session: Session) -> dict:
+    """在独立事务中校验并批量写入一个批次，失败只影响当前批次"""
+    rows_to_insert, errors = _validate_chunk(rows, session)
+    inserted = 0
+    try:
+        if rows_to_insert:
+            session.execute(insert(AdResult), rows_to_insert)
+        session.commit()
+        inserted = len(rows_to_insert)
+    except Exception as e:
+        session.rollback()
+        logger.exception("批量写入效果数据失败")
+        errors.append({"line": rows[0][0], "error": f"批次写入失败: {e}"})
+    return {
+        "first_line": rows[0][0],
+        "last_line": rows[-1][0],
+        "received": len(rows),
+        "inserted": inserted,
+        "failed": len(rows) - inserted,
+        "errors": sorted(errors, key=lambda e: e["line"])[:MAX_ERRORS_PER_CHUNK],
+    }
+
+@router.post("/bulk")
+async def bulk_ingest_results(
+    request: Request,
+    format: Optional[str] = Query(None, description="ndjson/csv，默认根据Content-Type判断"),
+    chunk_size: int = Query(CHUNK_SIZE, ge=100, le=50000, description="每批写入行数"),
+    refresh: bool = Query(True, description="导入完成后增量刷新汇总表与预算预测参数"),
+    session: Session = Depends(get_session)
+) -> Any:
+    """流式导入效果数据（NDJSON或CSV），分批校验、分批事务写入，单批失败不影响其他批次"""
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in content_type else "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="不支持的导入格式")
+
+    parse = _parse_ndjson if fmt == "ndjson" else None
+    chunks, pending = [], []
+    totals = {"received": 0, "inserted": 0, "failed": 0}
+
+    async def _flush(rows: list):
+        report = await run_in_threadpool(_write_chunk, rows, session)
+        for key in totals:
+            totals[key] += report[key]
+        if report["failed"] and len(chunks) < MAX_ERROR_CHUNKS:
+            chunks.append(report)
+
+    line_no = 0
+    try:
+        async for raw in _iter_lines(request.stream()):
+            line_no += 1
+            try:
+                line = _decode(raw)
+            except ValueError as e:
+                if parse is None:
+                    raise HTTPException(status_code=400, detail=f"CSV表头{e}")
+                pending.append((line_no, e))
+            else:
+                if not line.strip():
+                    continue
+                if parse is None:
+                    parse = _csv_parser(line)
+                    continue
+                try:
+                    pending.append((line_no, parse(line)))
+                except ValueError as e:
+                    pending.append((line_no, e))
+            if len(pending) >= chunk_size:
+                await _flush(pending)
+                pending = []
+    except HTTPException:
+        # 中止前已提交的批次同样需要让仪表盘缓存失效
+        if totals["inserted"]:
+            response_cache.invalidate(DASHBOARD_TAG)
+        raise
+    if pending:
+        await _flush(pending)
+
+    if refresh and totals["inserted"]:
+        # 同时刷新汇总表与预算预测参数
+        await run_in_threadpool(refresh_forecast_params, session)
+    if totals["inserted"]:
+        response_cache.invalidate(DASHBOARD_TAG)
+    return {"format": fmt, **totals, "chunks_with_errors": chunks}
@@ -0,0 +1,484 @@
+"""
+数据保留与冷归档：按表配置热数据窗口，把更早的AgentLog/AdResult按月分区写入压缩的列式归档文件
+（安装pyarrow时为zstd压缩的Parquet，否则为gzip压缩的NDJSON），登记到archivepartition清单后再分批从在线库删除；
+同一月份的多个分片定期合并。/logs、/decisions 查询的时间范围早于热数据窗口时从归档文件补齐。
+
+命令行（在backend目录下）:
+    python retention.py              # 按策略归档并合并分片
+    python retention.py --dry-run    # 只统计待归档行数
+    python retention.py --vacuum     # 归档后整理数据库文件（会长时间持有写锁，请在低峰期执行）
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import Boolean, DateTime, Float, Integer, case, delete, func, or_
+from sqlmodel import Session, select
+
+from instrumentation import registry
+from models import AdResult, AgentLog, ArchivePartition, RollupWatermark
+from pagination import decode_cursor
+from rollups import ROLLUP_TABLES, refresh_rollups
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow为可选依赖，未安装时归档为gzip压缩的NDJSON
+    pa = None
+    pq = None
+
+load_dotenv()
+
+logger = logging.getLogger("retention")
+
+FORMATS = {"parquet": ".parquet", "ndjson.gz": ".ndjson.gz"}
+
+ROWS_ARCHIVED = registry.counter("retention_rows_archived_total", "写入冷归档并从在线库删除的行数", ("table",))
+ARCHIVE_READS = registry.counter("archive_partition_reads_total", "查询历史数据时读取的归档分片数", ("table",))
+
+@dataclass
+class RetentionPolicy:
+    model: type
+    hot_days: int
+
+    @property
+    def enabled(self) -> bool:
+        return self.hot_days > 0
+
+def policies_from_env() -> Dict[str, RetentionPolicy]:
+    """各表的热数据保留天数，0表示不归档"""
+    return {
+        "agentlog": RetentionPolicy(AgentLog, int(os.getenv("RETENTION_AGENTLOG_DAYS", "90"))),
+        "adresult": RetentionPolicy(AdResult, int(os.getenv("RETENTION_ADRESULT_DAYS", "180"))),
+    }
+
+def _columns(model) -> List[Tuple[str, type]]:
+    """表的列名与对应的Python类型，用于生成归档schema"""
+    columns = []
+    for column in model.__table__.columns:
+        kind = str
+        for sa_type, python_type in ((Boolean, bool), (Integer, int), (Float, float), (DateTime, datetime)):
+            if isinstance(column.type, sa_type):
+                kind = python_type
+                break
+        columns.append((column.name, kind))
+    return columns
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+class _PartWriter:
+    """单个归档分片：先写临时文件，close时原子重命名，避免半个文件被登记或读取"""
+
+    def __init__(self, path: str, columns: List[Tuple[str, type]], fmt: str, flush_rows: int = 5000):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.columns = columns
+        self.fmt = fmt
+        self.flush_rows = flush_rows
+        self.buffer: List[tuple] = []
+        self.rows = 0
+        self.min_id = self.max_id = None
+        self.min_created_at = self.max_created_at = None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if fmt == "parquet":
+            types = {int: pa.int64(), float: pa.float64(), str: pa.string(), bool: pa.bool_(), datetime: pa.timestamp("us")}
+            self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+            self._writer = pq.ParquetWriter(self.tmp_path, self.schema, compression="zstd")
+        else:
+            self._writer = gzip.open(self.tmp_path, "wt", encoding="utf-8")
+
+    def write(self, row: tuple, row_id: int, created_at: datetime):
+        self.buffer.append(row)
+        self.rows += 1
+        self.min_id = row_id if self.min_id is None else min(self.min_id, row_id)
+        self.max_id = row_id if self.max_id is None else max(self.max_id, row_id)
+        self.min_created_at = created_at if self.min_created_at is None else min(self.min_created_at, created_at)
+        self.max_created_at = created_at if self.max_created_at is None else max(self.max_created_at, created_at)
+        if len(self.buffer) >= self.flush_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        if self.fmt == "parquet":
+            arrays = [pa.array([row[i] for row in self.buffer], type=self.schema.field(i).type) for i in range(len(self.columns))]
+            self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        else:
+            names = [name for name, _ in self.columns]
+            self._writer.writelines(
+                json.dumps(dict(zip(names, row)), ensure_ascii=False, default=_json_default) + "\n" for row in self.buffer
+            )
+        self.buffer = []
+
+    def close(self) -> int:
+        """返回文件字节数"""
+        self._flush()
+        self._writer.close()
+        if hasattr(os, "fsync"):
+            with open(self.tmp_path, "rb") as f:
+                os.fsync(f.fileno())
+        os.replace(self.tmp_path, self.path)
+        return os.path.getsize(self.path)
+
+def _read_part(path: str, fmt: str, columns: List[Tuple[str, type]], campaign_id: Optional[int] = None) -> List[dict]:
+    """读取归档分片；指定campaign_id时Parquet按行组统计信息跳过无关数据"""
+    if fmt == "parquet":
+        if pq is None:
+            raise RuntimeError("读取Parquet归档需要安装pyarrow")
+        filters = [("campaign_id", "=", campaign_id)] if campaign_id is not None else None
+        return pq.read_table(path, filters=filters).to_pylist()
+    datetime_columns = [name for name, kind in columns if kind is datetime]
+    rows = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if campaign_id is not None and row.get("campaign_id") != campaign_id:
+                continue
+            for name in datetime_columns:
+                if row.get(name):
+                    row[name] = datetime.fromisoformat(row[name])
+            rows.append(row)
+    return rows
+
+def merge_rows(live: list, archived: list, limit: Optional[int] = None, descending: bool = True) -> list:
+    """合并在线与归档数据：按(created_at, id)排序，同一ID（归档后尚未删除完的行）以在线库为准"""
+    if not archived:
+        return live
+    seen = {row.id for row in live}
+    rows = list(live) + [row for row in archived if row.id not in seen]
+    rows.sort(key=lambda row: (row.created_at, row.id), reverse=descending)
+    return rows[:limit + 1] if limit is not None else rows
+
+class RetentionManager:
+    def __init__(self, engine=None, directory: str = "archive", fmt: Optional[str] = None,
+                 policies: Dict[str, RetentionPolicy] = None, batch_size: int = 5000,
+                 pause: float = 0.0, interval: float = 0):
+        """
+        fmt: parquet / ndjson.gz，默认安装了pyarrow时用parquet
+        batch_size: 每批读取与删除的行数，删除按批提交以免长时间持有写锁
+        pause: 每批删除后的等待秒数，给在线写入让出写锁
+        interval: 后台定时执行间隔（秒），<=0时只能通过命令行触发
+        """
+        fmt = fmt or ("parquet" if pa is not None else "ndjson.gz")
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的归档格式: {fmt}")
+        if fmt == "parquet" and pa is None:
+            logger.warning("未安装pyarrow，归档格式改为ndjson.gz")
+            fmt = "ndjson.gz"
+        self.engine = engine
+        self.directory = directory
+        self.fmt = fmt
+        self.policies = policies if policies is not None else policies_from_env()
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.last_result: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "RetentionManager":
+        return cls(
+            directory=os.getenv("ARCHIVE_DIR", "archive"),
+            fmt=os.getenv("ARCHIVE_FORMAT") or None,
+            batch_size=int(os.getenv("RETENTION_BATCH_SIZE", "5000")),
+            pause=float(os.getenv("RETENTION_BATCH_PAUSE", "0.05")),
+            interval=float(os.getenv("RETENTION_INTERVAL", "0")),
+        )
+
+    def _engine(self):
+        if self.engine is None:
+            from db import engine
+            return engine
+        return self.engine
+
+    def _part_path(self, table: str, month: str, min_id: int, max_id: int, fmt: str, prefix: str = "part") -> str:
+        return os.path.join(table, f"month={month}", f"{prefix}-{min_id:012d}-{max_id:012d}{FORMATS[fmt]}")
+
+    def _upper_id(self, session: Session, name: str, model) -> int:
+        """
+        可归档的最大ID。始终保留表中ID最大的一行：SQLite删除最大ID后会复用该ID，
+        会让新数据落到汇总水位之下或与归档中的ID冲突。效果数据只归档已计入汇总表的行
+        """
+        if name != "adresult":
+            return (session.exec(select(func.max(model.id))).one() or 0) - 1
+        # 汇总刷新须在事务开始时进行（见rollups.lock_watermarks）：先结束之前的读事务
+        session.commit()
+        refresh_rollups(session)
+        upper = (session.exec(select(func.max(model.id))).one() or 0) - 1
+        marks = [session.get(RollupWatermark, grain) for grain in ROLLUP_TABLES]
+        return min([upper] + [mark.last_result_id if mark else 0 for mark in marks])
+
+    def archive_table(self, session: Session, name: str, now: datetime = None, dry_run: bool = False,
+                      max_rows: Optional[int] = None) -> dict:
+        """把created_at早于热数据窗口的行按月写入归档分片并登记，再按ID区间分批删除"""
+        policy = self.policies[name]
+        model = policy.model
+        table = model.__table__
+        cutoff = (now or datetime.utcnow()) - timedelta(days=policy.hot_days)
+        upper_id = self._upper_id(session, name, model)
+        condition = (model.created_at < cutoff, model.id <= upper_id)
+        if dry_run:
+            count, oldest = session.exec(select(func.count(model.id), func.min(model.created_at)).where(*condition)).one()
+            return {"cutoff": cutoff, "rows": count, "oldest": oldest}
+
+        started = time.perf_counter()
+        columns = _columns(model)
+        id_index = [name for name, _ in columns].index("id")
+        created_index = [name for name, _ in columns].index("created_at")
+        writers: Dict[str, _PartWriter] = {}
+        conn = session.connection()
+        last_id, first_id, total = 0, None, 0
+        while max_rows is None or total < max_rows:
+            batch = self.batch_size if max_rows is None else min(self.batch_size, max_rows - total)
+            rows = conn.execute(
+                select(*table.c).where(*condition, model.id > last_id).order_by(model.id).limit(batch)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                created_at = row[created_index]
+                if isinstance(created_at, str):
+                    created_at = datetime.fromisoformat(created_at)
+                month = created_at.strftime("%Y-%m")
+                writer = writers.get(month)
+                if writer is None:
+                    path = os.path.join(self.directory, name, f"month={month}", f"run-{time.time_ns()}{FORMATS[self.fmt]}")
+                    writer = writers[month] = _PartWriter(path, columns, self.fmt, self.batch_size)
+                writer.write(tuple(row), row[id_index], created_at)
+            first_id = rows[0][id_index] if first_id is None else first_id
+            last_id = rows[-1][id_index]
+            total += len(rows)
+        session.rollback()
+        if not total:
+            return {"cutoff": cutoff, "rows": 0, "months": []}
+
+        # 1. 分片文件落盘后登记清单（同一事务），之后即使删除中断，查询也会按ID去重
+        for month, writer in writers.items():
+            size = writer.close()
+            relative = self._part_path(name, month, writer.min_id, writer.max_id, self.fmt)
+            if os.path.exists(os.path.join(self.directory, relative)):
+                # 上次删除中断后重新归档的同一批行，换个文件名避免覆盖已登记的分片
+                relative = self._part_path(name, month, writer.min_id, writer.max_id, self.fmt, prefix=f"part{time.time_ns()}")
+            final = os.path.join(self.directory, relative)
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(writer.path, final)
+            session.add(ArchivePartition(
+                table_name=name, month=month, path=relative, format=self.fmt, rows=writer.rows, bytes=size,
+                min_id=writer.min_id, max_id=writer.max_id,
+                min_created_at=writer.min_created_at, max_created_at=writer.max_created_at,
+            ))
+        session.commit()
+
+        # 2. 按ID区间分批删除，每批单独提交；期间写入的新行ID都大于last_id，不会被误删
+        deleted = 0
+        low = first_id - 1
+        while low < last_id:
+            high = min(low + self.batch_size, last_id)
+            result = session.execute(delete(model).where(model.id > low, model.id <= high, model.created_at < cutoff))
+            session.commit()
+            deleted += result.rowcount or 0
+            low = high
+            if self.pause:
+                time.sleep(self.pause)
+        ROWS_ARCHIVED.inc(deleted, table=name)
+        logger.info("%s归档%d行（%d个月份），删除%d行", name, total, len(writers), deleted)
+        return {
+            "cutoff": cutoff,
+            "rows": total,
+            "deleted": deleted,
+            "months": sorted(writers),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    def compact(self, session: Session, name: str) -> dict:
+        """
+        合并同一月份的分片（按ID去重），并按(campaign_id, created_at)重新排序写出：
+        查询单个活动时Parquet可按行组的campaign_id统计信息跳过无关行组，同时减少需要打开的文件数
+        """
+        model = self.policies[name].model
+        columns = _columns(model)
+        months = session.exec(
+            select(ArchivePartition.month)
+            .where(ArchivePartition.table_name == name)
+            .group_by(ArchivePartition.month)
+            .having(or_(func.count(ArchivePartition.id) > 1, func.sum(case((ArchivePartition.compacted, 0), else_=1)) > 0))
+        ).all()
+        merged_parts = 0
+        for month in months:
+            parts = session.exec(
+                select(ArchivePartition).where(ArchivePartition.table_name == name, ArchivePartition.month == month)
+            ).all()
+            rows = {}
+            for part in parts:
+                for row in _read_part(os.path.join(self.directory, part.path), part.format, columns):
+                    rows[row["id"]] = row
+            ordered = sorted(rows.values(), key=lambda row: (row["campaign_id"], row["created_at"], row["id"]))
+            relative = self._part_path(name, month, min(rows), max(rows), self.fmt, prefix=f"compact{time.time_ns()}")
+            writer = _PartWriter(os.path.join(self.directory, relative), columns, self.fmt, self.batch_size)
+            for row in ordered:
+                writer.write(tuple(row.get(column) for column, _ in columns), row["id"], row["created_at"])
+            size = writer.close()
+            session.add(ArchivePartition(
+                table_name=name, month=month, path=relative, format=self.fmt, rows=writer.rows, bytes=size,
+                min_id=writer.min_id, max_id=writer.max_id, compacted=True,
+                min_created_at=writer.min_created_at, max_created_at=writer.max_created_at,
+            ))
+            for part in parts:
+                session.delete(part)
+            session.commit()
+            # 清单提交后再删旧文件；删除失败只会留下未登记的孤立文件
+            for part in parts:
+                try:
+                    os.remove(os.path.join(self.directory, part.path))
+                except OSError:
+                    logger.warning("删除已合并的归档分片失败: %s", part.path)
+            merged_parts += len(parts)
+        return {"months": len(months), "parts_merged": merged_parts}
+
+    def run(self, dry_run: bool = False, now: datetime = None) -> dict:
+        summary = {}
+        with Session(self._engine()) as session:
+            for name, policy in self.policies.items():
+                if not policy.enabled:
+                    continue
+                result = self.archive_table(session, name, now=now, dry_run=dry_run)
+                if not dry_run:
+                    result["compaction"] = self.compact(session, name)
+                summary[name] = result
+        if not dry_run:
+            self.last_result = {**summary, "finished_at": datetime.utcnow()}
+        return summary
+
+    def vacuum(self):
+        """回收删除后的空闲页；SQLite的VACUUM会重写整个文件并持有写锁"""
+        engine = self._engine()
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if engine.dialect.name == "sqlite":
+                conn.exec_driver_sql("VACUUM")
+            else:
+                for name in self.policies:
+                    conn.exec_driver_sql(f"VACUUM ANALYZE {name}")
+
+    def archived_until(self, session: Session, name: str) -> Optional[datetime]:
+        """归档中最新一行的时间，没有归档时返回None"""
+        return session.exec(
+            select(func.max(ArchivePartition.max_created_at)).where(ArchivePartition.table_name == name)
+        ).one()
+
+    def query(self, session: Session, model, campaign_id: int, created_from: datetime = None, created_to: datetime = None,
+              cursor: Optional[str] = None, limit: Optional[int] = None, descending: bool = True, step: str = None) -> list:
+        """
+        从归档读取单个活动在时间范围内的行，按(created_at, id)排序。返回属性与模型字段一致的只读记录
+        （SimpleNamespace），避免逐行构造ORM对象的开销。
+        指定limit时按分片时间倒序（正序）读取，已凑够limit条且后续分片不可能更新（更早）时提前结束
+        """
+        name = model.__tablename__
+        parts_query = select(ArchivePartition).where(ArchivePartition.table_name == name)
+        if created_from:
+            parts_query = parts_query.where(ArchivePartition.max_created_at >= created_from)
+        if created_to:
+            parts_query = parts_query.where(ArchivePartition.min_created_at < created_to)
+        position = decode_cursor(cursor) if cursor else None
+        if position:
+            if descending:
+                parts_query = parts_query.where(ArchivePartition.min_created_at <= position[0])
+            else:
+                parts_query = parts_query.where(ArchivePartition.max_created_at >= position[0])
+        order = ArchivePartition.max_created_at.desc() if descending else ArchivePartition.min_created_at.asc()
+        parts = session.exec(parts_query.order_by(order)).all()
+
+        columns = _columns(model)
+        rows: Dict[int, dict] = {}
+        threshold = None
+        for part in parts:
+            if threshold is not None and (part.max_created_at < threshold if descending else part.min_created_at > threshold):
+                break
+            ARCHIVE_READS.inc(table=name)
+            for row in _read_part(os.path.join(self.directory, part.path), part.format, columns, campaign_id):
+                key = (row["created_at"], row["id"])
+                if created_from and row["created_at"] < created_from:
+                    continue
+                if created_to and row["created_at"] >= created_to:
+                    continue
+                if step and row.get("step") != step:
+                    continue
+                if position and (key >= position if descending else key <= position):
+                    continue
+                rows[row["id"]] = row
+            if limit is not None and len(rows) >= limit:
+                ordered = sorted(rows.values(), key=lambda row: (row["created_at"], row["id"]), reverse=descending)[:limit]
+                rows = {row["id"]: row for row in ordered}
+                threshold = ordered[-1]["created_at"]
+        ordered = sorted(rows.values(), key=lambda row: (row["created_at"], row["id"]), reverse=descending)
+        # 早于新增列写出的归档分片缺少这些列，补为None
+        return [SimpleNamespace(**{name: row.get(name) for name, _ in columns}) for row in ordered]
+
+    def with_archived(self, session: Session, model, live: list, campaign_id: int, created_from: datetime = None,
+                      created_to: datetime = None, cursor: Optional[str] = None, limit: Optional[int] = None,
+                      descending: bool = True, step: str = None) -> list:
+        """
+        查询范围早于归档中最新一行时，把归档数据合并进在线查询结果（live须已按同样顺序排序，
+        分页时多取一行）；在线结果已凑满一页且都比归档新时不读取归档
+        """
+        until = self.archived_until(session, model.__tablename__)
+        if until is None or (created_from and created_from > until):
+            return live
+        if limit is not None and len(live) > limit and descending and live[limit].created_at > until:
+            return live
+        fetch = limit + 1 if limit is not None else None
+        archived = self.query(session, model, campaign_id, created_from, created_to, cursor, fetch, descending, step)
+        return merge_rows(live, archived, limit, descending)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run)
+            except Exception:
+                logger.exception("数据归档失败")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# 全局归档管理器
+retention_manager = RetentionManager.from_env()
+
+def main():
+    parser = argparse.ArgumentParser(description="按保留策略归档AgentLog/AdResult")
+    parser.add_argument("--dry-run", action="store_true", help="只统计待归档行数")
+    parser.add_argument("--vacuum", action="store_true", help="归档后整理数据库文件")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    from db import init_db
+    init_db()
+    print(retention_manager.run(dry_run=args.dry_run))
+    if args.vacuum and not args.dry_run:
+        retention_manager.vacuum()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+AdResult预汇总：按活动×小时、活动×天两个粒度增量刷新汇总表。
+
+刷新是写事务，只在写路径（效果数据导入、规则评估、归档、刷新接口）与后台定时刷新（rollup_refresher）中执行，
+读接口只读汇总表。并发刷新通过锁定水位行串行化，避免重复累加同一ID区间。
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import func, delete, text
+from sqlmodel import Session, select
+from models import AdResult, AdResultHourly, AdResultDaily, RollupWatermark
+from response_cache import response_cache, DASHBOARD_TAG
+
+load_dotenv()
+
+logger = logging.getLogger("rollups")
+
+ROLLUP_TABLES = {
+    "hourly": AdResultHourly,
+    "daily": AdResultDaily,
+}
+
+_BUCKET_FORMATS = {
+    "hourly": ("%Y-%m-%d %H:00:00", "hour"),
+    "daily": ("%Y-%m-%d 00:00:00", "day"),
+}
+
+def _bucket_expr(session: Session, grain: str):
+    """按数据库方言生成时间分桶表达式"""
+    sqlite_format, pg_unit = _BUCKET_FORMATS[grain]
+    if session.get_bind().dialect.name == "sqlite":
+        return func.strftime(sqlite_format, AdResult.created_at)
+    return func.date_trunc(pg_unit, AdResult.created_at)
+
+def _insert(session: Session):
+    if session.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
+
+def _upsert(session: Session, model, rows: list):
+    """把增量汇总累加进汇总表（活动+时间桶冲突时做加法）"""
+    stmt = _insert(session)(model).values(rows)
+    excluded = stmt.excluded
+    table = model.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["campaign_id", "bucket"],
+        set_={
+            col: table.c[col] + excluded[col]
+            for col in ("impressions", "clicks", "conversions", "cost", "rows")
+        },
+    )
+    session.execute(stmt)
+
+def lock_watermarks(session: Session, names: List[str]) -> Dict[str, RollupWatermark]:
+    """
+    锁定并返回水位行，持有到事务提交；其他刷新者在此等待，读到的总是上一次刷新提交后的水位。
+    SQLite以写语句开启事务即取得库级写锁（等待上限为busy_timeout），其他数据库对水位行SELECT ... FOR UPDATE。
+    须在事务开始时调用：SQLite事务中先读后写时，若期间有其他写入提交会直接报错而不是等待
+    """
+    now = datetime.utcnow()
+    session.execute(
+        _insert(session)(RollupWatermark)
+        .values([{"name": name, "last_result_id": 0, "refreshed_at": now} for name in names])
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    marks = session.exec(
+        select(RollupWatermark)
+        .where(RollupWatermark.name.in_(names))
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    ).all()
+    return {mark.name: mark for mark in marks}
+
+def _committed_max_id(session: Session) -> int:
+    """
+    可安全汇总到的最大ID。PostgreSQL的序列号在插入时分配、提交顺序不保证与ID顺序一致，
+    直接取max(id)会让尚未提交的较小ID落到水位之下被永久跳过；以SHARE模式锁表等待进行中的写入事务结束
+    （期间新的写入等待本次刷新提交）。SQLite写入本身串行，ID按提交顺序分配
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text(f"LOCK TABLE {AdResult.__tablename__} IN SHARE MODE"))
+    return session.exec(select(func.max(AdResult.id))).one() or 0
+
+def _fold(session: Session, grain: str, low_id: int, high_id: int, chunk: int = 500) -> Tuple[int, int]:
+    """把ID区间(low_id, high_id]内的效果数据汇总进指定粒度的汇总表，返回(写入的桶数, 汇总的行数)"""
+    bucket = _bucket_expr(session, grain).label("bucket")
+    deltas = session.exec(
+        select(
+            AdResult.campaign_id,
+            bucket,
+            func.sum(AdResult.impressions),
+            func.sum(AdResult.clicks),
+            func.sum(AdResult.conversions),
+            func.sum(AdResult.cost),
+            func.count(AdResult.id),
+        )
+        .where(AdResult.id > low_id, AdResult.id <= high_id)
+        .group_by(AdResult.campaign_id, bucket)
+    ).all()
+    rows = []
+    for campaign_id, bucket_start, impressions, clicks, conversions, cost, count in deltas:
+        if isinstance(bucket_start, str):
+            bucket_start = datetime.fromisoformat(bucket_start)
+        rows.append({
+            "campaign_id": campaign_id,
+            "bucket": bucket_start,
+            "impressions": impressions or 0,
+            "clicks": clicks or 0,
+            "conversions": conversions or 0,
+            "cost": cost or 0.0,
+            "rows": count,
+        })
+    for i in range(0, len(rows), chunk):
+        _upsert(session, ROLLUP_TABLES[grain], rows[i:i + chunk])
+    return len(rows), sum(r["rows"] for r in rows)
+
+def refresh_rollups(session: Session) -> dict:
+    """
+    增量刷新：只汇总上次水位之后新写入的AdResult。
+    水位使用自增ID而不是created_at，迟到的历史数据也能被正确累加到对应时间桶。
+    会提交当前事务；须在事务开始时调用（见lock_watermarks）。汇总了新数据时使仪表盘缓存失效
+    """
+    marks = lock_watermarks(session, list(ROLLUP_TABLES))
+    high_id = _committed_max_id(session)
+    summary = {}
+    for grain in ROLLUP_TABLES:
+        mark = marks[grain]
+        low_id = mark.last_result_id
+        if high_id <= low_id:
+            summary[grain] = {"buckets": 0, "results": 0}
+            continue
+        buckets, results = _fold(session, grain, low_id, high_id)
+        mark.last_result_id = high_id
+        mark.refreshed_at = datetime.utcnow()
+        session.add(mark)
+        summary[grain] = {"buckets": buckets, "results": results}
+    session.commit()
+    if any(item["results"] for item in summary.values()):
+        # 无论由哪条写路径或后台定时任务触发，汇总了新数据后仪表盘缓存都须失效
+        response_cache.invalidate(DASHBOARD_TAG)
+    return summary
+
+def rebuild_rollups(session: Session) -> dict:
+    """清空汇总表与水位，从原始数据完整重建（已冷归档的效果数据不在在线库中，重建后将不再计入汇总）"""
+    marks = lock_watermarks(session, list(ROLLUP_TABLES))
+    for model in ROLLUP_TABLES.values():
+        session.execute(delete(model))
+    for mark in marks.values():
+        mark.last_result_id = 0
+        session.add(mark)
+    session.flush()
+    return refresh_rollups(session)
+
+def campaign_series(session: Session, campaign_id: int, grain: str, since: datetime) -> list:
+    """读取单个活动的汇总时间序列"""
+    model = ROLLUP_TABLES[grain]
+    rows = session.exec(
+        select(model)
+        .where(model.campaign_id == campaign_id, model.bucket >= since)
+        .order_by(model.bucket.asc())
+    ).all()
+    return [
+        {
+            "bucket": r.bucket,
+            "impressions": r.impressions,
+            "clicks": r.clicks,
+            "conversions": r.conversions,
+            "cost": r.cost,
+        }
+        for r in rows
+    ]
+
+class RollupRefresher:
+    def __init__(self, engine=None, interval: float = 0):
+        """interval: 后台定时刷新间隔（秒），<=0时只在写路径与刷新接口中刷新"""
+        self.engine = engine
+        self.interval = interval
+        self.last_result: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _engine(self):
+        if self.engine is None:
+            from db import engine
+            return engine
+        return self.engine
+
+    def run(self) -> dict:
+        """刷新汇总表与基于天级汇总的预算预测参数"""
+        from forecast import refresh_forecast_params
+
+        with Session(self._engine()) as session:
+            result = {"rollups": refresh_rollups(session), "forecast": refresh_forecast_params(session)}
+        self.last_result = {**result, "finished_at": datetime.utcnow()}
+        return result
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run)
+            except Exception:
+                logger.exception("刷新效果汇总表失败")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+rollup_refresher = RollupRefresher(interval=float(os.getenv("ROLLUP_REFRESH_INTERVAL", "30")))
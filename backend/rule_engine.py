@@ -0,0 +1,339 @@
+"""
+规则引擎：一次性读取全部运行中活动与窗口内的小时汇总数据，用NumPy向量化计算指标并匹配规则，
+命中的活动批量生成AI建议；安全规则（auto_execute）直接执行并写入执行记录。
+
+命令行用法（在backend目录下）:
+    python rule_engine.py [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import case, func, insert, update
+from sqlmodel import Session, select
+
+from events import campaign_topic, event_broker
+from models import AdCampaign, AdResultHourly, AIAdvice, AIExecution, AutomationRule, RuleTrigger
+from response_cache import response_cache, campaign_tag, DASHBOARD_TAG
+from rollups import refresh_rollups
+
+logger = logging.getLogger("rule_engine")
+
+OPERATORS = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal}
+
+METRIC_LABELS = {
+    "impressions": "展示", "clicks": "点击", "conversions": "转化", "cost": "花费",
+    "ctr": "CTR(%)", "cvr": "转化率(%)", "cpa": "CPA", "cpc": "CPC",
+}
+
+# SQLite单条语句的参数上限为32766，批量UPDATE按该大小分段
+ID_CHUNK = 10000
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray, scale: float = 1.0) -> np.ndarray:
+    """分母为0时：分子也为0记为NaN（不参与比较），否则记为无穷大（如花费了但没有转化的CPA）"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return numerator / denominator * scale
+
+class CampaignSnapshot:
+    """运行中活动的列式快照：ID有序数组 + 各统计窗口的指标数组"""
+
+    def __init__(self, session: Session, now: datetime, windows=(24,)):
+        # 只读取标量列，直接走Core连接执行，省去ORM逐行组装结果的开销
+        conn = session.connection()
+        rows = conn.execute(select(AdCampaign.id, AdCampaign.budget).where(AdCampaign.status == "running")).all()
+        data = _to_array(rows, 2)
+        order = np.argsort(data[:, 0], kind="stable")
+        self.now = now
+        self.ids = data[order, 0].astype(np.int64)
+        self.budgets = data[order, 1]
+        self._windows = self._load(conn, sorted(set(windows)))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def metrics(self, window_hours: int) -> Dict[str, np.ndarray]:
+        return self._windows[window_hours]
+
+    def _load(self, conn, windows: List[int]) -> Dict[int, Dict[str, np.ndarray]]:
+        """
+        一次扫描最大窗口内的小时汇总数据，较小的窗口用条件求和同时算出，
+        避免每个窗口各扫描一遍；SQL只按活动分组，指标派生与规则匹配都在NumPy中完成
+        """
+        if not windows or not len(self.ids):
+            return {w: _derive(np.zeros((4, len(self.ids)))) for w in windows}
+        hour = self.now.replace(minute=0, second=0, microsecond=0)
+        since = {w: hour - timedelta(hours=w - 1) for w in windows}
+        widest = max(windows)
+        columns = []
+        for w in windows:
+            for col in (AdResultHourly.impressions, AdResultHourly.clicks, AdResultHourly.conversions, AdResultHourly.cost):
+                columns.append(func.sum(col) if w == widest else func.sum(case((AdResultHourly.bucket >= since[w], col), else_=0)))
+        rows = conn.execute(
+            select(AdResultHourly.campaign_id, *columns)
+            .where(AdResultHourly.bucket >= since[widest])
+            .group_by(AdResultHourly.campaign_id)
+        ).all()
+        data = _to_array(rows, 1 + 4 * len(windows))
+        totals = np.zeros((4 * len(windows), len(self.ids)))
+        if len(data):
+            campaign_ids = data[:, 0].astype(np.int64)
+            # 汇总结果按活动ID对齐到快照数组，非运行中活动的数据丢弃
+            pos = np.searchsorted(self.ids, campaign_ids).clip(max=len(self.ids) - 1)
+            matched = self.ids[pos] == campaign_ids
+            totals[:, pos[matched]] = data[matched, 1:].T
+        return {w: _derive(totals[4 * i:4 * i + 4]) for i, w in enumerate(windows)}
+
+def _to_array(rows: list, width: int) -> np.ndarray:
+    # 先转成普通元组再交给NumPy，直接转换Row对象要慢一个数量级
+    return np.array([tuple(row) for row in rows], dtype=np.float64).reshape(-1, width)
+
+def _derive(totals: np.ndarray) -> Dict[str, np.ndarray]:
+    impressions, clicks, conversions, cost = totals
+    return {
+        "impressions": impressions,
+        "clicks": clicks,
+        "conversions": conversions,
+        "cost": cost,
+        "ctr": _ratio(clicks, impressions, 100),
+        "cvr": _ratio(conversions, clicks, 100),
+        "cpa": _ratio(cost, conversions),
+        "cpc": _ratio(cost, clicks),
+    }
+
+def _cooling(session: Session, rule: AutomationRule, ids: np.ndarray, now: datetime) -> np.ndarray:
+    """冷却期内已触发过该规则的活动"""
+    recent = session.exec(
+        select(RuleTrigger.campaign_id).distinct()
+        .where(RuleTrigger.rule_id == rule.id, RuleTrigger.created_at >= now - timedelta(hours=rule.cooldown_hours))
+    ).all()
+    return np.isin(ids, np.array(recent, dtype=np.int64))
+
+def evaluate(session: Session, snapshot: CampaignSnapshot, rules: List[AutomationRule]) -> list:
+    """
+    按优先级依次匹配规则，返回[(规则, 命中活动在快照中的下标, 指标值)]。
+    每条规则只是几次数组运算，与活动数量线性相关且不随活动数增加查询次数。
+    """
+    taken = np.zeros(len(snapshot), dtype=bool)
+    matches = []
+    for rule in sorted(rules, key=lambda r: (r.priority, r.id)):
+        metrics = snapshot.metrics(rule.window_hours)
+        values = metrics[rule.metric]
+        with np.errstate(invalid="ignore"):
+            mask = OPERATORS[rule.operator](values, rule.threshold)
+        mask &= metrics["impressions"] >= rule.min_impressions
+        mask &= ~taken
+        if mask.any():
+            mask &= ~_cooling(session, rule, snapshot.ids, snapshot.now)
+        taken |= mask
+        index = np.nonzero(mask)[0]
+        if len(index):
+            matches.append((rule, index, values[index]))
+    return matches
+
+def describe_action(action: str, action_value: float) -> str:
+    if action == "pause":
+        return "暂停投放"
+    if action == "budget_increase":
+        return f"预算提高{action_value:g}%"
+    return f"预算降低{action_value:g}%"
+
+def _budget_factor(action: str, action_value: float) -> float:
+    return 1 + action_value / 100 if action == "budget_increase" else 1 - action_value / 100
+
+def _apply_action(session: Session, action: str, action_value: float, campaign_ids: list) -> set:
+    """
+    对一组活动批量执行同一动作：每段ID一条UPDATE，返回实际调整的活动ID。
+    只调整仍在投放中的活动：评估或审批之后被人工暂停、结束的活动不会被改预算或重新改状态
+    """
+    applied = set()
+    for start in range(0, len(campaign_ids), ID_CHUNK):
+        chunk = campaign_ids[start:start + ID_CHUNK]
+        stmt = update(AdCampaign).where(AdCampaign.id.in_(chunk), AdCampaign.status == "running")
+        if action == "pause":
+            stmt = stmt.values(status="paused")
+        else:
+            stmt = stmt.values(budget=AdCampaign.budget * _budget_factor(action, action_value))
+        applied.update(session.execute(stmt.returning(AdCampaign.id)).scalars().all())
+    return applied
+
+def record_matches(session: Session, snapshot: CampaignSnapshot, matches: list) -> dict:
+    """把命中结果批量写入AI建议与规则命中记录，安全规则直接执行；整体一个事务"""
+    now = snapshot.now
+    summary = {"advices": 0, "executed": 0, "by_rule": {}}
+    published = []
+    for rule, index, values in matches:
+        campaign_ids = snapshot.ids[index].tolist()
+        label = METRIC_LABELS[rule.metric]
+        action_text = describe_action(rule.action, rule.action_value)
+        status = "executed" if rule.auto_execute else "pending"
+        value_list = [float(v) if np.isfinite(v) else None for v in values]
+        advice_rows = [
+            {
+                "campaign_id": campaign_id,
+                "type": f"rule:{rule.name}",
+                "content": f"规则「{rule.name}」命中：近{rule.window_hours}小时{label}为"
+                           f"{'无穷大' if value is None else f'{value:.2f}'}（{rule.operator} {rule.threshold:g}），建议{action_text}",
+                "status": status,
+                "created_at": now,
+                "executed_at": now if rule.auto_execute else None,
+                "approved_by": "rule_engine" if rule.auto_execute else None,
+            }
+            for campaign_id, value in zip(campaign_ids, value_list)
+        ]
+        advice_ids = session.execute(
+            insert(AIAdvice).returning(AIAdvice.id, sort_by_parameter_order=True), advice_rows
+        ).scalars().all()
+        session.execute(insert(RuleTrigger), [
+            {
+                "rule_id": rule.id,
+                "campaign_id": campaign_id,
+                "advice_id": advice_id,
+                "action": rule.action,
+                "action_value": rule.action_value,
+                "metric": rule.metric,
+                "value": value,
+                "threshold": rule.threshold,
+                "created_at": now,
+            }
+            for campaign_id, advice_id, value in zip(campaign_ids, advice_ids, value_list)
+        ])
+        if rule.auto_execute:
+            applied = _apply_action(session, rule.action, rule.action_value, campaign_ids)
+            executed = [advice_id for campaign_id, advice_id in zip(campaign_ids, advice_ids) if campaign_id in applied]
+            if len(executed) < len(advice_ids):
+                # 评估之后活动已不在投放中：不再自动执行，转为待审批
+                skipped = [advice_id for campaign_id, advice_id in zip(campaign_ids, advice_ids) if campaign_id not in applied]
+                for start in range(0, len(skipped), ID_CHUNK):
+                    session.execute(
+                        update(AIAdvice).where(AIAdvice.id.in_(skipped[start:start + ID_CHUNK]))
+                        .values(status="pending", executed_at=None, approved_by=None)
+                    )
+                for row, campaign_id in zip(advice_rows, campaign_ids):
+                    if campaign_id not in applied:
+                        row.update(status="pending", executed_at=None, approved_by=None)
+            if executed:
+                session.execute(insert(AIExecution), [
+                    {"advice_id": advice_id, "result": f"规则引擎自动执行: {action_text}", "executed_at": now}
+                    for advice_id in executed
+                ])
+            summary["executed"] += len(executed)
+        summary["advices"] += len(advice_ids)
+        summary["by_rule"][rule.name] = {"matched": len(campaign_ids), "auto_executed": rule.auto_execute}
+        published.extend(
+            (campaign_topic(row["campaign_id"]), "advice", {**row, "id": advice_id})
+            for row, advice_id in zip(advice_rows, advice_ids)
+        )
+    session.commit()
+    if published:
+        try:
+            event_broker.publish_many(published)
+        except Exception:
+            logger.exception("推送规则建议事件失败")
+        response_cache.invalidate(*{campaign_tag(item[2]["campaign_id"]) for item in published}, DASHBOARD_TAG)
+    return summary
+
+def run_rules(session: Session, dry_run: bool = False, now: Optional[datetime] = None) -> dict:
+    """刷新汇总表后评估全部启用的规则；dry_run时只返回命中情况，不写入"""
+    now = now or datetime.utcnow()
+    refresh_rollups(session)
+    started = time.perf_counter()
+    rules = session.exec(select(AutomationRule).where(AutomationRule.enabled == True)).all()  # noqa: E712
+    snapshot = CampaignSnapshot(session, now, [rule.window_hours for rule in rules])
+    loaded = time.perf_counter()
+    matches = evaluate(session, snapshot, rules) if rules and len(snapshot) else []
+    evaluated = time.perf_counter()
+    result = {
+        "campaigns": len(snapshot),
+        "rules": len(rules),
+        "matched": sum(len(index) for _, index, _ in matches),
+        "dry_run": dry_run,
+        "load_ms": round((loaded - started) * 1000, 1),
+        "evaluate_ms": round((evaluated - loaded) * 1000, 1),
+    }
+    if dry_run:
+        result["matches"] = {
+            rule.name: snapshot.ids[index][:100].tolist() for rule, index, _ in matches
+        }
+    else:
+        result.update(record_matches(session, snapshot, matches))
+        result["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+def is_rule_advice(session: Session, advice_id: int) -> bool:
+    """建议是否由规则生成（执行时会按命中记录调整活动）"""
+    return session.exec(select(RuleTrigger.id).where(RuleTrigger.advice_id == advice_id)).first() is not None
+
+def apply_advice_action(session: Session, advice_id: int) -> Optional[str]:
+    """
+    手动执行由规则生成的已审批建议时，按命中记录调整活动；不是规则建议时返回None。
+    活动已不在投放中时抛出ValueError，由调用方回滚整个执行事务
+    """
+    trigger = session.exec(select(RuleTrigger).where(RuleTrigger.advice_id == advice_id)).first()
+    if trigger is None:
+        return None
+    if not _apply_action(session, trigger.action, trigger.action_value, [trigger.campaign_id]):
+        raise ValueError("活动已不在投放中，规则动作未执行")
+    return describe_action(trigger.action, trigger.action_value)
+
+class RuleEngine:
+    def __init__(self, engine=None, interval: float = 0):
+        """interval: 后台定时评估间隔（秒），<=0时只能通过接口或命令行触发"""
+        self.engine = engine
+        self.interval = interval
+        self.last_result: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _engine(self):
+        if self.engine is None:
+            from db import engine
+            return engine
+        return self.engine
+
+    def run(self, dry_run: bool = False) -> dict:
+        with Session(self._engine()) as session:
+            result = run_rules(session, dry_run=dry_run)
+        if not dry_run:
+            self.last_result = {**result, "finished_at": datetime.utcnow()}
+        return result
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run)
+            except Exception:
+                logger.exception("规则评估失败")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+rule_engine = RuleEngine(interval=float(os.getenv("RULES_EVAL_INTERVAL", "0")))
+
+def main():
+    parser = argparse.ArgumentParser(description="评估自动化规则")
+    parser.add_argument("--dry-run", action="store_true", help="只输出命中情况，不写入建议")
+    args = parser.parse_args()
+    from db import init_db
+    init_db()
+    print(rule_engine.run(dry_run=args.dry_run))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlmodel import select
+from models import AutomationRule, AutomationRuleCreate, AutomationRuleUpdate
+from db import get_async_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from fastapi.concurrency import run_in_threadpool
+from rule_engine import rule_engine
+from typing import List
+
+router = APIRouter(prefix="/api/rules", tags=["Rules"])
+
+async def _check_name(session: AsyncSession, name: str, rule_id: int = None):
+    existing = (await session.exec(select(AutomationRule).where(AutomationRule.name == name))).first()
+    if existing and existing.id != rule_id:
+        raise HTTPException(status_code=400, detail="规则名称已存在")
+
+# 查询全部规则（按优先级）
+@router.get("/", response_model=List[AutomationRule])
+async def list_rules(session: AsyncSession = Depends(get_async_session)):
+    return (await session.exec(select(AutomationRule).order_by(AutomationRule.priority, AutomationRule.id))).all()
+
+# 新建规则
+@router.post("/", response_model=AutomationRule)
+async def create_rule(rule_create: AutomationRuleCreate, session: AsyncSession = Depends(get_async_session)):
+    await _check_name(session, rule_create.name)
+    rule = AutomationRule(**rule_create.dict(exclude_none=True))
+    session.add(rule)
+    await session.commit()
+    await session.refresh(rule)
+    return rule
+
+# 修改规则
+@router.put("/{rule_id}", response_model=AutomationRule)
+async def update_rule(rule_id: int, rule_update: AutomationRuleUpdate, session: AsyncSession = Depends(get_async_session)):
+    rule = await session.get(AutomationRule, rule_id)
+    if not rule:
+        raise HTTPException(status_code=404, detail="规则不存在")
+    update_data = rule_update.dict(exclude_unset=True, exclude_none=True)
+    if "name" in update_data:
+        await _check_name(session, update_data["name"], rule_id)
+    for key, value in update_data.items():
+        setattr(rule, key, value)
+    session.add(rule)
+    await session.commit()
+    await session.refresh(rule)
+    return rule
+
+# 删除规则（保留历史命中记录，改为停用）
+@router.delete("/{rule_id}", response_model=AutomationRule)
+async def disable_rule(rule_id: int, session: AsyncSession = Depends(get_async_session)):
+    rule = await session.get(AutomationRule, rule_id)
+    if not rule:
+        raise HTTPException(status_code=404, detail="规则不存在")
+    rule.enabled = False
+    session.add(rule)
+    await session.commit()
+    await session.refresh(rule)
+    return rule
+
+# 立即评估全部启用的规则
+@router.post("/evaluate")
+async def evaluate_rules(dry_run: bool = Query(False, description="只返回命中情况，不生成建议")):
+    return await run_in_threadpool(rule_engine.run, dry_run)
+
+# 最近一次评估结果
+@router.get("/last-run")
+async def last_rule_run():
+    return {"lastRun": rule_engine.last_result}
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from db import get_async_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Any, List, Optional
+from pagination import NEXT_CURSOR_HEADER, encode_rank_cursor, decode_rank_cursor
+from search_index import DOC_TYPES, search, index_stats, rebuild
+
+router = APIRouter(prefix="/api/search", tags=["Search"])
+
+# 全文搜索广告活动、AI建议与行业快讯（按相关度排序，游标分页）
+@router.get("")
+async def search_documents(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200, description="关键词，空格分隔的多个词须全部命中"),
+    types: Optional[List[str]] = Query(None, description="campaign/advice/brief，可重复，默认全部"),
+    campaign_id: Optional[int] = Query(None, description="只搜索该活动及其AI建议"),
+    limit: int = Query(20, ge=1, le=100, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页响应头X-Next-Cursor"),
+    session: AsyncSession = Depends(get_async_session)
+) -> Any:
+    unknown = sorted(set(types or []) - set(DOC_TYPES))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"不支持的搜索类型: {', '.join(unknown)}")
+    after = decode_rank_cursor(cursor) if cursor else None
+    try:
+        results, last = await session.run_sync(search, q, types, campaign_id, after, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if last:
+        response.headers[NEXT_CURSOR_HEADER] = encode_rank_cursor(*last)
+    return {"results": results}
+
+# 各类型的索引文档数
+@router.get("/stats")
+async def search_index_stats(session: AsyncSession = Depends(get_async_session)) -> Any:
+    return await session.run_sync(index_stats)
+
+# 清空后按源表重建索引（调整分词规则后执行）
+@router.post("/rebuild")
+async def rebuild_search_index(session: AsyncSession = Depends(get_async_session)) -> Any:
+    return {"documents": await session.run_sync(rebuild)}
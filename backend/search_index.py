@@ -0,0 +1,340 @@
+"""
+全文搜索索引：广告活动（名称/产品/目标）、AI建议内容、行业快讯内容写入同一个SQLite FTS5表。
+
+中文没有空格分词，这里在写入与查询时统一用cjk_tokens把文本切成词元：连续的中日韩字符切成重叠的二元组，
+并补上末字的单字词元（保证每个字都是某个词元的开头，单字查询可用前缀匹配）；其他字母数字按单词切分并转小写。
+多字查询转换为二元组的短语查询，等价于子串匹配。
+
+增量维护分两步：源表上的触发器只用纯SQL把变更文档的rowid记入searchqueue（任何连接写入都可用，不依赖自定义函数）；
+本应用的连接在提交事务前把队列中的文档按源表当前内容重新切词写入索引（见register_index_hooks），与源表写入同一事务生效。
+不经过本应用的连接（如sqlite3命令行、恢复工具）写入的变更留在队列中，在本应用下一次写事务提交时补上。
+rowid = 类型编号 << 40 | 源表ID，每种类型占一段连续的rowid，
+按类型筛选与“取最新的N条命中”都是FTS5可直接利用的rowid范围条件；查询结果再回源表取字段。
+bm25打分需要逐条计算，高频词可能命中数十万条，因此每种类型只对最新的SEARCH_MAX_CANDIDATES条命中打分排序。
+PostgreSQL未建索引，search退化为ILIKE匹配，按ID排序。
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, event, or_, text
+from sqlmodel import Session, select
+from dotenv import load_dotenv
+
+from models import AdCampaign, AIAdvice, IndustryBrief
+
+load_dotenv()
+
+INDEX_TABLE = "searchindex"
+
+# 每种类型参与相关度排序的最新命中数，0表示不限制
+MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "5000"))
+
+TYPE_SHIFT = 1 << 40
+
+# 类型名 -> (rowid中的类型编号, 源表名, 标题SQL表达式, 正文SQL表达式)
+DOC_TYPES = {
+    "campaign": (1, "adcampaign", "{row}.name", "{row}.product || ' ' || {row}.objective"),
+    "advice": (2, "aiadvice", "{row}.type", "{row}.content"),
+    "brief": (3, "industrybrief", "''", "{row}.content"),
+}
+TYPE_BY_CODE = {code: name for name, (code, *_rest) in DOC_TYPES.items()}
+
+def doc_rowid(name: str, row_id: int) -> int:
+    return DOC_TYPES[name][0] * TYPE_SHIFT + row_id
+
+# 标题命中的权重高于正文
+RANK = "bm25(2.0, 1.0)"
+
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN_RE = re.compile(f"([{_CJK}]+)|([^\\W{_CJK}]+)")
+
+def _segments(value: Optional[str]):
+    """依次产出(是否中日韩字符, 片段)"""
+    for cjk, word in _TOKEN_RE.findall(value or ""):
+        if cjk:
+            yield True, cjk
+        else:
+            yield False, word.lower()
+
+def cjk_tokens(value: Optional[str]) -> str:
+    """写入索引用的词元串（空格分隔）"""
+    tokens = []
+    for is_cjk, segment in _segments(value):
+        if is_cjk:
+            tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+            tokens.append(segment[-1])
+        else:
+            tokens.append(segment)
+    return " ".join(tokens)
+
+def match_query(query: str) -> Optional[str]:
+    """
+    把用户输入转换为FTS5查询：空格分隔的各个词须全部命中；中文多字词为二元组短语（子串匹配），
+    单字与英文/数字按前缀匹配。没有可用词元时返回None
+    """
+    terms = []
+    for is_cjk, segment in _segments(query):
+        if is_cjk and len(segment) > 1:
+            terms.append('"' + " ".join(segment[i:i + 2] for i in range(len(segment) - 1)) + '"')
+        else:
+            terms.append(f'"{segment}"*')
+    return " AND ".join(terms) or None
+
+def query_terms(query: str) -> List[str]:
+    """ILIKE回退与摘要高亮用的原始词"""
+    return [segment for _, segment in _segments(query)]
+
+QUEUE_TABLE = "searchqueue"
+# 每次从队列取出并重建索引的文档数
+APPLY_CHUNK = 5000
+
+def _ddl() -> List[str]:
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+        "title, body, tokenize='unicode61 remove_diacritics 2')",
+        f"INSERT INTO {INDEX_TABLE}({INDEX_TABLE}, rank) VALUES ('rank', '{RANK}')",
+        f"CREATE TABLE IF NOT EXISTS {QUEUE_TABLE} (doc INTEGER PRIMARY KEY)",
+    ]
+    for name, (code, table, title, body) in DOC_TYPES.items():
+        columns = ", ".join(sorted({column for column in re.findall(r"\{row\}\.(\w+)", title + body)} | {"id"}))
+        enqueue = f"INSERT OR IGNORE INTO {QUEUE_TABLE}(doc) VALUES ({code * TYPE_SHIFT} + {{row}}.id);"
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} "
+            f"BEGIN {enqueue.format(row='NEW')} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} "
+            f"BEGIN {enqueue.format(row='OLD')} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {columns} ON {table} "
+            f"BEGIN {enqueue.format(row='OLD')} {enqueue.format(row='NEW')} END",
+        ]
+    return statements
+
+def _installed(conn) -> bool:
+    """队列表存在即已执行迁移；结果缓存在DBAPI连接上，迁移前的连接每次写事务提交时重新检查"""
+    if conn.info.get("search_index_installed"):
+        return True
+    found = conn.exec_driver_sql(
+        f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{QUEUE_TABLE}'"
+    ).first() is not None
+    conn.info["search_index_installed"] = found
+    return found
+
+def _index_documents(conn, name: str, ids: List[int]):
+    """按源表当前内容写入索引；源表中已不存在的ID（已删除）不写入"""
+    code, table, title, body = DOC_TYPES[name]
+    placeholders = ", ".join("?" * len(ids))
+    rows = conn.exec_driver_sql(
+        f"SELECT id, {title.format(row=table)}, {body.format(row=table)} FROM {table} WHERE id IN ({placeholders})",
+        tuple(ids),
+    ).all()
+    if rows:
+        conn.exec_driver_sql(
+            f"INSERT INTO {INDEX_TABLE}(rowid, title, body) VALUES (?, ?, ?)",
+            [(code * TYPE_SHIFT + row_id, cjk_tokens(t), cjk_tokens(b)) for row_id, t, b in rows],
+        )
+
+def apply_pending(conn) -> int:
+    """把队列中的文档按源表当前内容重新写入索引（先删旧条目），返回处理的文档数"""
+    total = 0
+    while True:
+        docs = [row[0] for row in conn.exec_driver_sql(
+            f"SELECT doc FROM {QUEUE_TABLE} ORDER BY doc LIMIT {APPLY_CHUNK}"
+        )]
+        if not docs:
+            return total
+        placeholders = ", ".join("?" * len(docs))
+        conn.exec_driver_sql(f"DELETE FROM {INDEX_TABLE} WHERE rowid IN ({placeholders})", tuple(docs))
+        ids: Dict[str, List[int]] = {}
+        for doc in docs:
+            ids.setdefault(TYPE_BY_CODE[doc // TYPE_SHIFT], []).append(doc % TYPE_SHIFT)
+        for name, type_ids in ids.items():
+            _index_documents(conn, name, type_ids)
+        conn.exec_driver_sql(f"DELETE FROM {QUEUE_TABLE} WHERE doc IN ({placeholders})", tuple(docs))
+        total += len(docs)
+
+_WRITES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+def register_index_hooks(sync_engine):
+    """
+    在SQLite引擎上登记提交前同步索引：连接执行过写语句时，提交前处理队列，
+    使索引与源表的变更在同一事务中生效（只读事务不产生额外查询）
+    """
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _mark_write(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:7].upper().startswith(_WRITES):
+            conn.info["search_index_pending"] = True
+
+    @event.listens_for(sync_engine, "commit")
+    def _apply_before_commit(conn):
+        if conn.info.pop("search_index_pending", False) and _installed(conn):
+            apply_pending(conn)
+            conn.info.pop("search_index_pending", None)
+
+    @event.listens_for(sync_engine, "rollback")
+    def _discard(conn):
+        conn.info.pop("search_index_pending", None)
+
+def _backfill(conn):
+    for name, (code, table, _title, _body) in DOC_TYPES.items():
+        conn.exec_driver_sql(f"INSERT OR IGNORE INTO {QUEUE_TABLE}(doc) SELECT {code * TYPE_SHIFT} + id FROM {table}")
+    apply_pending(conn)
+
+def install(conn):
+    """迁移：建索引表、变更队列与触发器，并为已有数据建立索引（仅SQLite）"""
+    if conn.dialect.name != "sqlite":
+        return
+    for statement in _ddl():
+        conn.exec_driver_sql(statement)
+    _backfill(conn)
+
+def replace_function_triggers(conn):
+    """
+    迁移：早期版本的触发器在SQL中调用自定义函数cjk_tokens，不经过本应用的连接写源表会失败。
+    删除这些触发器与无原文的索引表，改为队列触发器并重建索引；已是新结构时不做任何事
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    legacy = conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND sql LIKE '%cjk_tokens%'"
+    ).scalars().all()
+    if not legacy:
+        return
+    for name in legacy:
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {INDEX_TABLE}")
+    install(conn)
+
+def rebuild(session: Session) -> int:
+    """清空后按源表重建索引（词元规则调整后执行），返回索引文档数"""
+    if session.get_bind().dialect.name != "sqlite":
+        return 0
+    conn = session.connection()
+    conn.exec_driver_sql(f"DELETE FROM {INDEX_TABLE}")
+    _backfill(conn)
+    conn.exec_driver_sql(f"INSERT INTO {INDEX_TABLE}({INDEX_TABLE}) VALUES ('optimize')")
+    documents = conn.exec_driver_sql(f"SELECT count(*) FROM {INDEX_TABLE}").scalar()
+    session.commit()
+    return documents
+
+def _ranked(session: Session, match: str, types: List[str], campaign_id: Optional[int],
+            after: Optional[Tuple[float, int]], limit: int) -> List[Tuple[int, float]]:
+    """
+    FTS5按相关度排序（rank越小越相关，同分按rowid），返回[(rowid, rank)]。
+    每种类型在自己的rowid范围内按rowid倒序取最新的MAX_CANDIDATES条命中再打分，合并后排序
+    """
+    params = {"match": match, "limit": limit}
+    parts = []
+    for name in types:
+        code = DOC_TYPES[name][0]
+        conditions = [f"{INDEX_TABLE} MATCH :match", f"rowid > {code * TYPE_SHIFT}", f"rowid < {(code + 1) * TYPE_SHIFT}"]
+        if campaign_id is not None:
+            if name == "brief":
+                continue
+            if name == "campaign":
+                conditions.append("rowid = :campaign_rowid")
+            else:
+                conditions.append(f"rowid IN (SELECT {code * TYPE_SHIFT} + id FROM aiadvice WHERE campaign_id = :campaign_id)")
+        candidates = f" LIMIT {MAX_CANDIDATES}" if MAX_CANDIDATES > 0 else ""
+        parts.append(
+            f"SELECT * FROM (SELECT rowid, rank FROM {INDEX_TABLE} WHERE {' AND '.join(conditions)} ORDER BY rowid DESC{candidates})"
+        )
+    if not parts:
+        return []
+    if campaign_id is not None:
+        params.update(campaign_rowid=doc_rowid("campaign", campaign_id), campaign_id=campaign_id)
+    where = ""
+    if after is not None:
+        where = " WHERE rank > :after_rank OR (rank = :after_rank AND rowid > :after_rowid)"
+        params.update(after_rank=after[0], after_rowid=after[1])
+    sql = f"SELECT rowid, rank FROM ({' UNION ALL '.join(parts)}){where} ORDER BY rank, rowid LIMIT :limit"
+    return [(row[0], row[1]) for row in session.connection().execute(text(sql), params)]
+
+def _fallback(session: Session, query: str, types: List[str], campaign_id: Optional[int],
+              after: Optional[Tuple[float, int]], limit: int) -> List[Tuple[int, float]]:
+    """非SQLite数据库：各类型分别ILIKE匹配全部关键词，按rowid合并排序"""
+    terms = query_terms(query)
+    columns = {
+        "campaign": (AdCampaign, [AdCampaign.name, AdCampaign.product, AdCampaign.objective]),
+        "advice": (AIAdvice, [AIAdvice.type, AIAdvice.content]),
+        "brief": (IndustryBrief, [IndustryBrief.content]),
+    }
+    rowids = []
+    for name in types:
+        model, fields = columns[name]
+        stmt = select(model.id).where(and_(*[or_(*[field.ilike(f"%{term}%") for field in fields]) for term in terms]))
+        if campaign_id is not None:
+            if name == "brief":
+                continue
+            stmt = stmt.where((AdCampaign.id if name == "campaign" else AIAdvice.campaign_id) == campaign_id)
+        if after is not None:
+            stmt = stmt.where(model.id > after[1] - DOC_TYPES[name][0] * TYPE_SHIFT)
+        rowids += [doc_rowid(name, row_id) for row_id in session.exec(stmt.order_by(model.id).limit(limit)).all()]
+    return [(rowid, 0.0) for rowid in sorted(rowids)[:limit]]
+
+def _snippet(value: str, terms: List[str], width: int = 80) -> str:
+    """截取第一个命中词附近的文本"""
+    lowered = value.lower()
+    positions = [lowered.find(term) for term in terms if term and lowered.find(term) >= 0]
+    start = max(min(positions) - width // 4, 0) if positions else 0
+    snippet = value[start:start + width]
+    return ("…" if start else "") + snippet + ("…" if start + width < len(value) else "")
+
+def _load(session: Session, rowids: List[int], terms: List[str]) -> Dict[int, dict]:
+    """按类型批量回源表取字段"""
+    ids: Dict[str, List[int]] = {}
+    for rowid in rowids:
+        ids.setdefault(TYPE_BY_CODE[rowid // TYPE_SHIFT], []).append(rowid % TYPE_SHIFT)
+    docs = {}
+    if ids.get("campaign"):
+        for c in session.exec(select(AdCampaign).where(AdCampaign.id.in_(ids["campaign"]))).all():
+            docs[doc_rowid("campaign", c.id)] = {
+                "type": "campaign", "id": c.id, "campaignId": c.id, "title": c.name,
+                "snippet": _snippet(f"{c.product} · {c.objective}", terms), "status": c.status, "createdAt": c.created_at,
+            }
+    if ids.get("advice"):
+        for a in session.exec(select(AIAdvice).where(AIAdvice.id.in_(ids["advice"]))).all():
+            docs[doc_rowid("advice", a.id)] = {
+                "type": "advice", "id": a.id, "campaignId": a.campaign_id, "title": a.type,
+                "snippet": _snippet(a.content, terms), "status": a.status, "createdAt": a.created_at,
+            }
+    if ids.get("brief"):
+        for b in session.exec(select(IndustryBrief).where(IndustryBrief.id.in_(ids["brief"]))).all():
+            docs[doc_rowid("brief", b.id)] = {
+                "type": "brief", "id": b.id, "campaignId": None, "title": b.date.strftime("%Y-%m-%d"),
+                "snippet": _snippet(b.content, terms), "status": None, "createdAt": b.date,
+            }
+    return docs
+
+def search(session: Session, query: str, types: List[str] = None, campaign_id: Optional[int] = None,
+           after: Optional[Tuple[float, int]] = None, limit: int = 20) -> Tuple[List[dict], Optional[Tuple[float, int]]]:
+    """
+    按相关度搜索，返回(本页结果, 下一页位置)；位置为最后一条的(rank, rowid)，用于游标分页。
+    query中没有可检索的字符时抛出ValueError
+    """
+    types = types or list(DOC_TYPES)
+    match = match_query(query)
+    if match is None:
+        raise ValueError("搜索关键词不能为空")
+    if session.get_bind().dialect.name == "sqlite":
+        ranked = _ranked(session, match, types, campaign_id, after, limit + 1)
+    else:
+        ranked = _fallback(session, query, types, campaign_id, after, limit + 1)
+    page, more = ranked[:limit], len(ranked) > limit
+    docs = _load(session, [rowid for rowid, _ in page], query_terms(query))
+    results = []
+    for rowid, rank in page:
+        doc = docs.get(rowid)
+        if doc is not None:
+            results.append({**doc, "score": round(-rank, 4)})
+    return results, ((page[-1][1], page[-1][0]) if more else None)
+
+def index_stats(session: Session) -> dict:
+    """各类型的索引文档数"""
+    if session.get_bind().dialect.name != "sqlite":
+        return {"enabled": False}
+    rows = session.connection().exec_driver_sql(
+        f"SELECT rowid / {TYPE_SHIFT}, count(*) FROM {INDEX_TABLE} GROUP BY rowid / {TYPE_SHIFT}"
+    ).all()
+    counts = {TYPE_BY_CODE[code]: count for code, count in rows}
+    return {"enabled": True, **{name: counts.get(name, 0) for name in DOC_TYPES}}
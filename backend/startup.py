@@ -1,7 +1,38 @@
 from fastapi import FastAPI
-from db import init_db
+from db import init_db, async_engine
+from agent_core import ads_agent
+from news import news_fetcher
+from job_queue import job_queue
+from events import event_broker
+from rule_engine import rule_engine
+from retention import retention_manager
+from rollups import rollup_refresher
 
 def register_startup(app: FastAPI):
     @app.on_event("startup")
-    def on_startup():
-        init_db() 
\ No newline at end of file
+    async def on_startup():
+        init_db()
+        # 后台定时抓取行业新闻
+        news_fetcher.start()
+        # 启动后台任务worker池
+        job_queue.start()
+        # 多worker部署时轮询事件表，把其他进程发布的事件分发给本进程的SSE订阅者
+        event_broker.start()
+        # 按RULES_EVAL_INTERVAL定时评估自动化规则（默认关闭）
+        rule_engine.start()
+        # 按RETENTION_INTERVAL定时归档超出热数据窗口的日志与效果数据（默认关闭）
+        retention_manager.start()
+        # 按ROLLUP_REFRESH_INTERVAL定时刷新效果汇总表与预算预测参数，读接口只读汇总结果
+        rollup_refresher.start()
+
+    @app.on_event("shutdown")
+    async def on_shutdown():
+        await news_fetcher.stop()
+        await job_queue.stop()
+        await event_broker.stop()
+        await rule_engine.stop()
+        await retention_manager.stop()
+        await rollup_refresher.stop()
+        await async_engine.dispose()
+        # 关闭大模型客户端的共享连接池
+        await ads_agent.llm.aclose()
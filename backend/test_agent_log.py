@@ -0,0 +1,69 @@
+"""Agent日志缓冲写入：有无orjson序列化结果一致、步骤之间等待较久时按max_age定时落库、运行结束时全部落库"""
+
+import json
+import time
+from datetime import date, datetime
+
+import pytest
+from sqlmodel import Session, select
+
+from agent_log import AgentLogWriter, _json_dumps, dumps
+from benchmarks.seed import seed_campaigns
+from models import AgentLog, AgentRun
+
+SAMPLE = {
+    "action": "increase_budget",
+    "new_keywords": ["春季新品", "时尚潮流"],
+    "ratio": 0.3,
+    "ok": True,
+    "missing": None,
+    "nested": {"z": 1, "a": [1, 2.5, "¥18.8"]},
+    1: "整数键",
+    "at": datetime(2026, 1, 2, 3, 4, 5, 678900),
+    "day": date(2026, 1, 2),
+}
+
+def test_json_fallback_matches_orjson():
+    orjson = pytest.importorskip("orjson")
+    assert dumps is not _json_dumps
+    assert _json_dumps(SAMPLE) == dumps(SAMPLE) == orjson.dumps(SAMPLE, option=orjson.OPT_NON_STR_KEYS).decode()
+    assert json.loads(_json_dumps(SAMPLE))["at"] == "2026-01-02T03:04:05.678900"
+
+def _logs(engine) -> list:
+    with Session(engine) as session:
+        return [log.step for log in session.exec(select(AgentLog).order_by(AgentLog.id)).all()]
+
+def test_buffered_steps_flush_on_timer_between_steps(engine):
+    campaign_id = seed_campaigns(engine, 1)[0]
+    with Session(engine) as session:
+        with AgentLogWriter(session, campaign_id, max_buffer=50, max_age=0.1, run_kind="optimize") as writer:
+            writer.log("start", "开始广告活动优化")
+            writer.log("analysis", "分析广告活动表现数据")
+            assert _logs(engine) == []
+            # 模拟等待大模型：期间没有新步骤，缓存日志也按max_age落库
+            deadline = time.monotonic() + 5
+            while not _logs(engine) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert _logs(engine) == ["start", "analysis"]
+            assert writer.flushes == 1
+            writer.log("complete", "广告活动优化完成")
+    assert _logs(engine) == ["start", "analysis", "complete"]
+    with Session(engine) as session:
+        run = session.exec(select(AgentRun)).one()
+    assert (run.status, run.step_count) == ("completed", 3)
+    assert [item["type"] for item in json.loads(run.flow)] == ["start", "analysis", "complete"]
+
+def test_run_end_flushes_without_waiting_for_timer(engine):
+    campaign_id = seed_campaigns(engine, 1)[0]
+    with Session(engine) as session:
+        with pytest.raises(RuntimeError):
+            with AgentLogWriter(session, campaign_id, max_buffer=50, max_age=60, run_kind="optimize") as writer:
+                writer.log("start", "开始广告活动优化", {"at": datetime(2026, 1, 2)})
+                raise RuntimeError("中途失败")
+        assert writer._timer is None
+    assert _logs(engine) == ["start"]
+    with Session(engine) as session:
+        run = session.exec(select(AgentRun)).one()
+        log = session.exec(select(AgentLog)).one()
+    assert run.status == "error" and run.finished_at is not None
+    assert json.loads(log.data) == {"at": "2026-01-02T00:00:00"}
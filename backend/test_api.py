@@ -9,7 +9,7 @@ from sqlmodel import Session, select
 
 # 导入我们的模块
 from models import AdCampaign, AdResult, AgentLog
-from db import get_session, init_db
+from db import engine, init_db
 from agent_core import ads_agent
 
 def test_database():
@@ -21,7 +21,7 @@ def test_database():
         print("✅ 数据库初始化成功")
         
         # 测试会话
-        session = get_session()
+        session = Session(engine)
         print("✅ 数据库会话创建成功")
         
         # 测试查询
@@ -76,7 +76,7 @@ def test_agent():
     """测试Agent功能"""
     print("\n=== 测试Agent功能 ===")
     try:
-        session = get_session()
+        session = Session(engine)
         
         # 创建测试广告活动
         campaign = AdCampaign(
@@ -117,7 +117,7 @@ def test_api_endpoints():
     """测试API端点（模拟）"""
     print("\n=== 测试API端点 ===")
     try:
-        session = get_session()
+        session = Session(engine)
         
         # 模拟API调用
         # 1. 获取广告活动列表
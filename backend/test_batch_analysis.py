@@ -0,0 +1,83 @@
+"""批量分析：经任务队列执行、单个活动分析或写入失败不影响同批其他活动"""
+
+import asyncio
+import json
+
+from sqlmodel import Session, select
+
+import agent_core
+import batch_analysis
+from batch_analysis import create_job, job_progress, run_job
+from benchmarks.seed import seed_campaigns
+from job_queue import job_queue
+from models import AIAdvice, Job
+
+class _FakeLLM:
+    providers = ["fake"]
+
+    def __init__(self):
+        self.closed = []
+
+    async def aclose(self, current_only: bool = False):
+        self.closed.append(current_only)
+
+class _FakeAgent:
+    def __init__(self, fail_ids=()):
+        self.llm = _FakeLLM()
+        self.fail_ids = set(fail_ids)
+
+    async def analyze_campaign(self, campaign, info_list, use_cache=True, metrics=None):
+        if campaign.id in self.fail_ids:
+            raise RuntimeError("模型超时")
+        return f"活动{campaign.id}：保持当前投放节奏"
+
+def test_batch_endpoint_runs_through_job_queue(engine, client, monkeypatch):
+    ids = seed_campaigns(engine, 4)
+    agent = _FakeAgent(fail_ids=[ids[1]])
+    monkeypatch.setattr(agent_core, "ads_agent", agent)
+    monkeypatch.setattr(job_queue, "_engine", engine)
+
+    resp = client.post("/api/ai/batch-analyze", json={"campaign_ids": ids})
+    assert resp.status_code == 200, resp.text
+    data = resp.json()
+    assert (data["total"], data["status"]) == (4, "pending")
+
+    assert job_queue.run_one()
+    with Session(engine) as session:
+        queued = session.get(Job, data["queue_job_id"])
+    assert queued.status == "succeeded"
+    assert json.loads(queued.result) == {"status": "completed", "succeeded": 3, "failed": 1, "total": 4}
+    # worker线程上的事件循环结束前只关闭本循环的连接池
+    assert agent.llm.closed == [True]
+
+    progress = client.get(f"/api/ai/batch-analyze/{data['job_id']}").json()
+    failed = [item for item in progress["items"] if item["status"] == "failed"]
+    assert [(item["campaign_id"], item["error"]) for item in failed] == [(ids[1], "模型超时")]
+    assert client.post("/api/ai/batch-analyze", json={}).status_code == 400
+
+def test_item_write_failure_does_not_fail_the_job(engine, monkeypatch):
+    ids = seed_campaigns(engine, 5)
+    finish = batch_analysis._finish_item
+
+    def _flaky_finish(engine, item_id, campaign_id, suggestion, error):
+        if campaign_id == ids[2] and suggestion is not None:
+            raise RuntimeError("写入冲突")
+        if campaign_id == ids[3]:
+            raise RuntimeError("数据库不可用")
+        return finish(engine, item_id, campaign_id, suggestion, error)
+
+    monkeypatch.setattr(batch_analysis, "_finish_item", _flaky_finish)
+    with Session(engine) as session:
+        job = create_job(session, campaign_ids=ids)
+    asyncio.run(run_job(job.id, agent=_FakeAgent(), engine=engine))
+
+    with Session(engine) as session:
+        progress = job_progress(session, job.id)
+        advices = session.exec(select(AIAdvice.campaign_id)).all()
+    statuses = {item["campaign_id"]: (item["status"], item["error"]) for item in progress["items"]}
+    assert progress["status"] == "completed"
+    assert statuses[ids[2]] == ("failed", "保存结果失败: 写入冲突")
+    # 连失败结果都写不进去的活动保留为pending，任务重试时重新分析
+    assert statuses[ids[3]] == ("pending", None)
+    assert sorted(advices) == sorted([ids[0], ids[1], ids[4]])
+    assert (progress["succeeded"], progress["failed"], progress["pending"]) == (3, 1, 1)
@@ -0,0 +1,63 @@
+"""批量活动接口：逐条校验、不合法或不存在的条目不影响其他条目，atomic时整批不写入，写入后缓存失效"""
+
+from sqlmodel import Session, select
+
+import campaigns
+from benchmarks.seed import seed_campaigns
+from models import AdCampaign
+
+def _campaigns(engine) -> dict:
+    with Session(engine) as session:
+        return {c.id: c for c in session.exec(select(AdCampaign)).all()}
+
+def test_bulk_create_keeps_valid_items_unless_atomic(engine, client):
+    items = [
+        {"name": "春季新品", "product": "运动鞋", "objective": "拉新", "budget": 1000},
+        {"name": " ", "product": "耳机", "objective": "拉新", "budget": 1000},
+        {"name": "夏季清仓", "product": "T恤", "objective": "转化优化", "budget": 500},
+    ]
+    atomic = client.post("/api/campaigns/bulk/create", json={"items": items, "atomic": True}).json()
+    assert (atomic["succeeded"], atomic["failed"]) == (0, 3)
+    assert atomic["results"][0]["error"] == "存在不合法条目，整批未写入"
+    assert _campaigns(engine) == {}
+
+    data = client.post("/api/campaigns/bulk/create", json={"items": items}).json()
+    assert (data["succeeded"], data["failed"]) == (2, 1)
+    assert data["results"][1]["ok"] is False and "字段不能为空" in data["results"][1]["error"]
+    created = _campaigns(engine)
+    assert sorted(c.name for c in created.values()) == ["夏季清仓", "春季新品"]
+    assert {data["results"][0]["id"], data["results"][2]["id"]} == set(created)
+
+def test_bulk_update_and_status_skip_missing_campaigns(engine, client):
+    ids = seed_campaigns(engine, 3)
+    before = client.get(f"/api/campaigns/{ids[0]}")
+    etag = before.headers["ETag"]
+
+    data = client.post("/api/campaigns/bulk/update", json={"items": [
+        {"id": ids[0], "budget": 8888},
+        {"id": 999, "budget": 1},
+        {"id": ids[1], "budget": -5},
+        {"budget": 1},
+    ]}).json()
+    assert [r["ok"] for r in data["results"]] == [True, False, False, False]
+    assert data["results"][1]["error"] == "Campaign not found"
+    assert data["results"][3]["error"] == "缺少活动id"
+
+    data = client.post("/api/campaigns/bulk/status", json={"items": [
+        {"id": ids[0], "status": "running"},
+        {"id": ids[1], "status": "paused"},
+        {"id": ids[0], "status": "paused"},
+        {"id": 999, "status": "paused"},
+    ]}).json()
+    assert (data["succeeded"], data["failed"]) == (3, 1)
+    campaigns = _campaigns(engine)
+    # 同一活动出现多次时以最后一条为准
+    assert (campaigns[ids[0]].budget, campaigns[ids[0]].status) == (8888, "paused")
+    assert campaigns[ids[1]].status == "paused"
+    after = client.get(f"/api/campaigns/{ids[0]}", headers={"If-None-Match": etag})
+    assert after.status_code == 200 and after.json()["status"] == "paused"
+
+def test_bulk_request_size_is_capped(client, monkeypatch):
+    monkeypatch.setattr(campaigns, "MAX_BULK_ITEMS", 2)
+    resp = client.post("/api/campaigns/bulk/status", json={"items": [{"id": i, "status": "paused"} for i in range(3)]})
+    assert resp.status_code == 400 and resp.json()["detail"] == "单次最多提交2条"
@@ -0,0 +1,73 @@
+"""仪表盘总览：活动按状态聚合、今日与昨日同时段的效果对比"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlmodel import Session
+
+import dashboard
+from models import AdCampaign, AdResult
+from rollups import refresh_rollups
+
+# 北京时间 2026-03-10 14:30，今日零点为 2026-03-09 16:00 UTC
+NOW = datetime(2026, 3, 10, 6, 30)
+
+def _seed(engine):
+    today = dashboard._day_start(NOW)
+    with Session(engine) as session:
+        session.execute(insert(AdCampaign), [
+            {"name": f"活动{i}", "product": "新品", "objective": "拉新", "budget": budget, "status": status, "created_at": created_at}
+            for i, (status, budget, created_at) in enumerate([
+                ("running", 1000.0, today - timedelta(days=3)),
+                ("running", 2000.0, today + timedelta(hours=2)),
+                ("paused", 500.0, today - timedelta(days=1)),
+                ("completed", 300.0, today - timedelta(days=9)),
+            ])
+        ])
+        results = [
+            (datetime(2026, 3, 10, 5, 10), 1000, 50, 5, 10.0),   # 今日
+            (datetime(2026, 3, 9, 17, 0), 1000, 30, 3, 5.0),     # 今日凌晨1点
+            (datetime(2026, 3, 9, 5, 0), 1000, 20, 1, 4.0),      # 昨日13点
+            (datetime(2026, 3, 9, 6, 10), 1000, 20, 1, 2.0),     # 昨日与当前同一小时
+            (datetime(2026, 3, 9, 8, 0), 1000, 99, 9, 100.0),    # 昨日16点，晚于对比时段
+            (datetime(2026, 3, 8, 15, 0), 1000, 99, 9, 1000.0),  # 前日
+        ]
+        session.execute(insert(AdResult), [
+            {"campaign_id": 1, "impressions": imp, "clicks": clk, "conversions": conv, "cost": cost, "created_at": ts}
+            for ts, imp, clk, conv, cost in results
+        ])
+        session.commit()
+        refresh_rollups(session)
+
+def test_day_start_uses_configured_offset():
+    assert dashboard._day_start(NOW) == datetime(2026, 3, 9, 16, 0)
+    assert dashboard._day_start(datetime(2026, 3, 9, 15, 59)) == datetime(2026, 3, 8, 16, 0)
+
+def test_campaign_stats_group_by_status(engine):
+    _seed(engine)
+    with Session(engine) as session:
+        stats = dashboard._campaign_stats(session, dashboard._day_start(NOW))
+    assert stats["total"] == 4 and stats["budget"] == 3800.0
+    assert stats["by_status"]["running"] == {"count": 2, "budget": 3000.0, "created_today": 1}
+    assert stats["by_status"]["paused"]["count"] == 1
+
+def test_cards_compare_today_with_same_span_yesterday(engine):
+    _seed(engine)
+    today = dashboard._day_start(NOW)
+    with Session(engine) as session:
+        campaigns = dashboard._campaign_stats(session, today)
+        metrics = dashboard._period_metrics(session, NOW, today)
+    assert metrics["current"] == {"impressions": 2000, "clicks": 80, "conversions": 8, "cost": 15.0}
+    assert metrics["previous"] == {"impressions": 2000, "clicks": 40, "conversions": 2, "cost": 6.0}
+
+    cards = {card["title"]: card for card in dashboard.build_overview_stats(campaigns, metrics)}
+    assert (cards["活跃广告活动"]["value"], cards["活跃广告活动"]["change"]) == ("2", "+1")
+    assert (cards["今日花费"]["value"], cards["今日花费"]["change"]) == ("¥15.00", "+150.0%")
+    assert (cards["点击率(CTR)"]["value"], cards["点击率(CTR)"]["change"]) == ("4.0%", "+2.0%")
+    assert cards["转化率"]["trend"] == "up"
+
+def test_overview_endpoint_returns_status_summary(engine, client):
+    _seed(engine)
+    data = client.get("/api/dashboard/overview").json()
+    assert data["campaigns"]["byStatus"]["running"] == {"count": 2, "budget": 3000.0}
+    assert len(data["stats"]) == 4 and len(data["recentCampaigns"]) == 3
@@ -0,0 +1,69 @@
+"""数据库连接：同步连接串到异步驱动的映射、异步会话依赖的生命周期、同步与异步引擎互相可见写入"""
+
+import asyncio
+
+import pytest
+from sqlmodel import Session, select
+
+import db
+from benchmarks.seed import seed_campaigns
+from db import async_url, create_async_db_engine, get_async_session
+from models import AdCampaign
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+@pytest.mark.parametrize("url, expected", [
+    ("sqlite:///./ads_agent.db", "sqlite+aiosqlite:///./ads_agent.db"),
+    ("sqlite://", "sqlite+aiosqlite://"),
+    ("postgresql://user:p%40ss@db:5432/ads", "postgresql+asyncpg://user:p%40ss@db:5432/ads"),
+    ("postgresql+psycopg2://user:pass@db/ads?sslmode=require", "postgresql+asyncpg://user:pass@db/ads?sslmode=require"),
+    ("postgres://user:pass@db/ads", "postgresql+asyncpg://user:pass@db/ads"),
+    # 已是异步驱动或未知驱动时原样返回
+    ("postgresql+asyncpg://user:pass@db/ads", "postgresql+asyncpg://user:pass@db/ads"),
+    ("mysql+aiomysql://user:pass@db/ads", "mysql+aiomysql://user:pass@db/ads"),
+])
+def test_async_url_maps_sync_drivers(url, expected):
+    assert async_url(url) == expected
+
+def _async_engine(engine):
+    return create_async_db_engine(async_url(engine.url.render_as_string(hide_password=False)))
+
+def test_get_async_session_lifecycle(engine, monkeypatch):
+    async_engine = _async_engine(engine)
+    monkeypatch.setattr(db, "async_engine", async_engine)
+
+    async def _run():
+        dependency = get_async_session()
+        session = await dependency.__anext__()
+        assert isinstance(session, AsyncSession)
+        campaign = AdCampaign(name="异步写入", product="耳机", objective="拉新", budget=100.0)
+        session.add(campaign)
+        await session.commit()
+        # expire_on_commit=False：提交后读取属性不会在异步上下文中触发隐式加载
+        assert (campaign.id, campaign.name) == (1, "异步写入")
+        assert async_engine.pool.checkedout() == 0
+        assert (await session.exec(select(AdCampaign.name))).all() == ["异步写入"]
+        assert async_engine.pool.checkedout() == 1
+        # 请求结束时FastAPI关闭依赖生成器：会话关闭并归还连接
+        await dependency.aclose()
+        assert async_engine.pool.checkedout() == 0
+        await async_engine.dispose()
+
+    asyncio.run(_run())
+    with Session(engine) as session:
+        assert session.exec(select(AdCampaign.name)).all() == ["异步写入"]
+
+def test_sync_and_async_engines_see_each_others_writes(engine):
+    seed_campaigns(engine, 3)
+    async_engine = _async_engine(engine)
+
+    async def _run():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            names = (await session.exec(select(AdCampaign.name).order_by(AdCampaign.id))).all()
+            session.add(AdCampaign(name="异步新增", product="耳机", objective="拉新", budget=1.0))
+            await session.commit()
+        await async_engine.dispose()
+        return names
+
+    assert asyncio.run(_run()) == ["活动0", "活动1", "活动2"]
+    with Session(engine) as session:
+        assert session.exec(select(AdCampaign.name).order_by(AdCampaign.id.desc())).first() == "异步新增"
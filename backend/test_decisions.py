@@ -0,0 +1,64 @@
+"""决策链路：运行的flow文档随步骤写入逐批追加，/decisions默认输出最近一次运行，内容与按日志逐条构建的一致"""
+
+import json
+from datetime import datetime, timedelta
+
+from sqlmodel import Session
+
+from agent_log import AgentLogWriter, append_flow
+from benchmarks.seed import seed_campaigns
+
+def test_append_flow():
+    assert append_flow("[]", []) == "[]"
+    flow = append_flow("[]", ['{"id":1}'])
+    flow = append_flow(flow, ['{"id":2}', '{"id":3}'])
+    assert json.loads(flow) == [{"id": 1}, {"id": 2}, {"id": 3}]
+
+def _decisions(client, campaign_id: int, **params) -> dict:
+    resp = client.get(f"/api/campaigns/{campaign_id}/decisions", params=params)
+    assert resp.status_code == 200
+    return resp.json()
+
+def test_latest_run_flow_follows_appended_steps(engine, client):
+    campaign_id = seed_campaigns(engine, 1)[0]
+    with Session(engine) as session:
+        with AgentLogWriter(session, campaign_id, max_buffer=50, run_kind="optimize") as writer:
+            writer.log("start", "开始广告活动优化")
+            writer.log("analysis", "分析广告活动表现数据", {"ctr": "3.2%"})
+            writer.flush()
+            first = _decisions(client, campaign_id)
+            assert (first["status"], [s["type"] for s in first["decisionFlow"]]) == ("running", ["start", "analysis"])
+
+            # 新步骤落库后缓存的响应失效，flow追加而不是重写
+            writer.log("decision", "制定优化策略", {"action": "increase_budget"}, {"budget_increase": "30%"})
+            writer.flush()
+            second = _decisions(client, campaign_id)
+            assert second["decisionFlow"][:2] == first["decisionFlow"]
+            assert [s["id"] for s in second["decisionFlow"]] == [1, 2, 3]
+            writer.log("complete", "广告活动优化完成")
+        first_run = writer.run_id
+
+    done = _decisions(client, campaign_id)
+    assert done["runId"] == first_run and done["status"] == "completed"
+    flow = done["decisionFlow"]
+    assert [s["type"] for s in flow] == ["start", "analysis", "decision", "complete"]
+    assert flow[2]["input"] == {"action": "increase_budget"} and flow[2]["output"] == {"budget_increase": "30%"}
+
+    # 按时间范围查询时从日志逐条构建，结果与预先生成的flow一致
+    window = {
+        "created_from": (datetime.utcnow() - timedelta(hours=1)).isoformat(),
+        "created_to": (datetime.utcnow() + timedelta(hours=1)).isoformat(),
+    }
+    assert _decisions(client, campaign_id, **window)["decisionFlow"] == flow
+
+    # 新的一次运行成为默认输出，之前的运行仍可按run_id查询
+    with Session(engine) as session:
+        with AgentLogWriter(session, campaign_id, run_kind="optimize") as writer:
+            writer.log("start", "开始广告活动优化")
+            writer.log("error", "优化失败: 超时")
+    latest = _decisions(client, campaign_id)
+    assert latest["runId"] == writer.run_id != first_run
+    assert latest["status"] == "error"
+    assert [s["status"] for s in latest["decisionFlow"]] == ["completed", "error"]
+    assert _decisions(client, campaign_id, run_id=first_run)["decisionFlow"] == flow
+    assert client.get(f"/api/campaigns/{campaign_id}/decisions", params={"run_id": 9999}).status_code == 404
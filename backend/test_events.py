@@ -0,0 +1,82 @@
+"""实时事件：SSE先订阅再回放且按ID去重、缓冲淘汰后推送reset、事件表广播跨进程送达、事件表模式只支持SQLite"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from events import RESET_MESSAGE, DatabaseEventBroker, MemoryEventBroker, sse_stream
+
+async def _collect(stream, count: int) -> list:
+    """读取count条事件消息（跳过retry与心跳）"""
+    messages = []
+    async for message in stream:
+        if message.startswith(("retry:", ":")):
+            continue
+        messages.append(message)
+        if len(messages) == count:
+            break
+    await stream.aclose()
+    return messages
+
+def _ids(messages: list) -> list:
+    return [int(m.split("\n")[0][len("id: "):]) for m in messages if m.startswith("id: ")]
+
+def test_sse_replays_after_last_event_id_then_streams_live():
+    async def _run():
+        broker = MemoryEventBroker(buffer_size=10)
+        for i in range(5):
+            broker.publish("campaign:1", "agent_log", {"step": i})
+        broker.publish("campaign:2", "agent_log", {"step": "其他活动"})
+        stream = sse_stream(broker, "campaign:1", last_event_id=2, heartbeat=0.05)
+        first = await stream.__anext__()
+        assert first.startswith("retry:")
+        # 回放期间已订阅：之后发布的事件不会丢，与回放重叠的部分按ID去重
+        broker.publish("campaign:1", "advice", {"id": 9})
+        messages = await _collect(stream, 4)
+        assert _ids(messages) == [3, 4, 5, 7]
+        assert 'event: advice\ndata: {"id": 9}' in messages[-1]
+        assert broker.subscriber_count() == 0
+
+    asyncio.run(_run())
+
+def test_sse_resets_when_events_were_evicted_or_server_restarted():
+    async def _run():
+        broker = MemoryEventBroker(buffer_size=3)
+        for i in range(6):
+            broker.publish("campaign:1", "agent_log", {"step": i})
+        assert await _collect(sse_stream(broker, "campaign:1", last_event_id=1), 1) == [RESET_MESSAGE]
+        assert await _collect(sse_stream(broker, "campaign:1", last_event_id=99), 1) == [RESET_MESSAGE]
+        assert _ids(await _collect(sse_stream(broker, "campaign:1", last_event_id=4), 2)) == [5, 6]
+
+    asyncio.run(_run())
+
+@pytest.mark.sqlite_only
+def test_database_broker_delivers_events_published_by_other_workers(engine):
+    async def _run():
+        broker = DatabaseEventBroker(engine=engine, poll_interval=0.02)
+        other_worker = DatabaseEventBroker(engine=engine)
+        other_worker.publish("campaign:1", "agent_log", {"step": "启动前"})
+        broker.start()
+        try:
+            stream = sse_stream(broker, "campaign:1", heartbeat=0.05)
+            await stream.__anext__()
+            await asyncio.sleep(0.05)
+            other_worker.publish_many([("campaign:1", "agent_log", {"step": i}) for i in range(3)])
+            messages = await _collect(stream, 3)
+        finally:
+            await broker.stop()
+        # 启动前已有的事件不推送给新订阅者，但可以按Last-Event-ID回放
+        assert _ids(messages) == [2, 3, 4]
+        assert [e.data["step"] for e in broker.replay("campaign:1", 0)] == ["启动前", 0, 1, 2]
+
+    asyncio.run(_run())
+
+def test_database_broker_refuses_to_start_on_other_databases():
+    async def _run():
+        broker = DatabaseEventBroker(engine=SimpleNamespace(dialect=SimpleNamespace(name="postgresql")))
+        with pytest.raises(RuntimeError, match="只支持SQLite"):
+            broker.start()
+        assert broker._task is None
+
+    asyncio.run(_run())
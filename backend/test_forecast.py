@@ -0,0 +1,106 @@
+"""预算预测：增量折算与全量重建的统计量一致、回归恢复已知弹性、预算调整按利用率消化、从建议中识别调整幅度"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+
+from benchmarks.seed import seed_campaigns, seed_results
+from forecast import STAT_FIELDS, WATERMARK, _contributions, advice_budget_change, fit, project, refresh_forecast_params
+from models import AdResult, AIAdvice, ForecastParams, RollupWatermark
+
+def _params(engine) -> dict:
+    with Session(engine) as session:
+        return {p.campaign_id: [getattr(p, f) for f in STAT_FIELDS + ("intercept", "slope")]
+                for p in session.exec(select(ForecastParams)).all()}
+
+def test_incremental_refresh_matches_rebuild(engine):
+    ids = seed_campaigns(engine, 20)
+    seed_results(engine, ids, 3000, days=20)
+    with Session(engine) as session:
+        assert refresh_forecast_params(session)["campaigns"] == 20
+    # 新数据既落在已有的天，也落在新的一天
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        session.execute(insert(AdResult), [
+            {"campaign_id": ids[i % 5], "impressions": 1000, "clicks": 50, "conversions": i % 4, "cost": 40.0 + i,
+             "created_at": now - timedelta(days=i % 3)}
+            for i in range(30)
+        ])
+        session.commit()
+        assert refresh_forecast_params(session)["campaigns"] == 5
+    incremental = _params(engine)
+
+    with Session(engine) as session:
+        session.execute(delete(ForecastParams))
+        session.get(RollupWatermark, WATERMARK).last_result_id = 0
+        session.commit()
+        refresh_forecast_params(session)
+    rebuilt = _params(engine)
+    assert incremental.keys() == rebuilt.keys()
+    for campaign_id in rebuilt:
+        np.testing.assert_allclose(incremental[campaign_id], rebuilt[campaign_id], rtol=1e-9, atol=1e-9)
+
+def test_fit_recovers_known_elasticity():
+    spend = np.array([[50.0, 80, 120, 200, 300, 500]])
+    conversions = np.expm1(0.2 + 0.6 * np.log1p(spend))
+    stats = np.stack([_contributions(s, c).sum(axis=1) for s, c in zip(spend, conversions)], axis=1)
+    intercept, slope = fit(stats)
+    assert slope[0] == pytest.approx(0.6) and intercept[0] == pytest.approx(0.2)
+
+    # 天数不足或花费没有波动时按平均CPA线性外推（slope=1）
+    flat = np.stack([_contributions(np.full(5, 100.0), np.full(5, 4.0)).sum(axis=1),
+                     _contributions(np.array([100.0, 200.0]), np.array([1.0, 9.0])).sum(axis=1)], axis=1)
+    assert fit(flat)[1].tolist() == [1.0, 1.0]
+
+def test_project_absorbs_budget_changes_by_utilization():
+    # 日预算1000、日均花费500（利用率0.5），每花1元转化0.1个
+    stats = np.stack([_contributions(np.full(10, 500.0), np.full(10, 50.0)).sum(axis=1), np.zeros(7)], axis=1)
+    intercept, slope = fit(stats)
+    budget = np.array([1000.0, 1000.0])
+    for change, spend in ((40.0, 700.0), (-60.0, 400.0), (-100.0, 0.0)):
+        result = project(budget, stats, intercept, slope, np.array([change, change]))
+        assert result["projected_spend"][0] == pytest.approx(spend)
+        # 没有历史花费的活动无法预测转化
+        assert np.isnan(result["projected_conversions"][1])
+    assert result["projected_conversions"][0] == 0.0
+
+def test_advice_budget_change_from_rule_or_text(engine):
+    campaign_id = seed_campaigns(engine, 1)[0]
+    texts = {
+        "建议预算提高30%以扩大投放": 30.0,
+        '{"action": "budget_decrease", "budget_decrease": "15%"}': -15.0,
+        "Reduce the budget by 12.5% this week": -12.5,
+        "保持当前投放节奏": None,
+    }
+    with Session(engine) as session:
+        for text, expected in texts.items():
+            advice = AIAdvice(campaign_id=campaign_id, type="analysis", content=text, status="pending")
+            session.add(advice)
+            session.commit()
+            assert advice_budget_change(session, advice) == expected, text
+
+def test_forecast_endpoints(engine, client):
+    ids = seed_campaigns(engine, 3)
+    seed_results(engine, ids, 600, days=14)
+    with Session(engine) as session:
+        refresh_forecast_params(session)
+        advices = [AIAdvice(campaign_id=ids[0], type="analysis", content="预算提高50%", status="pending"),
+                   AIAdvice(campaign_id=ids[1], type="analysis", content="保持不变", status="pending")]
+        session.add_all(advices)
+        session.commit()
+        advice_ids = [a.id for a in advices]
+
+    data = client.get(f"/api/ai/advices/{advice_ids[0]}/forecast", params={"horizon": 7}).json()
+    assert data["budget_change"] == 50.0 and len(data["spend_curve"]) == 7
+    assert data["projected"]["daily_spend"] >= data["current"]["daily_spend"]
+    assert client.get(f"/api/ai/advices/{advice_ids[1]}/forecast").status_code == 400
+
+    batch = client.post("/api/ai/advices/forecast", json={}).json()
+    assert [f["advice_id"] for f in batch["forecasts"]] == [advice_ids[0]] and batch["skipped"] == [advice_ids[1]]
+    simulated = client.post("/api/ai/forecast/simulate", json={"items": [
+        {"campaign_id": ids[2], "budget_change": -100}, {"campaign_id": 999, "budget_change": 10},
+    ]}).json()
+    assert simulated["forecasts"][0]["projected"]["daily_spend"] == 0 and simulated["forecasts"][1] is None
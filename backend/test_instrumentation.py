@@ -0,0 +1,108 @@
+"""运行时指标：Prometheus文本格式、按路由模板统计请求与SQL、N+1检测、慢请求剖析输出折叠栈"""
+
+import time
+
+from sqlalchemy import text
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from benchmarks.seed import seed_campaigns
+from instrumentation import (
+    CONTENT_TYPE, HTTP_REQUESTS, N_PLUS_ONE, PROFILES_DUMPED, REQUEST_QUERIES,
+    MetricsMiddleware, MetricsRegistry, SlowRequestProfiler,
+)
+
+def _sample(body: str, prefix: str) -> float:
+    """取指标文本中以prefix开头的样本值"""
+    for line in body.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    hits = registry.counter("demo_hits_total", "命中次数", ("path",))
+    latency = registry.histogram("demo_seconds", "耗时", buckets=(0.1, 1.0))
+    hits.inc(path='a"b')
+    hits.inc(2, path='a"b')
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_hits_total counter" in lines
+    assert 'demo_hits_total{path="a\\"b"} 3' in lines
+    # 桶计数按Prometheus约定累计输出
+    assert 'demo_seconds_bucket{le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{le="1"} 2' in lines
+    assert 'demo_seconds_bucket{le="+Inf"} 3' in lines
+    assert "demo_seconds_sum 5.55" in lines and "demo_seconds_count 3" in lines
+
+    try:
+        registry.counter("demo_hits_total", "重复注册")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("重复注册应报错")
+
+def test_metrics_endpoint_labels_by_route_template(engine, client):
+    ids = seed_campaigns(engine, 3)
+    route = "/api/campaigns/{campaign_id}"
+    before = HTTP_REQUESTS.value(method="GET", route=route, status="200")
+    queries_before = REQUEST_QUERIES.count(route=route)
+    for campaign_id in ids:
+        assert client.get(f"/api/campaigns/{campaign_id}").status_code == 200
+
+    resp = client.get("/metrics")
+    assert resp.headers["content-type"] == CONTENT_TYPE
+    prefix = f'http_requests_total{{method="GET",route="{route}",status="200"}}'
+    assert _sample(resp.text, prefix) == before + 3
+    # 路径参数不进入标签
+    assert f'route="/api/campaigns/{ids[0]}"' not in resp.text
+    assert REQUEST_QUERIES.count(route=route) == queries_before + 3
+    assert "db_query_duration_seconds_bucket" in resp.text
+
+def test_repeated_statement_counts_as_n_plus_one(engine):
+    def n_plus_one(request):
+        with engine.connect() as conn:
+            for i in range(5):
+                conn.execute(text("SELECT :i"), {"i": i})
+        return PlainTextResponse("ok")
+
+    def single(request):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return PlainTextResponse("ok")
+
+    app = MetricsMiddleware(Starlette(routes=[Route("/loop", n_plus_one), Route("/single", single)]), n_plus_one_threshold=5)
+    before = N_PLUS_ONE.value(route="n_plus_one"), N_PLUS_ONE.value(route="single")
+    client = TestClient(app)
+    client.get("/loop")
+    client.get("/single")
+    assert N_PLUS_ONE.value(route="n_plus_one") == before[0] + 1
+    assert N_PLUS_ONE.value(route="single") == before[1]
+
+def test_slow_request_profile_is_written(tmp_path):
+    def slow(request):
+        time.sleep(0.1)
+        return PlainTextResponse("ok")
+
+    def fast(request):
+        return PlainTextResponse("ok")
+
+    profiler = SlowRequestProfiler(threshold_ms=50, directory=str(tmp_path), interval=0.002)
+    app = MetricsMiddleware(Starlette(routes=[Route("/slow", slow), Route("/fast", fast)]), profiler=profiler)
+    before = PROFILES_DUMPED.value(route="slow")
+    client = TestClient(app)
+    client.get("/fast")
+    assert list(tmp_path.iterdir()) == []
+    client.get("/slow")
+
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1 and files[0].name.endswith(".folded") and "slow" in files[0].name
+    stacks = files[0].read_text(encoding="utf-8").splitlines()
+    # 每行为“以分号连接的调用栈 采样次数”
+    assert stacks and all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+    assert any("slow (test_instrumentation.py" in line for line in stacks)
+    assert PROFILES_DUMPED.value(route="slow") == before + 1
@@ -0,0 +1,63 @@
+"""任务队列：失败重试直至成功或耗尽次数、回收worker遗留任务且不回收仍在续期的任务"""
+
+import json
+from datetime import datetime, timedelta
+
+from sqlmodel import Session
+
+from job_queue import JobQueue
+from models import Job
+
+def test_job_retries_until_success_then_exhausts(engine):
+    queue = JobQueue(engine=engine, retry_backoff=0)
+    calls = []
+
+    @queue.register("flaky")
+    def _flaky(payload, session, ctx):
+        calls.append(ctx.attempt)
+        if ctx.attempt < payload["succeed_on"]:
+            raise RuntimeError(f"第{ctx.attempt}次失败")
+        return {"attempt": ctx.attempt}
+
+    job = queue.enqueue("flaky", {"succeed_on": 2})
+    assert queue.run_one()
+    retried = queue.get(job.id)
+    assert (retried.status, retried.attempts, retried.error) == ("queued", 1, "第1次失败")
+    assert queue.run_one()
+    done = queue.get(job.id)
+    assert (done.status, done.attempts, json.loads(done.result)) == ("succeeded", 2, {"attempt": 2})
+
+    exhausted = queue.enqueue("flaky", {"succeed_on": 99}, max_attempts=2)
+    while queue.run_one():
+        pass
+    failed = queue.get(exhausted.id)
+    assert (failed.status, failed.attempts) == ("failed", 2)
+    assert calls == [1, 2, 1, 2]
+
+def test_recover_stale_requeues_or_fails_and_heartbeat_protects_running(engine):
+    queue = JobQueue(engine=engine, lock_timeout=60)
+    queue.register("noop")(lambda payload, session, ctx: {})
+    orphan, exhausted, alive = (queue.enqueue("noop", {}, max_attempts=2) for _ in range(3))
+    stale_at = datetime.utcnow() - timedelta(seconds=120)
+    with Session(engine) as session:
+        for job_id, attempts, worker in ((orphan.id, 1, "gone"), (exhausted.id, 2, "gone"), (alive.id, 1, queue.worker_id)):
+            job = session.get(Job, job_id)
+            job.status, job.attempts, job.locked_by, job.locked_at = "running", attempts, worker, stale_at
+            session.add(job)
+        session.commit()
+
+    # 本进程仍在执行的任务先续期，不会被回收
+    queue._running.add(alive.id)
+    queue.maintain()
+
+    requeued = queue.get(orphan.id)
+    assert (requeued.status, requeued.locked_by) == ("queued", None)
+    assert requeued.run_after <= datetime.utcnow()
+    failed = queue.get(exhausted.id)
+    assert failed.status == "failed" and "最大重试次数" in failed.error
+    running = queue.get(alive.id)
+    assert running.status == "running" and running.locked_at > stale_at
+
+    queue._running.clear()
+    assert queue.run_one()
+    assert queue.get(orphan.id).status == "succeeded"
@@ -0,0 +1,78 @@
+"""大模型响应缓存：内容寻址、进程内LRU与持久层两级命中、过期与容量淘汰、客户端命中后不再请求服务商"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from sqlmodel import Session, select
+
+from benchmarks.fake_llm import create_fake_llm_app
+from llm_cache import LLMResponseCache, cache_key
+from llm_client import AsyncLLMClient, LLMProvider
+from models import LLMCacheEntry
+
+def test_key_covers_provider_model_prompt_and_max_tokens():
+    base = cache_key("openai", "gpt", "分析活动", 512)
+    assert base == cache_key("openai", "gpt", "分析活动", 512)
+    assert len({base, cache_key("deepseek", "gpt", "分析活动", 512), cache_key("openai", "gpt-4", "分析活动", 512),
+                cache_key("openai", "gpt", "分析活动 ", 512), cache_key("openai", "gpt", "分析活动", 256)}) == 5
+
+def test_persistent_tier_survives_restart(engine):
+    cache = LLMResponseCache(engine=engine)
+    key = cache_key("openai", "gpt", "prompt", 512)
+    assert cache.get(key) is None
+    cache.set(key, "openai", "gpt", "建议A")
+    assert cache.get(key) == "建议A"
+    assert cache.stats["memory_hits"] == 1
+
+    restarted = LLMResponseCache(engine=engine)
+    assert restarted.get("other", key) == "建议A"
+    assert restarted.stats["persistent_hits"] == 1 and restarted.stats["misses"] == 0
+    # 持久层命中后回填进程内LRU
+    assert restarted.get(key) == "建议A" and restarted.stats["memory_hits"] == 1
+    with Session(engine) as session:
+        assert session.get(LLMCacheEntry, key).hits == 1
+
+def test_expired_entries_are_not_served(engine):
+    cache = LLMResponseCache(engine=engine, ttl=0.05)
+    cache.set("k", "openai", "gpt", "旧建议")
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert LLMResponseCache(engine=engine).get("k") is None
+    with Session(engine) as session:
+        assert session.get(LLMCacheEntry, "k") is None
+
+def test_memory_lru_and_persistent_capacity(engine):
+    cache = LLMResponseCache(engine=engine, memory_size=2, max_entries=3, prune_every=1000)
+    for i in range(5):
+        cache.set(f"k{i}", "openai", "gpt", f"v{i}")
+    assert list(cache._memory) == ["k3", "k4"] and cache.stats["memory_evictions"] == 3
+    with Session(engine) as session:
+        entry = session.get(LLMCacheEntry, "k0")
+        entry.last_used_at = datetime.utcnow() + timedelta(minutes=1)
+        session.add(entry)
+        session.commit()
+    assert cache.prune() == 2
+    with Session(engine) as session:
+        kept = set(session.exec(select(LLMCacheEntry.key)).all())
+    # 按最近使用时间淘汰：刚被使用过的k0保留
+    assert kept == {"k0", "k3", "k4"}
+
+def test_client_serves_repeated_prompt_from_cache(engine):
+    fake = create_fake_llm_app(latency=0)
+    client = AsyncLLMClient([LLMProvider("primary", "http://primary/v1", "fake-model", "key")],
+                            transport=httpx.ASGITransport(app=fake), cache=LLMResponseCache(engine=engine))
+
+    async def _run():
+        try:
+            first = await client.complete("同一个prompt")
+            second = await client.complete("同一个prompt")
+            fresh = await client.complete("同一个prompt", use_cache=False)
+            return first, second, fresh
+        finally:
+            await client.aclose()
+
+    first, second, fresh = asyncio.run(_run())
+    assert first == second == fresh
+    assert fake.state.stats["requests"] == 2
@@ -0,0 +1,116 @@
+"""大模型客户端：并发上限（跨事件循环共享）、故障切换、流式生成被放弃时归还并发名额（本地假服务，完全离线）"""
+
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from benchmarks.fake_llm import create_fake_llm_app
+from llm_client import AsyncLLMClient, ConcurrencyLimiter, LLMError, LLMProvider
+
+class _Router(httpx.AsyncBaseTransport):
+    """按域名把请求分发给不同的假服务"""
+    def __init__(self, apps: dict):
+        self.transports = {host: httpx.ASGITransport(app=app) for host, app in apps.items()}
+
+    async def handle_async_request(self, request):
+        return await self.transports[request.url.host].handle_async_request(request)
+
+def _client(apps: dict, **options) -> AsyncLLMClient:
+    providers = [LLMProvider(host, f"http://{host}/v1", f"{host}-model", "key") for host in apps]
+    return AsyncLLMClient(providers, transport=_Router(apps), backoff_base=0.01, **options)
+
+def test_complete_respects_concurrency_cap():
+    fake = create_fake_llm_app(latency=0.05)
+    client = _client({"primary": fake}, max_concurrency=3)
+
+    async def _run():
+        try:
+            return await asyncio.gather(*[client.complete(f"prompt {i}") for i in range(12)])
+        finally:
+            await client.aclose()
+
+    replies = asyncio.run(_run())
+    assert len(replies) == 12 and all("primary-model" in r for r in replies)
+    assert fake.state.stats["max_in_flight"] == 3
+
+def test_cap_is_shared_across_event_loops():
+    fake = create_fake_llm_app(latency=0.05)
+    client = _client({"primary": fake}, max_concurrency=2)
+    errors = []
+
+    def _worker():
+        async def _run():
+            try:
+                await asyncio.gather(*[client.complete(f"prompt {i}") for i in range(4)])
+            finally:
+                # 只关闭本循环的连接池，不影响其他线程中仍在运行的循环
+                await client.aclose(current_only=True)
+        try:
+            asyncio.run(_run())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert fake.state.stats["requests"] == 12
+    assert fake.state.stats["max_in_flight"] <= 2
+    assert client._clients == {}
+
+def test_failover_to_next_provider():
+    broken = create_fake_llm_app(latency=0, failure_rate=1.0)
+    backup = create_fake_llm_app(latency=0)
+    client = _client({"openai": broken, "deepseek": backup}, max_retries=1)
+
+    async def _run():
+        try:
+            return await client.complete("prompt")
+        finally:
+            await client.aclose()
+
+    assert "deepseek-model" in asyncio.run(_run())
+    assert broken.state.stats["requests"] == 2
+
+def test_all_providers_failing_raises():
+    client = _client({"openai": create_fake_llm_app(latency=0, failure_rate=1.0)}, max_retries=0)
+    with pytest.raises(LLMError):
+        asyncio.run(client.complete("prompt"))
+
+def test_abandoned_stream_releases_slot():
+    fake = create_fake_llm_app(latency=0, reply="一二三四五六七八九十" * 4, chunk_chars=2)
+    client = _client({"primary": fake}, max_concurrency=1)
+
+    async def _run():
+        try:
+            stream = client.stream("prompt")
+            assert await stream.__anext__() == "一二"
+            # 模拟SSE客户端断开：只关闭最外层生成器，名额须立即归还，下一个请求不必等垃圾回收
+            await stream.aclose()
+            return await asyncio.wait_for(client.complete("next"), timeout=2)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(_run())
+    assert client._limiter._free == 1
+
+def test_limiter_cancelled_waiter_does_not_leak_slot():
+    limiter = ConcurrencyLimiter(1)
+
+    async def _run():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+        limiter.release()
+
+    asyncio.run(_run())
+    assert limiter._free == 1
@@ -0,0 +1,74 @@
+"""行业新闻：按URL/标题去重入库、并发刷新写入同一条目时其余条目不丢失、信息源故障隔离、分析只读本地存储"""
+
+from sqlmodel import Session, select
+
+from models import NewsItem
+from news import EMPTY_INFO, NewsFetcher, NewsSource, StaticNewsSource, content_hash
+
+ITEMS = [
+    {"title": "短视频广告预算持续上涨", "summary": "品牌加大投放", "url": "https://example.com/a"},
+    {"title": "搜索广告点击成本下降", "summary": "", "url": "https://example.com/b"},
+    {"title": "  直播电商  新规 ", "summary": "无链接，按标题去重", "url": None},
+]
+
+class _BrokenSource(NewsSource):
+    name = "broken"
+
+    def fetch(self):
+        raise RuntimeError("连接超时")
+
+def _titles(engine) -> list:
+    with Session(engine) as session:
+        return sorted(item.title for item in session.exec(select(NewsItem)).all())
+
+def test_refresh_dedupes_by_url_or_title(engine):
+    fetcher = NewsFetcher(sources=[StaticNewsSource(ITEMS)], engine=engine)
+    assert fetcher.refresh() == {"static": {"fetched": 3, "inserted": 3}}
+    # 同一条目换了标题大小写/空白、或同一URL换了标题，都视为重复
+    fetcher.sources = [StaticNewsSource([
+        {"title": "直播电商 新规", "url": None},
+        {"title": "改写后的标题", "url": "https://example.com/a"},
+        {"title": "程序化购买占比提升", "url": "https://example.com/c"},
+    ])]
+    assert fetcher.refresh() == {"static": {"fetched": 3, "inserted": 1}}
+    assert len(_titles(engine)) == 4
+    assert content_hash({"title": " 直播电商 新规"}) == content_hash({"title": "直播电商   新规"})
+
+def test_concurrent_duplicate_does_not_drop_other_items(engine, monkeypatch):
+    fetcher = NewsFetcher(sources=[], engine=engine)
+    with Session(engine) as session:
+        fetcher._store(session, "other", ITEMS[:1])
+
+    class _StaleResult:
+        def all(self):
+            return []
+
+    with Session(engine) as session:
+        # 模拟去重查询之后、写入之前，另一轮刷新已写入ITEMS[0]
+        original = session.exec
+        monkeypatch.setattr(session, "exec", lambda statement, **kw: _StaleResult())
+        inserted = fetcher._store(session, "static", ITEMS)
+        monkeypatch.setattr(session, "exec", original)
+    assert inserted == 2
+    assert _titles(engine) == sorted(item["title"] for item in ITEMS)
+
+def test_failing_source_does_not_block_others(engine):
+    fetcher = NewsFetcher(sources=[_BrokenSource(), StaticNewsSource(ITEMS)], engine=engine)
+    summary = fetcher.refresh()
+    assert summary["broken"] == {"error": "连接超时"}
+    assert summary["static"]["inserted"] == 3
+    assert fetcher.status["broken"]["last_error"] == "连接超时"
+    assert "last_success_at" in fetcher.status["static"]
+
+def test_latest_reads_local_store_only(engine):
+    fetcher = NewsFetcher(sources=[_BrokenSource()], engine=engine)
+    with Session(engine) as session:
+        assert fetcher.latest(session) == EMPTY_INFO
+    fetcher.sources = [StaticNewsSource(ITEMS[:2])]
+    fetcher.refresh()
+    fetcher.sources = [StaticNewsSource(ITEMS[2:])]
+    fetcher.refresh()
+    with Session(engine) as session:
+        latest = fetcher.latest(session, limit=2)
+    assert latest[0] == {"title": ITEMS[2]["title"], "summary": ITEMS[2]["summary"]}
+    assert len(latest) == 2
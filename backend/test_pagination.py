@@ -0,0 +1,83 @@
+"""游标分页：按(created_at, id)逐页不重不漏，所有游标分页接口的下一页游标统一放在响应头X-Next-Cursor"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from benchmarks.seed import seed_agent_logs, seed_campaigns
+from models import AdCampaign, AgentRun, AIAdvice
+from pagination import NEXT_CURSOR_HEADER
+
+def test_campaign_cursor_pagination_walks_every_row_once(engine, client):
+    seed_campaigns(engine, 47)
+    # 同一创建时间的多行：游标须以(created_at, id)定位，不能跳过或重复
+    same_time = datetime.utcnow() - timedelta(minutes=10, seconds=30)
+    with Session(engine) as session:
+        session.execute(insert(AdCampaign), [
+            {"name": f"并列{i}", "product": "并列", "objective": "拉新", "budget": 1000.0, "status": "running", "created_at": same_time}
+            for i in range(8)
+        ])
+        session.commit()
+        expected = [c.id for c in session.exec(
+            select(AdCampaign).order_by(AdCampaign.created_at.desc(), AdCampaign.id.desc())
+        ).all()]
+        running = [c.id for c in session.exec(
+            select(AdCampaign).where(AdCampaign.status == "running").order_by(AdCampaign.created_at.desc(), AdCampaign.id.desc())
+        ).all()]
+
+    def _walk(params: dict) -> list:
+        seen, cursor = [], None
+        while True:
+            resp = client.get("/api/campaigns/", params={**params, "limit": 7, **({"cursor": cursor} if cursor else {})})
+            assert resp.status_code == 200, resp.text
+            page = [c["id"] for c in resp.json()]
+            assert len(page) <= 7
+            seen.extend(page)
+            cursor = resp.headers.get(NEXT_CURSOR_HEADER)
+            if not cursor:
+                return seen
+
+    assert _walk({}) == expected
+    assert _walk({"status": "running"}) == running
+
+def test_invalid_cursor_is_rejected(client):
+    resp = client.get("/api/campaigns/", params={"cursor": "not-a-cursor"})
+    assert resp.status_code == 400
+
+def _walk(client, path: str, key: str = None, **params) -> list:
+    """按响应头中的游标翻完所有页，返回各页的行ID（或日志消息）"""
+    seen, cursor = [], None
+    while True:
+        resp = client.get(path, params={**params, "limit": 4, **({"cursor": cursor} if cursor else {})})
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        rows = body[key] if key else body
+        assert len(rows) <= 4
+        seen.extend(row.get("id", row.get("message")) for row in rows)
+        assert "nextCursor" not in (body if key else {})
+        cursor = resp.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return seen
+
+def test_every_keyset_endpoint_returns_cursor_in_header(engine, client):
+    ids = seed_campaigns(engine, 2)
+    seed_agent_logs(engine, ids[:1], 10)
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        session.execute(insert(AIAdvice), [
+            {"campaign_id": ids[0], "type": "analysis", "content": f"建议{i}", "status": "pending", "created_at": now - timedelta(minutes=i)}
+            for i in range(9)
+        ])
+        session.execute(insert(AgentRun), [
+            {"campaign_id": ids[0], "kind": "optimize", "status": "completed", "flow": "[]", "step_count": 0,
+             "created_at": now - timedelta(minutes=i), "updated_at": now}
+            for i in range(6)
+        ])
+        session.commit()
+        advices = session.exec(select(AIAdvice.id).order_by(AIAdvice.created_at.desc(), AIAdvice.id.desc())).all()
+        runs = session.exec(select(AgentRun.id).order_by(AgentRun.created_at.desc(), AgentRun.id.desc())).all()
+
+    assert _walk(client, "/api/ai/advices") == advices
+    assert _walk(client, f"/api/campaigns/{ids[0]}/runs", "runs") == runs
+    assert len(_walk(client, f"/api/campaigns/{ids[0]}/logs", "agentLogs")) == 10
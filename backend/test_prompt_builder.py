@@ -0,0 +1,89 @@
+"""prompt预算：行业信息按相关度排序去重、在token预算内截断，近期指标按当前/上一周期分别汇总"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlmodel import Session
+
+from benchmarks.seed import seed_campaigns
+from models import AdResultDaily
+from prompt_builder import PromptBuilder, estimate_tokens, format_metrics, rank_info, recent_metrics, truncate_to_tokens
+
+CAMPAIGN = SimpleNamespace(id=1, name="春季跑鞋推广", product="跑鞋", objective="提升转化", budget=1000.0)
+
+TOPICS = ["家电", "美妆", "零食", "家居", "数码", "宠物", "母婴", "图书", "汽车", "旅游", "茶饮", "珠宝"]
+
+def _info(n: int) -> list:
+    # 各条摘要词项互不相同，避免被当作重复条目去掉
+    return [{"title": f"行业动态{i}", "summary": f"{TOPICS[i % len(TOPICS)]}品类第{i}周{TOPICS[(i * 5 + 1) % len(TOPICS)]}渠道投放资讯" * 3}
+            for i in range(n)]
+
+def test_estimate_and_truncate():
+    assert estimate_tokens("") == 0
+    # 汉字各1个，英文单词每4个字母1个，数字每3位1个
+    assert estimate_tokens("跑鞋") == 2
+    assert estimate_tokens("marketing 123456") == 3 + 2
+    text = "广告投放建议" * 50
+    cut = truncate_to_tokens(text, 20)
+    assert cut.endswith("…") and estimate_tokens(cut) <= 20
+    assert truncate_to_tokens("短文本", 20) == "短文本"
+
+def test_rank_info_prefers_relevant_and_drops_duplicates():
+    info = [
+        {"title": "家电促销季开启", "summary": "冰箱洗衣机"},
+        {"title": "跑鞋市场转化率上升", "summary": "运动品类"},
+        {"title": "跑鞋市场转化率上升！", "summary": "运动品类"},
+        {"title": "春季服饰趋势", "summary": "跑鞋和运动服需求增长"},
+    ]
+    ranked = rank_info(CAMPAIGN, info)
+    assert [item["title"] for item in ranked] == ["跑鞋市场转化率上升", "春季服饰趋势", "家电促销季开启"]
+
+def test_build_analysis_respects_budget():
+    relevant = {"title": "跑鞋转化提升技巧", "summary": "跑鞋类目的转化优化"}
+    info = _info(12) + [relevant]
+    fixed = PromptBuilder(token_budget=100000).build_analysis(CAMPAIGN, []).estimated_tokens
+    lines = [estimate_tokens(f"- {item['title']}: {item['summary']}") + 1 for item in info]
+    # 放下最相关的一条和两条普通信息后，剩余预算只够半条
+    budget = fixed + lines[-1] + lines[0] + lines[1] + lines[2] // 2
+    plan = PromptBuilder(token_budget=budget).build_analysis(CAMPAIGN, info)
+    assert plan.estimated_tokens <= budget
+    assert plan.items_used == 4 and plan.items_dropped == len(info) - 4
+    assert plan.truncated and plan.prompt.count("…") == 1
+    # 最相关的一条排在最前面，即使它在列表末尾
+    assert plan.prompt.index("跑鞋转化提升技巧") < plan.prompt.index("行业动态")
+
+    roomy = PromptBuilder(token_budget=100000).build_analysis(CAMPAIGN, info)
+    assert roomy.items_used == len(info) and roomy.items_dropped == 0 and not roomy.truncated
+
+    # 预算连固定部分都放不下时不放任何行业信息
+    tight = PromptBuilder(token_budget=10).build_analysis(CAMPAIGN, info)
+    assert tight.items_used == 0 and not tight.truncated
+    assert "【广告活动】" in tight.prompt
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("PROMPT_TOKEN_BUDGET", "321")
+    assert PromptBuilder.from_env().token_budget == 321
+    monkeypatch.delenv("PROMPT_TOKEN_BUDGET")
+    assert PromptBuilder.from_env().token_budget == 1500
+
+def test_recent_metrics_splits_current_and_previous(engine):
+    ids = seed_campaigns(engine, 2)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    with Session(engine) as session:
+        for days_ago, clicks in ((0, 10), (6, 20), (7, 40), (13, 80), (14, 1000)):
+            session.add(AdResultDaily(campaign_id=ids[0], bucket=today - timedelta(days=days_ago),
+                                      impressions=clicks * 10, clicks=clicks, conversions=clicks // 10, cost=clicks * 2.0))
+        session.commit()
+        metrics = recent_metrics(session, ids)
+        assert recent_metrics(session, []) == {}
+
+    # 没有汇总数据的活动不出现在结果里；14天前的数据不计入任何周期
+    assert set(metrics) == {ids[0]}
+    current, previous = metrics[ids[0]]["current"], metrics[ids[0]]["previous"]
+    assert current["clicks"] == 30 and previous["clicks"] == 120
+    assert current["cost"] == 60.0 and previous["cost"] == 240.0
+
+    line = format_metrics(metrics[ids[0]])
+    assert line.startswith("近7天: 展示300，点击30，转化3")
+    assert "CTR 10.00%" in line and "CPA ¥20.0" in line
+    assert format_metrics(None) == "暂无近期效果数据"
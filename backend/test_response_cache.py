@@ -0,0 +1,33 @@
+"""响应缓存：ETag条件请求在写操作使对应标签失效前返回304，活动写入使仪表盘缓存失效"""
+
+from benchmarks.seed import seed_campaigns
+
+def test_etag_revalidates_until_write_invalidates(engine, client):
+    ids = seed_campaigns(engine, 2)
+    first = client.get(f"/api/campaigns/{ids[0]}")
+    assert first.status_code == 200 and first.headers["X-Cache"] == "MISS"
+    etag = first.headers["ETag"]
+
+    cached = client.get(f"/api/campaigns/{ids[0]}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.headers["X-Cache"] == "HIT"
+
+    # 修改其他活动不影响该活动的缓存
+    assert client.put(f"/api/campaigns/{ids[1]}", json={"name": "另一个活动"}).status_code == 200
+    assert client.get(f"/api/campaigns/{ids[0]}", headers={"If-None-Match": etag}).status_code == 304
+
+    assert client.put(f"/api/campaigns/{ids[0]}", json={"name": "改名后的活动"}).status_code == 200
+    changed = client.get(f"/api/campaigns/{ids[0]}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["X-Cache"] == "MISS"
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["name"] == "改名后的活动"
+
+def test_dashboard_cache_invalidated_by_campaign_create(engine, client):
+    seed_campaigns(engine, 3)
+    before = client.get("/api/dashboard/overview")
+    assert before.headers["X-Cache"] == "MISS"
+    assert client.get("/api/dashboard/overview").headers["X-Cache"] == "HIT"
+    resp = client.post("/api/campaigns/", json={"name": "新活动", "product": "新品", "objective": "拉新", "budget": 5000})
+    assert resp.status_code == 200, resp.text
+    after = client.get("/api/dashboard/overview")
+    assert after.headers["X-Cache"] == "MISS"
+    assert after.headers["ETag"] != before.headers["ETag"]
@@ -0,0 +1,68 @@
+"""效果数据批量导入：逐行错误报告、超长行中止、CSV表头校验、带时区时间换算为UTC"""
+
+import json
+from datetime import datetime
+
+from sqlmodel import Session, select
+
+from benchmarks.seed import seed_campaigns
+from models import AdResult, AdResultHourly
+from results import MAX_LINE_BYTES
+
+def _ndjson(campaign_id: int, n: int) -> bytes:
+    return b"".join(
+        json.dumps({"campaign_id": campaign_id, "impressions": 1000, "clicks": 10 + i, "conversions": 1, "cost": 5.0}).encode() + b"\n"
+        for i in range(n)
+    )
+
+def _result_count(engine) -> int:
+    with Session(engine) as session:
+        return len(session.exec(select(AdResult.id)).all())
+
+def test_bulk_ingest_reports_bad_lines_and_keeps_valid_rows(engine, client):
+    ids = seed_campaigns(engine, 2)
+    body = (
+        _ndjson(ids[0], 1)
+        + b'{"campaign_id": 1, "impressions": "\xff\xfe"}\n'
+        + b"not json\n"
+        + json.dumps({"campaign_id": 9999, "impressions": 1}).encode() + b"\n"
+        + _ndjson(ids[1], 1)
+    )
+    resp = client.post("/api/results/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert resp.status_code == 200, resp.text
+    data = resp.json()
+    assert (data["received"], data["inserted"], data["failed"]) == (5, 2, 3)
+    errors = {e["line"]: e["error"] for e in data["chunks_with_errors"][0]["errors"]}
+    assert set(errors) == {2, 3, 4}
+    assert "UTF-8" in errors[2]
+    assert "9999" in errors[4]
+    assert _result_count(engine) == 2
+
+def test_bulk_ingest_rejects_overlong_line_after_committed_chunks(engine, client):
+    ids = seed_campaigns(engine, 1)
+    body = _ndjson(ids[0], 150) + b'{"campaign_id": 1, "note": "' + b"x" * (MAX_LINE_BYTES + 10)
+    resp = client.post("/api/results/bulk", params={"chunk_size": 100},
+                       content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert resp.status_code == 413
+    assert "151" in resp.json()["detail"]
+    # 超长行之前已写满的批次保留，未满一批的行不写入
+    assert _result_count(engine) == 100
+
+def test_bulk_ingest_csv_with_invalid_header_encoding(engine, client):
+    seed_campaigns(engine, 1)
+    resp = client.post("/api/results/bulk", content=b"campaign_id,\xff\n1,2\n", headers={"Content-Type": "text/csv"})
+    assert resp.status_code == 400
+    assert "CSV表头" in resp.json()["detail"]
+
+def test_bulk_ingest_converts_offset_timestamps_to_utc(engine, client):
+    ids = seed_campaigns(engine, 1)
+    body = "campaign_id,impressions,clicks,conversions,cost,created_at\n" + "\n".join(
+        f"{ids[0]},100,10,1,2.0,{ts}" for ts in ("2026-03-10T09:30:00+08:00", "2026-03-10T01:45:00Z", "2026-03-10T01:10:00")
+    )
+    resp = client.post("/api/results/bulk", content=body.encode(), headers={"Content-Type": "text/csv"})
+    assert resp.status_code == 200 and resp.json()["inserted"] == 3, resp.text
+    with Session(engine) as session:
+        stored = sorted(r.created_at for r in session.exec(select(AdResult)).all())
+        buckets = {(r.bucket, r.rows) for r in session.exec(select(AdResultHourly)).all()}
+    assert stored == [datetime(2026, 3, 10, 1, 10), datetime(2026, 3, 10, 1, 30), datetime(2026, 3, 10, 1, 45)]
+    assert buckets == {(datetime(2026, 3, 10, 1, 0), 3)}
@@ -0,0 +1,79 @@
+"""冷归档：过期Agent日志归档后，分页、时间范围与步骤筛选的查询结果与归档前一致"""
+
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, select
+
+from benchmarks.seed import seed_agent_logs, seed_campaigns
+from models import AgentLog, ArchivePartition
+from pagination import NEXT_CURSOR_HEADER
+from retention import RetentionPolicy, retention_manager
+
+def _walk_logs(client, campaign_id: int, params: dict) -> list:
+    rows, cursor = [], None
+    while True:
+        resp = client.get(f"/api/campaigns/{campaign_id}/logs",
+                          params={**params, "limit": 25, **({"cursor": cursor} if cursor else {})})
+        rows.extend(resp.json()["agentLogs"])
+        cursor = resp.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return rows
+
+def test_archived_logs_merge_into_live_queries(engine, client, tmp_path, monkeypatch):
+    ids = seed_campaigns(engine, 3)
+    seed_agent_logs(engine, ids, 900)
+    monkeypatch.setattr(retention_manager, "engine", engine)
+    monkeypatch.setattr(retention_manager, "directory", str(tmp_path / "archive"))
+    monkeypatch.setattr(retention_manager, "policies", {"agentlog": RetentionPolicy(AgentLog, 7)})
+    monkeypatch.setattr(retention_manager, "batch_size", 100)
+    monkeypatch.setattr(retention_manager, "pause", 0)
+
+    old_range = {
+        "created_from": (datetime.utcnow() - timedelta(days=20)).isoformat(),
+        "created_to": (datetime.utcnow() - timedelta(days=10)).isoformat(),
+    }
+    before_all = _walk_logs(client, ids[0], {})
+    before_old = _walk_logs(client, ids[0], old_range)
+    before_step = _walk_logs(client, ids[0], {"step": "decision"})
+    assert before_old
+
+    summary = retention_manager.run()
+    assert summary["agentlog"]["rows"] > 0
+    cutoff = datetime.utcnow() - timedelta(days=7)
+    with Session(engine) as session:
+        live = session.exec(select(AgentLog)).all()
+    # 只有ID最大的一行可能早于热数据窗口仍留在在线库（避免SQLite复用ID）
+    stale = [log.id for log in live if log.created_at < cutoff - timedelta(minutes=1)]
+    assert stale in ([], [max(log.id for log in live)])
+    assert len(live) + summary["agentlog"]["rows"] == 900
+
+    assert _walk_logs(client, ids[0], {}) == before_all
+    assert _walk_logs(client, ids[0], old_range) == before_old
+    assert _walk_logs(client, ids[0], {"step": "decision"}) == before_step
+
+def test_dry_run_and_repeated_runs_compact_without_duplicates(engine, tmp_path, monkeypatch):
+    ids = seed_campaigns(engine, 2)
+    seed_agent_logs(engine, ids, 400)
+    monkeypatch.setattr(retention_manager, "engine", engine)
+    monkeypatch.setattr(retention_manager, "directory", str(tmp_path / "archive"))
+    monkeypatch.setattr(retention_manager, "policies", {"agentlog": RetentionPolicy(AgentLog, 7)})
+    monkeypatch.setattr(retention_manager, "batch_size", 50)
+    monkeypatch.setattr(retention_manager, "pause", 0)
+
+    planned = retention_manager.run(dry_run=True)["agentlog"]["rows"]
+    with Session(engine) as session:
+        assert len(session.exec(select(AgentLog)).all()) == 400
+        # 先只归档一部分，再由完整运行接着归档并把同月分片合并
+        first = retention_manager.archive_table(session, "agentlog", max_rows=120)["rows"]
+    assert planned > first == 120
+    assert retention_manager.run()["agentlog"]["rows"] == planned - first
+
+    with Session(engine) as session:
+        parts = session.exec(select(ArchivePartition)).all()
+        archived = [row.id for campaign_id in ids for row in retention_manager.query(session, AgentLog, campaign_id)]
+        live = session.exec(select(AgentLog.id)).all()
+    assert len(archived) == len(set(archived)) == planned
+    assert not set(archived) & set(live) and len(archived) + len(live) == 400
+    assert all(part.compacted for part in parts)
+    assert len({part.month for part in parts}) == len(parts)
+    assert sum(part.rows for part in parts) == planned
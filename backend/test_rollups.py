@@ -0,0 +1,116 @@
+"""效果数据汇总表：增量刷新与完整重建一致、并发刷新串行化、刷新后仪表盘缓存失效"""
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from benchmarks.seed import seed_campaigns, seed_results
+from models import AdResult, AdResultDaily, AdResultHourly
+from rollups import ROLLUP_TABLES, RollupRefresher, rebuild_rollups, refresh_rollups
+
+def _rollup_snapshot(engine) -> dict:
+    with Session(engine) as session:
+        return {
+            grain: sorted(
+                (r.campaign_id, r.bucket, r.impressions, r.clicks, r.conversions, round(r.cost, 6), r.rows)
+                for r in session.exec(select(model)).all()
+            )
+            for grain, model in ROLLUP_TABLES.items()
+        }
+
+def test_rollup_incremental_refresh_matches_rebuild(engine):
+    ids = seed_campaigns(engine, 5)
+    seed_results(engine, ids, 2000, days=10)
+    with Session(engine) as session:
+        first = refresh_rollups(session)
+    assert first["daily"]["results"] == 2000
+
+    # 迟到的历史数据（早于已汇总的时间桶）与新数据一起增量累加
+    now = datetime.utcnow()
+    late = [
+        {"campaign_id": ids[i % 5], "impressions": 100, "clicks": 5, "conversions": 1, "cost": 2.5,
+         "created_at": now - timedelta(days=8, minutes=i)}
+        for i in range(50)
+    ] + [
+        {"campaign_id": ids[0], "impressions": 10, "clicks": 1, "conversions": 0, "cost": 0.5, "created_at": now}
+    ]
+    with Session(engine) as session:
+        session.execute(insert(AdResult), late)
+        session.commit()
+        second = refresh_rollups(session)
+        assert second["hourly"]["results"] == len(late)
+        assert refresh_rollups(session) == {grain: {"buckets": 0, "results": 0} for grain in ROLLUP_TABLES}
+
+        raw = {}
+        for r in session.exec(select(AdResult)).all():
+            day = r.created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+            total = raw.setdefault((r.campaign_id, day), [0, 0, 0, 0.0, 0])
+            for i, value in enumerate((r.impressions, r.clicks, r.conversions, r.cost, 1)):
+                total[i] += value
+        daily = {(r.campaign_id, r.bucket): r for r in session.exec(select(AdResultDaily)).all()}
+        assert set(daily) == set(raw)
+        for key, (impressions, clicks, conversions, cost, rows) in raw.items():
+            row = daily[key]
+            assert (row.impressions, row.clicks, row.conversions, row.rows) == (impressions, clicks, conversions, rows)
+            assert row.cost == pytest.approx(cost)
+        hourly_rows = sum(r.rows for r in session.exec(select(AdResultHourly)).all())
+        assert hourly_rows == 2000 + len(late)
+
+    incremental = _rollup_snapshot(engine)
+    with Session(engine) as session:
+        rebuild_rollups(session)
+    assert _rollup_snapshot(engine) == incremental
+
+def test_concurrent_refreshes_never_double_count(engine):
+    ids = seed_campaigns(engine, 3)
+    errors = []
+
+    def _writer():
+        for i in range(20):
+            with Session(engine) as session:
+                session.execute(insert(AdResult), [
+                    {"campaign_id": ids[j % 3], "impressions": 10, "clicks": 1, "conversions": 0, "cost": 1.0,
+                     "created_at": datetime.utcnow() - timedelta(hours=j)}
+                    for j in range(25)
+                ])
+                session.commit()
+
+    def _refresher():
+        try:
+            for _ in range(10):
+                with Session(engine) as session:
+                    refresh_rollups(session)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_writer)] + [threading.Thread(target=_refresher) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+    with Session(engine) as session:
+        refresh_rollups(session)
+        for model in ROLLUP_TABLES.values():
+            assert sum(r.rows for r in session.exec(select(model)).all()) == 20 * 25
+    incremental = _rollup_snapshot(engine)
+    with Session(engine) as session:
+        rebuild_rollups(session)
+    assert _rollup_snapshot(engine) == incremental
+
+def test_background_refresh_invalidates_dashboard_cache(engine, client):
+    ids = seed_campaigns(engine, 1)
+    refresher = RollupRefresher(engine=engine)
+    assert client.get("/api/dashboard/overview").headers["X-Cache"] == "MISS"
+    refresher.run()
+    # 没有新数据时不失效
+    assert client.get("/api/dashboard/overview").headers["X-Cache"] == "HIT"
+
+    seed_results(engine, ids, 10, days=1)
+    refresher.run()
+    assert refresher.last_result["rollups"]["hourly"]["results"] == 10
+    assert client.get("/api/dashboard/overview").headers["X-Cache"] == "MISS"
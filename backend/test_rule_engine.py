@@ -0,0 +1,108 @@
+"""规则引擎：自动执行只调整仍在投放中的活动；人工执行规则建议须先审批，并发执行时只认领并调整一次"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from models import AdCampaign, AdResult, AIAdvice, AIExecution, AutomationRule
+from rollups import refresh_rollups
+from rule_engine import CampaignSnapshot, evaluate, record_matches, run_rules
+
+def _setup(engine, statuses: list, auto_execute: bool, action: str = "budget_decrease") -> list:
+    """按状态建活动，每个活动近3小时花费500且无转化（CPA无穷大），并建一条CPA>100的规则"""
+    with Session(engine) as session:
+        campaigns = [AdCampaign(name=f"活动{i}", product="耳机", objective="转化优化", budget=1000.0, status=status)
+                     for i, status in enumerate(statuses)]
+        session.add_all(campaigns)
+        session.commit()
+        ids = [c.id for c in campaigns]
+        session.execute(insert(AdResult), [
+            {"campaign_id": campaign_id, "impressions": 5000, "clicks": 200, "conversions": 0, "cost": 500.0,
+             "created_at": datetime.utcnow() - timedelta(hours=3)}
+            for campaign_id in ids
+        ])
+        session.add(AutomationRule(name="CPA过高", metric="cpa", operator=">", threshold=100, action=action,
+                                   action_value=50, auto_execute=auto_execute))
+        session.commit()
+    return ids
+
+def _state(engine) -> dict:
+    with Session(engine) as session:
+        campaigns = {c.id: (c.status, c.budget) for c in session.exec(select(AdCampaign)).all()}
+        advices = {a.campaign_id: a for a in session.exec(select(AIAdvice)).all()}
+        executions = session.exec(select(AIExecution)).all()
+    return {"campaigns": campaigns, "advices": advices, "executions": executions}
+
+def test_auto_execute_adjusts_running_campaigns_only(engine):
+    running, paused = _setup(engine, ["running", "paused"], auto_execute=True)
+    with Session(engine) as session:
+        result = run_rules(session)
+    assert (result["matched"], result["executed"]) == (1, 1)
+    state = _state(engine)
+    assert state["campaigns"] == {running: ("running", 500.0), paused: ("paused", 1000.0)}
+    advice = state["advices"][running]
+    assert (advice.status, advice.approved_by) == ("executed", "rule_engine")
+    assert [e.advice_id for e in state["executions"]] == [advice.id]
+
+def test_campaign_paused_after_evaluation_is_left_for_review(engine):
+    ids = _setup(engine, ["running", "running"], auto_execute=True)
+    with Session(engine) as session:
+        refresh_rollups(session)
+        rules = session.exec(select(AutomationRule)).all()
+        snapshot = CampaignSnapshot(session, datetime.utcnow(), [24])
+        matches = evaluate(session, snapshot, rules)
+        # 评估之后、执行之前活动被人工暂停
+        session.get(AdCampaign, ids[1]).status = "paused"
+        summary = record_matches(session, snapshot, matches)
+    assert (summary["advices"], summary["executed"]) == (2, 1)
+    state = _state(engine)
+    assert state["campaigns"] == {ids[0]: ("running", 500.0), ids[1]: ("paused", 1000.0)}
+    skipped = state["advices"][ids[1]]
+    assert (skipped.status, skipped.executed_at, skipped.approved_by) == ("pending", None, None)
+    assert [e.advice_id for e in state["executions"]] == [state["advices"][ids[0]].id]
+
+def test_manual_execute_requires_approval_and_applies_once(engine, client):
+    campaign_id = _setup(engine, ["running"], auto_execute=False)[0]
+    with Session(engine) as session:
+        run_rules(session)
+    advice_id = _state(engine)["advices"][campaign_id].id
+
+    resp = client.post(f"/api/ai/execute/{advice_id}")
+    assert resp.status_code == 409 and "请先审批" in resp.json()["detail"]
+    assert client.post(f"/api/ai/approve/{advice_id}", params={"approve": True}).status_code == 200
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        statuses = list(pool.map(lambda _: client.post(f"/api/ai/execute/{advice_id}").status_code, range(4)))
+    # 先认领的请求调整活动；其余请求要么认领失败返回409，要么看到已执行只追加记录，都不再调整
+    assert statuses.count(200) >= 1 and set(statuses) <= {200, 409}
+    state = _state(engine)
+    assert state["campaigns"][campaign_id] == ("running", 500.0)
+    assert state["advices"][campaign_id].status == "executed"
+    assert sum(e.result.startswith("规则动作已执行") for e in state["executions"]) == 1
+
+def test_manual_execute_rolls_back_when_campaign_no_longer_running(engine, client):
+    campaign_id = _setup(engine, ["running"], auto_execute=False, action="pause")[0]
+    with Session(engine) as session:
+        run_rules(session)
+        session.get(AdCampaign, campaign_id).status = "completed"
+        session.commit()
+    advice_id = _state(engine)["advices"][campaign_id].id
+    assert client.post(f"/api/ai/approve/{advice_id}", params={"approve": True}).status_code == 200
+
+    resp = client.post(f"/api/ai/execute/{advice_id}")
+    assert resp.status_code == 409 and resp.json()["detail"] == "活动已不在投放中，规则动作未执行"
+    state = _state(engine)
+    assert state["advices"][campaign_id].status == "approved"
+    assert state["campaigns"][campaign_id] == ("completed", 1000.0)
+    assert state["executions"] == []
+
+def test_rejected_advice_cannot_be_executed(engine, client):
+    campaign_id = _setup(engine, ["running"], auto_execute=False)[0]
+    with Session(engine) as session:
+        run_rules(session)
+    advice_id = _state(engine)["advices"][campaign_id].id
+    assert client.post(f"/api/ai/approve/{advice_id}", params={"approve": False}).status_code == 200
+    assert client.post(f"/api/ai/execute/{advice_id}").status_code == 409
+    assert _state(engine)["campaigns"][campaign_id] == ("running", 1000.0)
@@ -0,0 +1,108 @@
+"""全文搜索：中文二元组词元与查询转换，FTS5索引随应用与外部写入、回滚、删除同步，按类型/活动筛选与标题加权排序，接口按相关度游标分页"""
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+from sqlmodel import Session
+
+from models import AdCampaign, AIAdvice
+from pagination import NEXT_CURSOR_HEADER
+from search_index import cjk_tokens, index_stats, match_query, rebuild, search
+
+def _titles(engine, query: str) -> set:
+    with Session(engine) as session:
+        results, _ = search(session, query)
+    return {r["title"] for r in results}
+
+@pytest.mark.sqlite_only
+def test_search_index_follows_writes_and_rollbacks(engine):
+    with Session(engine) as session:
+        campaign = AdCampaign(name="春季新品推广", product="运动鞋", objective="拉新", budget=1000.0)
+        session.add(campaign)
+        session.commit()
+        assert _titles(engine, "新品") == {"春季新品推广"}
+
+        campaign.name = "夏季清仓活动"
+        session.add(campaign)
+        session.commit()
+        assert _titles(engine, "新品") == set()
+        assert _titles(engine, "清仓") == {"夏季清仓活动"}
+
+        session.add(AdCampaign(name="回滚的活动", product="耳机", objective="拉新", budget=1.0))
+        session.flush()
+        session.rollback()
+        assert _titles(engine, "回滚") == set()
+
+        session.delete(session.get(AdCampaign, campaign.id))
+        session.commit()
+        assert _titles(engine, "清仓") == set()
+        assert index_stats(session)["campaign"] == 0
+
+@pytest.mark.sqlite_only
+def test_search_triggers_accept_external_writers(engine, db_path):
+    # 触发器只用纯SQL入队，不经过应用连接（未注册任何自定义函数）也能写源表
+    external = sqlite3.connect(db_path)
+    external.execute(
+        "INSERT INTO adcampaign (name, product, objective, budget, status, created_at) "
+        "VALUES ('外部导入的直播活动', '直播', '拉新', 100, 'created', '2026-01-01 00:00:00')"
+    )
+    external.commit()
+    external.close()
+
+    # 外部写入在应用下一次写事务提交时同步进索引
+    with Session(engine) as session:
+        session.add(AdCampaign(name="应用写入的活动", product="直播", objective="拉新", budget=1.0))
+        session.commit()
+    assert _titles(engine, "直播") == {"外部导入的直播活动", "应用写入的活动"}
+
+def test_search_api_pages_by_rank(engine, client):
+    with Session(engine) as session:
+        session.execute(insert(AdCampaign), [
+            {"name": f"新品推广{i}", "product": "新品", "objective": "拉新", "budget": 1.0, "status": "running",
+             "created_at": datetime.utcnow()}
+            for i in range(12)
+        ])
+        session.commit()
+    seen, cursor = [], None
+    while True:
+        resp = client.get("/api/search", params={"q": "新品", "limit": 5, **({"cursor": cursor} if cursor else {})})
+        seen.extend(r["id"] for r in resp.json()["results"])
+        cursor = resp.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+    assert sorted(seen) == list(range(1, 13))
+    assert client.get("/api/search", params={"q": "新品", "types": "unknown"}).status_code == 400
+
+def test_tokens_and_match_query():
+    assert cjk_tokens("春季新品 Sale2026") == "春季 季新 新品 品 sale2026"
+    assert match_query("新品 sale") == '"新品" AND "sale"*'
+    assert match_query("春季新品") == '"春季 季新 新品"'
+    assert match_query("新") == '"新"*'
+    assert match_query(" ,。 ") is None
+
+@pytest.mark.sqlite_only
+def test_search_filters_rank_titles_first_and_rebuilds(engine):
+    with Session(engine) as session:
+        titled = AdCampaign(name="跑鞋促销", product="服饰", objective="拉新", budget=1.0)
+        mentioned = AdCampaign(name="夏季活动", product="跑鞋", objective="转化", budget=1.0)
+        session.add_all([titled, mentioned])
+        session.commit()
+        session.add(AIAdvice(campaign_id=mentioned.id, type="analysis", content="建议提高跑鞋关键词出价", status="pending"))
+        session.commit()
+
+        results, _ = search(session, "跑鞋")
+        assert [r["type"] for r in results[:2]] == ["campaign", "campaign"]
+        # 标题命中排在只有正文命中的前面
+        assert results[0]["title"] == "跑鞋促销"
+        assert {r["type"] for r in results} == {"campaign", "advice"}
+        assert [r["type"] for r in search(session, "跑鞋", types=["advice"])[0]] == ["advice"]
+        assert {r["id"] for r in search(session, "跑鞋", campaign_id=mentioned.id)[0] if r["type"] == "campaign"} == {mentioned.id}
+        with pytest.raises(ValueError):
+            search(session, "   ")
+
+        stats = index_stats(session)
+        assert stats["campaign"] == 2 and stats["advice"] == 1
+        assert rebuild(session) == 3
+        assert _titles(engine, "跑鞋") == {"跑鞋促销", "夏季活动", "analysis"}
@@ -0,0 +1,77 @@
+"""流式分析：经假大模型服务逐段推送token事件，完整结束后在独立会话中保存AI建议；失败时推送error且不保存"""
+
+import json
+
+import httpx
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from agent_core import ads_agent
+from benchmarks.fake_llm import create_fake_llm_app
+from benchmarks.seed import seed_campaigns
+from db import get_async_session
+from llm_client import AsyncLLMClient, LLMProvider
+from main import app
+from models import AIAdvice
+
+REPLY = "建议：点击率上升、转化成本下降，适当提高预算并扩充相关关键词。"
+
+def _use_fake_llm(monkeypatch, **options):
+    fake = create_fake_llm_app(latency=0, reply=REPLY, chunk_chars=4, **options)
+    llm = AsyncLLMClient([LLMProvider("primary", "http://primary/v1", "fake-model", "key")],
+                         max_retries=0, transport=httpx.ASGITransport(app=fake))
+    monkeypatch.setattr(ads_agent, "llm", llm)
+
+def _track_request_sessions(monkeypatch) -> list:
+    """记录经请求作用域会话写入的对象类型：保存建议不应经过请求会话（它在生成器运行前可能已关闭）"""
+    original, written = app.dependency_overrides[get_async_session], []
+
+    def _before_flush(session, flush_context, instances):
+        written.extend(type(obj).__name__ for obj in session.new)
+
+    async def _tracking():
+        async for session in original():
+            event.listen(session.sync_session, "before_flush", _before_flush)
+            yield session
+
+    monkeypatch.setitem(app.dependency_overrides, get_async_session, _tracking)
+    return written
+
+def _events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+def test_stream_saves_advice_after_done(engine, client, monkeypatch):
+    _use_fake_llm(monkeypatch)
+    written = _track_request_sessions(monkeypatch)
+    campaign_id = seed_campaigns(engine, 1)[0]
+    resp = client.post(f"/api/campaigns/{campaign_id}/agent/analyze", params={"stream": True, "no_cache": True})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+
+    events = _events(resp.text)
+    kinds = [kind for kind, _ in events]
+    assert kinds[0] == "info" and kinds[-1] == "done"
+    tokens = [data["text"] for kind, data in events if kind == "token"]
+    assert len(tokens) > 1 and "".join(tokens) == REPLY
+
+    done = events[-1][1]
+    assert done["suggestion"] == REPLY
+    with Session(engine) as session:
+        advice = session.get(AIAdvice, done["advice_id"])
+    assert advice.campaign_id == campaign_id and advice.content == REPLY and advice.status == "pending"
+    assert written == []
+    assert [a["id"] for a in client.get("/api/ai/advices", params={"campaign_id": campaign_id}).json()] == [advice.id]
+
+def test_stream_failure_does_not_save(engine, client, monkeypatch):
+    _use_fake_llm(monkeypatch, failure_rate=1.0)
+    campaign_id = seed_campaigns(engine, 1)[0]
+    events = _events(client.post(f"/api/campaigns/{campaign_id}/agent/analyze",
+                                 params={"stream": True, "no_cache": True}).text)
+    assert [kind for kind, _ in events] == ["info", "error"]
+    assert events[-1][1]["detail"].startswith("AI分析失败")
+    with Session(engine) as session:
+        assert session.exec(select(AIAdvice)).all() == []
@@ -1,4 +1,4 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
 import { Badge } from "@/components/ui/badge";
@@ -23,6 +23,8 @@ export function AgentDecisionTree({ campaignId }: { campaignId: number }) {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [optimizing, setOptimizing] = useState(false);
+  // 当前展示的Agent运行，/decisions只返回最近一次运行的链路
+  const runIdRef = useRef<number | null>(null);
   const { toast } = useToast();
 
   const fetchDecisionFlow = () => {
@@ -33,6 +35,7 @@ export function AgentDecisionTree({ campaignId }: { campaignId: number }) {
         return res.json();
       })
       .then(data => {
+        runIdRef.current = data.runId ?? null;
         setDecisionFlow(data.decisionFlow || []);
         setError(null);
       })
@@ -46,6 +49,28 @@ export function AgentDecisionTree({ campaignId }: { campaignId: number }) {
   useEffect(() => {
     if (!campaignId) return;
     fetchDecisionFlow();
+    // 订阅实时事件：新的Agent步骤直接追加到决策链路，不再重复拉取全量历史；
+    // 步骤属于新的运行时，从该运行的第一步重新开始展示
+    const source = new EventSource(`/api/campaigns/${campaignId}/events`);
+    source.addEventListener("agent_log", (e) => {
+      const log = JSON.parse((e as MessageEvent).data);
+      const runId = log.run_id ?? null;
+      const newRun = runId !== runIdRef.current;
+      runIdRef.current = runId;
+      setDecisionFlow(flow => [...(newRun ? [] : flow), {
+        id: log.index ?? (newRun ? 1 : flow.length + 1),
+        type: log.step,
+        title: log.step.charAt(0).toUpperCase() + log.step.slice(1),
+        description: log.message,
+        status: log.status,
+        timestamp: log.created_at.replace("T", " ").slice(0, 19),
+        input: log.data,
+        output: log.output ?? { message: log.message }
+      }]);
+    });
+    // 断线期间的事件无法补发时重新拉取全量数据
+    source.addEventListener("reset", () => fetchDecisionFlow());
+    return () => source.close();
   }, [campaignId]);
 
   const handleOptimize = async () => {
@@ -53,9 +78,17 @@ export function AgentDecisionTree({ campaignId }: { campaignId: number }) {
     try {
       const res = await fetch(`/api/campaigns/${campaignId}/agent/optimize`, { method: "POST" });
       if (!res.ok) throw new Error("AI优化失败");
-      const data = await res.json();
-      toast({ title: "AI优化完成", description: data.result?.result || data.message });
-      fetchDecisionFlow();
+      const { job_id } = await res.json();
+      // 优化在后台任务队列中执行，轮询任务状态直到结束
+      let job: any;
+      do {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const jobRes = await fetch(`/api/jobs/${job_id}`);
+        if (!jobRes.ok) throw new Error("查询优化任务失败");
+        job = await jobRes.json();
+      } while (job.status === "queued" || job.status === "running");
+      if (job.status !== "succeeded") throw new Error(job.error || "AI优化失败");
+      toast({ title: "AI优化完成", description: job.result?.result });
     } catch (err: any) {
       toast({ title: err.message || "AI优化失败" });
     } finally {